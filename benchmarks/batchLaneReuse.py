@@ -0,0 +1,100 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Measure the per-dataset overhead of headless batch processing, with and without --reuse_lanes.
+
+Many small random images are exported (to arrays, so disk I/O doesn't count) from a trained project,
+once building a new lane for each image, and once pointing the same lane to one image after another.
+For small images, the time per image is dominated by building and tearing down the lane's operators.
+
+Usage:
+
+    python benchmarks/batchLaneReuse.py --project MyPixelClassification.ilp --images 200 --shape 64 64 1 --axes yxc
+"""
+import argparse
+
+import numpy as np
+import vigra
+
+from ilastik import app
+from ilastik.applets.dataSelection.opDataSelection import PreloadedArrayDatasetInfo
+from lazyflow.utility import Timer
+
+
+def run(batchProcessingApplet, lane_configs, reuse_lanes):
+    with Timer() as timer:
+        results = batchProcessingApplet.run_export(lane_configs, export_to_array=True, reuse_lanes=reuse_lanes)
+    return results, timer.seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", required=True, help="trained project with a batch processing applet")
+    parser.add_argument("--images", type=int, default=100)
+    parser.add_argument("--shape", type=int, nargs="+", default=[64, 64, 1], help="shape of each image")
+    parser.add_argument("--axes", default="yxc", help="axes of each image")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    parsed_args = app.parse_args([])
+    parsed_args.headless = True
+    parsed_args.project = args.project
+    shell = app.main(parsed_args, init_logging=False)
+    try:
+        batchProcessingApplet = shell.workflow.batchProcessingApplet
+        role_name = shell.workflow.dataSelectionApplet.role_names[0]
+
+        rng = np.random.default_rng(0)
+        lane_configs = [
+            {
+                role_name: PreloadedArrayDatasetInfo(
+                    preloaded_array=rng.integers(0, 255, args.shape, dtype=np.uint8),
+                    axistags=vigra.defaultAxistags(args.axes),
+                )
+            }
+            for _ in range(args.images)
+        ]
+        print(f"{args.images} images of shape {tuple(args.shape)} ({args.axes})")
+
+        # Warm up (imports, classifier, first-time allocations)
+        run(batchProcessingApplet, lane_configs[:2], reuse_lanes=False)
+
+        seconds = {}
+        results = {}
+        for reuse_lanes in (False, True):
+            results[reuse_lanes], seconds[reuse_lanes] = min(
+                (run(batchProcessingApplet, lane_configs, reuse_lanes) for _ in range(args.repeats)),
+                key=lambda result_and_seconds: result_and_seconds[1],
+            )
+            label = "reuse lanes" if reuse_lanes else "new lanes"
+            print(
+                f"{label:<14}{seconds[reuse_lanes]:>8.2f} s{1000 * seconds[reuse_lanes] / args.images:>10.1f} ms/image"
+            )
+
+        print(f"saved {1000 * (seconds[False] - seconds[True]) / args.images:.1f} ms/image")
+        for new_lane_result, reused_lane_result in zip(results[False], results[True]):
+            np.testing.assert_array_equal(new_lane_result, reused_lane_result)
+    finally:
+        shell.closeCurrentProject()
+
+
+if __name__ == "__main__":
+    main()
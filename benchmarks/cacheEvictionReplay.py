@@ -0,0 +1,118 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Replay a cache access trace against the cache eviction policies of the cache memory manager.
+
+A trace is a json-lines file with one access per line::
+
+    {"key": "OpPixelFeatures: ((0, 0, 0), (64, 64, 64))", "nbytes": 8388608, "cost": 12.5}
+
+``cost`` is the time (in seconds) it takes to compute the block on a miss.
+Without a trace file, a synthetic trace is generated: cheap raw data blocks and expensive
+feature blocks, accessed with a skewed (zipf-like) popularity distribution.
+
+For each policy, the hit rate and the total recomputation time are reported.
+
+Usage:
+
+    python benchmarks/cacheEvictionReplay.py --capacity-mb 512
+    python benchmarks/cacheEvictionReplay.py --trace accesses.jsonl --capacity-mb 4096
+"""
+import argparse
+import json
+import random
+from typing import Iterable, List, NamedTuple
+
+from lazyflow.operators.cacheEvictionPolicy import POLICY_NAMES, CacheEntry, createEvictionPolicy
+
+# Same ratio as _CacheMemoryManager._target_usage
+TARGET_USAGE = 0.9
+
+
+class Access(NamedTuple):
+    key: str
+    nbytes: int
+    cost: float
+
+
+def load_trace(path) -> List[Access]:
+    with open(path) as f:
+        return [Access(**json.loads(line)) for line in f if line.strip()]
+
+
+def synthetic_trace(num_accesses=20000, num_raw=400, num_features=400, seed=42) -> List[Access]:
+    rng = random.Random(seed)
+    blocks = [Access(f"raw {i}", 2 * 1024**2, rng.uniform(0.01, 0.05)) for i in range(num_raw)]
+    blocks += [Access(f"features {i}", 16 * 1024**2, rng.uniform(2.0, 40.0)) for i in range(num_features)]
+    rng.shuffle(blocks)
+    weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(blocks))]
+    return rng.choices(blocks, weights=weights, k=num_accesses)
+
+
+def replay(trace: Iterable[Access], policy_name: str, capacity: int):
+    """Simulate the memory manager: evict (in policy order) down to the target once over capacity."""
+    policy = createEvictionPolicy(policy_name)
+    cached = {}  # key -> CacheEntry
+    used = 0
+    hits = 0
+    misses = 0
+    recompute = 0.0
+
+    for clock, access in enumerate(trace):
+        entry = cached.get(access.key)
+        if entry is not None:
+            hits += 1
+        else:
+            misses += 1
+            recompute += access.cost
+            used += access.nbytes
+        cached[access.key] = CacheEntry(access.key, float(clock), access.nbytes, access.cost)
+
+        if used > capacity:
+            for victim in policy.evictionOrder(list(cached.values())):
+                if used <= TARGET_USAGE * capacity:
+                    break
+                del cached[victim.key]
+                used -= victim.nbytes
+                policy.notifyEvicted(victim)
+
+    return hits, misses, recompute
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="json-lines access trace (default: synthetic trace)")
+    parser.add_argument("--capacity-mb", type=float, default=1024.0)
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace) if args.trace else synthetic_trace()
+    capacity = int(args.capacity_mb * 1024**2)
+    no_cache_cost = sum(access.cost for access in trace)
+
+    print(f"{len(trace)} accesses, {len({a.key for a in trace})} distinct blocks, capacity {args.capacity_mb} MB")
+    print(f"{'policy':<8}{'hit rate':>10}{'recompute [s]':>16}{'saved [s]':>12}")
+    for name in POLICY_NAMES:
+        hits, misses, recompute = replay(trace, name, capacity)
+        print(f"{name:<8}{hits / (hits + misses):>10.1%}{recompute:>16.1f}{no_cache_cost - recompute:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Compare the block storage backends of OpCompressedCache (see lazyflow/operators/compressedBlockStore.py).
+
+For each backend, three phases are timed:
+
+* fill: the first request for the whole volume, which computes and compresses all blocks
+* read: a second request for the whole volume, served from the cache
+* random: many small requests at random positions, in parallel
+
+Usage:
+
+    python benchmarks/compressedCacheBackends.py --shape 512 512 512 --blockshape 128 128 128
+"""
+import argparse
+
+import numpy as np
+import vigra
+
+from lazyflow.graph import Graph
+from lazyflow.operators import OpArrayPiper, OpCompressedCache, compressedBlockStore
+from lazyflow.request import RequestPool
+from lazyflow.utility import Memory, Timer
+
+
+def sample_data(shape, seed=0):
+    """Smooth data with some noise, roughly as compressible as typical feature images."""
+    rng = np.random.default_rng(seed)
+    data = np.indices(shape, dtype=np.float32).sum(0) / sum(shape)
+    data += rng.normal(scale=0.01, size=shape).astype(np.float32)
+    return vigra.taggedView(data, "zyx")
+
+
+def run(backend, data, blockshape, num_random, random_size):
+    compressedBlockStore.setDefaultBackend(backend)
+    graph = Graph()
+    opData = OpArrayPiper(graph=graph)
+    opData.Input.setValue(data)
+    op = OpCompressedCache(graph=graph)
+    op.BlockShape.setValue(blockshape)
+    op.Input.connect(opData.Output)
+
+    timings = {}
+    with Timer() as timer:
+        op.Output[...].wait()
+    timings["fill"] = timer.seconds()
+
+    with Timer() as timer:
+        op.Output[...].wait()
+    timings["read"] = timer.seconds()
+
+    rng = np.random.default_rng(1)
+    starts = [[rng.integers(0, s - random_size + 1) for s in data.shape] for _ in range(num_random)]
+    pool = RequestPool()
+    for start in starts:
+        pool.add(op.Output(start, [s + random_size for s in start]))
+    with Timer() as timer:
+        pool.wait()
+    timings["random"] = timer.seconds()
+
+    used = op.usedMemory()
+    op.Input.disconnect()
+    op.cleanUp()
+    return timings, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", type=int, nargs=3, default=[256, 512, 512])
+    parser.add_argument("--blockshape", type=int, nargs=3, default=[64, 128, 128])
+    parser.add_argument("--random-requests", type=int, default=500)
+    parser.add_argument("--random-size", type=int, default=32)
+    args = parser.parse_args()
+
+    data = sample_data(tuple(args.shape))
+    volume_mb = data.nbytes / 1024**2
+    random_mb = args.random_requests * args.random_size**3 * data.itemsize / 1024**2
+    print(f"volume {args.shape} float32 ({volume_mb:.0f} MB), blocks {args.blockshape}")
+    print(f"{'backend':<8}{'fill [MB/s]':>13}{'read [MB/s]':>13}{'random [MB/s]':>15}{'cache size':>12}")
+    for backend in compressedBlockStore.BACKENDS:
+        timings, used = run(backend, data, args.blockshape, args.random_requests, args.random_size)
+        print(
+            f"{backend:<8}{volume_mb / timings['fill']:>13.0f}{volume_mb / timings['read']:>13.0f}"
+            f"{random_mb / timings['random']:>15.0f}{Memory.format(used):>12}"
+        )
+    compressedBlockStore.setDefaultBackend("hdf5")
+
+
+if __name__ == "__main__":
+    main()
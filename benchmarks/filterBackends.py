@@ -0,0 +1,99 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Compare the filter backends of OpPixelFeaturesPresmoothed: the filter operators ("operators") and
+the filter bank that shares the Gaussian smoothing and derivatives of each scale ("fused").
+
+The whole volume is requested block by block, as a batch export would do, with all features selected
+at all scales.  Besides the running time, the largest difference between the backends is reported
+for each feature, relative to the largest magnitude of that feature.
+
+Usage:
+
+    python benchmarks/filterBackends.py --shape 128 256 256 --blockshape 64 64 64
+"""
+import argparse
+
+import numpy as np
+import vigra
+
+from lazyflow.graph import Graph
+from lazyflow.operators import OpPixelFeaturesPresmoothed
+from lazyflow.operators.filterBank import FEATURE_IDS
+from lazyflow.request import RequestPool
+from lazyflow.roi import getIntersectingBlocks, getBlockBounds
+from lazyflow.utility import Timer
+
+SCALES = [0.7, 1.0, 1.6, 3.5, 5.0]
+
+
+def run(data, blockshape, backend, in2d):
+    op = OpPixelFeaturesPresmoothed(graph=Graph())
+    op.Scales.setValue(SCALES)
+    op.FeatureIds.setValue(FEATURE_IDS)
+    op.SelectionMatrix.setValue(np.ones((len(FEATURE_IDS), len(SCALES)), dtype=bool))
+    op.ComputeIn2d.setValue([in2d] * len(SCALES))
+    op.FilterBackend.setValue(backend)
+    op.Input.setValue(data)
+
+    shape = op.Output.meta.shape
+    full_blockshape = (1, shape[1]) + tuple(blockshape)
+    result = np.empty(shape, dtype=np.float32)
+    pool = RequestPool()
+    for block_start in getIntersectingBlocks(full_blockshape, ([0] * 5, shape)):
+        block_roi = getBlockBounds(shape, full_blockshape, block_start)
+        pool.add(op.Output(*block_roi).writeInto(result[tuple(map(slice, *block_roi))]))
+    with Timer() as timer:
+        pool.wait()
+
+    channels = [op.featureOps[i][j].resultingChannels() for i in range(len(FEATURE_IDS)) for j in range(len(SCALES))]
+    op.cleanUp()
+    return result, channels, timer.seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", type=int, nargs=3, default=[128, 256, 256])
+    parser.add_argument("--blockshape", type=int, nargs=3, default=[64, 64, 64])
+    parser.add_argument("--2d", dest="in2d", action="store_true", help="compute the features in 2D")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # smoothed noise, so that features of all scales are non-trivial
+    noise = vigra.taggedView(rng.random(tuple(args.shape), dtype=np.float32), "zyx")
+    data = vigra.taggedView(vigra.filters.gaussianSmoothing(noise, 1.0)[None, None], "tczyx")
+    print(f"volume {args.shape}, blocks {args.blockshape}, scales {SCALES}, {'2D' if args.in2d else '3D'}")
+
+    results = {}
+    for backend in ("operators", "fused"):
+        results[backend], channels, seconds = run(data, args.blockshape, backend, args.in2d)
+        print(f"{backend:<12}{seconds:>8.1f} s")
+
+    print(f"{'feature':<32}{'scale':>6}{'max. difference':>17}")
+    offsets = np.cumsum([0] + channels)
+    for k, (first, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+        expected = results["operators"][:, first:stop]
+        difference = np.abs(results["fused"][:, first:stop] - expected).max() / np.abs(expected).max()
+        print(f"{FEATURE_IDS[k // len(SCALES)]:<32}{SCALES[k % len(SCALES)]:>6}{difference:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
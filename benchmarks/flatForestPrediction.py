@@ -0,0 +1,73 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Compare the prediction speed of vigra random forests with their FlatForest copies
+(see lazyflow.classifiers.flatForestLazyflowClassifier), and report the largest deviation.
+
+Usage:
+
+    python benchmarks/flatForestPrediction.py --features 40 --trees 100 --threads 8 --samples 1000000
+"""
+import argparse
+
+import numpy as np
+
+from lazyflow.classifiers import FlatForestLazyflowClassifier, ParallelVigraRfLazyflowClassifierFactory
+from lazyflow.request import Request
+from lazyflow.utility import Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", type=int, default=40)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--labels", type=int, default=50000, help="training samples")
+    parser.add_argument("--samples", type=int, default=2**20, help="predicted samples")
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    Request.reset_thread_pool(args.threads)
+    rng = np.random.default_rng(0)
+    labels = rng.integers(1, args.classes + 1, args.labels).astype(np.uint32)
+    X_train = rng.normal(scale=2.0, size=(len(labels), args.features)).astype(np.float32) + labels[:, None]
+    classifier = ParallelVigraRfLazyflowClassifierFactory(args.trees).create_and_train(X_train, labels)
+
+    with Timer() as conversion_timer:
+        flat_classifier = FlatForestLazyflowClassifier.from_classifier(classifier)
+    flat_forest = flat_classifier.flat_forest
+    print(
+        f"{flat_forest.num_trees} trees, {flat_forest.num_nodes} nodes ({flat_forest.nbytes / 2**20:.1f} MiB),"
+        f" converted in {conversion_timer.seconds():.2f} s"
+    )
+
+    X = rng.normal(scale=2.0, size=(args.samples, args.features)).astype(np.float32) + 2
+    results = {}
+    print(f"{'classifier':<12}{'time [s]':>10}{'samples/s per thread':>24}")
+    for name, clf in (("vigra", classifier), ("flat", flat_classifier)):
+        with Timer() as timer:
+            results[name] = clf.predict_probabilities(X)
+        print(f"{name:<12}{timer.seconds():>10.2f}{args.samples / timer.seconds() / args.threads:>24.3g}")
+    print(f"max. deviation: {np.abs(results['vigra'] - results['flat']).max():.2g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Measures the import time of lazyflow and ilastik with ``python -X importtime``.
+
+Every target is imported in a fresh interpreter.  The slowest modules (by cumulative time) are
+reported, and the benchmark fails if a target pulls in one of the modules that are meant to be
+loaded on first use only (classifier backends, optional io backends, ...), or takes longer than
+``--max-seconds``.  This makes it usable as a regression check, e.g. in CI:
+
+    python benchmarks/importTime.py --max-seconds 2 lazyflow lazyflow.operators
+"""
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple
+
+#: Modules that must not be loaded by a plain ``import`` of the targets
+DEFERRED_MODULES = (
+    "sklearn",
+    "fastfilters",
+    "z5py",
+    "libdvid",
+    "tiktorch",
+    "torch",
+    "opengm",
+    "lazyflow.classifiers.vigraRfLazyflowClassifier",
+    "lazyflow.classifiers.sklearnLazyflowClassifier",
+    "lazyflow.operators.classifierOperators",
+    "lazyflow.operators.filterOperators",
+    "lazyflow.operators.ioOperators",
+)
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+
+
+def measure(target: str, runs: int) -> Dict[str, ImportTime]:
+    """Best-of-``runs`` import times of every module loaded by ``import target``"""
+    best = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            sys.exit(f"import {target} failed:\n{result.stderr}")
+        for entry in parse(result.stderr):
+            if entry.module not in best or entry.cumulative_us < best[entry.module].cumulative_us:
+                best[entry.module] = entry
+    return best
+
+
+def parse(importtime_output: str) -> List[ImportTime]:
+    """Parse the "import time: self [us] | cumulative | imported package" lines"""
+    entries = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header line
+        entries.append(ImportTime(module.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="*", default=["lazyflow", "lazyflow.operators", "ilastik"])
+    parser.add_argument("--runs", type=int, default=3, help="interpreter starts per target")
+    parser.add_argument("--top", type=int, default=15, help="number of modules to report")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if a target takes longer")
+    args = parser.parse_args()
+
+    failed = False
+    for target in args.targets:
+        times = measure(target, args.runs)
+        total = times[target].cumulative_us / 1e6
+        print(f"import {target}: {total:.3f} s, {len(times)} modules")
+        print(f"    {'cumulative [ms]':>16}{'self [ms]':>12}  module")
+        for entry in sorted(times.values(), key=lambda e: e.cumulative_us, reverse=True)[: args.top]:
+            print(f"    {entry.cumulative_us / 1000:>16.1f}{entry.self_us / 1000:>12.1f}  {entry.module}")
+
+        # A target that is itself deferred may of course load itself
+        deferred = [name for name in DEFERRED_MODULES if not target.startswith(name)]
+        loaded = sorted({m for m in times for name in deferred if m == name or m.startswith(name + ".")})
+        if loaded:
+            print(f"    ERROR: import {target} loaded deferred modules: {', '.join(loaded)}")
+            failed = True
+        if args.max_seconds is not None and total > args.max_seconds:
+            print(f"    ERROR: import {target} took longer than {args.max_seconds} s")
+            failed = True
+        print()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
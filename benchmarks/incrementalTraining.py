@@ -0,0 +1,98 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Measure the time from a label edit to the updated prediction in interactive pixel classification,
+with full and with incremental training of the parallel vigra random forest (see
+ParallelVigraRfLazyflowClassifierFactory.update_and_train).
+
+A labelled training set is simulated with random features, which grows by a few thousand
+labels per "brush stroke".  After every stroke, the classifier is trained again and a block
+of the size of a typical viewer tile is predicted, as the live update in the GUI would do.
+The accuracy on held-out samples shows whether the incremental classifier keeps up.
+
+Usage:
+
+    python benchmarks/incrementalTraining.py --labels 200000 --features 40 --strokes 8 --full-retrain-interval 4
+"""
+import argparse
+
+import numpy as np
+
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
+from lazyflow.utility import Timer
+
+
+def make_samples(rng, n, num_features, num_classes):
+    """Samples of num_classes overlapping Gaussian clusters."""
+    labels = rng.integers(1, num_classes + 1, n).astype(np.uint32)
+    centers = np.random.default_rng(1).normal(size=(num_classes + 1, num_features)).astype(np.float32)
+    features = centers[labels] + rng.normal(scale=2.0, size=(n, num_features)).astype(np.float32)
+    return features, labels
+
+
+def run(args, full_retrain_interval):
+    rng = np.random.default_rng(0)
+    factory = ParallelVigraRfLazyflowClassifierFactory(args.trees)
+    X, y = make_samples(rng, args.labels, args.features, args.classes)
+    X_test, y_test = make_samples(rng, 20000, args.features, args.classes)
+    tile = rng.normal(size=(args.tile_size**2, args.features)).astype(np.float32)
+
+    classifier = factory.create_and_train(X, y)
+    times = []
+    for stroke in range(1, args.strokes + 1):
+        X_new, y_new = make_samples(rng, args.stroke_size, args.features, args.classes)
+        X = np.concatenate([X, X_new])
+        y = np.concatenate([y, y_new])
+        with Timer() as timer:
+            if full_retrain_interval and stroke % full_retrain_interval:
+                classifier = factory.update_and_train(classifier, X, y, retrain_fraction=args.retrain_fraction)
+            else:
+                classifier = factory.create_and_train(X, y)
+            classifier.predict_probabilities(tile)
+        times.append(timer.seconds())
+
+    predictions = np.argmax(classifier.predict_probabilities(X_test), axis=1) + 1
+    return np.array(times), np.mean(predictions == y_test)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=int, default=200000, help="labelled pixels before the first stroke")
+    parser.add_argument("--stroke-size", type=int, default=2000, help="labelled pixels added per stroke")
+    parser.add_argument("--features", type=int, default=40)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--strokes", type=int, default=8)
+    parser.add_argument("--tile-size", type=int, default=256)
+    parser.add_argument("--full-retrain-interval", type=int, default=4)
+    parser.add_argument("--retrain-fraction", type=float, default=0.25)
+    args = parser.parse_args()
+
+    print(f"{args.labels} labels, {args.features} features, {args.trees} trees, {args.stroke_size} labels per stroke")
+    print(f"{'mode':<28}{'mean [s]':>10}{'max [s]':>10}{'accuracy':>10}")
+    modes = [("full", 0), (f"incremental (full every {args.full_retrain_interval})", args.full_retrain_interval)]
+    for mode, interval in modes:
+        times, accuracy = run(args, interval)
+        print(f"{mode:<28}{times.mean():>10.2f}{times.max():>10.2f}{accuracy:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -56,6 +56,21 @@ FEATURES = {
     }
 }
 
+# Features that can be merged across blocks (see blockwiseRegionFeatures.MERGEABLE_FEATURES)
+BLOCKWISE_FEATURES = {
+    NAME: {
+        "Count": {},
+        "RegionCenter": {},
+        "Mean": {},
+        "Variance": {},
+        "Coord<Minimum>": {},
+        "Coord<Maximum>": {},
+    }
+}
+
+# Small enough that the largest objects are split into several blocks
+BLOCK_SHAPE = {"x": 32, "y": 32}
+
 
 # Cleanup functions (used in vigra_objfeats.py)
 def cleanup_key(k):
@@ -211,6 +226,18 @@ class ObjectExtractionTimeComparison(object):
         self.opObjectExtraction.SegmentationImage.connect(self.op5Binary.Output)
         self.opObjectExtraction.Features.setValue(FEATURES)
 
+        # Object extraction of the same features, whole volume vs. blockwise
+        self.opObjectExtractionWhole = OpObjectExtraction(graph=g)
+        self.opObjectExtractionWhole.RawImage.connect(self.op5Raw.Output)
+        self.opObjectExtractionWhole.SegmentationImage.connect(self.op5Binary.Output)
+        self.opObjectExtractionWhole.Features.setValue(BLOCKWISE_FEATURES)
+
+        self.opObjectExtractionBlockwise = OpObjectExtraction(graph=g)
+        self.opObjectExtractionBlockwise.RawImage.connect(self.op5Raw.Output)
+        self.opObjectExtractionBlockwise.SegmentationImage.connect(self.op5Binary.Output)
+        self.opObjectExtractionBlockwise.Features.setValue(BLOCKWISE_FEATURES)
+        self.opObjectExtractionBlockwise.FeatureBlockShape.setValue(BLOCK_SHAPE)
+
         # Simplified object features operator (No overhead)
         self.opObjectFeaturesSimp = OpObjectFeaturesSimplified(graph=g)
         self.opObjectFeaturesSimp.RawVol.connect(self.opCacheRaw.Output)
@@ -244,6 +271,25 @@ class ObjectExtractionTimeComparison(object):
 
         print("Object extraction took: {} seconds".format(timerObjectExtraction.seconds()))
 
+        # Compare whole-volume and blockwise object extraction (labels are computed beforehand in both)
+        self.opObjectExtractionWhole.LabelImage[:].wait()
+        self.opObjectExtractionBlockwise.LabelImage[:].wait()
+
+        print("\nStarting object extraction of mergeable features (whole volume)")
+        with Timer() as timerWhole:
+            featsWhole = self.opObjectExtractionWhole.RegionFeatures([]).wait()
+        print("Whole-volume object extraction took: {} seconds".format(timerWhole.seconds()))
+
+        print("\nStarting object extraction of mergeable features (blockwise, {})".format(BLOCK_SHAPE))
+        with Timer() as timerBlockwise:
+            featsBlockwise = self.opObjectExtractionBlockwise.RegionFeatures([]).wait()
+        print("Blockwise object extraction took: {} seconds".format(timerBlockwise.seconds()))
+
+        for t, feats in featsWhole.items():
+            for name, value in feats[NAME].items():
+                np.testing.assert_allclose(featsBlockwise[t][NAME][name], value, rtol=1e-4, err_msg=name)
+        print("Blockwise features are identical to the whole-volume features")
+
         # Profile for basic multi-threaded feature computation
         # just a multi-threaded loop that labels volumes and extract object features directly (No operators, no plugin system, no overhead, just a loop)
         featsBasicFeatureComp = dict.fromkeys(list(range(self.op5Raw.Output.meta.shape[0])), None)
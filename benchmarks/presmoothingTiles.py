@@ -0,0 +1,109 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Measure the redundant pre-smoothing work of OpPixelFeaturesPresmoothed with and without
+tile caches for the pre-smoothed images (see setPresmoothingTileSize()).
+
+The whole volume is requested block by block, as a batch export would do.  For each mode,
+the number of voxels that were pre-smoothed (summed over all scales) and the number of input
+voxels that were read for pre-smoothing are reported per output voxel and scale.
+Without tiles, every block smooths its own halo, so these numbers grow as the blocks get smaller.
+
+Usage:
+
+    python benchmarks/presmoothingTiles.py --shape 128 256 256 --blockshape 64 64 64 --tile-size 64
+"""
+import argparse
+import threading
+
+import numpy as np
+import vigra
+
+from lazyflow.graph import Graph
+from lazyflow.operators import OpPixelFeaturesPresmoothed, opPixelFeaturesPresmoothed
+from lazyflow.request import RequestPool
+from lazyflow.roi import getIntersectingBlocks, getBlockBounds
+from lazyflow.utility import Timer
+
+FEATURES = ["GaussianSmoothing", "GaussianGradientMagnitude", "HessianOfGaussianEigenvalues"]
+SCALES = [0.7, 1.6, 3.5, 5.0]
+
+
+class OpCountingPixelFeatures(OpPixelFeaturesPresmoothed):
+    """Counts the voxels passed to and produced by the pre-smoothing."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._count_lock = threading.Lock()
+        self.voxels_read = 0
+        self.voxels_smoothed = 0
+
+    def _computeGaussianSmoothing(self, vol, sigma, roi, in2d):
+        result = super()._computeGaussianSmoothing(vol, sigma, roi, in2d)
+        with self._count_lock:
+            self.voxels_read += vol.size
+            self.voxels_smoothed += result.size
+        return result
+
+
+def run(data, blockshape, tile_size):
+    opPixelFeaturesPresmoothed.setPresmoothingTileSize(tile_size)
+    op = OpCountingPixelFeatures(graph=Graph())
+    opPixelFeaturesPresmoothed.setPresmoothingTileSize(0)
+
+    op.Scales.setValue(SCALES)
+    op.FeatureIds.setValue(FEATURES)
+    op.SelectionMatrix.setValue(np.ones((len(FEATURES), len(SCALES)), dtype=bool))
+    op.ComputeIn2d.setValue([False] * len(SCALES))
+    op.Input.setValue(data)
+
+    shape = op.Output.meta.shape
+    full_blockshape = (1, shape[1]) + tuple(blockshape)
+    pool = RequestPool()
+    for block_start in getIntersectingBlocks(full_blockshape, ([0] * 5, shape)):
+        pool.add(op.Output(*getBlockBounds(shape, full_blockshape, block_start)))
+    with Timer() as timer:
+        pool.wait()
+
+    output_voxels = np.prod(data.shape) * len(SCALES)
+    result = (op.voxels_smoothed / output_voxels, op.voxels_read / output_voxels, timer.seconds())
+    op.cleanUp()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", type=int, nargs=3, default=[128, 256, 256])
+    parser.add_argument("--blockshape", type=int, nargs=3, default=[64, 64, 64])
+    parser.add_argument("--tile-size", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = vigra.taggedView(rng.random((1, 1) + tuple(args.shape), dtype=np.float32), "tczyx")
+    print(f"volume {args.shape}, blocks {args.blockshape}, scales {SCALES}")
+    print(f"{'mode':<16}{'smoothed/output':>17}{'read/output':>13}{'time [s]':>10}")
+    for mode, tile_size in (("per request", 0), (f"tiles {args.tile_size}", args.tile_size)):
+        smoothed, read, seconds = run(data, args.blockshape, tile_size)
+        print(f"{mode:<16}{smoothed:>17.2f}{read:>13.2f}{seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
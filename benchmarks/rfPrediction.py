@@ -0,0 +1,115 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Measure the prediction throughput of the parallel vigra random forest, in voxels per second
+and per worker thread, for blocks of different sizes.
+
+Compares predicting one block at a time (as OpVectorwiseClassifierPredict does), predicting
+many blocks with one call of ParallelVigraRfLazyflowClassifier.predict_probabilities_batch,
+and the previous implementation, which started one request per forest and summed up the
+per-forest predictions.
+
+Usage:
+
+    python benchmarks/rfPrediction.py --features 40 --trees 100 --threads 8 --block-sizes 32 64 128
+"""
+import argparse
+from functools import partial
+
+import numpy as np
+
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
+from lazyflow.request import Request, RequestLock, RequestPool
+from lazyflow.utility import Timer
+
+
+def predict_per_forest(classifier, X):
+    """The prediction before predict_probabilities_batch: one request per forest."""
+    total = [None]
+    lock = RequestLock()
+
+    def add(forest, predictions):
+        predictions *= forest.treeCount()
+        with lock:
+            if total[0] is None:
+                total[0] = predictions
+            else:
+                total[0] += predictions
+
+    pool = RequestPool()
+    for forest in classifier.forests:
+        req = Request(partial(forest.predictProbabilities, X))
+        req.notify_finished(partial(add, forest))
+        pool.add(req)
+    pool.wait()
+    return total[0] / classifier.tree_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--features", type=int, default=40)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--voxels", type=int, default=2**22, help="voxels predicted per measurement")
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[16, 32, 64, 128], help="3D block edge lengths")
+    args = parser.parse_args()
+
+    Request.reset_thread_pool(args.threads)
+    rng = np.random.default_rng(0)
+    labels = rng.integers(1, args.classes + 1, 20000).astype(np.uint32)
+    X_train = rng.normal(size=(len(labels), args.features)).astype(np.float32) + labels[:, None]
+    classifier = ParallelVigraRfLazyflowClassifierFactory(args.trees).create_and_train(X_train, labels)
+
+    features = rng.normal(size=(args.voxels, args.features)).astype(np.float32) + 2
+    output = np.empty((args.voxels, args.classes), dtype=np.float32)
+
+    print(f"{args.features} features, {args.trees} trees, {args.threads} threads, {args.voxels} voxels")
+    print(f"{'block':>8}{'per forest':>14}{'per block':>14}{'batched':>14}   [voxels/s per thread]")
+    for size in args.block_sizes:
+        block_voxels = min(size**3, args.voxels)
+        blocks = [features[start : start + block_voxels] for start in range(0, args.voxels, block_voxels)]
+        outputs = [output[start : start + block_voxels] for start in range(0, args.voxels, block_voxels)]
+
+        def per_forest():
+            for X in blocks:
+                predict_per_forest(classifier, X)
+
+        def per_block():
+            # Blocks are requested in parallel by the exporter or the viewer
+            pool = RequestPool()
+            for X, out in zip(blocks, outputs):
+                pool.add(Request(partial(classifier.predict_probabilities_batch, [X], [out])))
+            pool.wait()
+
+        def batched():
+            classifier.predict_probabilities_batch(blocks, outputs)
+
+        throughputs = []
+        for fn in (per_forest, per_block, batched):
+            with Timer() as timer:
+                fn()
+            throughputs.append(args.voxels / timer.seconds() / args.threads)
+        print(f"{size:>7}³" + "".join(f"{throughput:>14.3g}" for throughput in throughputs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Micro-benchmarks of the lazyflow.roi utilities that run for every request of the caches and filters.
+
+Each case is timed with timeit and reported in microseconds per call.  Where the implementation
+changed, the previous TinyVector-based version is measured as well ("previous").
+
+Usage:
+
+    python benchmarks/roiUtilities.py --repeats 5 --number 2000
+"""
+import argparse
+import timeit
+from functools import partial
+
+import numpy as np
+
+from lazyflow.roi import (
+    Box,
+    TinyVector,
+    enlargeRoiForHalo,
+    getBlockBounds,
+    getIntersectingBlockRois,
+    getIntersectingBlocks,
+    getIntersectingRois,
+    getIntersection,
+    roiFromShape,
+    roiToSlice,
+    sliceToRoi,
+)
+
+
+def previous_enlarge_roi_for_halo(start, stop, shape, sigma, window=3.5, enlarge_axes=None):
+    shape = TinyVector(shape)
+    if enlarge_axes is None:
+        enlarge_axes = TinyVector((1,) * len(start))
+    else:
+        enlarge_axes = TinyVector(enlarge_axes) * 1
+    max_spatial_shape = enlarge_axes * shape
+    spatial_start = enlarge_axes * start
+    spatial_stop = enlarge_axes * stop
+    ret_type = type(start[0])
+    zeros = TinyVector(start) - start
+    enlarged_start = np.maximum(spatial_start - np.ceil(window * sigma), zeros).astype(ret_type)
+    enlarged_stop = np.minimum(spatial_stop + np.ceil(window * sigma), max_spatial_shape).astype(ret_type)
+    enlarged_start += (enlarge_axes == 0) * start
+    enlarged_stop += (enlarge_axes == 0) * stop
+    return np.array((enlarged_start, enlarged_stop))
+
+
+def previous_get_intersecting_blocks(blockshape, roi):
+    assert not np.any(np.isclose(blockshape, 0))
+    roistart = TinyVector(roi[0])
+    roistop = TinyVector(roi[1])
+    blockshape = TinyVector(blockshape)
+    block_index_map_start = roistart // blockshape
+    block_index_map_stop = (roistop + (blockshape - 1)) // blockshape
+    block_indices = np.indices(block_index_map_stop - block_index_map_start)
+    block_indices = np.rollaxis(block_indices, 0, len(blockshape) + 1)
+    block_indices += block_index_map_start
+    block_indices *= blockshape
+    return block_indices.reshape(-1, len(blockshape))
+
+
+def previous_get_block_bounds(dataset_shape, block_shape, block_start):
+    assert (np.mod(block_start, block_shape) == 0).all()
+    block_bounds = (block_start, block_start + TinyVector(block_shape))
+    return getIntersection(block_bounds, roiFromShape(dataset_shape))
+
+
+def previous_get_intersecting_rois(dataset_shape, blockshape, roi):
+    block_starts = previous_get_intersecting_blocks(blockshape, roi)
+    block_rois = map(partial(previous_get_block_bounds, dataset_shape, blockshape), block_starts)
+    return [getIntersection(block_roi, roi) for block_roi in block_rois]
+
+
+def previous_block_slicings(roi, block_start, block_roi):
+    """The slicings of one block in OpCompressedCache._copyBlock, before Box"""
+    intersecting_roi = getIntersection(roi, block_roi)
+    return (
+        roiToSlice(*np.subtract(intersecting_roi, roi[0])),
+        roiToSlice(*np.subtract(intersecting_roi, block_start)),
+    )
+
+
+def box_block_slicings(roi, block_start, block_roi):
+    intersecting_roi = Box(*roi).intersection(block_roi)
+    return intersecting_roi.relative_to(roi[0]).slicing, intersecting_roi.relative_to(block_start).slicing
+
+
+def cases(shape, blockshape):
+    """(name, implementation, callable) for all measurements"""
+    start = TinyVector([0, 100, 200, 300, 0])
+    stop = TinyVector([1, 356, 456, 556, 3])
+    roi = (start, stop)
+    slicing = roiToSlice(start, stop)
+    other = ([0, 150, 150, 150, 0], [1, 300, 300, 400, 3])
+    block_start = getIntersectingBlocks(blockshape, roi)[1]
+    block_roi = getBlockBounds(shape, blockshape, block_start)
+    box = Box(start, stop)
+    halo_axes = (0, 1, 1, 1, 0)
+    wide_roi = ([0, 0, 0, 0, 0], list(shape))
+
+    yield "roiToSlice", "current", lambda: roiToSlice(start, stop)
+    yield "roiToSlice", "Box", lambda: Box(start, stop).slicing
+    yield "roiToSlice", "Box (cached)", lambda: box.slicing
+    yield "sliceToRoi", "current", lambda: sliceToRoi(slicing, shape)
+    yield "getIntersection", "current", lambda: getIntersection(roi, other)
+    yield "getIntersection", "Box", lambda: box.intersection(other)
+    yield "enlargeRoiForHalo", "previous", lambda: previous_enlarge_roi_for_halo(
+        start, stop, shape, 3.5, 3.5, halo_axes
+    )
+    yield "enlargeRoiForHalo", "current", lambda: enlargeRoiForHalo(start, stop, shape, 3.5, 3.5, halo_axes)
+    yield "enlargeRoiForHalo", "Box", lambda: box.enlarged((0, 13, 13, 13, 0), shape)
+    yield "getIntersectingBlocks", "previous", lambda: previous_get_intersecting_blocks(blockshape, roi)
+    yield "getIntersectingBlocks", "current", lambda: getIntersectingBlocks(blockshape, roi)
+    yield "getBlockBounds", "previous", lambda: previous_get_block_bounds(shape, blockshape, block_start)
+    yield "getBlockBounds", "current", lambda: getBlockBounds(shape, blockshape, block_start)
+    yield "getIntersectingRois", "previous", lambda: previous_get_intersecting_rois(shape, blockshape, wide_roi)
+    yield "getIntersectingRois", "current", lambda: getIntersectingRois(shape, blockshape, wide_roi)
+    yield "getIntersectingRois", "arrays", lambda: getIntersectingBlockRois(shape, blockshape, wide_roi)
+    yield "_copyBlock slicings", "previous", lambda: previous_block_slicings(roi, block_start, block_roi)
+    yield "_copyBlock slicings", "Box", lambda: box_block_slicings(roi, block_start, block_roi)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shape", type=int, nargs=5, default=[1, 1024, 1024, 1024, 3], help="tzyxc dataset shape")
+    parser.add_argument("--blockshape", type=int, nargs=5, default=[1, 64, 64, 64, 3])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--number", type=int, default=2000, help="calls per repeat")
+    args = parser.parse_args()
+
+    print(f"{'function':<24}{'implementation':<16}{'best [us]':>10}")
+    for name, implementation, fn in cases(tuple(args.shape), tuple(args.blockshape)):
+        # getIntersectingRois enumerates all blocks of the dataset
+        number = args.number if "Rois" not in name else max(1, args.number // 100)
+        best = min(timeit.repeat(fn, repeat=args.repeats, number=number)) / number
+        print(f"{name:<24}{implementation:<16}{best * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
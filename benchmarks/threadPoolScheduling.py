@@ -0,0 +1,97 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Compare the throughput of the lazyflow thread pool schedulers.
+
+Two workloads are measured for each scheduler:
+
+* many tiny requests, each spawning a few children (scheduling overhead dominates)
+* a few big requests that release the GIL (numpy work dominates)
+
+Usage:
+
+    python benchmarks/threadPoolScheduling.py --threads 64 --numa
+"""
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from lazyflow.request import Request, RequestPool
+from lazyflow.request.threadPool import SCHEDULERS
+from lazyflow.utility import Timer
+
+
+def tiny_requests(num_parents, num_children):
+    def child(i):
+        return i + 1
+
+    def parent():
+        pool = RequestPool()
+        for i in range(num_children):
+            pool.add(Request(lambda i=i: child(i)))
+        pool.wait()
+
+    pool = RequestPool()
+    for _ in range(num_parents):
+        pool.add(Request(parent))
+    pool.wait()
+    return num_parents * (num_children + 1)
+
+
+def big_requests(num_requests, size):
+    def work():
+        a = np.random.random((size, size))
+        return float((a @ a).sum())
+
+    pool = RequestPool()
+    for _ in range(num_requests):
+        pool.add(Request(work))
+    pool.wait()
+    return num_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--numa", action="store_true", help="Pin workers to NUMA nodes (work-stealing only).")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    workloads = [
+        ("tiny", lambda: tiny_requests(num_parents=200, num_children=100)),
+        ("big", lambda: big_requests(num_requests=2 * args.threads, size=1024)),
+    ]
+
+    print(f"{'scheduler':<15}{'workload':<10}{'best [s]':>10}{'requests/s':>14}")
+    for scheduler in SCHEDULERS:
+        Request.reset_thread_pool(args.threads, scheduler=scheduler, numa_aware=args.numa)
+        for name, workload in workloads:
+            best = float("inf")
+            for _ in range(args.repeats):
+                with Timer() as timer:
+                    count = workload()
+                best = min(best, timer.seconds())
+            print(f"{scheduler:<15}{name:<10}{best:>10.3f}{count / best:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
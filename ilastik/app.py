@@ -20,7 +20,8 @@
 ###############################################################################
 import argparse
 import faulthandler
-import importlib
+import importlib.machinery
+import importlib.util
 import logging
 import os
 import sys
@@ -73,6 +74,15 @@ def _argparser() -> argparse.ArgumentParser:
     ap.add_argument(
         "--nn_device", help="Local device to run Neural Networks on. Examples: 'cpu', 'cuda:0'.", default=None
     )
+    ap.add_argument(
+        "--profile_requests",
+        metavar="TRACE_JSON",
+        help=(
+            "Profile all lazyflow operator executions. On exit, writes a Chrome trace (also readable by speedscope) "
+            "to the given path, and a per-operator summary next to it."
+        ),
+        default=None,
+    )
     return ap
 
 
@@ -163,13 +173,15 @@ def main(parsed_args, workflow_cmdline_args=[], init_logging=True):
     # Extra initialization functions.
     # These are called during app startup, but before the shell is created.
     preinit_funcs = []
-    # Must be first (or at least before vigra).
-    preinit_funcs.append(_import_opengm)
 
     lazyflow_config_fn = _prepare_lazyflow_config(parsed_args)
     if lazyflow_config_fn:
         preinit_funcs.append(lazyflow_config_fn)
 
+    profiler_fn = _prepare_request_profiler(parsed_args)
+    if profiler_fn:
+        preinit_funcs.append(profiler_fn)
+
     # More initialization functions.
     # These will be called AFTER the shell is created.
     # The shell is provided as a parameter to the function.
@@ -271,11 +283,9 @@ def _check_hbp_mode(parsed_args):
 
 def _update_tiktorch_executable_location(parsed_args):
     """enable tiktorch local workflow"""
-    TIKTORCH_MODULES = ("tiktorch", "tiktorch.server", "torch")
-
     if parsed_args.tiktorch_executable and Path(parsed_args.tiktorch_executable).exists():
         tiktorch_executable = [parsed_args.tiktorch_executable]
-    elif all(importlib.util.find_spec(mod) for mod in TIKTORCH_MODULES):
+    elif _tiktorch_server_available():
         tiktorch_executable = [sys.executable, "-m", "tiktorch.server"]
     else:
         tiktorch_executable = None
@@ -286,6 +296,19 @@ def _update_tiktorch_executable_location(parsed_args):
         runtime_cfg.tiktorch_executable = tiktorch_executable
 
 
+def _tiktorch_server_available() -> bool:
+    """
+    Whether tiktorch.server and torch are installed, without importing them.
+    (find_spec("tiktorch.server") would import the tiktorch package, and with it torch.)
+    """
+    if importlib.util.find_spec("torch") is None:
+        return False
+    tiktorch_spec = importlib.util.find_spec("tiktorch")
+    if tiktorch_spec is None or tiktorch_spec.submodule_search_locations is None:
+        return False
+    return importlib.machinery.PathFinder.find_spec("server", tiktorch_spec.submodule_search_locations) is not None
+
+
 def _init_logging(parsed_args):
     from ilastik.ilastik_logging import default_config, startUpdateInterval, DEFAULT_LOGFILE_PATH
 
@@ -319,22 +342,26 @@ def _init_threading_logging_monkeypatch():
         threading.Thread.start = logged_start
 
 
-def _import_opengm():
-    # Import opengm first if possible, to make sure it is included before
-    # vigra.
-    # Otherwise the import fails and we will not get access to GraphCut
-    # thresholding
-    try:
-        import opengm  # noqa
-    except ImportError:
-        pass
-
-
 def _prepare_lazyflow_config(parsed_args):
     # Check environment variable settings.
     n_threads = os.getenv("LAZYFLOW_THREADS", None)
     total_ram_mb = os.getenv("LAZYFLOW_TOTAL_RAM_MB", None)
     status_interval_secs = int(os.getenv("LAZYFLOW_STATUS_MONITOR_SECONDS", "0"))
+    scheduler = os.getenv("LAZYFLOW_SCHEDULER", None) or ilastik_config.get("lazyflow", "scheduler")
+    numa_aware = ilastik_config.getboolean("lazyflow", "numa_aware")
+    custom_scheduler = scheduler != "shared" or numa_aware
+    eviction_policy = ilastik_config.get("lazyflow", "cache_eviction_policy")
+    spill_dir = os.path.expanduser(ilastik_config.get("lazyflow", "cache_spill_dir"))
+    spill_mb = ilastik_config.getint("lazyflow", "cache_spill_mb")
+    spill_to_disk = bool(spill_dir) and spill_mb > 0
+    compressed_cache_backend = ilastik_config.get("lazyflow", "compressed_cache_backend")
+    persistent_cache_dir = ilastik_config.get("lazyflow", "persistent_cache_dir")
+    persistent_cache_mb = ilastik_config.getint("lazyflow", "persistent_cache_mb")
+    persistent_cache = bool(persistent_cache_dir) and persistent_cache_mb > 0
+    presmoothing_tile_size = ilastik_config.getint("lazyflow", "presmoothing_tile_size")
+    process_workers = ilastik_config.getint("lazyflow", "process_workers")
+    export_prefetch = ilastik_config.getboolean("lazyflow", "export_prefetch")
+    flat_forest_inference = ilastik_config.getboolean("lazyflow", "flat_forest_inference")
 
     # Convert str -> int
     if n_threads is not None:
@@ -349,22 +376,67 @@ def _prepare_lazyflow_config(parsed_args):
     total_ram_mb = total_ram_mb or ilastik_config.getint("lazyflow", "total_ram_mb")
 
     # Note that n_threads == 0 is valid and useful for debugging.
-    if (n_threads is not None) or total_ram_mb or status_interval_secs:
+    if (
+        (n_threads is not None)
+        or total_ram_mb
+        or status_interval_secs
+        or custom_scheduler
+        or eviction_policy != "lru"
+        or spill_to_disk
+        or compressed_cache_backend != "hdf5"
+        or persistent_cache
+        or presmoothing_tile_size
+        or process_workers
+        or export_prefetch
+        or flat_forest_inference
+    ):
 
         def _configure_lazyflow_settings():
             import lazyflow
             import lazyflow.request
-            from lazyflow.utility import Memory
-            from lazyflow.operators import cacheMemoryManager
+            from lazyflow.utility import Memory, bigRequestStreamer
+            from lazyflow.request import processPool
+            from lazyflow.classifiers import flatForestLazyflowClassifier
+            from lazyflow.operators import (
+                cacheMemoryManager,
+                cacheSpillStore,
+                compressedBlockStore,
+                opPixelFeaturesPresmoothed,
+                persistentBlockCache,
+            )
 
             if status_interval_secs:
                 memory_logger = logging.getLogger("lazyflow.operators.cacheMemoryManager")
                 memory_logger.setLevel(logging.DEBUG)
                 cacheMemoryManager.setRefreshInterval(status_interval_secs)
 
-            if n_threads is not None:
-                logger.info(f"Resetting lazyflow thread pool with {n_threads} threads.")
-                lazyflow.request.Request.reset_thread_pool(n_threads)
+            if n_threads is not None or custom_scheduler:
+                num_workers = (
+                    n_threads if n_threads is not None else lazyflow.request.Request.global_thread_pool.num_workers
+                )
+                logger.info(f"Resetting lazyflow thread pool with {num_workers} threads ({scheduler} scheduler).")
+                lazyflow.request.Request.reset_thread_pool(num_workers, scheduler=scheduler, numa_aware=numa_aware)
+            if eviction_policy != "lru":
+                logger.info(f"Using cache eviction policy {eviction_policy!r}")
+                cacheMemoryManager.setEvictionPolicy(eviction_policy)
+            if spill_to_disk:
+                cacheSpillStore.configure(spill_dir, spill_mb * 1024**2)
+            if compressed_cache_backend != "hdf5":
+                logger.info(f"Using {compressed_cache_backend!r} backend for compressed caches")
+                compressedBlockStore.setDefaultBackend(compressed_cache_backend)
+            if persistent_cache:
+                persistentBlockCache.configure(persistent_cache_dir, persistent_cache_mb * 1024**2)
+            if presmoothing_tile_size:
+                logger.info(f"Caching pre-smoothed images in tiles of size {presmoothing_tile_size}")
+                opPixelFeaturesPresmoothed.setPresmoothingTileSize(presmoothing_tile_size)
+            if process_workers:
+                processPool.configure(process_workers)
+            if export_prefetch:
+                logger.info("Computing export blocks ahead of the writer")
+                bigRequestStreamer.setPrefetchEnabled(True)
+            if flat_forest_inference:
+                logger.info("Predicting with flat copies of the random forests")
+                flatForestLazyflowClassifier.setInferenceEnabled(True)
             if total_ram_mb > 0:
                 if total_ram_mb < 500:
                     raise Exception(
@@ -381,6 +453,23 @@ def _prepare_lazyflow_config(parsed_args):
     return None
 
 
+def _prepare_request_profiler(parsed_args):
+    if parsed_args.profile_requests is None:
+        return None
+
+    trace_path = os.path.abspath(os.path.expanduser(parsed_args.profile_requests))
+
+    def _start_request_profiler():
+        import atexit
+        from lazyflow.request import profiler
+
+        logger.info(f"Profiling lazyflow requests, trace will be written to {trace_path}")
+        profiler.start()
+        atexit.register(profiler.save, trace_path)
+
+    return _start_request_profiler
+
+
 def _prepare_auto_open_project(parsed_args):
     if parsed_args.project is None:
         return None
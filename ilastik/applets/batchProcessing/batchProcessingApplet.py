@@ -1,5 +1,9 @@
 import logging
+import os
+import sys
+import threading
 import weakref
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable, Dict, List, Optional, Union
 import numpy.typing as npt
 from ndstructs import Slice5D
@@ -12,6 +16,8 @@ from ilastik.applets.base.applet import Applet
 from ilastik.applets.dataExport.opDataExport import OpDataExport
 from ilastik.applets.dataSelection import DataSelectionApplet
 from ilastik.applets.dataSelection.opDataSelection import DatasetInfo, OpMultiLaneDataSelectionGroup
+from lazyflow.distributed.orchestratorBackend import BACKENDS, OrchestratorBackend, create_orchestrator
+from lazyflow.utility import Memory
 
 logger = logging.getLogger(__name__)  # noqa
 
@@ -27,6 +33,7 @@ class BatchProcessingApplet(Applet):
         self.workflow = weakref.ref(workflow)
         self.dataSelectionApplet = dataSelectionApplet
         self.dataExportApplet = dataExportApplet
+        self._batch_lanes = 0  # Number of lanes at the end of the workflow that were added by export_datasets
         assert isinstance(self.dataSelectionApplet.topLevelOperator, OpMultiLaneDataSelectionGroup)
         self._gui = None  # Created on first access
 
@@ -94,26 +101,116 @@ class BatchProcessingApplet(Applet):
             default=default_block_roi,
         )
 
+        parser.add_argument(
+            "--distributed_backend",
+            "--distributed-backend",
+            help=(
+                "How to run the workers in distributed mode: 'mpi' (default, launch ilastik with mpirun/srun)"
+                " or 'local' (start worker processes on this machine, no MPI needed)."
+            ),
+            choices=BACKENDS,
+            default="mpi",
+        )
+
+        def parse_distributed_workers(value: str) -> int:
+            workers = int(value)
+            if workers < 1:
+                raise argparse.ArgumentTypeError(f"distributed_workers must be at least 1: {value}")
+            return workers
+
+        parser.add_argument(
+            "--distributed_workers",
+            "--distributed-workers",
+            help="Number of worker processes for --distributed_backend local (default: one per CPU core).",
+            type=parse_distributed_workers,
+            default=None,
+        )
+
+        def parse_parallel_lanes(value: str) -> int:
+            lanes = int(value)
+            if lanes < 1:
+                raise argparse.ArgumentTypeError(f"parallel_lanes must be at least 1: {value}")
+            return lanes
+
+        parser.add_argument(
+            "--parallel_lanes",
+            "--parallel-lanes",
+            help=(
+                "Number of datasets to export at the same time (default: 1)."
+                " Speeds up the processing of many small images."
+                " The memory available for computation is split between the concurrent exports."
+            ),
+            type=parse_parallel_lanes,
+            default=1,
+        )
+
+        parser.add_argument(
+            "--reuse_lanes",
+            "--reuse-lanes",
+            help=(
+                "Point the same workflow lane(s) to one dataset after another, instead of building new ones for each"
+                " dataset. Reduces the overhead per dataset when processing many small images."
+            ),
+            action="store_true",
+        )
+
         parsed_args, unused_args = parser.parse_known_args(cmdline_args)
+        if parsed_args.distributed and parsed_args.parallel_lanes > 1:
+            raise ValueError("--parallel_lanes can't be combined with --distributed")
         return parsed_args, unused_args
 
     def run_export_from_parsed_args(self, parsed_args: argparse.Namespace):
         "Run the export for each dataset listed in parsed_args as interpreted by DataSelectionApplet."
+        orchestrator = None
         if parsed_args.distributed:
-            export_function = partial(self.do_distributed_export, block_roi=parsed_args.distributed_block_roi)
+            orchestrator = self.create_orchestrator(
+                getattr(parsed_args, "distributed_backend", "mpi"), getattr(parsed_args, "distributed_workers", None)
+            )
+            export_function = partial(
+                self.do_distributed_export, block_roi=parsed_args.distributed_block_roi, orchestrator=orchestrator
+            )
         else:
             export_function = self.do_normal_export
 
-        return self.run_export(
-            lane_configs=self.dataSelectionApplet.lane_configs_from_parsed_args(parsed_args),
-            export_function=export_function,
-        )
+        try:
+            return self.run_export(
+                lane_configs=self.dataSelectionApplet.lane_configs_from_parsed_args(parsed_args),
+                export_function=export_function,
+                parallel_lanes=getattr(parsed_args, "parallel_lanes", 1),
+                reuse_lanes=getattr(parsed_args, "reuse_lanes", False),
+            )
+        finally:
+            if orchestrator is not None:
+                orchestrator.close()
+
+    @staticmethod
+    def create_orchestrator(backend: str, num_workers: Optional[int] = None) -> OrchestratorBackend:
+        """
+        The same orchestrator is used for all datasets, so local worker processes are only started once.
+        """
+        if backend != "local":
+            return create_orchestrator(backend)
+
+        num_workers = num_workers or os.cpu_count() or 1
+        # The workers run this very command (see LocalTaskOrchestrator), but share the machine
+        worker_env = {
+            "LAZYFLOW_THREADS": str(max(1, (os.cpu_count() or 1) // num_workers)),
+            "LAZYFLOW_TOTAL_RAM_MB": str(max(1, Memory.getAvailableRam() // num_workers // 2**20)),
+            # All workers read the project file
+            "HDF5_USE_FILE_LOCKING": "FALSE",
+        }
+        worker_command = list(getattr(sys, "orig_argv", [sys.executable] + sys.argv))
+        if "--readonly" not in worker_command:
+            worker_command.append("--readonly")
+        return create_orchestrator(backend, num_workers, worker_command=worker_command, worker_env=worker_env)
 
     def run_export(
         self,
         lane_configs: List[Dict[str, Optional[DatasetInfo]]],
         export_to_array: bool = False,
         export_function: Optional[Callable] = None,
+        parallel_lanes: int = 1,
+        reuse_lanes: bool = False,
     ) -> Union[List[str], List[npt.NDArray]]:
         """Run the export for each dataset listed in role_data_dict
 
@@ -128,11 +225,17 @@ class BatchProcessingApplet(Applet):
             prepareForNewLane() and connectLane() logic, which ensures that we get a fresh new lane that's
             ready to process data.
 
+            With reuse_lanes, the lane is only appended for the first dataset, and then pointed to the next
+            dataset each time, which is much faster for many small datasets.  Its caches are invalidated by
+            the new input, and the workflow's prepareForNewLane()/handleNewLanesAdded() hooks still run.
+
         Args:
             lane_configs: A list of dicts with one dict of role_name -> DatasetInfo for each lane
             export_to_array: If True do NOT export to disk as usual.
               Instead, export the results to a list of arrays, which is returned.
               If False, return a list of the filenames we produced to.
+            parallel_lanes: Number of lanes to export concurrently (see export_datasets).
+            reuse_lanes: Keep the batch lanes between datasets (see export_datasets).
 
         Returns:
             list containing either strings of paths to exported files,
@@ -150,6 +253,9 @@ class BatchProcessingApplet(Applet):
 
         self.progressSignal(0)
         try:
+            if parallel_lanes > 1:
+                return self._run_parallel_export(lane_configs, export_function, parallel_lanes, reuse_lanes)
+
             results = []
             for batch_index, lane_config in enumerate(lane_configs):
 
@@ -163,14 +269,42 @@ class BatchProcessingApplet(Applet):
                     lane_config,
                     export_function=export_function,
                     progress_callback=partial(lerpProgressSignal, global_progress_start, global_progress_end),
+                    reuse_lane=reuse_lanes,
                 )
                 results.append(result)
             return results
         finally:
             try:
-                self.dataExportApplet.post_process_entire_export()
+                self.drop_batch_lanes()
             finally:
-                self.progressSignal(100)
+                try:
+                    self.dataExportApplet.post_process_entire_export()
+                finally:
+                    self.progressSignal(100)
+
+    def _run_parallel_export(self, lane_configs, export_function, parallel_lanes, reuse_lanes):
+        """
+        Export the lanes in groups of parallel_lanes (see export_datasets), and aggregate
+        the progress of all lanes.
+        """
+        lane_progress = [0] * len(lane_configs)
+        progress_lock = threading.Lock()
+
+        def laneProgressSignal(batch_index, p):
+            with progress_lock:
+                lane_progress[batch_index] = p
+                self.progressSignal(sum(lane_progress) / len(lane_configs))
+
+        results = []
+        for start in range(0, len(lane_configs), parallel_lanes):
+            group = range(start, min(start + parallel_lanes, len(lane_configs)))
+            results += self.export_datasets(
+                [lane_configs[i] for i in group],
+                export_function=export_function,
+                progress_callbacks=[partial(laneProgressSignal, i) for i in group],
+                reuse_lanes=reuse_lanes,
+            )
+        return results
 
     def do_normal_export(self, opDataExport):
         logger.info(f"Exporting to {opDataExport.ExportPath.value}")
@@ -181,31 +315,91 @@ class BatchProcessingApplet(Applet):
         logger.info("Exporting to in-memory array.")
         return opDataExport.run_export_to_array()
 
-    def do_distributed_export(self, opDataExport, *, block_roi: Slice5D):
+    def do_distributed_export(
+        self, opDataExport, *, block_roi: Slice5D, orchestrator: Optional[OrchestratorBackend] = None
+    ):
         logger.info("Running ilastik distributed...")
-        return opDataExport.run_distributed_export(block_roi=block_roi)
+        return opDataExport.run_distributed_export(block_roi=block_roi, orchestrator=orchestrator)
 
     def export_dataset(
         self,
         lane_config: Dict[str, DatasetInfo],
         export_function: Optional[Callable[[OpDataExport], Union[str, npt.NDArray]]] = None,
         progress_callback: Optional[Callable[[int], None]] = None,
+        reuse_lane: bool = False,
     ) -> Union[str, npt.NDArray]:
         """
         Configures a lane using the paths specified in the paths from role_inputs and runs the workflow.
+        (See export_datasets for reuse_lane.)
+        """
+        return self.export_datasets(
+            [lane_config],
+            export_function=export_function,
+            progress_callbacks=[progress_callback or self.progressSignal],
+            reuse_lanes=reuse_lane,
+        )[0]
+
+    def export_datasets(
+        self,
+        lane_configs: List[Dict[str, DatasetInfo]],
+        export_function: Optional[Callable[[OpDataExport], Union[str, npt.NDArray]]] = None,
+        progress_callbacks: Optional[List[Callable[[int], None]]] = None,
+        reuse_lanes: bool = False,
+    ) -> List[Union[str, npt.NDArray]]:
+        """
+        Like export_dataset, but for several lanes at once:  All lanes are appended to the workflow
+        and configured first (one after another, since that modifies the graph), and then exported
+        concurrently, with the memory available for computation split between the exports.
+        The customization hooks are called in lane order, so the results match the sequential export.
+
+        If reuse_lanes is True, the lanes are kept after the export, and the next call points them
+        to its datasets instead of appending new lanes.  That saves building the lanes' operators
+        for every dataset.  The lanes are removed at the end of run_export (or by drop_batch_lanes).
+
+        Returns the results in the order of lane_configs.
         """
         export_function = export_function or self.do_normal_export
+        progress_callbacks = progress_callbacks or [self.progressSignal] * len(lane_configs)
 
-        # Call customization hook
-        self.dataSelectionApplet.pushLane(lane_config)
+        first_lane = self.dataSelectionApplet.num_lanes - self._batch_lanes
+        opDataExports = []
+        succeeded = False
         try:
-            # Call customization hook
-            self.dataExportApplet.prepare_lane_for_export(self.dataSelectionApplet.num_lanes - 1)
-            opDataExport = self.dataExportApplet.topLevelOperator.getLane(self.dataSelectionApplet.num_lanes - 1)
-            opDataExport.progressSignal.subscribe(progress_callback or self.progressSignal)
-            result = export_function(opDataExport)
-            # Call customization hook
-            self.dataExportApplet.post_process_lane_export(self.dataSelectionApplet.num_lanes - 1)
-            return result
+            for offset, lane_config in enumerate(lane_configs):
+                if offset < self._batch_lanes:
+                    self.dataSelectionApplet.reconfigureLane(first_lane + offset, lane_config)
+                else:
+                    self.dataSelectionApplet.pushLane(lane_config)
+                    self._batch_lanes += 1
+                # Call customization hook
+                self.dataExportApplet.prepare_lane_for_export(first_lane + offset)
+
+            for offset, progress_callback in enumerate(progress_callbacks):
+                opDataExport = self.dataExportApplet.topLevelOperator.getLane(first_lane + offset)
+                opDataExport.progressSignal.subscribe(progress_callback)
+                opDataExports.append((opDataExport, progress_callback))
+
+            if len(lane_configs) == 1:
+                results = [export_function(opDataExports[0][0])]
+            else:
+                with Memory.sharedComputation(len(lane_configs)):
+                    with ThreadPoolExecutor(max_workers=len(lane_configs)) as executor:
+                        futures = [executor.submit(export_function, opDataExport) for opDataExport, _ in opDataExports]
+                        results = [future.result() for future in futures]
+
+            for offset in range(len(lane_configs)):
+                # Call customization hook
+                self.dataExportApplet.post_process_lane_export(first_lane + offset)
+            succeeded = True
+            return results
         finally:
+            for opDataExport, progress_callback in opDataExports:
+                opDataExport.progressSignal.unsubscribe(progress_callback)
+            if not (reuse_lanes and succeeded):
+                self.drop_batch_lanes()
+
+    def drop_batch_lanes(self):
+        """Remove the lanes that were added for batch processing from the workflow."""
+        while self._batch_lanes > 0:
+            self._batch_lanes -= 1
             self.dataSelectionApplet.dropLastLane()
@@ -166,6 +166,15 @@ class DataExportApplet(Applet):
         )
 
         arg_parser.add_argument("--table_only", help="Export only csv/HDF5 table.", action="store_true", default=False)
+        arg_parser.add_argument(
+            "--resume",
+            help=(
+                "Continue an interrupted export to hdf5, n5 or OME-Zarr: Blocks that were written completely"
+                " (according to the export's .manifest.json file) are skipped."
+            ),
+            action="store_true",
+            default=False,
+        )
 
         return arg_parser
 
@@ -322,5 +331,8 @@ class DataExportApplet(Applet):
         if parsed_args.table_only:
             opDataExport.TableOnly.setValue(True)
 
+        if getattr(parsed_args, "resume", False):
+            opDataExport.ResumeExport.setValue(True)
+
         # Re-connect the 'transaction' slot to apply all settings at once.
         opDataExport.TransactionSlot.setValue(True)
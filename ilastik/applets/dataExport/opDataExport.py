@@ -21,13 +21,14 @@
 import os
 import collections
 from collections import OrderedDict
-from typing import Tuple, Union
+from typing import Optional, Tuple, Union
 
 import numpy
 from ndstructs import Slice5D
 
 from ilastik.config import cfg
 
+from lazyflow.distributed.orchestratorBackend import OrchestratorBackend
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.utility import PathComponents, getPathVariants, format_known_keys
 from lazyflow.operators.ioOperators import OpFormattedDataExport
@@ -101,6 +102,9 @@ class OpDataExport(Operator):
     TableOnlyName = InputSlot(value="Table-Only")
     TableOnly = InputSlot(value=False)
 
+    # Continue an interrupted export instead of starting over (see OpExportSlot.ResumeExport)
+    ResumeExport = InputSlot(value=False)
+
     ExportPath = OutputSlot()  # Location of the saved file after export is complete.
 
     ConvertedImage = OutputSlot()  # Cropped image, not yet re-ordered (useful for guis)
@@ -150,6 +154,7 @@ class OpDataExport(Operator):
         opFormattedExport.ExportDtype.connect(self.ExportDtype)
         opFormattedExport.OutputAxisOrder.connect(self.OutputAxisOrder)
         opFormattedExport.OutputFormat.connect(self.OutputFormat)
+        opFormattedExport.ResumeExport.connect(self.ResumeExport)
 
         self.ConvertedImage.connect(opFormattedExport.ConvertedImage)
         self.ImageToExport.connect(opFormattedExport.ImageToExport)
@@ -255,8 +260,8 @@ class OpDataExport(Operator):
         # (Typically used from pure-python clients in batch mode.)
         return self._opFormattedExport.run_export_to_array()
 
-    def run_distributed_export(self, block_roi: Slice5D):
-        return self._opFormattedExport.run_distributed_export(block_roi)
+    def run_distributed_export(self, block_roi: Slice5D, orchestrator: Optional[OrchestratorBackend] = None) -> str:
+        return self._opFormattedExport.run_distributed_export(block_roi, orchestrator)
 
 
 class OpRawSubRegionHelper(Operator):
@@ -23,17 +23,13 @@ from qtpy.QtWidgets import QMenu, QPushButton
 from qtpy.QtGui import QIcon
 
 # this is used to find the location of the icon file
+import importlib.util
 import os.path
 
 FILEPATH = os.path.split(__file__)[0]
 
 # Is DVID available?
-try:
-    import libdvid
-
-    _supports_dvid = True
-except ImportError:
-    _supports_dvid = False
+_supports_dvid = importlib.util.find_spec("libdvid") is not None
 
 
 class AddFileButton(QPushButton):
@@ -316,6 +316,9 @@ class DataSelectionApplet(Applet):
     def dropLastLane(self):
         return self.topLevelOperator.dropLastLane()
 
+    def reconfigureLane(self, lane_idx: int, role_infos: Dict[str, DatasetInfo]):
+        return self.topLevelOperator.reconfigureLane(lane_idx, role_infos)
+
     @property
     def num_lanes(self) -> int:
         return self.topLevelOperator.num_lanes
@@ -34,7 +34,6 @@ from typing import List, Tuple, Dict, Optional, Union, Callable, Set
 import h5py
 import numpy
 import vigra
-import z5py
 from ndstructs import Shape5D
 from vigra import AxisTags
 
@@ -53,7 +52,7 @@ from lazyflow.operators.opArrayPiper import OpArrayPiper
 from lazyflow.operators.opReorderAxes import OpReorderAxes
 from lazyflow.utility.helpers import get_default_axisordering, eq_shapes
 from lazyflow.utility.io_util.multiscaleStore import DEFAULT_SCALE_KEY, Multiscales
-from lazyflow.utility.pathHelpers import splitPath, globH5N5, globNpz, PathComponents, uri_to_Path
+from lazyflow.utility.pathHelpers import splitPath, globH5N5, globNpz, PathComponents, uri_to_Path, loadedZ5pyTypes
 
 
 def getTypeRange(numpy_type):
@@ -306,6 +305,8 @@ class DatasetInfo(ABC):
                 elif cls.pathIsHdf5(path):
                     f = h5py.File(path, "r")
                 elif cls.pathIsN5(path):
+                    from lazyflow.utility.n5 import z5py
+
                     try:
                         f = z5py.N5File(path)
                     except AttributeError as e:
@@ -341,13 +342,18 @@ class DatasetInfo(ABC):
         datasetNames = []
 
         def accumulateInternalPaths(name, val):
-            if isinstance(val, (h5py.Dataset, z5py.dataset.Dataset)) and min_ndim <= len(val.shape) <= max_ndim:
+            if (
+                isinstance(val, (h5py.Dataset, *loadedZ5pyTypes("dataset.Dataset")))
+                and min_ndim <= len(val.shape) <= max_ndim
+            ):
                 datasetNames.append("/" + name)
 
         if cls.pathIsHdf5(file_path):
             with h5py.File(file_path, "r") as f:
                 f.visititems(accumulateInternalPaths)
         elif cls.pathIsN5(file_path):
+            from lazyflow.utility.n5 import z5py
+
             with z5py.N5File(file_path, mode="r+") as f:
                 f.visititems(accumulateInternalPaths)
 
@@ -1244,6 +1250,19 @@ class OpMultiLaneDataSelectionGroup(OpMultiLaneWrapper):
     def dropLastLane(self):
         self.removeLane(self.num_lanes - 1, self.num_lanes - 1)
 
+    def reconfigureLane(self, lane_idx: int, role_infos: Dict[str, DatasetInfo]):
+        """
+        Point an existing lane to other datasets, keeping the lane's operators (cheaper than dropping
+        the lane and pushing a new one).  Roles that are missing from role_infos are cleared.
+        """
+        self.workflow.prepareForNewLane(lane_idx)
+        lane = self.get_lane(lane_idx)
+        for role_index, role_name in enumerate(self.role_names):
+            if role_name not in role_infos:
+                lane.DatasetGroup[role_index].disconnect()
+        lane.configure(infos=role_infos)
+        self.workflow.handleNewLanesAdded()
+
     @property
     def num_lanes(self) -> int:
         return len(self.innerOperators)
@@ -32,6 +32,7 @@ from lazyflow.operators import OpReorderAxes
 from lazyflow.operatorWrapper import OperatorWrapper
 
 from ilastik.applets.featureSelection import FeatureSelectionConstraintError
+from ilastik.config import cfg
 
 logger = logging.getLogger(__name__)
 
@@ -91,6 +92,9 @@ class OpFeatureSelectionNoCache(Operator):
 
     FeatureListFilename = InputSlot(stype="str", optional=True)
 
+    # How features are computed, see lazyflow.operators.opPixelFeaturesPresmoothed.FILTER_BACKENDS
+    FilterBackend = InputSlot(value=cfg["lazyflow"]["filter_backend"])
+
     # Features are presented in the channels of the output image
     # Output can be optionally accessed via an internal cache.
     # (Training a classifier benefits from caching, but predicting with an existing classifier does not.)
@@ -110,6 +114,7 @@ class OpFeatureSelectionNoCache(Operator):
         self.opPixelFeatures.FeatureIds.connect(self.FeatureIds)
         self.opPixelFeatures.SelectionMatrix.connect(self.SelectionMatrix)
         self.opPixelFeatures.ComputeIn2d.connect(self.ComputeIn2d)
+        self.opPixelFeatures.FilterBackend.connect(self.FilterBackend)
         self.opReorderIn = OpReorderAxes(parent=self)
         self.opReorderIn.AxisOrder.setValue("tczyx")
         self.opReorderIn.Input.connect(self.InputImage)
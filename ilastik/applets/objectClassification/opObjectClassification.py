@@ -32,6 +32,7 @@ from lazyflow.rtype import List
 from lazyflow.operators import OpValueCache, OpSlicedBlockedArrayCache, OpMultiArrayStacker
 from lazyflow.operatorWrapper import OperatorWrapper
 from lazyflow.request import Request, RequestPool, RequestLock
+from lazyflow.utility import Memory
 
 from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
 
@@ -39,6 +40,7 @@ from ilastik.utility import OperatorSubView, MultiLaneOperatorABC, OpMultiLaneWr
 from ilastik.utility.exportFile import objects_per_frame, ExportFile, ilastik_ids, Mode, Default
 from ilastik.utility.exportingOperator import ExportingOperator
 from ilastik.applets.objectExtraction.opObjectExtraction import default_features_key
+from ilastik.applets.objectExtraction.featureTable import FeatureTable
 
 
 from ilastik.applets.base.applet import DatasetConstraintError
@@ -50,6 +52,9 @@ logger = logging.getLogger(__name__)
 
 MISSING_VALUE = 0
 
+#: Size of the chunks of the feature table that OpObjectPredict passes to the classifier
+PREDICTION_CHUNK_BYTES = 64 * 2**20
+
 
 class InvalidObjectIndex(BaseException):
     pass
@@ -941,55 +946,31 @@ def _concatenate(arrays, axis):
 
 
 def make_feature_array(feats, selected, labels=None):
-    featlist = []
-    labellist = []
-
-    row_names = []
-    col_names = []
-
-    for t in sorted(feats.keys()):
-        featsMatrix_tmp = []
-        index = None
-        if labels is not None:
-            labellist_tmp = []
-            lab = labels[t].squeeze()
-            index = numpy.nonzero(lab)
-            labellist_tmp.append(lab[index])
-
-        timestep_col_names = []
-        for plugin in sorted(feats[t].keys()):
-            if plugin == default_features_key or plugin not in selected:
-                continue
-            for featname in sorted(feats[t][plugin].keys()):
-                if featname not in selected[plugin]:
-                    continue
-                value = feats[t][plugin][featname]
-                ft = numpy.asarray(value.squeeze())
-                if index is not None:
-                    ft = ft[index]
-                featsMatrix_tmp.append(ft)
-                timestep_col_names.extend([(plugin, featname)] * value.shape[1])
-        if not col_names:
-            col_names = timestep_col_names
-        elif col_names != timestep_col_names:
-            raise Exception("different time slices did not have same features.")
-
-        # FIXME: we can do it all with just arrays
-        featsMatrix_tmp_combined = _concatenate(featsMatrix_tmp, axis=1)
-        featlist.append(featsMatrix_tmp_combined)
-        if index is not None:
-            row_names.extend(list((t, obj) for obj in index[0]))
-        if labels is not None:
-            labellist_tmp_combined = _concatenate(labellist_tmp, axis=1)
-            labellist.append(labellist_tmp_combined)
-
-    featMatrix = _concatenate(featlist, axis=0)
+    """
+    Stack the selected features of the time frames in feats (dict[t][plugin_name][feature_name])
+    into one float32 matrix.  If labels (dict[t] = label per object) are given, only the labeled
+    objects are used.
 
-    if labels is not None:
-        labelsMatrix = _concatenate(labellist, axis=0)
-        assert labelsMatrix.shape[0] == featMatrix.shape[0]
-        return featMatrix, row_names, col_names, labelsMatrix
-    return featMatrix, row_names, col_names
+    Returns: featMatrix, row_names, col_names (and labelsMatrix, if labels are given)
+    """
+    if labels is None:
+        table = FeatureTable.from_frames(feats, selected)
+        return table.values(), [], table.column_names
+
+    # Only the labeled objects are copied (OpObjectTrain calls this on every retrain)
+    times = sorted(feats)
+    frame_labels = {t: labels[t].squeeze() for t in times}
+    objects = {t: numpy.flatnonzero(frame_labels[t]) for t in times}
+    table = FeatureTable.for_frames([feats[t] for t in times], selected, num_rows=sum(len(objects[t]) for t in times))
+    for t in times:
+        table.append_frame(t, feats[t], objects=objects[t])
+
+    row_names = [(t, obj) for t in times for obj in objects[t]]
+    labellist = [frame_labels[t][objects[t]].reshape(-1, 1) for t in times]
+    labelsMatrix = numpy.concatenate(labellist, axis=0) if labellist else numpy.zeros((0, 1))
+    featMatrix = table.values()
+    assert labelsMatrix.shape[0] == featMatrix.shape[0]
+    return featMatrix, row_names, table.column_names, labelsMatrix
 
 
 def replace_missing(a):
@@ -1124,7 +1105,7 @@ class OpObjectTrain(Operator):
             self._tree_count, self.ForestCount.value, labels=allLabels
         )
         classifier = classifier_factory.create_and_train(
-            featMatrix.astype(numpy.float32), numpy.asarray(labelsMatrix, dtype=numpy.uint32)
+            numpy.asarray(featMatrix, dtype=numpy.float32), numpy.asarray(labelsMatrix, dtype=numpy.uint32)
         )
         avg_oob = numpy.mean(classifier.oobs)
         logger.info("training finished, average out-of-bag error: {}".format(avg_oob))
@@ -1249,16 +1230,25 @@ class OpObjectPredict(Operator):
         if times_not_cached:
             tmpfeats = self.Features(times_not_cached).wait()
 
+        times_to_predict = []
         for t in times_not_cached:
             prob_predictions[t] = numpy.zeros((1, len(self.ProbabilityChannels)), dtype=numpy.float32)
             num_objects = get_num_objects(tmpfeats[t])  # tmpfeats[t])
             # Apparently self.Features always returns a background object,
             #  so we expect at least 1 object in the list, even if there's nothing to predict.
             assert num_objects > 0
-            if num_objects == 1:
-                continue
+            if num_objects > 1:
+                times_to_predict.append(t)
 
-            ftmatrix, _, col_names = make_feature_array({t: tmpfeats[t]}, selected)
+        # One float32 table for all time steps, which is kept on disk if it would take too much RAM.
+        # (The feature dicts themselves are still held by the RegionFeatures cache of OpObjectExtraction.)
+        table = FeatureTable.for_frames(
+            (tmpfeats[t] for t in times_to_predict), selected, max_ram=Memory.getAvailableRamComputation() // 4
+        )
+        for t in times_to_predict:
+            table.append_frame(t, tmpfeats[t])
+        for t in times_to_predict:
+            ftmatrix = table.frame(t)
             rows, cols = replace_missing(ftmatrix)
             self.bad_objects[t] = numpy.zeros((ftmatrix.shape[0],))
             self.bad_objects[t][rows] = 1
@@ -1268,26 +1258,35 @@ class OpObjectPredict(Operator):
 
         # Are there any objects to predict?
         if len(feats) > 0:
+            # The frames are (possibly memory-mapped) views of the table,
+            # predict them in chunks of rows that are copied into contiguous arrays.
+            chunk_rows = max(1, PREDICTION_CHUNK_BYTES // (4 * max(1, len(table.columns))))
+            chunk_predictions = {t: {} for t in feats}
 
-            def predict_forest(_t):
+            def predict_forest(_t, _start):
                 # Note: We can't use RandomForest.predictLabels() here because we're training in parallel,
                 #        and we have to average the PROBABILITIES from all forests.
                 #       Averaging the label predictions from each forest is NOT equivalent.
                 #       For details please see wikipedia:
                 #       http://en.wikipedia.org/wiki/Electoral_College_%28United_States%29#Irrelevancy_of_national_popular_vote
                 #       (^-^)
-                prob_predictions[_t] = classifier.predict_probabilities(feats[_t].astype(numpy.float32))
+                chunk = numpy.ascontiguousarray(feats[_t][_start : _start + chunk_rows])
+                chunk_predictions[_t][_start] = classifier.predict_probabilities(chunk)
 
             # predict the data with all the forests in parallel
             pool = RequestPool()
-            for t in times_not_cached:
+            for t in feats:
                 logger.debug("Predicting object probabilities for time step: {}".format(t))
-                req = Request(partial(predict_forest, t))
-                pool.add(req)
+                for start in range(0, len(feats[t]), chunk_rows):
+                    pool.add(Request(partial(predict_forest, t, start)))
 
             pool.wait()
             pool.clean()
 
+            for t, predictions in chunk_predictions.items():
+                prob_predictions[t] = numpy.concatenate([predictions[start] for start in sorted(predictions)])
+        table.close()
+
         with self.lock:
             for t in times:
                 if t not in self.prob_cache:
@@ -0,0 +1,234 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+Region features that can be computed block by block.
+
+Every block is reduced to a small table of per-object statistics (count, intensity sums and central
+moments, intensity minimum/maximum, bounding box and coordinate sums), and the tables of all blocks
+are merged into one.  Objects that cross block boundaries get the same features as if the whole
+volume had been processed at once, but only one block of raw data and labels is held in memory.
+
+The features use the names and conventions of the "Standard Object Features" plugin (vigra):
+coordinates are given in xyz order (without z for 2D data), Coord<Maximum> is end-exclusive and
+Variance, Skewness and Kurtosis are the population moments.
+"""
+from typing import Dict, Iterable
+
+import numpy
+
+#: Features of the "Standard Object Features" plugin that can be merged across blocks
+MERGEABLE_FEATURES = (
+    "Count",
+    "Sum",
+    "Mean",
+    "Variance",
+    "Skewness",
+    "Kurtosis",
+    "Minimum",
+    "Maximum",
+    "Coord<Minimum>",
+    "Coord<Maximum>",
+    "RegionCenter",
+)
+
+
+class BlockStatistics:
+    """
+    Per-object statistics of a single block.
+
+    All arrays have one row per object in ``ids`` (the background, label 0, is ignored).
+    ``mean``, ``m2``, ``m3``, ``m4``, ``minimum`` and ``maximum`` have one column per channel,
+    the coordinate arrays have one column per spatial axis.
+    """
+
+    def __init__(self, ids, count, mean, m2, m3, m4, minimum, maximum, coord_min, coord_max, coord_sum):
+        self.ids = ids
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.m3 = m3
+        self.m4 = m4
+        self.minimum = minimum
+        self.maximum = maximum
+        self.coord_min = coord_min
+        self.coord_max = coord_max
+        self.coord_sum = coord_sum
+
+    @classmethod
+    def from_block(cls, raw: numpy.ndarray, labels: numpy.ndarray, offset: Iterable[int]) -> "BlockStatistics":
+        """
+        Args:
+            raw: Intensities with axes xyzc (or xyc).
+            labels: Object labels with axes xyz (or xy), 0 is background.
+            offset: Position of the block in the whole volume, in the same axis order as ``labels``.
+        """
+        labels = numpy.asarray(labels)
+        raw = numpy.asarray(raw)
+        assert raw.shape[:-1] == labels.shape, f"raw {raw.shape} and labels {labels.shape} do not match"
+        num_channels = raw.shape[-1]
+
+        foreground = labels != 0
+        ids, inverse, count = numpy.unique(labels[foreground], return_inverse=True, return_counts=True)
+        num_objects = len(ids)
+
+        def per_object_sum(values):
+            return numpy.stack([numpy.bincount(inverse, weights=v, minlength=num_objects) for v in values.T], axis=-1)
+
+        values = raw.reshape(-1, num_channels)[foreground.reshape(-1)].astype(numpy.float64)
+        mean = per_object_sum(values) / count[:, None]
+        centered = values - mean[inverse]
+        m2 = per_object_sum(centered**2)
+        m3 = per_object_sum(centered**3)
+        m4 = per_object_sum(centered**4)
+
+        coords = numpy.stack(numpy.nonzero(foreground), axis=-1) + numpy.asarray(offset, dtype=numpy.int64)
+        coord_sum = per_object_sum(coords.astype(numpy.float64))
+
+        # Sort the voxels by object, so that every object is one contiguous run for reduceat
+        order = numpy.argsort(inverse, kind="stable")
+        starts = numpy.concatenate(([0], numpy.cumsum(count)[:-1])) if num_objects else numpy.zeros(0, dtype=int)
+
+        def per_object_reduce(ufunc, data):
+            if not num_objects:
+                return numpy.zeros((0, data.shape[-1]), dtype=data.dtype)
+            return ufunc.reduceat(data[order], starts, axis=0)
+
+        return cls(
+            ids=ids,
+            count=count.astype(numpy.float64),
+            mean=mean,
+            m2=m2,
+            m3=m3,
+            m4=m4,
+            minimum=per_object_reduce(numpy.minimum, values),
+            maximum=per_object_reduce(numpy.maximum, values),
+            coord_min=per_object_reduce(numpy.minimum, coords),
+            coord_max=per_object_reduce(numpy.maximum, coords),
+            coord_sum=coord_sum,
+        )
+
+
+class RegionFeatureAccumulator:
+    """
+    Merges the statistics of many blocks into one per-object table, indexed by label.
+
+    Central moments are combined with the pairwise update formulas by Chan et al. and Pébay,
+    which are exact (up to rounding) for any split of the objects into blocks.
+    """
+
+    def __init__(self, num_channels: int, num_spatial_axes: int):
+        self.num_channels = num_channels
+        self.num_spatial_axes = num_spatial_axes
+        self._allocate(0)
+
+    def _allocate(self, size):
+        c, d = self.num_channels, self.num_spatial_axes
+        self.count = numpy.zeros(size)
+        self.mean = numpy.zeros((size, c))
+        self.m2 = numpy.zeros((size, c))
+        self.m3 = numpy.zeros((size, c))
+        self.m4 = numpy.zeros((size, c))
+        self.minimum = numpy.full((size, c), numpy.inf)
+        self.maximum = numpy.full((size, c), -numpy.inf)
+        self.coord_min = numpy.full((size, d), numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+        self.coord_max = numpy.full((size, d), -1, dtype=numpy.int64)
+        self.coord_sum = numpy.zeros((size, d))
+
+    def _grow(self, size):
+        old = dict(vars(self))
+        old_size = len(self.count)
+        self._allocate(max(size, 2 * old_size))
+        for name, value in old.items():
+            if isinstance(value, numpy.ndarray):
+                getattr(self, name)[:old_size] = value
+
+    @property
+    def num_objects(self) -> int:
+        """Highest label that was seen in any block."""
+        seen = numpy.flatnonzero(self.count)
+        return int(seen[-1]) if len(seen) else 0
+
+    def add_block(self, raw: numpy.ndarray, labels: numpy.ndarray, offset: Iterable[int]):
+        """See BlockStatistics.from_block"""
+        self.merge(BlockStatistics.from_block(raw, labels, offset))
+
+    def merge(self, block: BlockStatistics):
+        if not len(block.ids):
+            return
+        if block.ids[-1] >= len(self.count):
+            self._grow(int(block.ids[-1]) + 1)
+
+        ids = block.ids
+        na = self.count[ids][:, None]
+        nb = block.count[:, None]
+        n = na + nb
+        delta = block.mean - self.mean[ids]
+        m2a, m2b = self.m2[ids], block.m2
+        m3a, m3b = self.m3[ids], block.m3
+
+        self.m4[ids] += (
+            block.m4
+            + delta**4 * na * nb * (na**2 - na * nb + nb**2) / n**3
+            + 6 * delta**2 * (na**2 * m2b + nb**2 * m2a) / n**2
+            + 4 * delta * (na * m3b - nb * m3a) / n
+        )
+        self.m3[ids] += m3b + delta**3 * na * nb * (na - nb) / n**2 + 3 * delta * (na * m2b - nb * m2a) / n
+        self.m2[ids] += m2b + delta**2 * na * nb / n
+        self.mean[ids] += delta * nb / n
+        self.count[ids] = n[:, 0]
+
+        self.minimum[ids] = numpy.minimum(self.minimum[ids], block.minimum)
+        self.maximum[ids] = numpy.maximum(self.maximum[ids], block.maximum)
+        self.coord_min[ids] = numpy.minimum(self.coord_min[ids], block.coord_min)
+        self.coord_max[ids] = numpy.maximum(self.coord_max[ids], block.coord_max)
+        self.coord_sum[ids] += block.coord_sum
+
+    def features(self, names: Iterable[str]) -> Dict[str, numpy.ndarray]:
+        """
+        Compute the requested features (see MERGEABLE_FEATURES) for objects 1..num_objects.
+
+        Like the "Standard Object Features" plugin, the background is not included, so row i
+        belongs to label i + 1.  Labels that did not occur in any block have zero features.
+        """
+        unknown = set(names) - set(MERGEABLE_FEATURES)
+        if unknown:
+            raise ValueError(f"Features cannot be computed blockwise: {sorted(unknown)}")
+
+        rows = slice(1, self.num_objects + 1)
+        count = self.count[rows, None]
+        present = count > 0
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            m2 = self.m2[rows]
+            computed = {
+                "Count": lambda: count,
+                "Sum": lambda: self.mean[rows] * count,
+                "Mean": lambda: self.mean[rows],
+                "Variance": lambda: numpy.where(present, m2 / count, 0),
+                "Skewness": lambda: numpy.where(present, numpy.sqrt(count) * self.m3[rows] / m2**1.5, 0),
+                "Kurtosis": lambda: numpy.where(present, count * self.m4[rows] / m2**2 - 3, 0),
+                "Minimum": lambda: numpy.where(present, self.minimum[rows], 0),
+                "Maximum": lambda: numpy.where(present, self.maximum[rows], 0),
+                "Coord<Minimum>": lambda: numpy.where(present, self.coord_min[rows], 0),
+                # end exclusive, like the vigra plugin
+                "Coord<Maximum>": lambda: numpy.where(present, self.coord_max[rows] + 1, 0),
+                "RegionCenter": lambda: numpy.where(present, self.coord_sum[rows] / count, 0),
+            }
+            return {name: computed[name]() for name in names}
@@ -0,0 +1,257 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#           http://ilastik.org/license.html
+###############################################################################
+"""
+A columnar table of object features.
+
+OpObjectExtraction provides the features of each time frame as a nested dict,
+dict[plugin_name][feature_name] = array with one row per object (row 0 is the background).
+FeatureTable stores the features of many frames as contiguous float32 columns, one per feature
+channel, with the frames appended one after the other.  Consumers get views of a frame, a feature
+or a single column, without copying.  Large tables can be memory-mapped to a temporary file.
+"""
+import tempfile
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy
+
+from ilastik.applets.objectExtraction.opObjectExtraction import default_features_key
+
+#: (plugin name, feature name, channel)
+Column = Tuple[str, str, int]
+
+
+def _num_objects(features) -> int:
+    return max((len(value) for feature_dict in features.values() for value in feature_dict.values()), default=0)
+
+
+class FeatureTable:
+    def __init__(
+        self, columns: Sequence[Column], capacity: int = 1024, memmap: bool = False, scratch_dir: Optional[str] = None
+    ):
+        """
+        Args:
+            columns: The columns of the table.  The channels of a feature must be consecutive.
+            capacity: Number of rows to allocate initially (the table grows as needed).
+            memmap: Store the table in a temporary file instead of RAM.
+            scratch_dir: Directory of the temporary file (default: the system temp directory).
+        """
+        self.columns = list(columns)
+        self._features = {}  # (plugin name, feature name) -> slice of columns
+        for i, (plugin_name, feature_name, channel) in enumerate(self.columns):
+            key = (plugin_name, feature_name)
+            if key not in self._features:
+                self._features[key] = slice(i, i)
+            assert self._features[key].stop == i, f"channels of {key} are not consecutive"
+            self._features[key] = slice(self._features[key].start, i + 1)
+
+        self._memmap = memmap and len(self.columns) > 0
+        self._scratch_dir = scratch_dir
+        self._file = None
+        self._data, self._file = self._allocate(max(capacity, 1))
+        self._num_rows = 0
+        self._frames = {}  # t -> slice of rows
+
+    @staticmethod
+    def columns_for(
+        features: Mapping[str, Mapping[str, numpy.ndarray]],
+        selected: Optional[Mapping[str, Iterable[str]]] = None,
+        include_default_features: bool = False,
+    ) -> List[Column]:
+        """
+        The columns for the features of one frame, in the order of make_feature_array:
+        sorted by plugin and feature name.  Only the ``selected`` features are used
+        (dict[plugin_name] = feature names), if given.
+        """
+        columns = []
+        for plugin_name in sorted(features):
+            if plugin_name == default_features_key and not include_default_features:
+                continue
+            if selected is not None and plugin_name not in selected and plugin_name != default_features_key:
+                continue
+            for feature_name in sorted(features[plugin_name]):
+                if selected is not None and plugin_name in selected and feature_name not in selected[plugin_name]:
+                    continue
+                num_channels = int(numpy.prod(numpy.shape(features[plugin_name][feature_name])[1:]))
+                columns.extend((plugin_name, feature_name, channel) for channel in range(num_channels))
+        return columns
+
+    @classmethod
+    def for_frames(
+        cls,
+        frames: Iterable[Mapping[str, Mapping[str, numpy.ndarray]]],
+        selected: Optional[Mapping[str, Iterable[str]]] = None,
+        include_default_features: bool = False,
+        max_ram: Optional[int] = None,
+        scratch_dir: Optional[str] = None,
+        num_rows: Optional[int] = None,
+    ) -> "FeatureTable":
+        """
+        An empty table with the columns and capacity for the features of the given frames,
+        which can then be appended one by one.
+        The table is memory-mapped to a temporary file in ``scratch_dir`` if it would need more than ``max_ram`` bytes.
+        ``num_rows`` is the number of rows to reserve, if only some objects of the frames are appended
+        (default: all objects).
+        """
+        frames = list(frames)
+        # Frames with only the background may lack the local features, take the columns from the biggest one
+        biggest = max(frames, key=_num_objects, default=None)
+        columns = [] if biggest is None else cls.columns_for(biggest, selected, include_default_features)
+        if num_rows is None:
+            num_rows = sum(_num_objects(features) for features in frames)
+        memmap = max_ram is not None and num_rows * len(columns) * 4 > max_ram
+        return cls(columns, capacity=num_rows, memmap=memmap, scratch_dir=scratch_dir)
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Mapping[int, Mapping[str, Mapping[str, numpy.ndarray]]],
+        selected: Optional[Mapping[str, Iterable[str]]] = None,
+        include_default_features: bool = False,
+        max_ram: Optional[int] = None,
+        scratch_dir: Optional[str] = None,
+    ) -> "FeatureTable":
+        """
+        Build a table from the features of several frames (as returned by the RegionFeatures slot), sorted by time.
+        See for_frames for the memory-mapping.
+        """
+        times = sorted(frames)
+        table = cls.for_frames(
+            [frames[t] for t in times], selected, include_default_features, max_ram=max_ram, scratch_dir=scratch_dir
+        )
+        for t in times:
+            table.append_frame(t, frames[t])
+        return table
+
+    def _allocate(self, capacity):
+        shape = (len(self.columns), capacity)
+        if not self._memmap:
+            return numpy.empty(shape, dtype=numpy.float32), None
+        scratch_file = tempfile.TemporaryFile(prefix="ilastik-features-", dir=self._scratch_dir)
+        return numpy.memmap(scratch_file, dtype=numpy.float32, mode="w+", shape=shape), scratch_file
+
+    def _reserve(self, num_rows):
+        capacity = self._data.shape[1]
+        if num_rows <= capacity:
+            return
+        data, scratch_file = self._allocate(max(num_rows, 2 * capacity))
+        data[:, : self._num_rows] = self._data[:, : self._num_rows]
+        self.close()
+        self._data, self._file = data, scratch_file
+
+    def append_frame(
+        self, t: int, features: Mapping[str, Mapping[str, numpy.ndarray]], objects: Optional[Sequence[int]] = None
+    ):
+        """
+        Append the features of time frame t (dict[plugin_name][feature_name] = array, row 0 is the background).
+        Frames that contain only the background may lack features, their values are 0.
+
+        If ``objects`` is given, only the rows of these objects are appended (in this order),
+        and row i of ``frame(t)`` belongs to object ``objects[i]``.
+        """
+        if t in self._frames:
+            raise ValueError(f"Time frame {t} is already in the table")
+        frame_objects = _num_objects(features)
+        num_objects = frame_objects if objects is None else len(objects)
+        start = self._num_rows
+        self._reserve(start + num_objects)
+
+        for (plugin_name, feature_name), columns in self._features.items():
+            try:
+                value = numpy.asarray(features[plugin_name][feature_name])
+            except KeyError:
+                if frame_objects > 1:
+                    raise ValueError("different time slices did not have same features.") from None
+                self._data[columns, start : start + num_objects] = 0
+                continue
+            value = value.reshape(frame_objects, -1)
+            if objects is not None:
+                value = value[objects]
+            if value.shape[1] != columns.stop - columns.start:
+                raise ValueError("different time slices did not have same features.")
+            self._data[columns, start : start + num_objects] = value.T
+
+        self._num_rows += num_objects
+        self._frames[t] = slice(start, self._num_rows)
+
+    @property
+    def frames(self) -> List[int]:
+        return list(self._frames)
+
+    @property
+    def memmapped(self) -> bool:
+        """Whether the table is stored in a temporary file."""
+        return self._memmap
+
+    @property
+    def num_rows(self) -> int:
+        return self._num_rows
+
+    def __len__(self):
+        return self._num_rows
+
+    @property
+    def column_names(self) -> List[Tuple[str, str]]:
+        """(plugin name, feature name) of every column, like the col_names of make_feature_array."""
+        return [(plugin_name, feature_name) for plugin_name, feature_name, _ in self.columns]
+
+    @property
+    def features(self) -> Dict[Tuple[str, str], int]:
+        """The number of channels of every feature, in column order."""
+        return {key: columns.stop - columns.start for key, columns in self._features.items()}
+
+    def rows(self, t: int) -> slice:
+        """The rows of time frame t, starting with its background object."""
+        return self._frames[t]
+
+    def object_rows(self) -> numpy.ndarray:
+        """Indices of all rows except the background rows."""
+        is_object = numpy.ones(self._num_rows, dtype=bool)
+        is_object[[rows.start for rows in self._frames.values() if rows.stop > rows.start]] = False
+        return numpy.flatnonzero(is_object)
+
+    def values(self) -> numpy.ndarray:
+        """All rows, as an (objects, columns) view."""
+        return self._data[:, : self._num_rows].T
+
+    def frame(self, t: int) -> numpy.ndarray:
+        """
+        The features of time frame t, as an (objects, columns) view.
+        Row i belongs to object i (or to ``objects[i]``, if only some objects were appended).
+        """
+        return self._data[:, self._frames[t]].T
+
+    def feature(self, plugin_name: str, feature_name: str) -> numpy.ndarray:
+        """All values of a feature, as an (objects, channels) view."""
+        return self._data[self._features[(plugin_name, feature_name)], : self._num_rows].T
+
+    def column(self, plugin_name: str, feature_name: str, channel: int = 0) -> numpy.ndarray:
+        """All values of one channel of a feature (a contiguous array)."""
+        columns = self._features[(plugin_name, feature_name)]
+        if not 0 <= channel < columns.stop - columns.start:
+            raise IndexError(f"{feature_name} has no channel {channel}")
+        return self._data[columns.start + channel, : self._num_rows]
+
+    def close(self):
+        """Release the temporary file of a memory-mapped table."""
+        if self._file is not None:
+            self._data = numpy.zeros((len(self.columns), 0), dtype=numpy.float32)
+            self._file.close()
+            self._file = None
@@ -34,7 +34,7 @@ from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.request import Request, RequestPool
 from lazyflow.stype import Opaque
 from lazyflow.rtype import List, SubRegion
-from lazyflow.roi import roiToSlice
+from lazyflow.roi import getIntersectingRois, roiToSlice
 from lazyflow.operators.opLabelBase import OpLabelBase
 from lazyflow.operators.opRelabelConsecutive import OpRelabelConsecutive
 from lazyflow.operators import OpLabelVolume, OpCompressedCache, OpBlockedArrayCache
@@ -48,6 +48,11 @@ from ilastik.plugins.manager import pluginManager
 
 
 from ilastik.applets.base.applet import DatasetConstraintError
+from ilastik.applets.objectExtraction.blockwiseRegionFeatures import (
+    MERGEABLE_FEATURES,
+    BlockStatistics,
+    RegionFeatureAccumulator,
+)
 
 # These features are always calculated, but not used for prediction.
 # They are needed by our gui, or by downstream applets.
@@ -56,6 +61,9 @@ default_features = {"Coord<Minimum>": {}, "Coord<Maximum>": {}, "RegionCenter":
 # to distinguish them, they go in their own category with this name
 default_features_key = "Default features"
 
+# Maximum number of objects passed to ObjectFeaturesPlugin.compute_local_batch at once
+LOCAL_FEATURES_CHUNK_SIZE = 1000
+
 
 def max_margin(d, default=(0, 0, 0)):
     """find any parameter named 'margin' in the nested feature
@@ -124,6 +132,7 @@ class OpCachedRegionFeatures(Operator):
     LabelImage = InputSlot()
     CacheInput = InputSlot(optional=True)
     Features = InputSlot(rtype=List, stype=Opaque)
+    FeatureBlockShape = InputSlot(optional=True)
 
     Output = OutputSlot()
     CleanBlocks = OutputSlot()
@@ -146,6 +155,7 @@ class OpCachedRegionFeatures(Operator):
         self._opRegionFeatures.ObjectIDMapping.connect(self.ObjectIDMapping)
         self._opRegionFeatures.LabelVolume.connect(self.LabelImage)
         self._opRegionFeatures.Features.connect(self.Features)
+        self._opRegionFeatures.FeatureBlockShape.connect(self.FeatureBlockShape)
 
         # Hook up the cache.
         self._opCache = OpBlockedArrayCache(parent=self)
@@ -323,6 +333,11 @@ class OpObjectExtractionBase(Operator, ABC):
     # for example {"Standard Object Features": {"Mean in neighborhood":{"margin": (5, 5, 2)}}}
     Features = InputSlot(rtype=List, stype=Opaque, value={})
 
+    # If set, the features are computed block by block instead of for the whole volume of a time slice.
+    # Either an int (cubic blocks) or a dict of block lengths per spatial axis, e.g. {"x": 512, "y": 512, "z": 64}.
+    # Only the features in blockwiseRegionFeatures.MERGEABLE_FEATURES are supported.
+    FeatureBlockShape = InputSlot(optional=True)
+
     LabelImage = OutputSlot()
     ObjectCenterImage = OutputSlot()
     RelabelDict = OutputSlot()
@@ -368,6 +383,7 @@ class OpObjectExtractionBase(Operator, ABC):
         self._opRegFeats.RawImage.connect(self.RawImage)
         self._opRegFeats.LabelImage.connect(self._opLabelVolume.CachedOutput)
         self._opRegFeats.Features.connect(self.Features)
+        self._opRegFeats.FeatureBlockShape.connect(self.FeatureBlockShape)
         self._opRegFeats.Atlas.connect(self.Atlas)  # move into constructor?
         self.RegionFeaturesCleanBlocks.connect(self._opRegFeats.CleanBlocks)
 
@@ -503,6 +519,9 @@ class OpRegionFeatures(Operator):
     * Features : a nested dictionary of features to compute.
       Features[plugin name][feature name][parameter name] = parameter value
 
+    * FeatureBlockShape : optional, compute the features block by block
+      (see OpObjectExtractionBase.FeatureBlockShape)
+
     Outputs:
 
     * Output : a nested dictionary of features.
@@ -515,6 +534,7 @@ class OpRegionFeatures(Operator):
     ObjectIDMapping = InputSlot(optional=True)
     LabelVolume = InputSlot()
     Features = InputSlot(rtype=List, stype=Opaque)
+    FeatureBlockShape = InputSlot(optional=True)
 
     Output = OutputSlot()
 
@@ -554,6 +574,15 @@ class OpRegionFeatures(Operator):
             s[t_ind] = slice(t, t + 1)
             s = tuple(s)
 
+            if self.ObjectIDMapping.ready():
+                object_id_mapping = self.ObjectIDMapping[s[t_ind]].wait()[0]
+            else:
+                object_id_mapping = None
+
+            if self.FeatureBlockShape.ready():
+                result[res_t_ind] = self._extractBlockwise(t_ind, t, object_id_mapping)
+                return
+
             # Request in parallel
             raw_req = self.RawVolume[s]
             raw_req.submit()
@@ -568,11 +597,6 @@ class OpRegionFeatures(Operator):
             else:
                 atlasVolume = None
 
-            if self.ObjectIDMapping.ready():
-                object_id_mapping = self.ObjectIDMapping[s[t_ind]].wait()[0]
-            else:
-                object_id_mapping = None
-
             # Get results
             rawVolume = raw_req.wait()
             labelVolume = label_req.wait()
@@ -622,6 +646,21 @@ class OpRegionFeatures(Operator):
 
         return result
 
+    def compute_extents(self, image, mincoords, maxcoords, axes, margin):
+        """compute_extent for all objects at once."""
+        extents = [[None] * 3 for _ in range(len(mincoords))]
+        for axis in (axes.x, axes.y, axes.z):
+            if axis < mincoords.shape[1]:
+                start = numpy.maximum(mincoords[:, axis] - margin[axis], 0)
+                stop = numpy.minimum(maxcoords[:, axis] + 1 + margin[axis], image.shape[axis])
+            else:
+                # 2D data, there are no z coordinates
+                start = numpy.zeros(len(mincoords), dtype=int)
+                stop = start + 1
+            for extent, axis_start, axis_stop in zip(extents, start.tolist(), stop.tolist()):
+                extent[axis] = slice(axis_start, axis_stop)
+        return extents
+
     def compute_rawbbox(self, image, extent, axes):
         """essentially returns image[extent], preserving all channels."""
         key = copy(extent)
@@ -724,32 +763,12 @@ class OpRegionFeatures(Operator):
 
         pool.wait()
 
-        extrafeats = {}
-        for feat_key in default_features:
-            try:
-                sel = feature_names["Standard Object Features"][feat_key]["selected"]
-            except KeyError:
-                # we don't always set this property to True, sometimes it's just not there. The only important
-                # thing is that it's not False
-                sel = True
-            if not sel:
-                # This feature has not been selected by the user. Remove it from the computed dict into a special dict
-                # for default features
-                feature = global_features["Standard Object Features"].pop(feat_key)
-            else:
-                feature = global_features["Standard Object Features"][feat_key]
-            extrafeats[feat_key] = feature
+        extrafeats = self._splitDefaultFeatures(feature_names, global_features)
 
         if atlas is not None:
             extrafeats["AtlasMapping"] = self._createAtlasMapping(extrafeats["RegionCenter"], atlas)
 
-        if object_id_mapping is not None:
-            rev_mapping = {v: k for k, v in object_id_mapping.items()}
-            extrafeats["original_oid"] = numpy.expand_dims(
-                numpy.vectorize(rev_mapping.get)(numpy.arange(1, extrafeats["Count"].shape[0] + 1)), axis=-1
-            )
-
-        extrafeats = dict((k.replace(" ", ""), v) for k, v in extrafeats.items())
+        extrafeats = self._finishDefaultFeatures(extrafeats, object_id_mapping)
 
         # index in those have an -1 offset to object ids
         mincoords = extrafeats["Coord<Minimum>"].astype(int)
@@ -760,31 +779,36 @@ class OpRegionFeatures(Operator):
         margin = max_margin(feature_names)
 
         if numpy.any(margin):
-            bboxes = {}
+            # starting from 0, we stripped 0th background object in global computation,
+            # so object i has label i + 1
+            object_ids = numpy.arange(1, nobj + 1)
+            extents = self.compute_extents(image, mincoords, maxcoords, axes, margin)
+            # Objects are passed to the plugins in chunks, but at least one chunk per worker thread
+            num_workers = max(1, Request.global_thread_pool.num_workers)
+            chunk_size = max(1, min(LOCAL_FEATURES_CHUNK_SIZE, -(-nobj // num_workers)))
+            chunk_starts = range(0, nobj, chunk_size)
+
             for plugin_name, feature_dict in feature_names.items():
                 if not any("margin" in features for features in feature_dict.values()):
                     continue
 
                 plugin = pluginManager.getPluginByName(plugin_name, "ObjectFeatures")
-                tmp_dicts = [None] * nobj
-
-                def _calc_single(i, raw_bbox, binary_bbox):
-                    feats = plugin.plugin_object.compute_local(raw_bbox, binary_bbox, feature_dict, axes)
-                    tmp_dicts[i] = feats
+                tmp_dicts = [None] * len(chunk_starts)
+
+                def _calc_chunk(chunk_index, start):
+                    logger.debug("processing objects {} to {}".format(start, start + chunk_size))
+                    tmp_dicts[chunk_index] = plugin.plugin_object.compute_local_batch(
+                        image,
+                        labels,
+                        object_ids[start : start + chunk_size],
+                        extents[start : start + chunk_size],
+                        feature_dict,
+                        axes,
+                    )
 
                 with RequestPool() as pool:
-                    # starting from 0, we stripped 0th background object in global computation
-                    for i in range(nobj):
-                        logger.debug("processing object {}".format(i))
-                        if i not in bboxes:
-                            extent = self.compute_extent(i, image, mincoords, maxcoords, axes, margin)
-                            raw_bbox = self.compute_rawbbox(image, extent, axes)
-                            # it's i+1 here, because the background has label 0
-                            binary_bbox = labels[tuple(extent)] == i + 1
-                            bboxes[i] = (raw_bbox, binary_bbox)
-
-                        raw_bbox, binary_bbox = bboxes[i]
-                        pool.add(Request(partial(_calc_single, i, raw_bbox, binary_bbox)))
+                    for chunk_index, start in enumerate(chunk_starts):
+                        pool.add(Request(partial(_calc_chunk, chunk_index, start)))
 
                 # merge the results
                 for feature_dict in tmp_dicts:
@@ -792,18 +816,56 @@ class OpRegionFeatures(Operator):
                         local_features[plugin_name][feature_name].append(features)
 
         logger.debug("computing done, removing failures")
-        # remove local features that failed
+        # remove local features that failed (for some of the chunks)
         for pname, pfeats in local_features.items():
             for key in list(pfeats.keys()):
-                value = pfeats[key]
+                value = pfeats.pop(key)
                 try:
-                    pfeats[key] = numpy.vstack(list(v.reshape(1, -1) for v in value))
-                except:
+                    value = numpy.vstack(list(v.reshape(v.shape[0], -1) for v in value))
+                except ValueError:
+                    value = None
+                if value is None or value.shape[0] != nobj:
                     logger.warning("feature {} failed".format(key))
-                    del pfeats[key]
+                else:
+                    pfeats[key] = value
 
         # merge the global and local features
         logger.debug("removed failed, merging")
+        return self._mergeFeatures(global_features, local_features, extrafeats, nobj)
+
+    @staticmethod
+    def _splitDefaultFeatures(feature_names, global_features):
+        """Move the default features the user has not selected out of the standard features."""
+        extrafeats = {}
+        for feat_key in default_features:
+            try:
+                sel = feature_names["Standard Object Features"][feat_key]["selected"]
+            except KeyError:
+                # we don't always set this property to True, sometimes it's just not there. The only important
+                # thing is that it's not False
+                sel = True
+            if not sel:
+                # This feature has not been selected by the user. Remove it from the computed dict into a special dict
+                # for default features
+                feature = global_features["Standard Object Features"].pop(feat_key)
+            else:
+                feature = global_features["Standard Object Features"][feat_key]
+            extrafeats[feat_key] = feature
+        return extrafeats
+
+    @staticmethod
+    def _finishDefaultFeatures(extrafeats, object_id_mapping):
+        if object_id_mapping is not None:
+            rev_mapping = {v: k for k, v in object_id_mapping.items()}
+            extrafeats["original_oid"] = numpy.expand_dims(
+                numpy.vectorize(rev_mapping.get)(numpy.arange(1, extrafeats["Count"].shape[0] + 1)), axis=-1
+            )
+
+        return dict((k.replace(" ", ""), v) for k, v in extrafeats.items())
+
+    @staticmethod
+    def _mergeFeatures(global_features, local_features, extrafeats, nobj):
+        """Combine the features of all plugins and add the background row."""
         all_features = {}
         plugin_names = set(global_features.keys()) | set(local_features.keys())
         for name in plugin_names:
@@ -835,8 +897,122 @@ class OpRegionFeatures(Operator):
         logger.debug("merged, returning")
         return all_features
 
+    def _blockRois(self, t_ind, t):
+        """The rois of the FeatureBlockShape blocks in time slice t (all channels)."""
+        block_lengths = self.FeatureBlockShape.value
+        if isinstance(block_lengths, int):
+            block_lengths = dict.fromkeys("xyz", block_lengths)
+
+        shape = self.RawVolume.meta.shape
+        axes = self.RawVolume.meta.getAxisKeys()
+        block_shape = [block_lengths.get(k, size) if k in "xyz" else size for k, size in zip(axes, shape)]
+        block_shape[t_ind] = 1
+
+        start = [0] * len(shape)
+        stop = list(shape)
+        start[t_ind], stop[t_ind] = t, t + 1
+        return getIntersectingRois(shape, block_shape, (start, stop))
+
+    @staticmethod
+    def _checkBlockwiseFeatures(feature_names):
+        unsupported = [
+            f"{plugin_name}: {feature_name}"
+            for plugin_name, feature_dict in feature_names.items()
+            if plugin_name != default_features_key
+            for feature_name in feature_dict
+            if plugin_name != "Standard Object Features" or feature_name not in MERGEABLE_FEATURES
+        ]
+        if unsupported:
+            raise DatasetConstraintError(
+                "Object Feature Selection",
+                "These features cannot be computed blockwise: {}.\n"
+                "Supported features are: {}.".format(", ".join(unsupported), ", ".join(MERGEABLE_FEATURES)),
+            )
+
+    def _extractBlockwise(self, t_ind, t, object_id_mapping=None) -> Dict[str, Dict[str, numpy.ndarray]]:
+        """
+        Same as _extract for one time slice, but only one batch of FeatureBlockShape blocks is held in
+        memory at a time.  The statistics of every block are merged into one table per object
+        (see blockwiseRegionFeatures), so objects may span several blocks.
+        """
+        feature_names = self._augmentFeatureNames(deepcopy(self.Features([]).wait()))
+        self._checkBlockwiseFeatures(feature_names)
+
+        tagged_shape = self.RawVolume.meta.getTaggedShape()
+        axes = list(tagged_shape.keys())
+        # Like the vigra plugin, coordinates are xyz, or xy for 2D data
+        spatial_axes = "xyz" if tagged_shape.get("z", 1) > 1 else "xy"
+        accumulator = RegionFeatureAccumulator(tagged_shape.get("c", 1), len(spatial_axes))
+
+        def compute_block_statistics(block_start, block_stop):
+            slicing = roiToSlice(block_start, block_stop)
+            raw_req = self.RawVolume[slicing]
+            raw_req.submit()
+            # The label volume has a single channel
+            label_slicing = list(slicing)
+            label_slicing[axes.index("c")] = slice(0, 1)
+            labels = self.LabelVolume[tuple(label_slicing)].wait()
+            labels = vigra.taggedView(labels, axistags=self.LabelVolume.meta.axistags).withAxes(*spatial_axes)
+            raw = vigra.taggedView(raw_req.wait(), axistags=self.RawVolume.meta.axistags).withAxes(*spatial_axes, "c")
+            offset = [block_start[axes.index(k)] for k in spatial_axes]
+            return BlockStatistics.from_block(raw, labels, offset)
+
+        block_rois = self._blockRois(t_ind, t)
+        batch_size = max(1, Request.global_thread_pool.num_workers)
+        for batch_start in range(0, len(block_rois), batch_size):
+            batch = [
+                Request(partial(compute_block_statistics, *block_roi))
+                for block_roi in block_rois[batch_start : batch_start + batch_size]
+            ]
+            for req in batch:
+                req.submit()
+            # Merge in block order, so that the result does not depend on the scheduling
+            for req in batch:
+                accumulator.merge(req.wait())
+
+        global_features = {"Standard Object Features": accumulator.features(feature_names["Standard Object Features"])}
+        extrafeats = self._splitDefaultFeatures(feature_names, global_features)
+
+        if self.Atlas.ready():
+            extrafeats["AtlasMapping"] = self._createAtlasMappingBlockwise(extrafeats["RegionCenter"], block_rois)
+
+        extrafeats = self._finishDefaultFeatures(extrafeats, object_id_mapping)
+        return self._mergeFeatures(global_features, {}, extrafeats, accumulator.num_objects)
+
+    def _createAtlasMappingBlockwise(self, region_centers: numpy.ndarray, block_rois):
+        """Like _createAtlasMapping, but reads only the atlas blocks that contain region centers."""
+        axes = self.Atlas.meta.getAxisKeys()
+        axes4d = [k for k in axes if k in "xyzc"]
+        spatial_axes = "xyz"[: region_centers.shape[1]]
+        rounded_centers = region_centers.round()
+
+        atlas_mapping = None
+        for block_start, block_stop in block_rois:
+            # The atlas may have a different number of channels than the raw data
+            block_start, block_stop = list(block_start), list(block_stop)
+            block_start[axes.index("c")], block_stop[axes.index("c")] = 0, self.Atlas.meta.getTaggedShape()["c"]
+
+            offset = numpy.array([block_start[axes.index(k)] for k in spatial_axes])
+            end = numpy.array([block_stop[axes.index(k)] for k in spatial_axes])
+            inside = numpy.all((rounded_centers >= offset) & (rounded_centers < end), axis=1)
+            if not inside.any():
+                continue
+
+            atlas = self.Atlas(block_start, block_stop).wait()
+            atlas = vigra.taggedView(atlas, axistags=self.Atlas.meta.axistags).withAxes(*axes4d)
+            block_mapping = self._createAtlasMapping(rounded_centers[inside] - offset, atlas)
+            if atlas_mapping is None:
+                atlas_mapping = numpy.zeros((len(region_centers), block_mapping.shape[1]), dtype=block_mapping.dtype)
+            atlas_mapping[inside] = block_mapping
+
+        if atlas_mapping is None:
+            atlas_mapping = numpy.zeros(
+                (len(region_centers), self.Atlas.meta.getTaggedShape()["c"]), self.Atlas.meta.dtype
+            )
+        return atlas_mapping
+
     def propagateDirty(self, slot, subindex, roi):
-        if slot is self.Features:
+        if slot is self.Features or slot is self.FeatureBlockShape:
             self.Output.setDirty(slice(None))
         else:
             axes = list(self.RawVolume.meta.getTaggedShape().keys())
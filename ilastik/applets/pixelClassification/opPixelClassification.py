@@ -52,6 +52,7 @@ from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
 
 # ilastik
 from ilastik.applets.base.applet import DatasetConstraintError
+from ilastik.config import cfg
 from ilastik.utility.operatorSubView import OperatorSubView
 from ilastik.utility import OpMultiLaneWrapper
 from ilastik.utility.slottools import DtypeConvertFunction
@@ -161,6 +162,8 @@ class OpPixelClassification(Operator):
         self.opTrain.Labels.connect(self.opLabelPipeline.Output)
         self.opTrain.Images.connect(self.FeatureImages)
         self.opTrain.nonzeroLabelBlocks.connect(self.opLabelPipeline.nonzeroBlocks)
+        # Interactive training: retrain only part of the forest after most label edits
+        self.opTrain.FullRetrainInterval.setValue(cfg.getint("lazyflow", "full_retrain_interval"))
 
         # Hook up the Classifier Cache
         # The classifier is cached here to allow serializers to force in
@@ -54,6 +54,20 @@ output_format: compressed hdf5
 [lazyflow]
 threads: -1
 total_ram_mb: 0
+scheduler: shared
+numa_aware: false
+cache_eviction_policy: lru
+cache_spill_dir:
+cache_spill_mb: 0
+compressed_cache_backend: hdf5
+persistent_cache_dir:
+persistent_cache_mb: 0
+presmoothing_tile_size: 0
+filter_backend: operators
+process_workers: 0
+export_prefetch: false
+full_retrain_interval: 0
+flat_forest_inference: false
 """
 
 
@@ -20,19 +20,25 @@
 ###############################################################################
 # pyright: strict
 import warnings
-from typing import Literal, Union
+from typing import Any, Dict, Literal, Optional, Tuple, Union
 
 import h5py
+import numpy
 import vigra
 import xarray
 
 from ilastik.applets.featureSelection.opFeatureSelection import OpFeatureSelection
 from ilastik.experimental import parser
 from ilastik.utility.slottools import DtypeConvertFunction
+from lazyflow.classifiers import FlatForestLazyflowClassifier, LazyflowVectorwiseClassifierABC
 from lazyflow.graph import Graph
 from lazyflow.operators import OpReorderAxes
 from lazyflow.operators.classifierOperators import OpClassifierPredict
 from lazyflow.operators.generic import OpMultiArrayStacker, OpPixelOperator
+from lazyflow.roi import roiFromShape, roiToSlice
+from lazyflow.utility import BigRequestStreamer
+
+from ._streaming import connect_source, open_sink
 
 
 class PixelClassificationPipeline:
@@ -67,15 +73,27 @@ class PixelClassificationPipeline:
 
     prob_maps = pipeline.get_probabilities(img)
     ```
+
+    Example for images that don't fit into memory, predicted block by block:
+    ```Python
+    import zarr
+    from ilastik.experimental.api import PixelClassificationPipeline
+
+    img = zarr.open("<path/to/image.zarr>", mode="r")
+    pipeline = PixelClassificationPipeline.from_ilp_file("<path/to/project.ilp>")
+
+    axes = pipeline.write_probabilities(img, "<path/to/probabilities.zarr>", axes="zyx")
+    ```
     """
 
     @classmethod
-    def from_ilp_file(cls, path: str) -> "PixelClassificationPipeline":
+    def from_ilp_file(cls, path: str, flat_forest: bool = False) -> "PixelClassificationPipeline":
         """
         Create a Pixel Classification Pipeline instance from a trained project.ilp file
 
         Args:
             path: Path to the ilp file
+            flat_forest: predict with a flat copy of the random forest (see FlatForestLazyflowClassifier)
 
         Returns:
             PixelClassificationPipeline instance configured with trained classifier
@@ -83,9 +101,9 @@ class PixelClassificationPipeline:
         with h5py.File(path, "r") as f:
             project = parser.PixelClassificationProject.model_validate(f)
 
-        return cls(project)
+        return cls(project, flat_forest=flat_forest)
 
-    def __init__(self, project: parser.PixelClassificationProject):
+    def __init__(self, project: parser.PixelClassificationProject, flat_forest: bool = False):
         self._num_spatial_dims = len(project.input_data.spatial_axes)
         self._num_channels = project.input_data.num_channels
 
@@ -100,7 +118,7 @@ class PixelClassificationPipeline:
         self._feature_sel_op.ComputeIn2d.setValue(project.feature_matrix.compute_in_2d.tolist())
 
         self._predict_op = OpClassifierPredict(graph=graph)
-        self._predict_op.Classifier.setValue(project.classifier.classifier)
+        self._predict_op.Classifier.setValue(prediction_classifier(project.classifier.classifier, flat_forest))
         self._predict_op.Classifier.meta.classifier_factory = project.classifier.classifier_factory
         self._predict_op.Image.connect(self._feature_sel_op.OutputImage)
         self._predict_op.LabelsCount.setValue(project.classifier.label_count)
@@ -120,24 +138,84 @@ class PixelClassificationPipeline:
             raw_data: image with same dimensionality as in the trained project file
         """
         raw_data = as_vigra_array(raw_data)
-        num_channels_in_data = raw_data.channels
+        self._check_input(raw_data.axistags, raw_data.channels)
+
+        self._reorder_op.Input.setValue(raw_data)
+
+        probabilities = self._predict_op.PMaps.value[...]
+        return xarray.DataArray(probabilities, dims=tuple(self._predict_op.PMaps.meta.axistags.keys()))
+
+    def write_probabilities(
+        self,
+        source: Any,
+        sink: Any,
+        *,
+        axes: Optional[str] = None,
+        block_shape: Optional[Dict[str, int]] = None,
+        num_threads: Optional[int] = None,
+    ) -> Tuple[str, ...]:
+        """
+        Predict an image block by block, and write the probability map to sink.
+
+        The image is read on demand, and each block of probabilities is written as soon as it is done,
+        so only the blocks that are being processed are held in memory, no matter how big the image is.
+
+        Args:
+            source: image with same dimensionality as in the trained project file. Either an array-like object
+                that is read on demand (zarr array, h5py dataset, dask array, numpy memmap, ...) together
+                with ``axes``, an ``xarray.DataArray``, or the path to a dataset (e.g. "<path/to/image.h5>/raw")
+            sink: array-like object of the shape of the probability map to write to (e.g. a zarr array),
+                or the path to an HDF5 or zarr dataset to (over)write (e.g. "<path/to/probabilities.zarr>")
+            axes: axis keys of an array-like source, e.g. "zyx"
+            block_shape: block size along the spatial axes, e.g. {"z": 64, "y": 256, "x": 256}.
+                Axes that are not listed are not split.  By default, the block size is chosen
+                from the available RAM.
+            num_threads: maximum number of blocks that are processed in parallel
+                (by default, the number of lazyflow worker threads)
+
+        Returns:
+            The axes of the probability map, e.g. ("z", "y", "x", "c")
+        """
+        source_op = connect_source(self._reorder_op.graph, source, axes)
+        try:
+            self._check_input(source_op.Output.meta.axistags, source_op.Output.meta.getTaggedShape().get("c", 1))
+            self._reorder_op.Input.connect(source_op.Output)
+
+            pmaps = self._predict_op.PMaps
+            output_axes = tuple(pmaps.meta.getAxisKeys())
+            blockshape = None
+            if block_shape is not None:
+                blockshape = tuple(
+                    block_shape.get(axis, size) if axis != "c" else size
+                    for axis, size in zip(output_axes, pmaps.meta.shape)
+                )
+
+            with open_sink(sink, pmaps.meta.shape, blockshape) as out:
+
+                def write_block(roi, block):
+                    out[roiToSlice(*roi)] = numpy.asarray(block)
+
+                streamer = BigRequestStreamer(pmaps, roiFromShape(pmaps.meta.shape), blockshape, num_threads)
+                streamer.resultSignal.subscribe(write_block)
+                streamer.execute()
+            return output_axes
+        finally:
+            self._reorder_op.Input.disconnect()
+            source_op.cleanUp()
+
+    def _check_input(self, axistags: vigra.AxisTags, num_channels_in_data: int):
         if num_channels_in_data != self._num_channels:
             raise ValueError(
                 f"Number of channels mismatch. Classifier trained for {self._num_channels} but input has {num_channels_in_data}"
             )
 
-        num_spatial_in_data = sum(a.isSpatial() for a in raw_data.axistags)
+        num_spatial_in_data = sum(a.isSpatial() for a in axistags)
         if num_spatial_in_data != self._num_spatial_dims:
             raise ValueError(
                 "Number of spatial dims doesn't match. "
                 f"Classifier trained for {self._num_spatial_dims} but input has {num_spatial_in_data}"
             )
 
-        self._reorder_op.Input.setValue(raw_data)
-
-        probabilities = self._predict_op.PMaps.value[...]
-        return xarray.DataArray(probabilities, dims=tuple(self._predict_op.PMaps.meta.axistags.keys()))
-
 
 class AutocontextPipeline:
     """
@@ -159,12 +237,13 @@ class AutocontextPipeline:
     """
 
     @classmethod
-    def from_ilp_file(cls, path: str) -> "AutocontextPipeline":
+    def from_ilp_file(cls, path: str, flat_forest: bool = False) -> "AutocontextPipeline":
         """
         Create an Autocontext Pipeline instance from a trained project.ilp file
 
         Args:
             path: Path to the ilp file
+            flat_forest: predict with a flat copy of the random forest (see FlatForestLazyflowClassifier)
 
         Returns:
             AutocontextPipeline instance configured with trained classifier
@@ -172,9 +251,9 @@ class AutocontextPipeline:
         with h5py.File(path, "r") as f:
             project = parser.AutocontextProject.model_validate(f)
 
-        return cls(project)
+        return cls(project, flat_forest=flat_forest)
 
-    def __init__(self, project: parser.AutocontextProject):
+    def __init__(self, project: parser.AutocontextProject, flat_forest: bool = False):
         self._num_spatial_dims = len(project.input_data.spatial_axes)
         self._num_channels = project.input_data.num_channels
 
@@ -189,7 +268,9 @@ class AutocontextPipeline:
         self._feature_sel_op_stage1.ComputeIn2d.setValue(project.feature_matrix_stage1.compute_in_2d.tolist())
 
         self._predict_op_stage1 = OpClassifierPredict(graph=graph)
-        self._predict_op_stage1.Classifier.setValue(project.classifier_stage1.classifier)
+        self._predict_op_stage1.Classifier.setValue(
+            prediction_classifier(project.classifier_stage1.classifier, flat_forest)
+        )
         self._predict_op_stage1.Classifier.meta.classifier_factory = project.classifier_stage1.classifier_factory
         self._predict_op_stage1.Image.connect(self._feature_sel_op_stage1.OutputImage)
         self._predict_op_stage1.LabelsCount.setValue(project.classifier_stage1.label_count)
@@ -213,7 +294,9 @@ class AutocontextPipeline:
         self._feature_sel_op_stage2.ComputeIn2d.setValue(project.feature_matrix_stage2.compute_in_2d.tolist())
 
         self._predict_op_stage2 = OpClassifierPredict(graph=graph)
-        self._predict_op_stage2.Classifier.setValue(project.classifier_stage2.classifier)
+        self._predict_op_stage2.Classifier.setValue(
+            prediction_classifier(project.classifier_stage2.classifier, flat_forest)
+        )
         self._predict_op_stage2.Classifier.meta.classifier_factory = project.classifier_stage2.classifier_factory
         self._predict_op_stage2.Image.connect(self._feature_sel_op_stage2.OutputImage)
         self._predict_op_stage2.LabelsCount.setValue(project.classifier_stage2.label_count)
@@ -270,6 +353,14 @@ class AutocontextPipeline:
         return self._get_probabilities(raw_data, stage=2)
 
 
+def prediction_classifier(
+    classifier: LazyflowVectorwiseClassifierABC, flat_forest: bool
+) -> LazyflowVectorwiseClassifierABC:
+    if flat_forest:
+        return FlatForestLazyflowClassifier.from_classifier(classifier)
+    return classifier
+
+
 def ensure_channel_axis(axis_order):
     if "c" not in axis_order:
         return axis_order + "c"
@@ -0,0 +1,106 @@
+###############################################################################
+#   ilastik: interactive learning and segmentation toolkit
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# In addition, as a special exception, the copyright holders of
+# ilastik give you permission to combine ilastik with applets,
+# workflows and plugins which are not covered under the GNU
+# General Public License.
+#
+# See the LICENSE file for details. License information is also available
+# on the ilastik web site at:
+#          http://ilastik.org/license.html
+###############################################################################
+# pyright: strict
+"""
+Lazy sources and sinks for blockwise prediction (see PixelClassificationPipeline.write_probabilities).
+"""
+import contextlib
+from typing import Any, Iterator, Optional, Sequence, Tuple
+
+import h5py
+import numpy
+import xarray
+
+from lazyflow.graph import Graph, Operator
+from lazyflow.operators import OpArrayLikeSource
+from lazyflow.operators.ioOperators import OpInputDataReader
+from lazyflow.utility import PathComponents
+
+
+def connect_source(graph: Graph, source: Any, axes: Optional[str]) -> Operator:
+    """
+    An operator that provides the data of source in its Output slot.
+
+    source: an array-like object (with ``axes``), an xarray.DataArray (possibly backed by a lazy array),
+            or the path to a dataset that ilastik can read (e.g. "/path/to/file.h5/data")
+    """
+    if isinstance(source, str) or hasattr(source, "__fspath__"):
+        if axes is not None:
+            raise ValueError("The axes of datasets on disk are read from the file")
+        return OpInputDataReader(graph=graph, FilePath=str(source))
+
+    if isinstance(source, xarray.DataArray):
+        axes = axes or "".join(map(str, source.dims))
+        source = source.data
+    if axes is None:
+        raise ValueError("The axes of the source (e.g. 'zyx') are required for array-like sources")
+
+    op = OpArrayLikeSource(graph=graph)
+    op.setArray(source, axes)
+    return op
+
+
+@contextlib.contextmanager
+def open_sink(sink: Any, shape: Tuple[int, ...], chunks: Optional[Sequence[int]]) -> Iterator[Any]:
+    """
+    Yield an array-like object to write the probabilities to.
+
+    sink: an array-like object of the right shape, or a path to an HDF5 or zarr dataset to be (over)written,
+          e.g. "/path/to/file.h5/probabilities", "/path/to/file.zarr" or "/path/to/file.zarr/probabilities"
+    """
+    if not isinstance(sink, str) and not hasattr(sink, "__fspath__"):
+        if tuple(sink.shape) != tuple(shape):
+            raise ValueError(f"Sink shape {tuple(sink.shape)} doesn't match the probabilities shape {tuple(shape)}")
+        yield sink
+        return
+
+    path = str(sink).replace("\\", "/")
+    chunks = tuple(min(c, s) for c, s in zip(chunks, shape)) if chunks else True
+    zarr_store, zarr_path = _split_zarr_path(path)
+    if zarr_store is not None:
+        import zarr
+
+        yield zarr.open_array(zarr_store, mode="w", path=zarr_path, shape=shape, dtype=numpy.float32, chunks=chunks)
+        return
+
+    components = PathComponents(path)
+    if components.extension in PathComponents.HDF5_EXTS:
+        internal_path = components.internalPath or "exported_data"
+        with h5py.File(components.externalPath, "a") as f:
+            if internal_path in f:
+                del f[internal_path]
+            yield f.create_dataset(internal_path, shape=shape, dtype=numpy.float32, chunks=chunks)
+    else:
+        raise ValueError(f"Can't write probabilities to {sink}: only HDF5 and zarr paths are supported")
+
+
+def _split_zarr_path(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Split e.g. "/path/to/file.zarr/group/array" into the store "/path/to/file.zarr" and the path of the array
+    within the store "group/array" (None for an array at the root of the store).
+
+    PathComponents only supports internal paths for HDF5 files, so zarr paths are split here.
+    Returns (None, None) if path is not a zarr path.
+    """
+    store, ext, internal = path.rpartition(PathComponents.ZARR_EXTS[0])
+    if not ext or (internal and not internal.startswith("/")):
+        return None, None
+    return store + ext, internal.strip("/") or None
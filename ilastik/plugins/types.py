@@ -18,9 +18,14 @@
 # on the ilastik web site at:
 # 		   http://ilastik.org/license.html
 ###############################################################################
+import collections
+import logging
+
 import numpy
 from yapsy.IPlugin import IPlugin
 
+logger = logging.getLogger(__name__)
+
 ##########################
 # different plugin types #
 ##########################
@@ -80,6 +85,48 @@ class ObjectFeaturesPlugin(IPlugin):
         """
         return dict()
 
+    def compute_local_batch(self, image, labels, object_ids, extents, features, axes):
+        """Calculate features on many objects at once.
+
+        Plugins can override this to avoid the per-object overhead of
+        compute_local, e.g. by computing the features of all objects
+        with a few vectorized calls.  By default, compute_local is
+        called for every object.
+
+        :param image: np.ndarray - the whole (4D) image
+        :param labels: np.ndarray, dtype=int - the whole (3D) label image
+        :param object_ids: the labels of the objects
+        :param extents: for every object, its expanded bounding box: a
+            list of three slices (for the x, y and z axes of labels)
+        :param features: which features to compute
+        :param axes: axis tags
+
+        :returns: a dictionary with one entry per feature.
+            dict[feature_name] is a numpy.ndarray with ndim=2 and
+            shape[0] == len(object_ids).  Features that could not be
+            computed for every object are left out.
+
+        """
+        results = collections.defaultdict(list)
+        for object_id, extent in zip(object_ids, extents):
+            key = list(extent)
+            key.insert(axes.c, slice(None))
+            raw_bbox = image[tuple(key)]
+            binary_bbox = labels[tuple(extent)] == object_id
+            for feature_name, value in self.compute_local(raw_bbox, binary_bbox, features, axes).items():
+                results[feature_name].append(numpy.asarray(value).reshape(1, -1))
+
+        stacked = {}
+        for feature_name, values in results.items():
+            try:
+                if len(values) == len(object_ids):
+                    stacked[feature_name] = numpy.vstack(values)
+                    continue
+            except ValueError:
+                pass
+            logger.warning("feature {} failed".format(feature_name))
+        return stacked
+
     def fill_properties(self, feature_dict):
         """
         For every feature in the feature dictionary, fill in its properties,
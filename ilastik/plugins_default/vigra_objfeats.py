@@ -295,3 +295,48 @@ class VigraObjFeats(ObjectFeaturesPlugin):
             result = self._do_4d(image, label, featurenames, axes)
             results.append(self.update_keys(result, suffix=suffix))
         return self.combine_dicts(results)
+
+    def compute_local_batch(self, image, labels, object_ids, extents, feature_dict, axes):
+        """
+        The local features only depend on the intensities in the neighborhood of each object.
+        So the neighborhood voxels of all objects are collected into one flat image, labelled by
+        object, and the features are computed with a single vigra call (per neighborhood type).
+        """
+        featurenames = list(feature_dict.keys())
+        local = [x + self.local_suffix for x in self.local_features]
+        featurenames = list(set(featurenames) & set(local))
+        featurenames = [x.split(" ")[0] for x in featurenames]
+        if "Histogram" in featurenames:
+            # The histogram range depends on the bounding box of each object
+            return super().compute_local_batch(image, labels, object_ids, extents, feature_dict, axes)
+
+        margin = ilastik.applets.objectExtraction.opObjectExtraction.max_margin({"": feature_dict})
+        voxels = ([], [])
+        voxel_labels = ([], [])
+        for i, (object_id, extent) in enumerate(zip(object_ids, extents)):
+            key = list(extent)
+            key.insert(axes.c, slice(None))
+            raw_bbox = np.moveaxis(np.asarray(image[tuple(key)]), axes.c, -1)
+            binary_bbox = labels[tuple(extent)] == object_id
+            masks = ilastik.applets.objectExtraction.opObjectExtraction.make_bboxes(binary_bbox, margin)[::-1]
+            for mask, mask_voxels, mask_labels in zip(masks, voxels, voxel_labels):
+                mask_voxels.append(raw_bbox[mask])
+                mask_labels.append(np.full(mask_voxels[-1].shape[0], i + 1, dtype=np.uint32))
+
+        if any(len(object_voxels) == 0 for mask_voxels in voxels for object_voxels in mask_voxels):
+            # An object without neighborhood fails on its own, then the per-object path drops the feature
+            return super().compute_local_batch(image, labels, object_ids, extents, feature_dict, axes)
+
+        results = []
+        for mask_voxels, mask_labels, suffix in zip(voxels, voxel_labels, self.local_out_suffixes):
+            flat_image = np.concatenate(mask_voxels).astype(np.float32)
+            flat_labels = np.concatenate(mask_labels)
+            result = vigra.analysis.extractRegionFeatures(
+                vigra.taggedView(flat_image[:, None, :], "xyc"),
+                vigra.taggedView(flat_labels[:, None], "xy"),
+                featurenames,
+                ignoreLabel=0,
+            )
+            result = cleanup(result, len(object_ids) + 1, featurenames)
+            results.append(self.update_keys(result, suffix=suffix))
+        return self.combine_dicts(results)
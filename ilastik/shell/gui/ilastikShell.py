@@ -20,6 +20,7 @@
 ###############################################################################
 import re
 import os
+import importlib.util
 import time
 import pathlib
 from functools import partial
@@ -110,12 +111,7 @@ from ilastik.widgets.filePathButton import FilePathButton
 # Import all known workflows now to make sure they are all registered with getWorkflowFromName()
 import ilastik.workflows
 
-try:
-    import libdvid
-
-    _has_dvid_support = True
-except:
-    _has_dvid_support = False
+_has_dvid_support = importlib.util.find_spec("libdvid") is not None
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +19,7 @@
 # 		   http://ilastik.org/license.html
 ###############################################################################
 import os
+import importlib.util
 import gc
 import copy
 import platform
@@ -38,12 +39,7 @@ from ilastik.utility import log_exception
 from ilastik.workflow import getWorkflowFromName, Workflow
 from lazyflow.utility.timer import Timer, timeLogged
 
-try:
-    import libdvid
-
-    _has_dvid_support = True
-except:
-    _has_dvid_support = False
+_has_dvid_support = importlib.util.find_spec("libdvid") is not None
 
 
 class ProjectManager(object):
@@ -212,6 +208,8 @@ class ProjectManager(object):
         If no local_filepath is given, create a new temporary file.
         Returns the path to the downloaded file.
         """
+        import libdvid
+
         node_service = libdvid.DVIDNodeService(hostname, node_uuid)
         keys = node_service.get_keys(keyvalue_name)
 
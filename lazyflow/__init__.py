@@ -19,10 +19,6 @@
 # This information is also available on the ilastik web site at:
 # 		   http://ilastik.org/license/
 ###############################################################################
-import z5py
-import json
-import numpy as np
-
 # This level can be used to issue user-facing log messages
 # log messages at this level get special treatment in ilastik:
 # those are shown in the status bar
@@ -30,26 +26,14 @@ USER_LOGLEVEL = 23
 
 from . import utility
 from . import request
-from . import classifiers
 from . import roi
 from . import rtype
 from . import stype
 from . import graph
 from . import slot
-from . import operators
-
-
-class N5JsonEncoder(json.JSONEncoder):
-    """
-    json encoder for json dumps in z5py
-    """
-
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        return super().default(obj)
 
+# The classifiers and operators pull in most of the heavy dependencies (sklearn, fastfilters, z5py, ...),
+# they are imported when they are first used.
+from .utility.lazyImport import lazy_module_attributes
 
-z5py.set_json_encoder(N5JsonEncoder)  # Set a json decoder for z5py
+__getattr__, __dir__ = lazy_module_attributes(__name__, {"N5JsonEncoder": ".utility.n5"})[:2]
@@ -1,16 +1,23 @@
-from __future__ import absolute_import
-from .lazyflowClassifier import (
-    LazyflowVectorwiseClassifierABC,
-    LazyflowVectorwiseClassifierFactoryABC,
-    LazyflowPixelwiseClassifierABC,
-    LazyflowPixelwiseClassifierFactoryABC,
-)
-from .vigraRfLazyflowClassifier import VigraRfLazyflowClassifier, VigraRfLazyflowClassifierFactory
-from .parallelVigraRfLazyflowClassifier import (
-    ParallelVigraRfLazyflowClassifier,
-    ParallelVigraRfLazyflowClassifierFactory,
-)
-from .sklearnLazyflowClassifier import SklearnLazyflowClassifier, SklearnLazyflowClassifierFactory
+# The classifiers are imported on first use (see lazyflow.utility.lazyImport), sklearn is slow to import
+from lazyflow.utility.lazyImport import lazy_module_attributes
 
-# Testing
-from .vigraRfPixelwiseClassifier import VigraRfPixelwiseClassifier, VigraRfPixelwiseClassifierFactory
+__getattr__, __dir__, __all__ = lazy_module_attributes(
+    __name__,
+    {
+        "LazyflowVectorwiseClassifierABC": ".lazyflowClassifier",
+        "LazyflowVectorwiseClassifierFactoryABC": ".lazyflowClassifier",
+        "LazyflowPixelwiseClassifierABC": ".lazyflowClassifier",
+        "LazyflowPixelwiseClassifierFactoryABC": ".lazyflowClassifier",
+        "VigraRfLazyflowClassifier": ".vigraRfLazyflowClassifier",
+        "VigraRfLazyflowClassifierFactory": ".vigraRfLazyflowClassifier",
+        "ParallelVigraRfLazyflowClassifier": ".parallelVigraRfLazyflowClassifier",
+        "ParallelVigraRfLazyflowClassifierFactory": ".parallelVigraRfLazyflowClassifier",
+        "FlatForest": ".flatForestLazyflowClassifier",
+        "FlatForestLazyflowClassifier": ".flatForestLazyflowClassifier",
+        "SklearnLazyflowClassifier": ".sklearnLazyflowClassifier",
+        "SklearnLazyflowClassifierFactory": ".sklearnLazyflowClassifier",
+        # Testing
+        "VigraRfPixelwiseClassifier": ".vigraRfPixelwiseClassifier",
+        "VigraRfPixelwiseClassifierFactory": ".vigraRfPixelwiseClassifier",
+    },
+)
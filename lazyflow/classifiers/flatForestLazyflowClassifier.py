@@ -0,0 +1,363 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Random forests as flat arrays of nodes, with a vectorized numpy evaluator.
+
+vigra RandomForest objects are opaque: the trees can only be evaluated one sample and one tree
+at a time inside vigra, and only be stored through vigra's own HDF5 format.  A :class:`FlatForest`
+holds all trees of one or several vigra forests in a few contiguous arrays (feature index,
+threshold and children of every node, class distribution of every leaf), and evaluates all
+trees for a whole batch of samples with numpy operations, one tree level per step.
+
+:class:`FlatForestLazyflowClassifier` wraps a FlatForest as a LazyflowVectorwiseClassifierABC,
+so it can stand in for VigraRfLazyflowClassifier and ParallelVigraRfLazyflowClassifier in
+prediction.  OpVectorwiseClassifierPredict converts the trained classifier automatically if
+enabled with :func:`setInferenceEnabled` (``[lazyflow] flat_forest_inference`` in the ilastik
+config file).  Trained classifiers are not changed, so project files still contain vigra forests.
+"""
+import os
+import pickle
+import tempfile
+import weakref
+from functools import partial
+
+import h5py
+import numpy
+
+from lazyflow.request import Request, RequestLock, RequestPool
+from .lazyflowClassifier import LazyflowVectorwiseClassifierABC
+from .parallelVigraRfLazyflowClassifier import ParallelVigraRfLazyflowClassifier
+from .vigraRfLazyflowClassifier import VigraRfLazyflowClassifier
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Node type tags of vigra's decision trees (see vigra/random_forest/rf_nodeproxy.hxx)
+_VIGRA_THRESHOLD_NODE = 0x00000000
+_VIGRA_LEAF_NODE_TAG = 0x80000000
+_VIGRA_CONST_PROB_NODE = 0x00000000 | _VIGRA_LEAF_NODE_TAG
+# The first two entries of a tree topology are the feature and class counts, the root follows
+_VIGRA_ROOT_ADDRESS = 2
+
+#: Samples evaluated by one request
+CHUNK_ROWS = 16384
+
+_inference_enabled = False
+_flat_classifiers = weakref.WeakKeyDictionary()
+_flat_classifiers_lock = RequestLock()
+
+
+def setInferenceEnabled(enabled: bool) -> None:
+    """
+    Let OpVectorwiseClassifierPredict predict with a flat copy of vigra random forests.
+    """
+    global _inference_enabled
+    _inference_enabled = enabled
+
+
+def isInferenceEnabled() -> bool:
+    return _inference_enabled
+
+
+def flatClassifierFor(classifier):
+    """
+    The FlatForestLazyflowClassifier equivalent to the given classifier, which is converted only once.
+    Classifiers that can't be converted are returned as they are.
+    """
+    if not FlatForestLazyflowClassifier.can_convert(classifier):
+        return classifier
+    with _flat_classifiers_lock:
+        flat_classifier = _flat_classifiers.get(classifier)
+        if flat_classifier is None:
+            flat_classifier = _flat_classifiers[classifier] = FlatForestLazyflowClassifier.from_classifier(classifier)
+        return flat_classifier
+
+
+class FlatForest:
+    """
+    The trees of a random forest, as flat arrays over all nodes of all trees.
+
+    feature: feature index of each node (-1 for leaves)
+    threshold: samples with ``X[feature] < threshold`` go to the left child, the others to the right child
+    children: left and right child of each node, shape (num_nodes, 2)
+    leaf: row in leaf_values of each node (-1 for inner nodes)
+    leaf_values: class distribution of each leaf, shape (num_leaves, num_classes)
+    roots: root node of each tree
+    """
+
+    def __init__(self, feature, threshold, children, leaf, leaf_values, roots):
+        self.feature = numpy.asarray(feature, dtype=numpy.int32)
+        self.threshold = numpy.asarray(threshold, dtype=numpy.float64)
+        self.children = numpy.asarray(children, dtype=numpy.int32).reshape(-1, 2)
+        self.leaf = numpy.asarray(leaf, dtype=numpy.int32)
+        self.leaf_values = numpy.asarray(leaf_values, dtype=numpy.float32)
+        self.roots = numpy.asarray(roots, dtype=numpy.int32)
+        assert len(self.feature) == len(self.threshold) == len(self.children) == len(self.leaf)
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    @property
+    def num_nodes(self):
+        return len(self.feature)
+
+    @property
+    def num_classes(self):
+        return self.leaf_values.shape[1]
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays().values())
+
+    def _arrays(self):
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "leaf": self.leaf,
+            "leaf_values": self.leaf_values,
+            "roots": self.roots,
+        }
+
+    @classmethod
+    def concatenate(cls, forests):
+        """
+        One forest with the trees of all given forests.
+        """
+        node_offsets = numpy.cumsum([0] + [forest.num_nodes for forest in forests])
+        leaf_offsets = numpy.cumsum([0] + [len(forest.leaf_values) for forest in forests])
+
+        def shifted(array, offset):
+            return numpy.where(array >= 0, array + offset, array)
+
+        return cls(
+            numpy.concatenate([forest.feature for forest in forests]),
+            numpy.concatenate([forest.threshold for forest in forests]),
+            numpy.concatenate([shifted(f.children, offset) for f, offset in zip(forests, node_offsets)]),
+            numpy.concatenate([shifted(f.leaf, offset) for f, offset in zip(forests, leaf_offsets)]),
+            numpy.concatenate([forest.leaf_values for forest in forests]),
+            numpy.concatenate([f.roots + offset for f, offset in zip(forests, node_offsets)]),
+        )
+
+    @classmethod
+    def from_vigra_tree(cls, topology, parameters):
+        """
+        Convert one tree from the arrays vigra stores for it (``Tree_<n>/topology`` and ``Tree_<n>/parameters``).
+
+        Each node of the topology consists of its type, the address of its parameters, and for
+        threshold nodes the addresses of the two children and the feature index.  The parameters
+        of a threshold node are its weight and threshold, those of a leaf its weight and class distribution.
+        """
+        topology = numpy.asarray(topology, dtype=numpy.int64)
+        parameters = numpy.asarray(parameters, dtype=numpy.float64)
+        num_classes = int(topology[1])
+
+        # Find all node addresses, one tree level at a time
+        levels = []
+        frontier = numpy.array([_VIGRA_ROOT_ADDRESS])
+        while len(frontier):
+            levels.append(frontier)
+            inner = frontier[(topology[frontier] & _VIGRA_LEAF_NODE_TAG) == 0]
+            frontier = numpy.stack([topology[inner + 2], topology[inner + 3]], axis=1).reshape(-1)
+        addresses = numpy.concatenate(levels)
+
+        types = topology[addresses] & 0xFFFFFFFF
+        unsupported = set(numpy.unique(types)) - {_VIGRA_THRESHOLD_NODE, _VIGRA_CONST_PROB_NODE}
+        if unsupported:
+            raise NotImplementedError(f"Unsupported vigra decision tree node types: {sorted(unsupported)}")
+        is_leaf = types == _VIGRA_CONST_PROB_NODE
+        inner_addresses = addresses[~is_leaf]
+        parameter_addresses = topology[addresses + 1]
+
+        # Node ids in the order of the addresses
+        order = numpy.argsort(addresses)
+
+        def node_ids(node_addresses):
+            return order[numpy.searchsorted(addresses, node_addresses, sorter=order)]
+
+        num_nodes = len(addresses)
+        feature = numpy.full(num_nodes, -1)
+        feature[~is_leaf] = topology[inner_addresses + 4]
+        threshold = numpy.zeros(num_nodes)
+        threshold[~is_leaf] = parameters[parameter_addresses[~is_leaf] + 1]
+        children = numpy.full((num_nodes, 2), -1)
+        children[~is_leaf, 0] = node_ids(topology[inner_addresses + 2])
+        children[~is_leaf, 1] = node_ids(topology[inner_addresses + 3])
+        leaf = numpy.full(num_nodes, -1)
+        leaf[is_leaf] = numpy.arange(is_leaf.sum())
+        leaf_values = parameters[parameter_addresses[is_leaf, None] + 1 + numpy.arange(num_classes)]
+        return cls(feature, threshold, children, leaf, leaf_values, [0])
+
+    @classmethod
+    def from_vigra_hdf5(cls, h5py_group):
+        """
+        Convert a vigra RandomForest stored with ``RandomForest.writeHDF5``.
+        """
+        tree_names = sorted((name for name in h5py_group if name.startswith("Tree_")), key=lambda n: int(n[5:]))
+        return cls.concatenate(
+            [
+                cls.from_vigra_tree(h5py_group[name]["topology"][:], h5py_group[name]["parameters"][:])
+                for name in tree_names
+            ]
+        )
+
+    @classmethod
+    def from_vigra(cls, forests):
+        """
+        Convert the given vigra RandomForests into one FlatForest.
+        """
+        # vigra's internals are only accessible through its HDF5 export
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "forests.h5").replace("\\", "/")
+            for i, forest in enumerate(forests):
+                forest.writeHDF5(path, f"forest{i}")
+            with h5py.File(path, "r") as f:
+                return cls.concatenate([cls.from_vigra_hdf5(f[f"forest{i}"]) for i in range(len(forests))])
+
+    def leaves(self, X):
+        """
+        The leaf that each sample ends up in, for each tree (shape: (num_trees, len(X))).
+        """
+        num_samples = len(X)
+        nodes = numpy.repeat(self.roots, num_samples)
+        samples = numpy.tile(numpy.arange(num_samples), self.num_trees)
+        children = self.children.reshape(-1)
+
+        # Move the samples that aren't in a leaf yet one level down
+        active = numpy.flatnonzero(self.feature[nodes] >= 0)
+        while len(active):
+            current = nodes[active]
+            # Written like this, NaN features go to the right child, as in vigra
+            go_right = numpy.logical_not(X[samples[active], self.feature[current]] < self.threshold[current])
+            current = children[2 * current + go_right]
+            nodes[active] = current
+            active = active[self.feature[current] >= 0]
+        return nodes.reshape(self.num_trees, num_samples)
+
+    def predict_probabilities(self, X, out=None):
+        """
+        Average the class distributions of the leaves that the samples end up in, like vigra does.
+        """
+        X = numpy.asarray(X, dtype=numpy.float32)
+        if out is None:
+            out = numpy.empty((len(X), self.num_classes), dtype=numpy.float32)
+        if len(X) == 0:
+            return out
+
+        totals = numpy.zeros((len(X), self.num_classes))
+        for tree_leaves in self.leaves(X):
+            totals += self.leaf_values[self.leaf[tree_leaves]]
+        totals /= totals.sum(axis=1, keepdims=True)
+        out[...] = totals
+        return out
+
+
+class FlatForestLazyflowClassifier(LazyflowVectorwiseClassifierABC):
+    """
+    Prediction-only classifier for random forests converted to a FlatForest.
+    """
+
+    def __init__(self, flat_forest, known_labels, feature_count, feature_names=None):
+        self._flat_forest = flat_forest
+        self._known_labels = known_labels
+        self._feature_count = feature_count
+        self._feature_names = feature_names
+
+    @staticmethod
+    def can_convert(classifier):
+        return isinstance(classifier, (VigraRfLazyflowClassifier, ParallelVigraRfLazyflowClassifier))
+
+    @classmethod
+    def from_classifier(cls, classifier):
+        """
+        Convert a VigraRfLazyflowClassifier or ParallelVigraRfLazyflowClassifier.
+        """
+        assert cls.can_convert(classifier), f"Can't convert {type(classifier)} to a flat forest"
+        flat_forest = FlatForest.from_vigra(classifier.forests)
+        logger.debug(f"Converted {flat_forest.num_trees} trees to a flat forest ({flat_forest.num_nodes} nodes)")
+        return cls(flat_forest, classifier.known_classes, classifier.feature_count, classifier.feature_names)
+
+    @property
+    def flat_forest(self):
+        return self._flat_forest
+
+    def predict_probabilities(self, X):
+        return self.predict_probabilities_batch([X])[0]
+
+    def predict_probabilities_batch(self, feature_matrices, outputs=None):
+        matrices = [numpy.asarray(X, dtype=numpy.float32) for X in feature_matrices]
+        for X in matrices:
+            assert X.ndim == 2
+            assert (
+                X.shape[1] == self._feature_count
+            ), f"Feature count ({X.shape[1]}) doesn't match {self._feature_count}"
+        if outputs is None:
+            outputs = [numpy.empty((len(X), len(self._known_labels)), dtype=numpy.float32) for X in matrices]
+
+        pool = RequestPool()
+        for X, out in zip(matrices, outputs):
+            for start in range(0, len(X), CHUNK_ROWS):
+                chunk = slice(start, start + CHUNK_ROWS)
+                pool.add(Request(partial(self._flat_forest.predict_probabilities, X[chunk], out[chunk])))
+        pool.wait()
+        return outputs
+
+    @property
+    def known_classes(self):
+        return self._known_labels
+
+    @property
+    def feature_count(self):
+        return self._feature_count
+
+    @property
+    def feature_names(self):
+        return self._feature_names
+
+    def serialize_hdf5(self, h5py_group):
+        for name, array in self._flat_forest._arrays().items():
+            h5py_group.create_dataset(name, data=array)
+        h5py_group["known_labels"] = self._known_labels
+        h5py_group["feature_count"] = self._feature_count
+        if self._feature_names is not None:
+            h5py_group["feature_names"] = [name.encode("utf-8") for name in self._feature_names]
+
+        # This field is required for all classifiers
+        h5py_group["pickled_type"] = pickle.dumps(type(self), 0)
+
+    @classmethod
+    def deserialize_hdf5(cls, h5py_group):
+        flat_forest = FlatForest(
+            **{
+                name: h5py_group[name][:]
+                for name in ("feature", "threshold", "children", "leaf", "leaf_values", "roots")
+            }
+        )
+        feature_names = None
+        if "feature_names" in h5py_group:
+            feature_names = [name.decode("utf-8") for name in h5py_group["feature_names"][:]]
+        return cls(flat_forest, h5py_group["known_labels"][:], int(h5py_group["feature_count"][()]), feature_names)
+
+
+assert issubclass(FlatForestLazyflowClassifier, LazyflowVectorwiseClassifierABC)
@@ -58,6 +58,15 @@ class LazyflowVectorwiseClassifierFactoryABC(abc.ABC):
         """
         raise NotImplementedError
 
+    def update_and_train(self, classifier, X, y, feature_names=None, retrain_fraction=0.25):
+        """
+        Train a classifier with the feature matrix X and label vector y, given a classifier that this
+        factory trained earlier with a previous version of the training data (e.g. before the user added
+        some labels).  Factories that can reuse parts of the previous classifier may retrain only about
+        ``retrain_fraction`` of it.  By default, a new classifier is trained from scratch.
+        """
+        return self.create_and_train(X, y, feature_names)
+
     @abc.abstractproperty
     def description(self):
         """
@@ -106,6 +115,26 @@ class LazyflowVectorwiseClassifierABC(abc.ABC):
         """
         raise NotImplementedError
 
+    def predict_probabilities_batch(self, feature_matrices, outputs=None):
+        """
+        Predict several feature matrices at once (e.g. the features of several blocks).
+        If ``outputs`` is given, it must contain a float32 array of shape (len(X), len(known_classes))
+        for each matrix, and the probabilities are written there.
+
+        Returns: The list of probability matrices.
+
+        By default, ``predict_probabilities`` is called for each matrix.
+        Classifiers may override this to share work between the matrices.
+        """
+        results = []
+        for i, X in enumerate(feature_matrices):
+            probabilities = self.predict_probabilities(X)
+            if outputs is not None:
+                outputs[i][...] = probabilities
+                probabilities = outputs[i]
+            results.append(probabilities)
+        return results
+
     @abc.abstractproperty
     def known_classes(self):
         """
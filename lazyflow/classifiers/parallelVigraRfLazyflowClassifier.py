@@ -32,13 +32,17 @@ import random
 
 from lazyflow import USER_LOGLEVEL
 from lazyflow.utility import Timer
-from lazyflow.request import Request, RequestPool, RequestLock
+from lazyflow.request import Request, RequestPool
 from .lazyflowClassifier import LazyflowVectorwiseClassifierABC, LazyflowVectorwiseClassifierFactoryABC
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows predicted by one request (see ParallelVigraRfLazyflowClassifier.predict_probabilities_batch)
+MIN_CHUNK_ROWS = 4096
+MAX_CHUNK_ROWS = 65536
+
 
 class ParallelVigraRfLazyflowClassifierFactory(LazyflowVectorwiseClassifierFactoryABC):
     """
@@ -98,40 +102,14 @@ class ParallelVigraRfLazyflowClassifierFactory(LazyflowVectorwiseClassifierFacto
     def create_and_train(self, X, y, feature_names=None):
         logger.debug("Training parallel vigra RF")
 
-        # Distribute trees as evenly as possible
-        tree_counts = numpy.array([self._num_trees // self._num_forests] * self._num_forests)
-        tree_counts[: self._num_trees % self._num_forests] += 1
-        assert tree_counts.sum() == self._num_trees
-        tree_counts = list(map(int, tree_counts))
-        tree_counts[:] = (tree_count for tree_count in tree_counts if tree_count != 0)
-
         # Save for future reference
         known_labels, label_counts = numpy.unique(y, return_counts=True)
-
-        X = numpy.asarray(X, numpy.float32)
-        y = numpy.asarray(y, numpy.uint32)
-        if y.ndim == 1:
-            y = y[:, numpy.newaxis]
-
-        assert X.ndim == 2
-        assert len(X) == len(y)
-
-        # Sample X and y
-        if self._label_proportion:
-            proportion = self._label_proportion
-            row_num = int(proportion * X.shape[0])
-            idx = random.sample(list(range(X.shape[0])), row_num)
-            X = X[idx, :]
-            y = y[idx]
-            assert (numpy.unique(y) == known_labels).all(), (
-                "Sampled labels are not representative of the complete set: some label values are missing!\n"
-                "Sampled labels include {}, but complete set has {}".format(numpy.unique(y), known_labels)
-            )
+        X, y = self._prepare_training_data(X, y, known_labels)
 
         # Create N forests to train
         # (treecount of each might differ)
         forests = []
-        for tree_count in tree_counts:
+        for tree_count in self._distribute_trees(self._num_trees):
             forests.append(vigra.learning.RandomForest(tree_count, **self._kwargs))
 
         # Train classifier with feature importance visitor
@@ -158,6 +136,83 @@ class ParallelVigraRfLazyflowClassifierFactory(LazyflowVectorwiseClassifierFacto
         )
         return ParallelVigraRfLazyflowClassifier(forests, oobs, known_labels, feature_names, named_importances)
 
+    def update_and_train(self, classifier, X, y, feature_names=None, retrain_fraction=0.25):
+        """
+        Replace the oldest trees of the given classifier (about ``retrain_fraction`` of all trees)
+        with new trees trained with X and y, and keep the other trees.  The new trees are distributed
+        over several forests again, so that they train in parallel.  Since the oldest trees are
+        replaced first, all trees have seen the latest labels after 1 / retrain_fraction updates.
+
+        Trains from scratch if the previous classifier can't be reused, i.e. if the label classes,
+        the features or the number of trees changed, or if feature importances are requested.
+        """
+        known_labels, label_counts = numpy.unique(y, return_counts=True)
+        reusable = (
+            isinstance(classifier, ParallelVigraRfLazyflowClassifier)
+            and not self._variable_importance_enabled
+            and classifier.tree_count == self._num_trees
+            and numpy.array_equal(classifier.known_classes, known_labels)
+            and classifier.feature_count == numpy.shape(X)[1]
+            and list(classifier.feature_names or []) == list(feature_names or [])
+        )
+        if not reusable:
+            return self.create_and_train(X, y, feature_names)
+
+        logger.debug("Updating parallel vigra RF")
+        X, y = self._prepare_training_data(X, y, known_labels)
+
+        # The forests of a classifier are ordered by age, oldest first
+        kept_forests = list(classifier.forests)
+        kept_oobs = list(classifier.oobs)
+        num_replaced_trees = 0
+        while kept_forests and num_replaced_trees < max(1, round(retrain_fraction * self._num_trees)):
+            num_replaced_trees += kept_forests.pop(0).treeCount()
+            kept_oobs.pop(0)
+
+        forests = [
+            vigra.learning.RandomForest(tree_count, **self._kwargs)
+            for tree_count in self._distribute_trees(num_replaced_trees)
+        ]
+        oobs = self._train_forests(forests, X, y)
+
+        logger.log(
+            USER_LOGLEVEL,
+            f"Retrained {num_replaced_trees} of {self._num_trees} trees. "
+            f"Label counts: ({', '.join(map(str, label_counts))}). Average OOB: {numpy.average(oobs):.3f}",
+        )
+        return ParallelVigraRfLazyflowClassifier(kept_forests + forests, kept_oobs + oobs, known_labels, feature_names)
+
+    def _distribute_trees(self, num_trees):
+        """
+        Distribute trees as evenly as possible among the forests (no empty forests).
+        """
+        tree_counts = numpy.array([num_trees // self._num_forests] * self._num_forests)
+        tree_counts[: num_trees % self._num_forests] += 1
+        assert tree_counts.sum() == num_trees
+        return [int(tree_count) for tree_count in tree_counts if tree_count != 0]
+
+    def _prepare_training_data(self, X, y, known_labels):
+        X = numpy.asarray(X, numpy.float32)
+        y = numpy.asarray(y, numpy.uint32)
+        if y.ndim == 1:
+            y = y[:, numpy.newaxis]
+
+        assert X.ndim == 2
+        assert len(X) == len(y)
+
+        # Sample X and y
+        if self._label_proportion:
+            proportion = self._label_proportion
+            row_num = int(proportion * X.shape[0])
+            idx = random.sample(list(range(X.shape[0])), row_num)
+            X = X[idx, :]
+            y = y[idx]
+            assert (numpy.unique(y) == known_labels).all(), (
+                "Sampled labels are not representative of the complete set: some label values are missing!\n"
+                "Sampled labels include {}, but complete set has {}".format(numpy.unique(y), known_labels)
+            )
+        return X, y
+
     @staticmethod
     def _train_forests(forests, X, y):
         """
@@ -320,6 +375,37 @@ class ParallelVigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
 
     def predict_probabilities(self, X):
         logger.debug("Predicting with parallel vigra RF")
+        return self.predict_probabilities_batch([X])[0]
+
+    def predict_probabilities_batch(self, feature_matrices, outputs=None):
+        """
+        Predict several feature matrices (e.g. the features of several blocks) together.
+
+        The rows of all matrices are split into chunks of similar size (small matrices are combined
+        into one chunk), which are predicted in parallel.  Each chunk is predicted by all forests,
+        one after the other, and their weighted predictions are summed up in the output, so the
+        only temporary is one chunk-sized scratch array per request.
+
+        outputs: Optional preallocated float32 arrays of shape (len(X), len(known_classes)), one per matrix.
+                 The arrays may be views (e.g. a region of a bigger result array).
+        Returns: The list of probability matrices (outputs, if given).
+        """
+        matrices = [self._check_features(X) for X in feature_matrices]
+        num_classes = len(self._known_labels)
+        if outputs is None:
+            outputs = [numpy.empty((len(X), num_classes), dtype=numpy.float32) for X in matrices]
+        assert len(outputs) == len(matrices)
+        for X, out in zip(matrices, outputs):
+            assert out.shape == (len(X), num_classes), f"Output shape {out.shape} doesn't match {(len(X), num_classes)}"
+            assert out.dtype == numpy.float32
+
+        pool = RequestPool()
+        for chunk in self._chunks(matrices, outputs):
+            pool.add(Request(partial(self._predict_chunk, chunk)))
+        pool.wait()
+        return outputs
+
+    def _check_features(self, X):
         X = numpy.asarray(X, dtype=numpy.float32)
         assert X.ndim == 2
 
@@ -330,36 +416,65 @@ class ParallelVigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
             ), "Feature count ({}) doesn't match the training feature count ({}).\nExpected features: {}".format(
                 X.shape[1], len(self._feature_names), self._feature_names
             )
+        return X
 
-        # As each forest completes, aggregate results in a shared array.
-        # (Must put in a list so we can update it in this closure.)
-        total_predictions = [None]
-        prediction_lock = RequestLock()
-
-        def update_predictions(forest, forest_predictions):
-            forest_predictions *= forest.treeCount()
-            with prediction_lock:
-                if total_predictions[0] is None:
-                    total_predictions[0] = forest_predictions
-                else:
-                    total_predictions[0] += forest_predictions
-
-        # Create a request for each forest
-        pool = RequestPool()
-        for forest in self._forests:
-            req = Request(partial(forest.predictProbabilities, X))
-            req.notify_finished(partial(update_predictions, forest))
-            pool.add(req)
-        del req
-        pool.wait()
+    def _chunks(self, matrices, outputs):
+        """
+        Split the rows of all matrices into lists of (features, output) pairs, one list per request.
+        """
+        total_rows = sum(len(X) for X in matrices)
+        num_workers = max(1, Request.global_thread_pool.num_workers)
+        chunk_rows = int(numpy.clip(-(-total_rows // num_workers), MIN_CHUNK_ROWS, MAX_CHUNK_ROWS))
+
+        chunk, rows_in_chunk = [], 0
+        for X, out in zip(matrices, outputs):
+            while len(X):
+                n = min(chunk_rows - rows_in_chunk, len(X))
+                chunk.append((X[:n], out[:n]))
+                X, out = X[n:], out[n:]
+                rows_in_chunk += n
+                if rows_in_chunk == chunk_rows:
+                    yield chunk
+                    chunk, rows_in_chunk = [], 0
+        if chunk:
+            yield chunk
+
+    def _predict_chunk(self, chunk):
+        if len(chunk) == 1:
+            features, out = chunk[0]
+        else:
+            features = numpy.concatenate([X for X, _ in chunk])
+            out = numpy.empty((len(features), len(self._known_labels)), dtype=numpy.float32)
 
-        total_predictions[0] /= self._num_trees
-        return total_predictions[0]
+        # Each forest returns the average prediction of its trees
+        scratch = numpy.empty((len(features), len(self._known_labels)), dtype=numpy.float32)
+        for i, forest in enumerate(self._forests):
+            forest.predictProbabilities(features, out=scratch)
+            weight = numpy.float32(forest.treeCount() / self._num_trees)
+            if i == 0:
+                numpy.multiply(scratch, weight, out=out)
+            else:
+                scratch *= weight
+                out += scratch
+
+        if len(chunk) > 1:
+            start = 0
+            for X, matrix_out in chunk:
+                matrix_out[...] = out[start : start + len(X)]
+                start += len(X)
 
     @property
     def oobs(self):
         return self._oobs
 
+    @property
+    def forests(self):
+        return self._forests
+
+    @property
+    def tree_count(self):
+        return self._num_trees
+
     @property
     def known_classes(self):
         return self._known_labels
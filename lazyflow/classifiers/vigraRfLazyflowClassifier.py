@@ -149,6 +149,10 @@ class VigraRfLazyflowClassifier(LazyflowVectorwiseClassifierABC):
         logger.debug("predicting single-threaded vigra RF")
         return self._vigra_rf.predictProbabilities(numpy.asarray(X, dtype=numpy.float32))
 
+    @property
+    def forests(self):
+        return [self._vigra_rf]
+
     @property
     def known_classes(self):
         return self._known_labels
@@ -1,14 +1,23 @@
 from mpi4py import MPI
+import collections
 import enum
-from typing import Iterable, TypeVar, Generic, Callable, Tuple
+from typing import Any, Iterable, Generic, Callable, Optional, Tuple
 import uuid
 import logging
 
+from lazyflow.distributed.orchestratorBackend import (
+    UNIT_OF_WORK,
+    OrchestratorBackend,
+    Progress,
+    TaskFailure,
+    WorkUnitFailed,
+    run_target,
+)
+
 logger = logging.getLogger(__name__)
 
 # message payload to signal a worker that it should terminate. Value is arbitrary but should be universally unique
 COMMAND_STOP_WORKER = "COMMAND_STOP_WORKER-eb23ae13-709e-4ac3-931d-99ab059ef0c2"
-UNIT_OF_WORK = TypeVar("UNIT_OF_WORK")
 
 
 @enum.unique
@@ -36,55 +45,78 @@ class _Worker(Generic[UNIT_OF_WORK]):
         self.stopped = True
 
 
-class TaskOrchestrator(Generic[UNIT_OF_WORK]):
+class TaskOrchestrator(OrchestratorBackend[UNIT_OF_WORK]):
     """Coordinates work amongst MPI processes.
 
     In order to use this class, applications must be launched with mpirun: e.g.: mpirun -N <num_workers> ilastik.py
     """
 
-    def __init__(self, comm=None):
+    def __init__(self, comm=None, max_retries: int = 2):
         self.comm = comm or MPI.COMM_WORLD
         self.rank = self.comm.Get_rank()
+        self.max_retries = max_retries
         num_workers = self.comm.size - 1
         if num_workers <= 0:
             raise ValueError("Trying to orchestrate tasks with {num_workers} workers")
         self.workers = {rank: _Worker(self.comm, rank) for rank in range(1, num_workers + 1)}
 
-    def _get_finished_worker(self) -> _Worker[UNIT_OF_WORK]:
+    def _get_finished_worker(self) -> Tuple[_Worker[UNIT_OF_WORK], Any]:
         status = MPI.Status()
-        self.comm.recv(source=MPI.ANY_SOURCE, tag=Tags.TASK_DONE, status=status)
-        return self.workers[status.Get_source()]
-
-    def orchestrate(self, work_units: Iterable[UNIT_OF_WORK]):
+        result = self.comm.recv(source=MPI.ANY_SOURCE, tag=Tags.TASK_DONE, status=status)
+        return self.workers[status.Get_source()], result
+
+    def orchestrate(
+        self,
+        work_units: Iterable[UNIT_OF_WORK],
+        on_result: Optional[Callable[[UNIT_OF_WORK, Any], None]] = None,
+        progress_callback: Optional[Callable[[int], None]] = None,
+    ):
         """Sends work units from work_units to workers as they become free. Usually ran in the process with mpi rank 0
 
         Blocks until all work units have been consumed and processed by the workers.
         Automatically terminates all workers when all work units have been consumed."""
 
         logger.info(f"ORCHESTRATOR: Starting orchestration of {len(self.workers)}...")
-        num_busy_workers = 0
-        for worker in self.workers.values():
-            try:
-                worker.send(next(work_units))
-                num_busy_workers += 1
-            except StopIteration:
-                break
-
-        while True:
-            worker = self._get_finished_worker()
-            try:
-                worker.send(next(work_units))
-            except StopIteration:
-                worker.stop()
-                num_busy_workers -= 1
-                if num_busy_workers == 0:
-                    break
-
-        for worker in self.workers.values():
-            if not worker.stopped:
-                worker.stop()
-
-    def start_as_worker(self, target: Callable[[UNIT_OF_WORK, int], None]):
+        pending = collections.deque((unit, 0) for unit in work_units)  # (unit of work, number of failures)
+        progress = Progress(len(pending), progress_callback)
+        busy = {}  # worker rank -> (unit of work, number of failures)
+        failure = None
+
+        def send_next(worker: _Worker[UNIT_OF_WORK]):
+            if pending and failure is None:
+                unit, failures = pending.popleft()
+                worker.send(unit)
+                busy[worker.rank] = (unit, failures)
+
+        try:
+            progress.report()
+            for worker in self.workers.values():
+                send_next(worker)
+
+            while busy:
+                worker, result = self._get_finished_worker()
+                unit, failures = busy.pop(worker.rank)
+                if isinstance(result, TaskFailure):
+                    if failures < self.max_retries:
+                        logger.warning(f"ORCHESTRATOR: Retrying {unit} after failure in worker {worker.rank}")
+                        pending.append((unit, failures + 1))
+                    elif failure is None:
+                        # Let the busy workers finish, but don't hand out new work
+                        failure = WorkUnitFailed(f"Failed to process {unit}:\n{result.message}")
+                else:
+                    if on_result is not None:
+                        on_result(unit, result)
+                    progress.advance()
+                send_next(worker)
+        finally:
+            for worker in self.workers.values():
+                if not worker.stopped:
+                    worker.stop()
+
+        if failure is not None:
+            raise failure
+
+    def start_as_worker(self, target: Callable[[UNIT_OF_WORK, int], Any]):
         """Synchronously runs 'target' on every work unit passed in by the orchestrating intance of this class
         (usually the process with mpi rank == 0, which should be executing the 'orchestrate' method)
 
@@ -97,5 +129,6 @@ class TaskOrchestrator(Generic[UNIT_OF_WORK]):
             unit_of_work = self.comm.recv(source=MPI.ANY_SOURCE, tag=Tags.WORK, status=status)
             if unit_of_work == COMMAND_STOP_WORKER:
                 break
-            self.comm.send(target(unit_of_work, self.rank), dest=status.Get_source(), tag=Tags.TASK_DONE)
+            result = run_target(target, unit_of_work, self.rank)
+            self.comm.send(result, dest=status.Get_source(), tag=Tags.TASK_DONE)
         logger.info(f"WORKER {self.rank}: Terminated")
@@ -0,0 +1,270 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import collections
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from lazyflow.distributed.orchestratorBackend import (
+    UNIT_OF_WORK,
+    OrchestratorBackend,
+    Progress,
+    TaskFailure,
+    WorkUnitFailed,
+    run_target,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tells a process that it is a worker of a LocalTaskOrchestrator, and where to find the orchestrator:
+# "<host>:<port>:<rank>:<authkey as hex>"
+WORKER_ENV_VAR = "LAZYFLOW_ORCHESTRATOR_WORKER"
+
+# message payload to signal a worker that the current orchestration is over
+COMMAND_STOP_WORKER = "COMMAND_STOP_WORKER-3f0c5b8e-8a4e-4a43-9f6b-2b7cfa8d51c4"
+
+
+class LocalTaskOrchestrator(OrchestratorBackend[UNIT_OF_WORK]):
+    """Coordinates work amongst worker processes on this machine, without MPI.
+
+    Like with mpirun, the workers run the same program as the orchestrator: the first call of
+    orchestrate starts worker_command (by default, the command line of the current process) num_workers times.
+    In the worker processes, the orchestrator has a rank > 0 (see WORKER_ENV_VAR), so they call start_as_worker
+    where the orchestrating process calls orchestrate.  Workers are kept for the following orchestrations, so
+    all processes must run the same sequence of orchestrations (e.g. one per exported dataset).  The orchestrating
+    process must call close when it is done.
+
+    If a worker dies, its unit of work is handed to another worker.  Dead workers are not replaced,
+    because a new process would not be at the same point of the program as the others.
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        max_retries: int = 2,
+        worker_command: Optional[Sequence[str]] = None,
+        worker_env: Optional[Dict[str, str]] = None,
+    ):
+        self.max_retries = max_retries
+        self._epoch = 0  # Number of the current orchestration, to detect workers that are out of step
+        self._closed = False
+
+        worker_info = os.environ.get(WORKER_ENV_VAR)
+        if worker_info:
+            host, port, rank, authkey = worker_info.rsplit(":", 3)
+            self.rank = int(rank)
+            self._connection = Client((host, int(port)), authkey=bytes.fromhex(authkey))
+            self._connection.send(self.rank)
+            return
+
+        self.rank = 0
+        self.num_workers = num_workers or os.cpu_count() or 1
+        if self.num_workers <= 0:
+            raise ValueError(f"Trying to orchestrate tasks with {self.num_workers} workers")
+        # sys.orig_argv (python >= 3.10) includes interpreter options such as "-m ilastik"
+        self.worker_command = list(worker_command or getattr(sys, "orig_argv", [sys.executable] + sys.argv))
+        self.worker_env = worker_env or {}
+        self._listener: Optional[Listener] = None
+        self._processes: List[subprocess.Popen] = []
+        self._new_connections: "queue.Queue[Tuple[Connection, int]]" = queue.Queue()
+        self._connections: Dict[Connection, int] = {}  # connection -> rank of the worker
+        self._lost_ranks = set()
+
+    def _start_workers(self):
+        authkey = os.urandom(16)
+        self._listener = Listener(("localhost", 0), authkey=authkey)
+        host, port = self._listener.address
+        logger.info(f"ORCHESTRATOR: Starting {self.num_workers} worker processes: {' '.join(self.worker_command)}")
+        for rank in range(1, self.num_workers + 1):
+            env = {**os.environ, **self.worker_env, WORKER_ENV_VAR: f"{host}:{port}:{rank}:{authkey.hex()}"}
+            self._processes.append(subprocess.Popen(self.worker_command, env=env))
+        threading.Thread(target=self._accept_workers, name="LocalTaskOrchestrator.accept", daemon=True).start()
+
+    def _accept_workers(self):
+        for _ in range(self.num_workers):
+            try:
+                connection = self._listener.accept()
+                rank = connection.recv()
+            except (OSError, EOFError):
+                return  # Listener closed, or the worker died while connecting
+            self._new_connections.put((connection, rank))
+
+    def _connect_new_workers(self, idle: List[Connection]):
+        while True:
+            try:
+                connection, rank = self._new_connections.get_nowait()
+            except queue.Empty:
+                return
+            self._connections[connection] = rank
+            idle.append(connection)
+
+    def _wait_for_starting_workers(self, idle: List[Connection]):
+        """Every worker must take part in every orchestration, so wait for the ones that are still starting up."""
+        while True:
+            self._connect_new_workers(idle)
+            known_ranks = set(self._connections.values()) | self._lost_ranks
+            if all(
+                rank in known_ranks or process.poll() is not None for rank, process in enumerate(self._processes, 1)
+            ):
+                return
+            time.sleep(0.05)
+
+    def _has_living_workers(self) -> bool:
+        return bool(self._connections) or any(process.poll() is None for process in self._processes)
+
+    def _drop_worker(self, connection: Connection):
+        rank = self._connections.pop(connection)
+        self._lost_ranks.add(rank)
+        logger.warning(f"ORCHESTRATOR: Lost worker {rank}")
+        connection.close()
+
+    def orchestrate(
+        self,
+        work_units: Iterable[UNIT_OF_WORK],
+        on_result: Optional[Callable[[UNIT_OF_WORK, Any], None]] = None,
+        progress_callback: Optional[Callable[[int], None]] = None,
+    ):
+        """Sends work units from work_units to workers as they become free, and blocks until all of them have
+        been processed (see OrchestratorBackend.orchestrate)."""
+        if self._closed:
+            raise RuntimeError("The orchestrator was closed")
+        if self._listener is None:
+            self._start_workers()
+        self._epoch += 1
+
+        pending = collections.deque((unit, 0) for unit in work_units)  # (unit of work, number of failures)
+        progress = Progress(len(pending), progress_callback)
+        idle: List[Connection] = list(self._connections)
+        busy = {}  # connection -> (unit of work, number of failures)
+        failure = None
+
+        def retry_or_fail(unit, failures, reason):
+            nonlocal failure
+            if failures < self.max_retries:
+                logger.warning(f"ORCHESTRATOR: Retrying {unit} after {reason}")
+                pending.append((unit, failures + 1))
+            elif failure is None:
+                # Let the busy workers finish, but don't hand out new work
+                failure = WorkUnitFailed(f"Failed to process {unit}: {reason}")
+
+        try:
+            progress.report()
+            while busy or (pending and failure is None):
+                self._connect_new_workers(idle)
+                while idle and pending and failure is None:
+                    connection = idle.pop()
+                    unit, failures = pending.popleft()
+                    try:
+                        connection.send((self._epoch, unit))
+                    except OSError:
+                        self._drop_worker(connection)
+                        pending.appendleft((unit, failures))
+                        continue
+                    busy[connection] = (unit, failures)
+
+                if not busy:
+                    if not self._has_living_workers():
+                        raise WorkUnitFailed("All worker processes exited")
+                    time.sleep(0.05)  # Waiting for workers to connect
+                    continue
+
+                for connection in wait(list(busy), timeout=0.5):
+                    unit, failures = busy.pop(connection)
+                    try:
+                        epoch, result = connection.recv()
+                    except (EOFError, OSError):
+                        self._drop_worker(connection)
+                        retry_or_fail(unit, failures, "worker process died")
+                        continue
+                    if epoch != self._epoch:
+                        raise RuntimeError(f"Worker {self._connections[connection]} is out of step")
+                    idle.append(connection)
+                    if isinstance(result, TaskFailure):
+                        retry_or_fail(
+                            unit, failures, f"failure in worker {self._connections[connection]}:\n{result.message}"
+                        )
+                    else:
+                        if on_result is not None:
+                            on_result(unit, result)
+                        progress.advance()
+        except BaseException:
+            # Busy workers would answer to the next orchestration
+            self.close()
+            raise
+
+        self._wait_for_starting_workers(idle)
+        for connection in idle:
+            try:
+                connection.send((self._epoch, COMMAND_STOP_WORKER))
+            except OSError:
+                self._drop_worker(connection)
+
+        if failure is not None:
+            raise failure
+
+    def start_as_worker(self, target: Callable[[UNIT_OF_WORK, int], Any]):
+        """Synchronously runs 'target' on every work unit passed in by the orchestrating process,
+        until it sends COMMAND_STOP_WORKER."""
+        self._epoch += 1
+        logger.info(f"WORKER {self.rank}: Started")
+        while True:
+            try:
+                epoch, unit_of_work = self._connection.recv()
+            except (EOFError, OSError) as e:
+                raise RuntimeError(f"WORKER {self.rank}: Lost connection to the orchestrator") from e
+            if epoch != self._epoch:
+                raise RuntimeError(f"WORKER {self.rank}: Out of step with the orchestrator")
+            if isinstance(unit_of_work, str) and unit_of_work == COMMAND_STOP_WORKER:
+                break
+            result = run_target(target, unit_of_work, self.rank)
+            self._connection.send((epoch, result))
+        logger.info(f"WORKER {self.rank}: Terminated")
+
+    def close(self, timeout: float = 60.0):
+        """Disconnect from the workers, and wait for the worker processes to exit (or kill them after timeout)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self.rank != 0:
+            self._connection.close()
+            return
+
+        self._connect_new_workers([])
+        for connection in self._connections:
+            connection.close()
+        self._connections = {}
+        if self._listener is not None:
+            self._listener.close()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"ORCHESTRATOR: Killing worker process {process.pid}")
+                process.kill()
+                process.wait()
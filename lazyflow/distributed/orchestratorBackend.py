@@ -0,0 +1,142 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Interface of the task orchestrators, which hand out units of work (e.g. the blocks of a distributed export)
+to worker processes.
+
+Orchestrators follow the MPI model: every process runs the same program, and the process with rank 0
+calls :meth:`OrchestratorBackend.orchestrate`, while all others call :meth:`OrchestratorBackend.start_as_worker`.
+"""
+import abc
+import logging
+import traceback
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+UNIT_OF_WORK = TypeVar("UNIT_OF_WORK")
+
+BACKENDS = ("mpi", "local")
+
+
+class WorkUnitFailed(RuntimeError):
+    """Raised by the orchestrator when a unit of work still failed after all retries."""
+
+
+class TaskFailure:
+    """Sent back by a worker instead of the result, if the target raised an exception."""
+
+    def __init__(self, exception: BaseException):
+        self.message = "".join(traceback.format_exception(type(exception), exception, exception.__traceback__))
+
+    def __repr__(self):
+        return f"TaskFailure({self.message!r})"
+
+
+def run_target(target: Callable[[UNIT_OF_WORK, int], Any], unit_of_work: UNIT_OF_WORK, rank: int) -> Any:
+    """Run target in a worker, and return its result, or a TaskFailure if it raised."""
+    try:
+        return target(unit_of_work, rank)
+    except Exception as e:
+        logger.exception(f"WORKER {rank}: Failed to process {unit_of_work}")
+        return TaskFailure(e)
+
+
+class OrchestratorBackend(Generic[UNIT_OF_WORK], abc.ABC):
+    """Coordinates work amongst worker processes.
+
+    Failed units of work are handed out again, up to ``max_retries`` times.
+    """
+
+    rank: int  # 0 in the orchestrating process
+    max_retries: int
+
+    @property
+    def is_orchestrator(self) -> bool:
+        return self.rank == 0
+
+    @abc.abstractmethod
+    def orchestrate(
+        self,
+        work_units: Iterable[UNIT_OF_WORK],
+        on_result: Optional[Callable[[UNIT_OF_WORK, Any], None]] = None,
+        progress_callback: Optional[Callable[[int], None]] = None,
+    ):
+        """Sends work units to workers as they become free, and blocks until all of them have been processed.
+
+        on_result is called in the orchestrating process with each unit of work and whatever the worker
+        target returned for it.  progress_callback receives the percentage of finished units.
+        Raises WorkUnitFailed if a unit of work could not be processed.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def start_as_worker(self, target: Callable[[UNIT_OF_WORK, int], Any]):
+        """Synchronously runs 'target' on every work unit passed in by the orchestrating instance,
+        until the orchestrator has no more work.
+
+        target is called with the unit of work and the rank of the worker.  Its return value is
+        passed to on_result in the orchestrating process, so it should be picklable.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the workers, once no more orchestrations follow."""
+        pass
+
+
+class Progress:
+    """Counts finished work units and reports the percentage (if it changed) to a progress callback."""
+
+    def __init__(self, total: int, callback: Optional[Callable[[int], None]]):
+        self.total = total
+        self.done = 0
+        self.callback = callback
+        self._last_percent = None
+
+    def advance(self):
+        self.done += 1
+        self.report()
+
+    def report(self):
+        if self.callback is None:
+            return
+        percent = 100 * self.done // self.total if self.total else 100
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.callback(percent)
+
+
+def create_orchestrator(backend: str = "mpi", num_workers: Optional[int] = None, **kwargs) -> OrchestratorBackend:
+    """
+    backend: "mpi" (the application must be launched with mpirun) or "local" (worker processes on this machine)
+    num_workers: Number of local worker processes (default: one per core).  MPI uses all processes of the job.
+    """
+    if backend == "mpi":
+        from lazyflow.distributed.TaskOrchestrator import TaskOrchestrator
+
+        return TaskOrchestrator(**kwargs)
+    if backend == "local":
+        from lazyflow.distributed.localTaskOrchestrator import LocalTaskOrchestrator
+
+        return LocalTaskOrchestrator(num_workers, **kwargs)
+    raise ValueError(f"Unknown orchestrator backend {backend!r}, expected one of {BACKENDS}")
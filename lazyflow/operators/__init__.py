@@ -19,72 +19,76 @@
 # This information is also available on the ilastik web site at:
 # 		   http://ilastik.org/license/
 ###############################################################################
-from . import classifierOperators, filterOperators, generic, operators, valueProviders
-from .classifierOperators import (
-    OpBaseClassifierPredict,
-    OpClassifierPredict,
-    OpPixelwiseClassifierPredict,
-    OpTrainClassifierBlocked,
-    OpTrainClassifierFromFeatureVectors,
-    OpTrainPixelwiseClassifierBlocked,
-    OpTrainVectorwiseClassifierBlocked,
-    OpVectorwiseClassifierPredict,
-)
-from .filterOperators import (
-    OpBaseFilter,
-    OpDifferenceOfGaussians,
-    OpGaussianGradientMagnitude,
-    OpGaussianSmoothing,
-    OpHessianOfGaussian,
-    OpHessianOfGaussianEigenvalues,
-    OpHessianOfGaussianEigenvaluesFirst,
-    OpLaplacianOfGaussian,
-    OpStructureTensorEigenvalues,
-)
-from .generic import (
-    OpConvertDtype,
-    OpDtypeView,
-    OpMaxChannelIndicatorOperator,
-    OpMultiArrayMerger,
-    OpMultiArraySlicer2,
-    OpMultiArrayStacker,
-    OpMultiChannelSelector,
-    OpMultiInputConcatenater,
-    OpPixelOperator,
-    OpSelectSubslot,
-    OpSingleChannelSelector,
-    OpSubRegion,
-    OpWrapSlot,
-)
-from .opArrayPiper import OpArrayPiper
-from .opBlockedArrayCache import OpBlockedArrayCache
-from .opCacheFixer import OpCacheFixer
-from .opCompressedCache import OpCompressedCache
-from .opCompressedUserLabelArray import OpCompressedUserLabelArray
-from .opConcatenateFeatureMatrices import OpConcatenateFeatureMatrices
-from .opFeatureMatrixCache import OpFeatureMatrixCache
-from .opFilterLabels import OpFilterLabels
-from .opInterpMissingData import OpInterpMissingData
-from .opLabelVolume import OpLabelVolume
-from .opObjectFeatures import OpObjectFeatures
-from .opPixelFeaturesPresmoothed import OpPixelFeaturesPresmoothed
-from .opRelabelConsecutive import OpRelabelConsecutive
-from .opReorderAxes import OpReorderAxes
-from .opSimpleBlockedArrayCache import OpSimpleBlockedArrayCache
-from .opSimpleStacker import OpSimpleStacker
-from .opSlicedBlockedArrayCache import OpSlicedBlockedArrayCache
-from .opUnblockedArrayCache import OpUnblockedArrayCache
-from .opVigraWatershed import OpVigraWatershed
-from .valueProviders import (
-    ListToMultiOperator,
-    OpAttributeSelector,
-    OpDummyData,
-    OpMetadataInjector,
-    OpMetadataMerge,
-    OpMetadataSelector,
-    OpOutputProvider,
-    OpPrecomputedInput,
-    OpValueCache,
-    OpZeroDefault,
-    OpMissingDataSource,
+"""
+The operators are imported on first use, e.g. ``from lazyflow.operators import OpArrayPiper`` only imports
+lazyflow.operators.opArrayPiper (and its dependencies).  Submodules such as ``lazyflow.operators.generic``
+are available as attributes as well.
+"""
+from lazyflow.utility.lazyImport import lazy_module_attributes
+
+__getattr__, __dir__, __all__ = lazy_module_attributes(
+    __name__,
+    {
+        "OpBaseClassifierPredict": ".classifierOperators",
+        "OpClassifierPredict": ".classifierOperators",
+        "OpPixelwiseClassifierPredict": ".classifierOperators",
+        "OpTrainClassifierBlocked": ".classifierOperators",
+        "OpTrainClassifierFromFeatureVectors": ".classifierOperators",
+        "OpTrainPixelwiseClassifierBlocked": ".classifierOperators",
+        "OpTrainVectorwiseClassifierBlocked": ".classifierOperators",
+        "OpVectorwiseClassifierPredict": ".classifierOperators",
+        "OpBaseFilter": ".filterOperators",
+        "OpDifferenceOfGaussians": ".filterOperators",
+        "OpGaussianGradientMagnitude": ".filterOperators",
+        "OpGaussianSmoothing": ".filterOperators",
+        "OpHessianOfGaussian": ".filterOperators",
+        "OpHessianOfGaussianEigenvalues": ".filterOperators",
+        "OpHessianOfGaussianEigenvaluesFirst": ".filterOperators",
+        "OpLaplacianOfGaussian": ".filterOperators",
+        "OpStructureTensorEigenvalues": ".filterOperators",
+        "OpConvertDtype": ".generic",
+        "OpDtypeView": ".generic",
+        "OpMaxChannelIndicatorOperator": ".generic",
+        "OpMultiArrayMerger": ".generic",
+        "OpMultiArraySlicer2": ".generic",
+        "OpMultiArrayStacker": ".generic",
+        "OpMultiChannelSelector": ".generic",
+        "OpMultiInputConcatenater": ".generic",
+        "OpPixelOperator": ".generic",
+        "OpSelectSubslot": ".generic",
+        "OpSingleChannelSelector": ".generic",
+        "OpSubRegion": ".generic",
+        "OpWrapSlot": ".generic",
+        "OpArrayLikeSource": ".opArrayLikeSource",
+        "OpArrayPiper": ".opArrayPiper",
+        "OpBlockedArrayCache": ".opBlockedArrayCache",
+        "OpCacheFixer": ".opCacheFixer",
+        "OpCompressedCache": ".opCompressedCache",
+        "OpCompressedUserLabelArray": ".opCompressedUserLabelArray",
+        "OpConcatenateFeatureMatrices": ".opConcatenateFeatureMatrices",
+        "OpFeatureMatrixCache": ".opFeatureMatrixCache",
+        "OpFilterLabels": ".opFilterLabels",
+        "OpInterpMissingData": ".opInterpMissingData",
+        "OpLabelVolume": ".opLabelVolume",
+        "OpObjectFeatures": ".opObjectFeatures",
+        "OpPixelFeaturesPresmoothed": ".opPixelFeaturesPresmoothed",
+        "OpRelabelConsecutive": ".opRelabelConsecutive",
+        "OpReorderAxes": ".opReorderAxes",
+        "OpSimpleBlockedArrayCache": ".opSimpleBlockedArrayCache",
+        "OpSimpleStacker": ".opSimpleStacker",
+        "OpSlicedBlockedArrayCache": ".opSlicedBlockedArrayCache",
+        "OpUnblockedArrayCache": ".opUnblockedArrayCache",
+        "OpVigraWatershed": ".opVigraWatershed",
+        "ListToMultiOperator": ".valueProviders",
+        "OpAttributeSelector": ".valueProviders",
+        "OpDummyData": ".valueProviders",
+        "OpMetadataInjector": ".valueProviders",
+        "OpMetadataMerge": ".valueProviders",
+        "OpMetadataSelector": ".valueProviders",
+        "OpOutputProvider": ".valueProviders",
+        "OpPrecomputedInput": ".valueProviders",
+        "OpValueCache": ".valueProviders",
+        "OpZeroDefault": ".valueProviders",
+        "OpMissingDataSource": ".valueProviders",
+    },
 )
@@ -0,0 +1,140 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Eviction policies for the cache memory manager.
+
+A policy decides in which order cache entries are freed once the caches use more memory than allowed.
+Policies only see :class:`CacheEntry` tuples, so they can also be used outside the memory manager
+(e.g. to replay recorded access traces, see ``benchmarks/cacheEvictionReplay.py``).
+"""
+import statistics
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class CacheEntry(NamedTuple):
+    #: identifies the entry across all caches, e.g. (id(cache), block_id)
+    key: Hashable
+    #: python timestamp of the last access
+    last_access: float
+    #: memory occupied by the entry, None if unknown
+    nbytes: Optional[float]
+    #: time in seconds it took to compute the entry, None if unknown
+    cost: Optional[float]
+    #: human-readable description, for logging
+    info: str = ""
+    #: frees the entry and returns the number of bytes freed
+    free: Optional[Callable[[], float]] = None
+
+
+class EvictionPolicy(ABC):
+    """
+    Interface for eviction policies.
+
+    The memory manager calls evictionOrder() once per cleanup, and then frees entries
+    in the returned order until the memory target is reached, calling notifyEvicted()
+    for each of them.
+    """
+
+    name = None
+
+    @abstractmethod
+    def evictionOrder(self, entries: Sequence[CacheEntry]) -> List[CacheEntry]:
+        """
+        return the entries sorted such that the entry to be evicted first comes first
+        """
+        raise NotImplementedError()
+
+    def notifyEvicted(self, entry: CacheEntry) -> None:
+        """
+        called after the given entry was freed
+        """
+        pass
+
+
+class LruPolicy(EvictionPolicy):
+    """
+    Least recently used entries are evicted first.
+    """
+
+    name = "lru"
+
+    def evictionOrder(self, entries):
+        return sorted(entries, key=lambda entry: entry.last_access)
+
+
+class GreedyDualSizePolicy(EvictionPolicy):
+    """
+    GreedyDual-Size (Cao & Irani, 1997): entries that are cheap to recompute per byte are evicted first.
+
+    Each entry gets the priority ``H = L + cost / nbytes`` when it is added or accessed.
+    The entry with the lowest H is evicted, and the "inflation" value L is raised to its H,
+    so that entries that have not been accessed for a long time eventually age out,
+    no matter how expensive they were.
+
+    Accesses are detected by a change of the entry's last access time between two cleanups.
+    Entries of unknown cost are assumed to have the median cost per byte of all known entries.
+    """
+
+    name = "gds"
+
+    def __init__(self):
+        self._inflation = 0.0
+        # key -> (last access time seen, H)
+        self._priorities: Dict[Hashable, Tuple[float, float]] = {}
+
+    def evictionOrder(self, entries):
+        densities = [entry.cost / max(entry.nbytes or 0, 1) for entry in entries if entry.cost is not None]
+        default_density = statistics.median(densities) if densities else 0.0
+
+        priorities = {}
+        for entry in entries:
+            previous = self._priorities.get(entry.key)
+            if previous is not None and previous[0] == entry.last_access:
+                priorities[entry.key] = previous
+            else:
+                if entry.cost is None:
+                    density = default_density
+                else:
+                    density = entry.cost / max(entry.nbytes or 0, 1)
+                priorities[entry.key] = (entry.last_access, self._inflation + density)
+
+        # Forget entries that don't exist anymore
+        self._priorities = priorities
+        return sorted(entries, key=lambda entry: (priorities[entry.key][1], entry.last_access))
+
+    def notifyEvicted(self, entry):
+        _, priority = self._priorities.pop(entry.key, (None, self._inflation))
+        self._inflation = max(self._inflation, priority)
+
+
+_policies = {policy.name: policy for policy in (LruPolicy, GreedyDualSizePolicy)}
+
+#: Names of all available policies, as used in the ``[lazyflow] cache_eviction_policy`` config setting
+POLICY_NAMES = tuple(_policies)
+
+
+def createEvictionPolicy(name: str) -> EvictionPolicy:
+    try:
+        return _policies[name]()
+    except KeyError:
+        raise ValueError(f"Unknown cache eviction policy {name!r}, expected one of {POLICY_NAMES}") from None
@@ -35,6 +35,8 @@ import warnings
 from lazyflow.utility import OrderedSignal
 from lazyflow.utility import log_exception
 from lazyflow.utility import Memory
+from lazyflow.operators import cacheSpillStore
+from lazyflow.operators.cacheEvictionPolicy import CacheEntry, EvictionPolicy, LruPolicy, createEvictionPolicy
 
 
 import logging
@@ -72,6 +74,11 @@ class _CacheMemoryManager(threading.Thread):
 
     the interval is measured in seconds. Each change of refresh interval
     triggers cleanup.
+
+    The order in which cache entries are freed is determined by an eviction
+    policy (least recently used by default), see cacheEvictionPolicy.py::
+
+        cache_mem_manager.setEvictionPolicy("gds")
     """
 
     totalCacheMemory = OrderedSignal()
@@ -97,6 +104,8 @@ class _CacheMemoryManager(threading.Thread):
         # target usage fraction
         self._target_usage = 0.90
 
+        self._eviction_policy = LruPolicy()
+
         self._stopped = False
         self.start()
         atexit.register(self.stop)
@@ -194,8 +203,8 @@ class _CacheMemoryManager(threading.Thread):
 
             logger.debug(
                 "Process memory usage is {:0.2f} GB out of {:0.2f} (caches are {}, {:.1f}% of allowed)".format(
-                    Memory.getMemoryUsage() / 2.0 ** 30,
-                    Memory.getAvailableRam() / 2.0 ** 30,
+                    Memory.getMemoryUsage() / 2.0**30,
+                    Memory.getAvailableRam() / 2.0**30,
                     Memory.format(total),
                     cache_pct,
                 )
@@ -206,30 +215,53 @@ class _CacheMemoryManager(threading.Thread):
 
             cache_entries = []
             cache_entries += [
-                (cache.lastAccessTime(), cache.name, cache.freeMemory) for cache in list(self._managed_caches)
+                CacheEntry(
+                    key=(id(cache),),
+                    last_access=cache.lastAccessTime(),
+                    nbytes=cache.usedMemory(),
+                    cost=None,
+                    info=cache.name,
+                    free=cache.freeMemory,
+                )
+                for cache in list(self._managed_caches)
             ]
             cache_entries += [
-                (lastAccessTime, f"{cache.name}: {blockKey}", functools.partial(cache.freeBlock, blockKey))
+                CacheEntry(
+                    key=(id(cache), blockKey),
+                    last_access=lastAccessTime,
+                    nbytes=nbytes,
+                    cost=cost,
+                    info=f"{cache.name}: {blockKey}",
+                    free=functools.partial(cache.evictBlock, blockKey),
+                )
                 for cache in list(self._managed_blocked_caches)
-                for blockKey, lastAccessTime in cache.getBlockAccessTimes()
+                for blockKey, lastAccessTime, nbytes, cost in cache.getBlockCosts()
             ]
-            cache_entries.sort(key=lambda entry: entry[0])
+            policy = self._eviction_policy
+            cache_entries = policy.evictionOrder(cache_entries)
 
-            for lastAccessTime, info, cleanupFun in cache_entries:
+            for entry in cache_entries:
                 if total <= self._target_usage * cache_memory:
                     break
-                mem = cleanupFun()
-                logger.debug(f"Cleaned up {info} ({Memory.format(mem)})")
+                mem = entry.free()
+                policy.notifyEvicted(entry)
+                logger.debug(f"Cleaned up {entry.info} ({Memory.format(mem)})")
                 total -= mem
 
             # Remove references to cache entries before triggering garbage collection.
-            cleanupFun = None
+            entry = None
             cache_entries = None
             gc.collect()
 
             msg = "Done cleaning up, cache memory usage is now at {}".format(Memory.format(total))
             if cache_memory > 0:
                 msg += " ({:.1f}% of allowed)".format(total * 100.0 / cache_memory)
+            spill_store = cacheSpillStore.getSpillStore()
+            if spill_store is not None:
+                stats = spill_store.stats()
+                msg += ", {} in {} blocks spilled to disk ({} hits, {} misses)".format(
+                    Memory.format(stats.used), stats.blocks, stats.hits, stats.misses
+                )
             logger.debug(msg)
         except:
             log_exception(logger)
@@ -258,6 +290,20 @@ class _CacheMemoryManager(threading.Thread):
             self._refresh_interval = t
             self._condition.notify_all()
 
+    def setEvictionPolicy(self, policy):
+        """
+        set the policy that decides which cache entries are freed first
+
+        :param policy: an EvictionPolicy instance, or the name of one (see cacheEvictionPolicy.POLICY_NAMES)
+        """
+        if not isinstance(policy, EvictionPolicy):
+            policy = createEvictionPolicy(policy)
+        with self._disable_lock:
+            self._eviction_policy = policy
+
+    def getEvictionPolicy(self):
+        return self._eviction_policy
+
     def disable(self):
         """
         disable all memory management
@@ -300,3 +346,7 @@ def addFirstClassCache(cache):
 
 def setRefreshInterval(seconds):
     _cache_memory_manager.setRefreshInterval(seconds)
+
+
+def setEvictionPolicy(policy):
+    _cache_memory_manager.setEvictionPolicy(policy)
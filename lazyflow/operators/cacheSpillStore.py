@@ -0,0 +1,257 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Second cache tier on local disk.
+
+When the cache memory manager evicts a block from a managed blocked cache, the cache may
+"spill" the block to the SpillStore instead of discarding it.  On a cache miss, the cache
+looks for the block in the SpillStore before recomputing it.
+
+Blocks are stored as one .npy file each in a private scratch directory, which is removed
+on exit.  The store has its own capacity; when it is full, the least recently spilled
+blocks are deleted.
+
+The store is disabled by default.  Enable it with::
+
+    from lazyflow.operators import cacheSpillStore
+    cacheSpillStore.configure("/local/ssd/scratch", capacity=50 * 1024**3)
+
+or in the ilastik config file (``[lazyflow] cache_spill_dir`` and ``cache_spill_mb``).
+"""
+import atexit
+import collections
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from typing import Callable, Hashable, NamedTuple, Optional
+
+import numpy
+import vigra
+
+logger = logging.getLogger(__name__)
+
+
+class SpillStats(NamedTuple):
+    used: int
+    capacity: int
+    blocks: int
+    hits: int
+    misses: int
+    writes: int
+    evictions: int
+
+
+class _SpilledBlock(NamedTuple):
+    path: str
+    nbytes: int
+    cost: Optional[float]
+    axistags: Optional[vigra.AxisTags]
+
+
+class SpillStore:
+    """
+    Disk-backed store for numpy arrays, keyed by (owner, block key).
+
+    Owners (i.e. caches) get a unique token from the module-level newOwner(), so blocks
+    of caches that have been deleted can never be confused with blocks of new caches.
+    All methods are threadsafe.
+    """
+
+    def __init__(self, directory: str, capacity: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="lazyflow-spill-", dir=directory)
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._blocks = collections.OrderedDict()  # (owner, key) -> _SpilledBlock, least recently spilled first
+        self._owner_bytes = collections.Counter()
+        self._used = 0
+        self._file_counter = itertools.count()
+
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+
+    def put(self, owner: int, key: Hashable, data: numpy.ndarray, cost: Optional[float] = None) -> bool:
+        """
+        Write a block to disk.
+
+        Numpy arrays and VigraArrays are supported (no masked arrays).
+        The axistags of a VigraArray are restored by take().
+
+        :return: True if the block was stored.
+        """
+        if (
+            not isinstance(data, numpy.ndarray)
+            or isinstance(data, numpy.ma.MaskedArray)
+            or data.dtype.hasobject
+            or data.nbytes > self.capacity
+        ):
+            return False
+
+        path = os.path.join(self.directory, f"{next(self._file_counter)}.npy")
+        try:
+            numpy.save(path, numpy.asarray(data), allow_pickle=False)
+        except OSError:
+            logger.warning(f"Could not spill block to {path}", exc_info=True)
+            _remove(path)
+            return False
+
+        with self._lock:
+            self._discard((owner, key))
+            self._blocks[(owner, key)] = _SpilledBlock(path, data.nbytes, cost, getattr(data, "axistags", None))
+            self._owner_bytes[owner] += data.nbytes
+            self._used += data.nbytes
+            self._writes += 1
+            while self._used > self.capacity:
+                self._discard(next(iter(self._blocks)))
+                self._evictions += 1
+        return True
+
+    def take(self, owner: int, key: Hashable, out: Optional[numpy.ndarray] = None):
+        """
+        Remove a block from the store and return it as (data, cost), or None if it isn't stored.
+
+        If out is given, the data is read directly into it, and out is returned as data.
+        Otherwise, blocks that were spilled as VigraArrays are returned with their axistags.
+        """
+        with self._lock:
+            block = self._blocks.pop((owner, key), None)
+            if block is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._owner_bytes[owner] -= block.nbytes
+            self._used -= block.nbytes
+
+        try:
+            spilled = numpy.load(block.path, mmap_mode="r", allow_pickle=False)
+            if out is not None:
+                out[...] = spilled
+                data = out
+            else:
+                data = numpy.array(spilled)
+                if block.axistags is not None:
+                    data = vigra.taggedView(data, block.axistags)
+            del spilled
+        except (OSError, ValueError):
+            logger.warning(f"Could not read spilled block from {block.path}", exc_info=True)
+            return None
+        finally:
+            _remove(block.path)
+        return data, block.cost
+
+    def discard(self, owner: int, key: Hashable) -> None:
+        with self._lock:
+            self._discard((owner, key))
+
+    def discardWhere(self, owner: int, predicate: Callable[[Hashable], bool]) -> None:
+        """
+        Discard all blocks of the given owner whose key matches the predicate.
+        """
+        with self._lock:
+            for owner_and_key in [k for k in self._blocks if k[0] == owner and predicate(k[1])]:
+                self._discard(owner_and_key)
+
+    def discardOwner(self, owner: int) -> None:
+        with self._lock:
+            if self._owner_bytes[owner] == 0:
+                return
+            for owner_and_key in [k for k in self._blocks if k[0] == owner]:
+                self._discard(owner_and_key)
+
+    def usedBytes(self, owner: Optional[int] = None) -> int:
+        if owner is None:
+            return self._used
+        return self._owner_bytes.get(owner, 0)
+
+    def stats(self) -> SpillStats:
+        with self._lock:
+            return SpillStats(
+                self._used, self.capacity, len(self._blocks), self._hits, self._misses, self._writes, self._evictions
+            )
+
+    def clear(self) -> None:
+        """
+        Delete all spilled blocks and the scratch directory.
+        """
+        with self._lock:
+            self._blocks.clear()
+            self._owner_bytes.clear()
+            self._used = 0
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _discard(self, owner_and_key) -> None:
+        """Must be called with self._lock held."""
+        block = self._blocks.pop(owner_and_key, None)
+        if block is not None:
+            self._owner_bytes[owner_and_key[0]] -= block.nbytes
+            self._used -= block.nbytes
+            _remove(block.path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_spill_store: Optional[SpillStore] = None
+_owner_counter = itertools.count()
+
+
+def newOwner() -> int:
+    """
+    Return a unique token that identifies a cache in the spill store.
+    """
+    return next(_owner_counter)
+
+
+def configure(directory: Optional[str], capacity: int) -> Optional[SpillStore]:
+    """
+    Enable the spill store in a new scratch directory inside ``directory``.
+    Pass directory=None (or capacity=0) to disable it.
+
+    .. note:: Like Request.reset_thread_pool(), this should only be called during startup.
+    """
+    global _spill_store
+    if _spill_store is not None:
+        _spill_store.clear()
+        _spill_store = None
+
+    if directory and capacity > 0:
+        _spill_store = SpillStore(directory, capacity)
+        atexit.register(_spill_store.clear)
+        logger.info(f"Spilling evicted cache blocks to {_spill_store.directory} (up to {capacity / 1024**2:.0f} MB)")
+    return _spill_store
+
+
+def getSpillStore() -> Optional[SpillStore]:
+    """
+    Return the active spill store, or None if spilling is disabled.
+    """
+    return _spill_store
@@ -33,11 +33,13 @@ import numpy
 from lazyflow.graph import Operator, InputSlot, OutputSlot, OrderedSignal, OperatorWrapper
 from lazyflow.roi import sliceToRoi, roiToSlice, getIntersection, roiFromShape, nonzero_bounding_box, enlargeRoiForHalo
 from lazyflow.utility import Timer
+from lazyflow.request import RequestLock
 from lazyflow.classifiers import (
     LazyflowVectorwiseClassifierABC,
     LazyflowVectorwiseClassifierFactoryABC,
     LazyflowPixelwiseClassifierABC,
     LazyflowPixelwiseClassifierFactoryABC,
+    flatForestLazyflowClassifier,
 )
 
 from lazyflow.utility.helpers import bigintprod
@@ -59,6 +61,7 @@ class OpTrainClassifierBlocked(Operator):
     ClassifierFactory = InputSlot()
     nonzeroLabelBlocks = InputSlot(level=1)  # Used only in the pixelwise case.
     MaxLabel = InputSlot()
+    FullRetrainInterval = InputSlot(value=0)  # Used only in the vectorwise case.
 
     Classifier = OutputSlot()
 
@@ -73,6 +76,7 @@ class OpTrainClassifierBlocked(Operator):
         self._opVectorwiseTrain.Labels.connect(self.Labels)
         self._opVectorwiseTrain.ClassifierFactory.connect(self.ClassifierFactory)
         self._opVectorwiseTrain.MaxLabel.connect(self.MaxLabel)
+        self._opVectorwiseTrain.FullRetrainInterval.connect(self.FullRetrainInterval)
         self._opVectorwiseTrain.progressSignal.subscribe(self.progressSignal)
 
         # Fully connect the pixelwise training operator
@@ -246,6 +250,7 @@ class OpTrainVectorwiseClassifierBlocked(Operator):
     Labels = InputSlot(level=1)
     ClassifierFactory = InputSlot()
     MaxLabel = InputSlot()
+    FullRetrainInterval = InputSlot(value=0)
 
     Classifier = OutputSlot()
 
@@ -269,6 +274,7 @@ class OpTrainVectorwiseClassifierBlocked(Operator):
         self._opTrainFromFeatures.ClassifierFactory.connect(self.ClassifierFactory)
         self._opTrainFromFeatures.LabelAndFeatureMatrix.connect(self._opConcatenateFeatureMatrices.ConcatenatedOutput)
         self._opTrainFromFeatures.MaxLabel.connect(self.MaxLabel)
+        self._opTrainFromFeatures.FullRetrainInterval.connect(self.FullRetrainInterval)
 
         self.Classifier.connect(self._opTrainFromFeatures.Classifier)
 
@@ -303,16 +309,32 @@ class OpTrainVectorwiseClassifierBlocked(Operator):
 
 
 class OpTrainClassifierFromFeatureVectors(Operator):
+    """
+    Trains a vectorwise classifier with the label and feature matrix.
+
+    If FullRetrainInterval is N > 1, the classifier is trained incrementally: after a full training,
+    the next N - 1 trainings only update the previous classifier (see
+    LazyflowVectorwiseClassifierFactoryABC.update_and_train), retraining about IncrementalRetrainFraction
+    of it.  With the default of 0, the classifier is always trained from scratch.
+    """
+
     ClassifierFactory = InputSlot()
     LabelAndFeatureMatrix = InputSlot()
 
     MaxLabel = InputSlot()
+    FullRetrainInterval = InputSlot(value=0)
+    IncrementalRetrainFraction = InputSlot(value=0.25)
     Classifier = OutputSlot()
 
     def __init__(self, *args, **kwargs):
         super(OpTrainClassifierFromFeatureVectors, self).__init__(*args, **kwargs)
         self.trainingCompleteSignal = OrderedSignal()
 
+        # The last classifier we trained, and how many incremental updates it has had since the last full training
+        self._lock = RequestLock()
+        self._previous_classifier = None
+        self._num_updates = 0
+
         # TODO: Progress...
         # self.progressSignal = OrderedSignal()
 
@@ -343,8 +365,23 @@ class OpTrainClassifierFromFeatureVectors(Operator):
             "".format(type(classifier_factory))
         )
 
-        logger.debug("Training new classifier: {}".format(classifier_factory.description))
-        classifier = classifier_factory.create_and_train(featMatrix, labelsMatrix[:, 0], channel_names)
+        with self._lock:
+            previous_classifier = self._previous_classifier
+            if previous_classifier is not None and self._num_updates + 1 < self.FullRetrainInterval.value:
+                logger.debug("Updating classifier: {}".format(classifier_factory.description))
+                classifier = classifier_factory.update_and_train(
+                    previous_classifier,
+                    featMatrix,
+                    labelsMatrix[:, 0],
+                    channel_names,
+                    retrain_fraction=self.IncrementalRetrainFraction.value,
+                )
+                self._num_updates += 1
+            else:
+                logger.debug("Training new classifier: {}".format(classifier_factory.description))
+                classifier = classifier_factory.create_and_train(featMatrix, labelsMatrix[:, 0], channel_names)
+                self._num_updates = 0
+            self._previous_classifier = classifier
         result[0] = classifier
         if classifier is not None:
             assert issubclass(type(classifier), LazyflowVectorwiseClassifierABC), (
@@ -355,7 +392,21 @@ class OpTrainClassifierFromFeatureVectors(Operator):
         self.trainingCompleteSignal()
         return result
 
+    def requestFullRetrain(self):
+        """
+        Train the next classifier from scratch, even if incremental training is enabled.
+        """
+        with self._lock:
+            self._previous_classifier = None
+        self.Classifier.setDirty()
+
     def propagateDirty(self, slot, subindex, roi):
+        if slot in (self.FullRetrainInterval, self.IncrementalRetrainFraction):
+            # Only affects future trainings
+            return
+        if slot == self.ClassifierFactory:
+            with self._lock:
+                self._previous_classifier = None
         self.Classifier.setDirty()
 
 
@@ -480,7 +531,7 @@ class OpBaseClassifierPredict(Operator):
                 result[:] = 0.0
                 return result
 
-        probabilities = self._calculate_probabilities(roi)
+        probabilities = self._calculate_probabilities(roi, mask)
 
         # We're expecting a channel for each label class.
         # If we didn't provide at least one sample for each label,
@@ -506,8 +557,11 @@ class OpBaseClassifierPredict(Operator):
         return result
 
     @abstractmethod
-    def _calculate_probabilities(roi):
-        """Returns the channel-wise probability maps calculated on roi"""
+    def _calculate_probabilities(self, roi, mask=None):
+        """
+        Returns the channel-wise probability maps calculated on roi.
+        Pixels outside of the mask (single-channel, if given) may be left out.
+        """
         pass
 
     def propagateDirty(self, slot, subindex, roi):
@@ -521,7 +575,7 @@ class OpBaseClassifierPredict(Operator):
 
 
 class OpPixelwiseClassifierPredict(OpBaseClassifierPredict):
-    def _calculate_probabilities(self, roi):
+    def _calculate_probabilities(self, roi, mask=None):
         classifier = self.Classifier.value
 
         assert isinstance(
@@ -580,12 +634,14 @@ class OpVectorwiseClassifierPredict(OpBaseClassifierPredict):
         feature_ram_per_pixel = max(self.Image.meta.dtype().nbytes, 4) * input_channels
         self.PMaps.meta.ram_usage_per_requested_pixel = classifier_ram_per_pixel + feature_ram_per_pixel
 
-    def _calculate_probabilities(self, roi):
+    def _calculate_probabilities(self, roi, mask=None):
         classifier = self.Classifier.value
 
         assert isinstance(
             classifier, LazyflowVectorwiseClassifierABC
         ), f"Classifier {classifier} must be sublcass of {LazyflowVectorwiseClassifierABC}"
+        if flatForestLazyflowClassifier.isInferenceEnabled():
+            classifier = flatForestLazyflowClassifier.flatClassifierFor(classifier)
 
         key = roi.toSlice()
         newKey = key[:-1]
@@ -596,16 +652,31 @@ class OpVectorwiseClassifierPredict(OpBaseClassifierPredict):
 
         input_data = numpy.asarray(input_data, numpy.float32)
         shape = input_data.shape
-        prod = bigintprod(shape[:-1])
-        features = input_data.reshape((prod, shape[-1]))
+        num_classes = len(classifier.known_classes)
+
+        if mask is not None and not mask.all():
+            # Only predict the pixels in the mask
+            pixel_mask = numpy.asarray(mask)[..., 0]
+            features = input_data[pixel_mask]
+            probabilities = numpy.zeros(shape[:-1] + (num_classes,), dtype=numpy.float32)
+            output = numpy.empty((len(features), num_classes), dtype=numpy.float32)
+        else:
+            # Predict directly into the result
+            pixel_mask = None
+            prod = bigintprod(shape[:-1])
+            features = input_data.reshape((prod, shape[-1]))
+            probabilities = numpy.empty(shape[:-1] + (num_classes,), dtype=numpy.float32)
+            output = probabilities.reshape((prod, num_classes))
 
         with Timer() as prediction_timer:
-            probabilities = classifier.predict_probabilities(features)
+            classifier.predict_probabilities_batch([features], [output])
 
         logger.debug(
             f"Features took {features_timer.seconds()} seconds."
-            f" Prediction took {prediction_timer.seconds()} seconds. {roi}"
+            f" Prediction took {prediction_timer.seconds()} seconds"
+            f" ({len(features)} of {bigintprod(shape[:-1])} pixels). {roi}"
         )
 
-        probabilities.shape = shape[:-1] + (probabilities.shape[-1],)
+        if pixel_mask is not None:
+            probabilities[pixel_mask] = output
         return probabilities
@@ -0,0 +1,259 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Block storage backends of OpCompressedCache.
+
+The "hdf5" backend keeps each block in its own in-memory hdf5 file (lzf compression).
+The "blosc" backend keeps each block as a set of blosc-compressed byte buffers (one per chunk):
+
+* no hdf5 metadata overhead per block,
+* no global h5py lock: compression and decompression release the GIL, so blocks can be
+  read and written in parallel,
+* chunks are decompressed directly into the destination array where possible.
+
+:class:`BloscBlockFile` and :class:`BloscDataset` implement the subset of the ``h5py.File``
+and ``h5py.Dataset`` interface the compressed caches use, so the caches don't need to know
+which backend they are using.
+"""
+import itertools
+import threading
+from typing import Optional, Tuple
+
+import h5py
+import numcodecs
+import numpy
+
+from lazyflow.roi import roiToSlice
+from lazyflow.utility.helpers import bigintprod
+
+#: Names of all backends, as used in the ``[lazyflow] compressed_cache_backend`` config setting
+BACKENDS = ("hdf5", "blosc")
+
+_default_backend = "hdf5"
+
+
+def setDefaultBackend(name: str) -> None:
+    """
+    Set the backend used by compressed caches that are set up from now on.
+    """
+    global _default_backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown compressed cache backend {name!r}, expected one of {BACKENDS}")
+    _default_backend = name
+
+
+def getDefaultBackend() -> str:
+    return _default_backend
+
+
+def defaultCodec():
+    return numcodecs.Blosc(cname="lz4", clevel=5, shuffle=numcodecs.Blosc.AUTOSHUFFLE)
+
+
+class BloscDataset:
+    """
+    An in-memory, chunked array in which each chunk is compressed separately.
+
+    Supports reading and writing of rectangular regions, with the indexing semantics of h5py
+    (basic slices with step 1, ``...`` and ``()``).  Chunks that were never written read as zeros.
+    """
+
+    def __init__(self, shape, dtype, chunks=None, codec=None):
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = numpy.dtype(dtype)
+        self.chunks = tuple(int(c) for c in chunks) if chunks else self.shape
+        self.size = bigintprod(self.shape) if self.shape else 1
+        self._codec = codec or defaultCodec()
+        self._lock = threading.Lock()
+        # chunk index -> compressed bytes
+        self._chunks = {}
+
+    def get_storage_size(self) -> int:
+        return sum(len(buf) for buf in list(self._chunks.values()))
+
+    def __getitem__(self, key):
+        start, stop = self._selection(key)
+        result = numpy.empty(tuple(stop - start), dtype=self.dtype)
+        self.read_direct(result, key)
+        if key == () and not self.shape:
+            # h5py returns scalars for dataset[()] of scalar datasets
+            return result[()]
+        return result
+
+    def __setitem__(self, key, value):
+        start, stop = self._selection(key)
+        value = numpy.broadcast_to(numpy.asarray(value, dtype=self.dtype), tuple(stop - start))
+        for index, chunk_start, chunk_stop in self._intersectingChunks(start, stop):
+            low = numpy.maximum(start, chunk_start)
+            high = numpy.minimum(stop, chunk_stop)
+            source = value[_slicing(low - start, high - start)]
+            if (low == chunk_start).all() and (high == chunk_stop).all():
+                buf = self._encode(source)
+                with self._lock:
+                    self._chunks[index] = buf
+            else:
+                # Read-modify-write, so concurrent writes to other parts of the chunk are not lost
+                with self._lock:
+                    chunk = self._decode(self._chunks.get(index), chunk_stop - chunk_start)
+                    chunk[_slicing(low - chunk_start, high - chunk_start)] = source
+                    self._chunks[index] = self._encode(chunk)
+
+    def read_direct(self, dest: numpy.ndarray, source_sel=None, dest_sel=None) -> None:
+        """
+        Read the region source_sel into dest[dest_sel] (same signature as ``h5py.Dataset.read_direct``).
+
+        Chunks that are entirely covered by the selection are decompressed straight
+        into the destination if it is contiguous there.
+        """
+        start, stop = self._selection(Ellipsis if source_sel is None else source_sel)
+        target = dest if dest_sel is None else dest[dest_sel]
+        assert target.shape == tuple(stop - start), f"Cannot read region of shape {stop - start} into {target.shape}"
+
+        for index, chunk_start, chunk_stop in self._intersectingChunks(start, stop):
+            low = numpy.maximum(start, chunk_start)
+            high = numpy.minimum(stop, chunk_stop)
+            target_part = target[_slicing(low - start, high - start)]
+            buf = self._chunks.get(index)
+            if buf is None:
+                target_part[...] = 0
+            elif (
+                (low == chunk_start).all()
+                and (high == chunk_stop).all()
+                and target_part.flags.c_contiguous
+                and target_part.dtype == self.dtype
+            ):
+                self._codec.decode(buf, out=numpy.asarray(target_part).reshape(-1))
+            else:
+                chunk = self._decode(buf, chunk_stop - chunk_start)
+                target_part[...] = chunk[_slicing(low - chunk_start, high - chunk_start)]
+
+    def _selection(self, key) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Convert an h5py-style key into the (start, stop) of the selected region.
+        """
+        if key is Ellipsis or key == ():
+            return numpy.zeros(len(self.shape), dtype=int), numpy.array(self.shape, dtype=int)
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * (len(self.shape) - len(key) + 1) + key[i + 1 :]
+        key = key + (slice(None),) * (len(self.shape) - len(key))
+        assert len(key) == len(self.shape), f"Too many indices for dataset of shape {self.shape}: {key}"
+
+        start = []
+        stop = []
+        for k, size in zip(key, self.shape):
+            assert isinstance(k, slice), "Only slices are supported, got {}".format(k)
+            k_start, k_stop, step = k.indices(size)
+            assert step == 1, "Only slices with step 1 are supported"
+            start.append(k_start)
+            stop.append(max(k_start, k_stop))
+        return numpy.array(start, dtype=int), numpy.array(stop, dtype=int)
+
+    def _intersectingChunks(self, start, stop):
+        """
+        Iterate over (chunk index, chunk start, chunk stop) of all chunks intersecting [start, stop).
+        """
+        if (stop <= start).any():
+            return
+        chunks = numpy.array(self.chunks, dtype=int)
+        shape = numpy.array(self.shape, dtype=int)
+        ranges = [range(b, e) for b, e in zip(start // chunks, -(-stop // chunks))]
+        for index in itertools.product(*ranges):
+            chunk_start = numpy.array(index, dtype=int) * chunks
+            yield index, chunk_start, numpy.minimum(chunk_start + chunks, shape)
+
+    def _encode(self, data: numpy.ndarray) -> bytes:
+        return self._codec.encode(numpy.ascontiguousarray(data).reshape(-1))
+
+    def _decode(self, buf: Optional[bytes], shape) -> numpy.ndarray:
+        if buf is None:
+            return numpy.zeros(tuple(shape), dtype=self.dtype)
+        chunk = numpy.empty(tuple(shape), dtype=self.dtype)
+        self._codec.decode(buf, out=chunk.reshape(-1))
+        return chunk
+
+
+def _slicing(start, stop):
+    # roiToSlice() gives () for scalars, but a view of a 0-d array needs [...]
+    return roiToSlice(start, stop) or Ellipsis
+
+
+class BloscBlockFile:
+    """
+    Stand-in for the in-memory ``h5py.File`` that compressed caches keep for each block.
+
+    Datasets are always compressed with the file's codec; h5py-style
+    compression arguments of :meth:`create_dataset` are ignored.
+    """
+
+    def __init__(self, codec=None):
+        self._codec = codec or defaultCodec()
+        self._datasets = {}
+
+    def create_dataset(self, name, shape, dtype, chunks=None, **_h5py_kwargs) -> BloscDataset:
+        assert name not in self._datasets, f"Dataset {name} already exists"
+        dataset = BloscDataset(shape, dtype, chunks=chunks, codec=self._codec)
+        self._datasets[name] = dataset
+        return dataset
+
+    def copy(self, source, name) -> None:
+        """
+        Copy an hdf5 dataset (or a BloscDataset) into a new dataset of this file.
+        """
+        dataset = self.create_dataset(name, source.shape, source.dtype, chunks=source.chunks)
+        dataset[...] = source[()]
+
+    def __getitem__(self, name):
+        if name == "/":
+            return self
+        return self._datasets[name]
+
+    def __contains__(self, name):
+        return name in self._datasets
+
+    def __delitem__(self, name):
+        del self._datasets[name]
+
+    def __iter__(self):
+        return iter(self._datasets)
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def close(self) -> None:
+        self._datasets = {}
+
+
+def copyToHdf5(source, group: h5py.Group, name: str) -> None:
+    """
+    Equivalent of ``group.copy(source, name)`` for BloscDataset and BloscBlockFile sources.
+    """
+    if isinstance(source, BloscBlockFile):
+        subgroup = group.create_group(name)
+        for dataset_name in source:
+            copyToHdf5(source[dataset_name], subgroup, dataset_name)
+    elif source.shape:
+        group.create_dataset(name, data=source[...], chunks=source.chunks, compression="lzf")
+    else:
+        group.create_dataset(name, data=source[()])
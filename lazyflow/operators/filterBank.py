@@ -0,0 +1,321 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Fused computation of all pixel features of one scale.
+
+The filter operators in filterOperators.py compute every feature on its own, although
+most of them are built from the same Gaussian derivatives: Hessian eigenvalues and the
+Laplacian both need the second derivatives, gradient magnitude and structure tensor both
+need the gradient, and all of them smooth along the axes they don't differentiate.
+
+A :class:`FilterBank` computes the Gaussian derivatives as separable 1D convolutions, with
+the kernels and the reflective border treatment of vigra's Kernel1D, so the features are the
+same as those of vigra's filters up to float rounding.  Every partial result (e.g. the image
+smoothed along z, or smoothed along z and differentiated along y) is kept, so each 1D convolution
+runs only once per block, no matter how many derivatives and features need it.  After each
+convolution, the array is cropped to the result region along the convolved axis, so later
+convolutions along other axes don't process the halo.  Every feature is written directly into
+its part of the output.
+
+fastfilters only provides whole features, not convolutions along single axes, so the
+convolutions are done with numpy.  The kernels of fastfilters differ slightly from vigra's, so
+with fastfilters installed, the "operators" backend differs from this one (and from vigra) by
+the same small amount.
+
+Used by OpPixelFeaturesPresmoothed with ``FilterBackend`` set to "fused".
+"""
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy
+
+#: Features a FilterBank can compute, with the same parameters as the filter operators used by
+#: OpPixelFeaturesPresmoothed (e.g. difference of Gaussians with sigma and 0.66 * sigma)
+FEATURE_IDS = (
+    "GaussianSmoothing",
+    "LaplacianOfGaussian",
+    "GaussianGradientMagnitude",
+    "DifferenceOfGaussians",
+    "StructureTensorEigenvalues",
+    "HessianOfGaussianEigenvalues",
+)
+
+#: (sigma, derivative order) of the 1D kernel along one axis
+Kernel = Tuple[float, int]
+
+
+def featureChannels(feature_id: str, ndim: int) -> int:
+    """
+    Number of channels of a feature computed over ndim axes.
+    """
+    if feature_id in ("StructureTensorEigenvalues", "HessianOfGaussianEigenvalues"):
+        return ndim
+    assert feature_id in FEATURE_IDS, f"Unknown feature {feature_id}"
+    return 1
+
+
+def _radius(sigma: float, window_size: float) -> int:
+    # as vigra.filters.Kernel1D
+    return max(1, int(window_size * sigma + 0.5))
+
+
+def haloSize(scale: float, window_size: float = 2.0) -> int:
+    """
+    Number of pixels around the result region a FilterBank needs to compute all features of the given scale
+    (the radius of the derivative kernels plus the radius of the outer smoothing of the structure tensor).
+    """
+    return _radius(scale, window_size) + _radius(0.5 * scale, window_size)
+
+
+def gaussianKernel(sigma: float, order: int = 0, window_size: float = 0.0) -> numpy.ndarray:
+    """
+    Sampled derivative of a Gaussian, as ``vigra.filters.Kernel1D.initGaussianDerivative``
+    computes it: the kernel has radius ``int(window_size * sigma + 0.5)`` (vigra's default
+    radius if window_size is 0), derivative kernels have no DC component, and the kernel is
+    normalized so that it computes the exact derivative of polynomials of the given order.
+
+    The kernel is meant for convolution, i.e. ``result[i] = sum(kernel[r + x] * data[i - x])``.
+    """
+    assert sigma > 0, f"Invalid sigma {sigma}"
+    if window_size > 0:
+        radius = _radius(sigma, window_size)
+    else:
+        radius = _radius(sigma, 3.0 + 0.5 * order)
+
+    x = numpy.arange(-radius, radius + 1, dtype=numpy.float64)
+    gauss = numpy.exp(-(x**2) / (2 * sigma**2))
+    if order == 0:
+        kernel = gauss
+    elif order == 1:
+        kernel = -x / sigma**2 * gauss
+    elif order == 2:
+        kernel = (x**2 / sigma**4 - 1 / sigma**2) * gauss
+    else:
+        raise ValueError(f"Derivatives of order {order} are not supported")
+
+    if order > 0:
+        kernel -= kernel.mean()
+    kernel /= numpy.sum(kernel * (-x) ** order) / math.factorial(order)
+    return kernel
+
+
+def convolve(
+    data: numpy.ndarray,
+    kernel: numpy.ndarray,
+    axis: int,
+    start: int = 0,
+    stop: Optional[int] = None,
+    out: Optional[numpy.ndarray] = None,
+) -> numpy.ndarray:
+    """
+    Convolve float32 data with kernel along axis, and return the result for the positions [start, stop) along that axis.
+
+    Outside of data, the data is reflected at the border (without repeating the border value,
+    vigra's BORDER_TREATMENT_REFLECT).  The result is accumulated in place, without temporaries per kernel tap.
+    """
+    size = data.shape[axis]
+    stop = size if stop is None else stop
+    radius = len(kernel) // 2
+    if radius >= size:
+        raise ValueError(f"Kernel of radius {radius} is longer than the line ({size} pixels)")
+
+    # data[start - radius : stop + radius] along axis, reflected at the border where needed
+    index = [slice(None)] * data.ndim
+    index[axis] = slice(max(0, start - radius), min(size, stop + radius))
+    window = data[tuple(index)]
+    padding = [(0, 0)] * data.ndim
+    padding[axis] = (max(0, radius - start), max(0, stop + radius - size))
+    if any(padding[axis]):
+        window = numpy.pad(window, padding, mode="reflect")
+
+    def shifted(x):
+        # data[i - x] for all i in [start, stop)
+        index[axis] = slice(radius - x, radius - x + stop - start)
+        return window[tuple(index)]
+
+    weights = kernel.astype(numpy.float32)
+    if out is None:
+        out = numpy.empty(shifted(0).shape, dtype=numpy.float32)
+    numpy.multiply(shifted(0), weights[radius], out=out)
+    scratch = numpy.empty_like(out)
+    for x in range(1, radius + 1):
+        before, after = weights[radius + x], weights[radius - x]  # weights of data[i - x] and data[i + x]
+        if before == after:
+            numpy.add(shifted(x), shifted(-x), out=scratch)
+        elif before == -after:
+            numpy.subtract(shifted(x), shifted(-x), out=scratch)
+        else:
+            numpy.multiply(shifted(-x), after, out=scratch)
+            out += scratch
+            numpy.multiply(shifted(x), before, out=scratch)
+            out += scratch
+            continue
+        scratch *= before
+        out += scratch
+    return out
+
+
+class FilterBank:
+    """
+    Computes the features of one scale for a single-channel image.
+
+    :param image: float32 image with the filtered (spatial) axes only, including the halo needed by the
+        filters (see :func:`haloSize`).  Outside of the image, the image is reflected at its border.
+    :param result_slicing: region of the image for which features are computed
+    :param scale: scale of the features
+    :param window_size: filter radius in units of sigma (as ``window_size`` of the filter operators)
+    """
+
+    def __init__(self, image: numpy.ndarray, result_slicing, scale: float, window_size: float = 2.0):
+        self.image = numpy.require(image, dtype=numpy.float32)
+        self.scale = scale
+        self.window_size = window_size
+        self.region = tuple(
+            (s.indices(size)[0], s.indices(size)[1]) for s, size in zip(result_slicing, self.image.shape)
+        )
+        # All derivatives are computed for the result region plus the margin needed by the outer smoothing
+        # of the structure tensor, so that all features can share them
+        margin = _radius(0.5 * scale, window_size)
+        self._work_region = tuple(
+            (max(0, start - margin), min(size, stop + margin))
+            for (start, stop), size in zip(self.region, self.image.shape)
+        )
+        # result region within the work region
+        self._inner = tuple(
+            slice(start - work_start, stop - work_start)
+            for (start, stop), (work_start, _) in zip(self.region, self._work_region)
+        )
+        # kernels along the first axes -> image convolved with them along these axes (cropped to the work region)
+        self._partial_results: Dict[Tuple[Kernel, ...], numpy.ndarray] = {}
+
+    @property
+    def ndim(self) -> int:
+        return self.image.ndim
+
+    def _convolved(self, kernels: Tuple[Kernel, ...]) -> numpy.ndarray:
+        if not kernels:
+            return self.image
+        if kernels not in self._partial_results:
+            axis = len(kernels) - 1
+            sigma, order = kernels[axis]
+            start, stop = self._work_region[axis]
+            kernel = gaussianKernel(sigma, order, self.window_size)
+            self._partial_results[kernels] = convolve(self._convolved(kernels[:-1]), kernel, axis, start, stop)
+        return self._partial_results[kernels]
+
+    def smoothed(self, sigma: Optional[float] = None) -> numpy.ndarray:
+        """The image smoothed with sigma (default: the scale), in the result region."""
+        sigma = self.scale if sigma is None else sigma
+        return self._convolved(((sigma, 0),) * self.ndim)[self._inner]
+
+    def derivative(self, *axes: int, region: Optional[Tuple[slice, ...]] = None) -> numpy.ndarray:
+        """
+        Gaussian derivative of the image along the given axes (e.g. ``derivative(0, 0)`` for the second derivative
+        along the first axis), in the result region (or the given region of the work region).
+        """
+        kernels = tuple((self.scale, axes.count(axis)) for axis in range(self.ndim))
+        return self._convolved(kernels)[self._inner if region is None else region]
+
+    def feature(self, feature_id: str, out: numpy.ndarray, first_channel: int = 0) -> None:
+        """
+        Compute a feature and write channels ``first_channel, ..., first_channel + len(out) - 1`` of it into out.
+
+        :param out: float32 array of shape (channels, *result shape), e.g. a view of the output block
+        """
+        shape = tuple(stop - start for start, stop in self.region)
+        assert out.shape[1:] == shape, f"out has shape {out.shape}, expected (c, *{shape})"
+        if feature_id == "GaussianSmoothing":
+            out[0] = self.smoothed()
+        elif feature_id == "DifferenceOfGaussians":
+            numpy.subtract(self.smoothed(), self.smoothed(0.66 * self.scale), out=out[0])
+        elif feature_id == "LaplacianOfGaussian":
+            out[0] = self.derivative(0, 0)
+            for axis in range(1, self.ndim):
+                out[0] += self.derivative(axis, axis)
+        elif feature_id == "GaussianGradientMagnitude":
+            numpy.square(self.derivative(0), out=out[0])
+            scratch = numpy.empty_like(out[0])
+            for axis in range(1, self.ndim):
+                out[0] += numpy.square(self.derivative(axis), out=scratch)
+            numpy.sqrt(out[0], out=out[0])
+        elif feature_id == "HessianOfGaussianEigenvalues":
+            hessian = {(i, j): self.derivative(i, j) for i in range(self.ndim) for j in range(i, self.ndim)}
+            _eigenvaluesDescending(hessian, self.ndim, out, first_channel)
+        elif feature_id == "StructureTensorEigenvalues":
+            _eigenvaluesDescending(self._structureTensor(0.5 * self.scale), self.ndim, out, first_channel)
+        else:
+            raise ValueError(f"Unknown feature {feature_id}")
+
+    def _structureTensor(self, outer_scale):
+        # The outer smoothing needs the gradient in the whole work region
+        everywhere = (slice(None),) * self.ndim
+        gradient = [self.derivative(axis, region=everywhere) for axis in range(self.ndim)]
+        kernel = gaussianKernel(outer_scale, 0, self.window_size)
+        tensor = {}
+        product = numpy.empty_like(gradient[0])
+        for i in range(self.ndim):
+            for j in range(i, self.ndim):
+                smoothed = numpy.multiply(gradient[i], gradient[j], out=product)
+                for axis, inner in enumerate(self._inner):
+                    smoothed = convolve(smoothed, kernel, axis, inner.start, inner.stop)
+                tensor[i, j] = smoothed
+        return tensor
+
+
+def _eigenvaluesDescending(matrix, n: int, out: numpy.ndarray, first_channel: int = 0) -> None:
+    """
+    Eigenvalues of symmetric 2x2 or 3x3 matrices, sorted in descending order, with closed formulas.
+
+    :param matrix: dict (i, j) -> component (i <= j), arrays of equal shape
+    :param out: target of the eigenvalues first_channel, ..., first_channel + len(out) - 1
+    """
+    channels = range(first_channel, first_channel + len(out))
+    if n == 1:
+        out[0] = matrix[0, 0]
+        return
+    if n == 2:
+        a, b, c = matrix[0, 0], matrix[0, 1], matrix[1, 1]
+        mean = (a + c) / 2
+        radius = numpy.hypot((a - c) / 2, b)
+        eigenvalues = {0: lambda: mean + radius, 1: lambda: mean - radius}
+    else:
+        assert n == 3, f"Eigenvalues of {n}x{n} matrices are not supported"
+        # Trigonometric solution for symmetric matrices, computed in double precision
+        a = {key: numpy.asarray(value, dtype=numpy.float64) for key, value in matrix.items()}
+        q = (a[0, 0] + a[1, 1] + a[2, 2]) / 3
+        d = [a[i, i] - q for i in range(3)]
+        off = a[0, 1] ** 2 + a[0, 2] ** 2 + a[1, 2] ** 2
+        p = numpy.sqrt((d[0] ** 2 + d[1] ** 2 + d[2] ** 2 + 2 * off) / 6)
+        p_safe = numpy.where(p > 0, p, 1)
+        # det((A - qI) / p) / 2
+        det = (
+            d[0] * (d[1] * d[2] - a[1, 2] ** 2)
+            - a[0, 1] * (a[0, 1] * d[2] - a[1, 2] * a[0, 2])
+            + a[0, 2] * (a[0, 1] * a[1, 2] - d[1] * a[0, 2])
+        )
+        r = numpy.clip(det / (2 * p_safe**3), -1, 1)
+        phi = numpy.arccos(r) / 3
+        largest = q + 2 * p * numpy.cos(phi)
+        smallest = q + 2 * p * numpy.cos(phi + 2 * numpy.pi / 3)
+        eigenvalues = {0: lambda: largest, 1: lambda: 3 * q - largest - smallest, 2: lambda: smallest}
+    for target, channel in zip(out, channels):
+        target[...] = eigenvalues[channel]()
@@ -40,16 +40,14 @@ from .opTiffReader import OpTiffReader
 from .opTiffSequenceReader import OpTiffSequenceReader
 from .opRESTfulPrecomputedChunkedVolumeReader import OpRESTfulPrecomputedChunkedVolumeReader
 
-# Try to import the dvid-related operator.
-# If it fails, that's okay.
-try:
-    from .opDvidVolume import OpDvidVolume
-    from .opDvidRoi import OpDvidRoi
-    from .opExportDvidVolume import OpExportDvidVolume
-except ImportError as ex:
-    # If the exception was not related to libdvid, then re-raise it.
-    if "libdvid" not in ex.args[0]:
-        raise
+# The dvid-related operators need libdvid, which is optional.
+# They are imported on first access, so that libdvid is only loaded when dvid is actually used.
+from lazyflow.utility.lazyImport import lazy_module_attributes
+
+__getattr__, __dir__ = lazy_module_attributes(
+    __name__,
+    {"OpDvidVolume": ".opDvidVolume", "OpDvidRoi": ".opDvidRoi", "OpExportDvidVolume": ".opExportDvidVolume"},
+)[:2]
 
 from .opInputDataReader import *
 
@@ -29,8 +29,8 @@ import math
 import logging
 import glob
 import h5py
-import z5py
 from collections import OrderedDict
+from functools import partial
 
 logger = logging.getLogger(__name__)
 traceLogger = logging.getLogger("TRACE." + __name__)
@@ -540,6 +540,10 @@ class OpH5N5WriterBigDataset(Operator):
     # h5py uses single-threaded gzip comression, which really slows down export.
     CompressionEnabled = InputSlot(value=False)
     BatchSize = InputSlot(optional=True)
+    # Optional ExportManifest to record the written blocks in
+    Manifest = InputSlot(optional=True)
+    # Keep an existing dataset of the right shape and dtype, and skip the blocks the manifest lists for it
+    Resume = InputSlot(value=False)
 
     WriteImage = OutputSlot()
 
@@ -562,6 +566,7 @@ class OpH5N5WriterBigDataset(Operator):
         self.progressSignal = OrderedSignal()
         self.d = None
         self.f = None
+        self._resumed = False
 
         self.h5N5File.setOrConnectIfAvailable(h5N5File)
         self.h5N5Path.setOrConnectIfAvailable(h5N5Path)
@@ -617,20 +622,31 @@ class OpH5N5WriterBigDataset(Operator):
 
         self.chunkShape = determineBlockShape(list(tagged_maxshape.values()), 512_000.0 / dtypeBytes)
 
+        self._resumed = False
         if datasetName in list(g.keys()):
-            del g[datasetName]
-        kwargs = {"shape": dataShape, "dtype": dtype, "chunks": self.chunkShape}
-        if self.CompressionEnabled.value:
-            kwargs["compression"] = "gzip"  # <-- Would be nice to use lzf compression here, but that is h5py-specific.
-            if isinstance(self.f, h5py.File):
-                kwargs["compression_opts"] = 1  # <-- Optimize for speed, not disk space.
-            else:  # z5py has uses different names here
-                kwargs["level"] = 1  # <-- Optimize for speed, not disk space.
-        else:
-            if isinstance(self.f, z5py.N5File):  # n5 uses gzip level 5 as default compression.
-                kwargs["compression"] = "raw"
+            existing = g[datasetName]
+            if self.Resume.value and tuple(existing.shape) == tuple(dataShape) and existing.dtype == numpy.dtype(dtype):
+                self.logger.info(f"Resuming export to existing dataset {h5N5Path}")
+                self.d = existing
+                self._resumed = True
+            else:
+                del g[datasetName]
+        if not self._resumed:
+            kwargs = {"shape": dataShape, "dtype": dtype, "chunks": self.chunkShape}
+            # h5N5File may also be a group (e.g. in the project file), h5py.File is a subclass of h5py.Group
+            is_hdf5 = isinstance(self.f, h5py.Group)
+            if self.CompressionEnabled.value:
+                # Would be nice to use lzf compression here, but that is h5py-specific.
+                kwargs["compression"] = "gzip"
+                if is_hdf5:
+                    kwargs["compression_opts"] = 1  # <-- Optimize for speed, not disk space.
+                else:  # z5py has uses different names here
+                    kwargs["level"] = 1  # <-- Optimize for speed, not disk space.
+            else:
+                if not is_hdf5:  # n5 uses gzip level 5 as default compression.
+                    kwargs["compression"] = "raw"
 
-        self.d = g.create_dataset(datasetName, **kwargs)
+            self.d = g.create_dataset(datasetName, **kwargs)
 
         if self.Image.meta.drange is not None:
             self.d.attrs["drange"] = self.Image.meta.drange
@@ -653,24 +669,54 @@ class OpH5N5WriterBigDataset(Operator):
         if drange:
             self.d.attrs["drange"] = drange
 
+        manifest_dataset = None
+        if self.Manifest.ready():
+            manifest_dataset = self.Manifest.value.dataset(
+                self.h5N5Path.value, self.d.shape, self.d.dtype, resume=self._resumed
+            )
+
         def handle_block_result(roi, data):
             slicing = roiToSlice(*roi)
             if data.flags.c_contiguous:
                 self.d.write_direct(data.view(numpy.ndarray), dest_sel=slicing)
             else:
                 self.d[slicing] = data
+            if manifest_dataset is not None:
+                manifest_dataset.markComplete(roi, data)
 
         batch_size = None
         if self.BatchSize.ready():
             batch_size = self.BatchSize.value
-        requester = BigRequestStreamer(self.Image, roiFromShape(self.Image.meta.shape), batchSize=batch_size)
+        blockshape = None
+        skip_roi = None
+        if manifest_dataset is not None and manifest_dataset.numCompleted:
+            # Use the blocks of the previous export, and skip the ones that were written correctly
+            blockshape = manifest_dataset.blockshape
+            skip_roi = partial(manifest_dataset.isComplete, read=lambda roi: self.d[roiToSlice(*roi)])
+        requester = BigRequestStreamer(
+            self.Image,
+            roiFromShape(self.Image.meta.shape),
+            blockshape=blockshape,
+            batchSize=batch_size,
+            skipRoi=skip_roi,
+        )
+        if manifest_dataset is not None:
+            manifest_dataset.blockshape = requester.blockshape
         requester.resultSignal.subscribe(handle_block_result)
         requester.progressSignal.subscribe(self.progressSignal)
-        requester.execute()
+        try:
+            requester.execute()
+        except BaseException:
+            if manifest_dataset is not None:
+                # Record all blocks that made it, for a resumed export
+                manifest_dataset.manifest.save()
+            raise
 
         # Be paranoid: Flush right now.
-        if isinstance(self.f, h5py.File):
+        if isinstance(self.f, h5py.Group):
             self.f.file.flush()  # not available in z5py
+        if manifest_dataset is not None:
+            manifest_dataset.finish()
 
         # We're finished.
         result[0] = True
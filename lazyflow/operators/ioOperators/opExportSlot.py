@@ -20,6 +20,7 @@
 # 		   http://ilastik.org/license/
 ###############################################################################
 import contextlib
+import importlib.util
 import os
 from collections import namedtuple
 from functools import partial
@@ -40,20 +41,15 @@ from lazyflow.operators.ioOperators import (
 )
 from lazyflow.roi import roiFromShape
 from lazyflow.utility import OrderedSignal, format_known_keys, PathComponents, mkdir_p, isUrl
+from lazyflow.utility.exportManifest import ExportManifest
 from lazyflow.utility.io_util.write_ome_zarr import (
     write_ome_zarr,
     generate_default_target_scales,
     match_target_scales_to_input_excluding_upscales,
 )
 
-try:
-    from lazyflow.operators.ioOperators import OpExportDvidVolume
-
-    _supports_dvid = True
-except ImportError as ex:
-    if not any(x in ex.args[0] for x in ["OpDvidVolume", "OpExportDvidVolume", "libdvid"]):
-        raise
-    _supports_dvid = False
+# libdvid is only imported when exporting to dvid
+_supports_dvid = importlib.util.find_spec("libdvid") is not None
 
 FormatInfo = namedtuple("FormatInfo", ("name", "extension", "min_dim", "max_dim"))
 
@@ -76,6 +72,9 @@ class OpExportSlot(Operator):
     CoordinateOffset = InputSlot(
         optional=True
     )  # Add an offset to the roi coordinates in the export path (useful if Input is a subregion of a larger dataset)
+    # Continue an interrupted export of a chunked format (hdf5, n5, OME-Zarr) instead of starting over:
+    # Only the blocks that aren't listed in the export manifest (see ExportManifest) are written.
+    ResumeExport = InputSlot(value=False)
 
     ExportPath = OutputSlot()
     TargetScales = OutputSlot()  # Target scales for multi-scale OME-Zarr export
@@ -304,13 +303,20 @@ class OpExportSlot(Operator):
 
         # Create and open the hdf5/n5 file
         export_components = PathComponents(self._get_export_path())
+        resume = self.ResumeExport.value
         try:
             with OpStreamingH5N5Reader.get_h5_n5_file(export_components.externalPath, mode="a") as h5N5File:
                 # Create a temporary operator to do the work for us
                 opH5N5Writer = OpH5N5WriterBigDataset(parent=self)
-                with contextlib.suppress(KeyError):
-                    del h5N5File[export_components.internalPath]
+                if not resume:
+                    with contextlib.suppress(KeyError):
+                        del h5N5File[export_components.internalPath]
+                manifest = ExportManifest(
+                    ExportManifest.pathFor(export_components.externalPath), flush=getattr(h5N5File, "flush", None)
+                )
                 try:
+                    opH5N5Writer.Manifest.setValue(manifest)
+                    opH5N5Writer.Resume.setValue(resume)
                     opH5N5Writer.CompressionEnabled.setValue(compress)
                     opH5N5Writer.h5N5File.setValue(h5N5File)
                     opH5N5Writer.h5N5Path.setValue(export_components.internalPath)
@@ -348,6 +354,8 @@ class OpExportSlot(Operator):
             self.progressSignal(100)
 
     def _export_dvid(self):
+        from lazyflow.operators.ioOperators import OpExportDvidVolume
+
         self.progressSignal(0)
         export_path = self._get_export_path()
 
@@ -445,7 +453,9 @@ class OpExportSlot(Operator):
         self.progressSignal(0)
         offset_meta = self.CoordinateOffset.value if self.CoordinateOffset.ready() else None
         try:
-            write_ome_zarr(self._get_export_path(), self.Input, self.progressSignal, offset_meta)
+            write_ome_zarr(
+                self._get_export_path(), self.Input, self.progressSignal, offset_meta, resume=self.ResumeExport.value
+            )
         finally:
             self.progressSignal(100)
 
@@ -455,7 +465,14 @@ class OpExportSlot(Operator):
         target_scales = self._get_target_scales()
         offset_meta = self.CoordinateOffset.value if self.CoordinateOffset.ready() else None
         try:
-            write_ome_zarr(self._get_export_path(), self.Input, self.progressSignal, offset_meta, target_scales)
+            write_ome_zarr(
+                self._get_export_path(),
+                self.Input,
+                self.progressSignal,
+                offset_meta,
+                target_scales,
+                resume=self.ResumeExport.value,
+            )
         finally:
             self.progressSignal(100)
 
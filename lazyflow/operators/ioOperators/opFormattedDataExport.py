@@ -25,17 +25,21 @@ from builtins import zip
 ###############################################################################
 import os
 import collections
+import logging
 import warnings
 from functools import partial
 
 import numpy
-from typing import Tuple, TypeVar, Type
+from typing import Optional, Tuple, TypeVar, Type
 from pathlib import Path
 
-import z5py
-from ndstructs import Slice5D
+import h5py
+import zarr
+from ndstructs import Shape5D, Slice5D
 
+from lazyflow.distributed.orchestratorBackend import OrchestratorBackend
 from lazyflow.utility import format_known_keys
+from lazyflow.utility.io_util.write_ome_zarr import OME_ZARR_AXES, OME_ZARR_V_0_4_KWARGS, create_empty_ome_zarr
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.roi import roiFromShape
 from lazyflow.operators.generic import OpSubRegion, OpPixelOperator
@@ -44,6 +48,8 @@ from lazyflow.operators.opReorderAxes import OpReorderAxes
 
 from .opExportSlot import OpExportSlot
 
+logger = logging.getLogger(__name__)
+
 DTYPE_IN = TypeVar("DTYPE_IN")
 DTYPE_OUT = TypeVar("DTYPE_OUT")
 
@@ -109,6 +115,7 @@ class OpFormattedDataExport(Operator):
     )  # A format string allowing {roi}, {x_start}, {x_stop}, etc.
     OutputInternalPath = InputSlot(value="exported_data")
     OutputFormat = InputSlot(value="hdf5")
+    ResumeExport = InputSlot(value=False)  # See OpExportSlot.ResumeExport
 
     ConvertedImage = OutputSlot()  # Not yet re-ordered
     ImageToExport = OutputSlot()  # Preview of the pre-processed image that will be exported
@@ -171,6 +178,7 @@ class OpFormattedDataExport(Operator):
         self._opExportSlot = OpExportSlot(parent=self)
         self._opExportSlot.Input.connect(opReorderAxes.Output)
         self._opExportSlot.OutputFormat.connect(self.OutputFormat)
+        self._opExportSlot.ResumeExport.connect(self.ResumeExport)
 
         self.ExportPath.connect(self._opExportSlot.ExportPath)
         self.TargetScales.connect(self._opExportSlot.TargetScales)
@@ -316,35 +324,141 @@ class OpFormattedDataExport(Operator):
     def run_export_to_array(self):
         return self._opExportSlot.run_export_to_array()
 
-    def run_distributed_export(self, block_roi: Slice5D):
-        from lazyflow.distributed.TaskOrchestrator import TaskOrchestrator
+    def run_distributed_export(self, block_roi: Slice5D, orchestrator: Optional[OrchestratorBackend] = None) -> str:
+        """
+        Export in blocks of (at most) the shape of block_roi, which the workers of the orchestrator compute.
+        All processes of the distributed run must call this (see OrchestratorBackend).  Uses MPI by default.
 
-        orchestrator = TaskOrchestrator()
-        n5_file_path = Path(self.OutputFilenameFormat.value).with_suffix(".n5")
-        output_meta = self.ImageToExport.meta
-        if orchestrator.rank == 0:
-            output_shape = output_meta.getShape5D()
-            block_shape = block_roi.clamped(output_shape.to_slice_5d()).shape
+        The workers write N5 and OME-Zarr blocks themselves.  HDF5 blocks are sent to the
+        orchestrating process, which writes all of them.  Other formats are exported as N5.
+        """
+        if orchestrator is None:
+            from lazyflow.distributed.TaskOrchestrator import TaskOrchestrator
 
-            with z5py.File(n5_file_path, "w") as f:
-                ds = f.create_dataset(
-                    self.OutputInternalPath.value,
-                    shape=output_meta.shape,
-                    chunks=block_shape.to_tuple(output_meta.getAxisKeys()),
-                    dtype=output_meta.dtype.__name__,
-                )
-                ds.attrs["axes"] = list(reversed(output_meta.getAxisKeys()))
-                ds[...] = 1  # FIXME: for some reason setting to 0 does nothing
+            orchestrator = TaskOrchestrator()
+        writer = _DistributedExportWriter.for_format(self)
 
-            cutout = self.get_roi()
-            orchestrator.orchestrate(cutout.split(block_shape=block_shape))
+        if orchestrator.is_orchestrator:
+            output_shape = self.ImageToExport.meta.getShape5D()
+            block_shape = block_roi.clamped(output_shape.to_slice_5d()).shape
+            writer.create(block_shape)
+            try:
+                cutout = self.get_roi()
+                orchestrator.orchestrate(
+                    cutout.split(block_shape=block_shape),
+                    on_result=None if writer.workers_write else writer.write_tile,
+                    progress_callback=self.progressSignal,
+                )
+            finally:
+                writer.close()
         else:
 
             def process_tile(tile: Slice5D, rank: int):
                 self.set_roi(tile)
-                slices = tile.to_slices(output_meta.getAxisKeys())
-                with z5py.File(n5_file_path, "r+") as n5_file:
-                    dataset = n5_file[self.OutputInternalPath.value]
-                    dataset[slices] = self.ImageToExport.value
+                data = self.ImageToExport.value
+                if writer.workers_write:
+                    writer.write_tile(tile, data)
+                    return None
+                return data
 
             orchestrator.start_as_worker(process_tile)
+        return str(writer.path)
+
+
+class _DistributedExportWriter:
+    """
+    Creates the output file of a distributed export (in the orchestrating process), and writes the blocks to it.
+    """
+
+    extension = ".n5"
+    workers_write = True  # Whether the workers write their blocks, or send them to the orchestrating process
+
+    @staticmethod
+    def for_format(op: OpFormattedDataExport) -> "_DistributedExportWriter":
+        output_format = op.OutputFormat.value
+        if output_format in ("hdf5", "compressed hdf5"):
+            return _DistributedHdf5Writer(op)
+        if output_format in ("single-scale OME-Zarr", "multi-scale OME-Zarr"):
+            if output_format == "multi-scale OME-Zarr":
+                logger.warning("Distributed export only writes the raw scale of multi-scale OME-Zarr")
+            return _DistributedOmeZarrWriter(op)
+        if output_format not in ("n5", "compressed n5"):
+            logger.info(f"Distributed export doesn't support {output_format}, exporting as n5")
+        return _DistributedExportWriter(op)
+
+    def __init__(self, op: OpFormattedDataExport):
+        self.op = op
+        self.path = Path(op.OutputFilenameFormat.value).with_suffix(self.extension)
+        self.internal_path = op.OutputInternalPath.value
+        self.axiskeys = op.ImageToExport.meta.getAxisKeys()
+
+    def create(self, block_shape: Shape5D):
+        from lazyflow.utility.n5 import z5py
+
+        output_meta = self.op.ImageToExport.meta
+        with z5py.File(self.path, "w") as f:
+            ds = f.create_dataset(
+                self.internal_path,
+                shape=output_meta.shape,
+                chunks=block_shape.to_tuple(self.axiskeys),
+                dtype=output_meta.dtype.__name__,
+            )
+            ds.attrs["axes"] = list(reversed(self.axiskeys))
+            ds[...] = 1  # FIXME: for some reason setting to 0 does nothing
+
+    def write_tile(self, tile: Slice5D, data):
+        from lazyflow.utility.n5 import z5py
+
+        with z5py.File(self.path, "r+") as n5_file:
+            n5_file[self.internal_path][tile.to_slices(self.axiskeys)] = data
+
+    def close(self):
+        pass
+
+
+class _DistributedHdf5Writer(_DistributedExportWriter):
+    """HDF5 files can't be written by several processes at once."""
+
+    extension = ".h5"
+    workers_write = False
+
+    def create(self, block_shape: Shape5D):
+        output_meta = self.op.ImageToExport.meta
+        self._file = h5py.File(self.path, "a")
+        if self.internal_path in self._file:
+            del self._file[self.internal_path]
+        compression = "gzip" if self.op.OutputFormat.value == "compressed hdf5" else None
+        self._dataset = self._file.create_dataset(
+            self.internal_path, shape=output_meta.shape, dtype=output_meta.dtype, chunks=True, compression=compression
+        )
+        self._dataset.attrs["axistags"] = output_meta.axistags.toJSON()
+
+    def write_tile(self, tile: Slice5D, data):
+        self._dataset[tile.to_slices(self.axiskeys)] = data
+
+    def close(self):
+        self._file.close()
+
+
+class _DistributedOmeZarrWriter(_DistributedExportWriter):
+    """Chunks are aligned with the blocks, so the workers write them in parallel."""
+
+    extension = ".zarr"
+
+    def create(self, block_shape: Shape5D):
+        # One time point and channel per chunk, like in regular OME-Zarr exports
+        block_sizes = block_shape.to_tuple("".join(OME_ZARR_AXES))
+        chunk_shape = tuple(1 if axis in "tc" else size for axis, size in zip(OME_ZARR_AXES, block_sizes))
+        create_empty_ome_zarr(str(self.path), self.op.ImageToExport, chunk_shape)
+
+    def write_tile(self, tile: Slice5D, data):
+        store = zarr.storage.FSStore(str(self.path), mode="w", **OME_ZARR_V_0_4_KWARGS)
+        scale_path = zarr.open_group(store, mode="r").attrs["multiscales"][0]["datasets"][0]["path"]
+        zarray = zarr.open_array(store, mode="r+", path=scale_path)
+        # Add the missing axes, and transpose to OME-Zarr axis order
+        data = numpy.asarray(data)
+        missing_axes = [axis for axis in OME_ZARR_AXES if axis not in self.axiskeys]
+        data = data.reshape(data.shape + (1,) * len(missing_axes))
+        data_axes = list(self.axiskeys) + missing_axes
+        data = data.transpose([data_axes.index(axis) for axis in OME_ZARR_AXES])
+        zarray[tile.to_slices("".join(OME_ZARR_AXES))] = data
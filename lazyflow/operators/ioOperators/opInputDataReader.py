@@ -19,6 +19,7 @@
 # This information is also available on the ilastik web site at:
 #          http://ilastik.org/license/
 ###############################################################################
+import importlib.util
 from pathlib import Path
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot
@@ -47,14 +48,8 @@ from .opOMEZarrMultiscaleReader import OpOMEZarrMultiscaleReader
 from .opStreamingUfmfReader import OpStreamingUfmfReader
 from .opStreamingMmfReader import OpStreamingMmfReader
 
-try:
-    from lazyflow.operators.ioOperators import OpDvidVolume, OpDvidRoi
-
-    _supports_dvid = True
-except ImportError as ex:
-    if not any(x in ex.args[0] for x in ["OpDvidVolume", "OpDvidRoi", "libdvid"]):
-        raise
-    _supports_dvid = False
+# libdvid is only imported when a dvid volume is opened
+_supports_dvid = importlib.util.find_spec("libdvid") is not None
 
 try:
     from lazyflow.operators.ioOperators.opH5BlockStoreReader import OpH5BlockStoreReader
@@ -510,6 +505,8 @@ class OpInputDataReader(Operator):
         1) via a file that contains the hostname, uuid, and dataset name (1 per line)
         2) as a url, e.g. http://localhost:8000/api/node/uuid/dataname
         """
+        from lazyflow.operators.ioOperators import OpDvidVolume, OpDvidRoi
+
         if os.path.splitext(filePath)[1] == ".dvidvol":
             with open(filePath) as f:
                 filetext = f.read()
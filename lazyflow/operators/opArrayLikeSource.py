@@ -0,0 +1,77 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+import numpy
+import vigra
+
+from lazyflow.graph import InputSlot, Operator, OutputSlot
+from lazyflow.stype import Opaque
+
+
+class OpArrayLikeSource(Operator):
+    """
+    Provides the data of an array-like object that is only read on request: anything with
+    ``shape``, ``dtype`` and numpy-style slicing, e.g. a zarr array, an h5py dataset,
+    a numpy memmap or a dask array.
+
+    Dask arrays are computed block by block, with dask's synchronous scheduler in the
+    requesting thread, so lazyflow's thread pool provides the parallelism (see also
+    :func:`lazyflow.utility.daskAdapter.slotToDaskArray` for the opposite direction).
+
+    The chunks of the array (if any) are used as ideal blockshape.
+    """
+
+    Array = InputSlot(stype=Opaque)
+    Axes = InputSlot()  # axis keys of the array, e.g. "zyx"
+
+    Output = OutputSlot()
+
+    def setupOutputs(self):
+        array = self.Array.value
+        axes = self.Axes.value
+        if len(axes) != len(array.shape):
+            raise ValueError(f"Axes {axes!r} don't match the array shape {array.shape}")
+
+        self.Output.meta.shape = tuple(array.shape)
+        self.Output.meta.dtype = numpy.dtype(array.dtype).type
+        self.Output.meta.axistags = vigra.defaultAxistags(axes)
+
+        chunks = getattr(array, "chunksize", None) or getattr(array, "chunks", None)
+        if chunks and all(isinstance(size, int) for size in chunks):
+            self.Output.meta.ideal_blockshape = tuple(chunks)
+
+    def execute(self, slot, subindex, roi, result):
+        block = self.Array.value[roi.toSlice()]
+        if hasattr(block, "compute"):
+            block = block.compute(scheduler="synchronous")
+        result[...] = block
+        return result
+
+    def setArray(self, array, axes):
+        """
+        Set the array and its axes.  (Lazy arrays can't be compared with the previous value,
+        so the array slot is always set dirty.)
+        """
+        self.Axes.setValue(axes)
+        self.Array.setValue(array, check_changed=False)
+
+    def propagateDirty(self, slot, subindex, roi):
+        self.Output.setDirty()
@@ -110,12 +110,21 @@ class OpBlockedArrayCache(Operator, ManagedBlockedCache):
     def getBlockAccessTimes(self):
         return self._opSimpleBlockedArrayCache.getBlockAccessTimes()
 
+    def getBlockCosts(self):
+        return self._opSimpleBlockedArrayCache.getBlockCosts()
+
     def freeMemory(self):
         return self._opSimpleBlockedArrayCache.freeMemory()
 
     def freeBlock(self, key):
         return self._opSimpleBlockedArrayCache.freeBlock(key)
 
+    def evictBlock(self, key):
+        return self._opSimpleBlockedArrayCache.evictBlock(key)
+
+    def spilledMemory(self):
+        return self._opSimpleBlockedArrayCache.spilledMemory()
+
     def freeDirtyMemory(self):
         return self._opSimpleBlockedArrayCache.freeDirtyMemory()
 
@@ -188,6 +188,37 @@ class ManagedBlockedCache(ManagedCache):
         """
         raise NotImplementedError("No default implementation for getBlockAccessTimes()")
 
+    def evictBlock(self, block_id):
+        """
+        called by the cache memory manager to free a block
+
+        Caches that support the spill store (see cacheSpillStore.py) demote
+        the block to disk here, before calling freeBlock().
+
+        @return amount of bytes freed from RAM
+        """
+        return self.freeBlock(block_id)
+
+    def spilledMemory(self):
+        """
+        get the number of bytes of this cache that are spilled to disk
+        """
+        return 0
+
+    def generateReport(self, memInfoNode):
+        super(ManagedBlockedCache, self).generateReport(memInfoNode)
+        memInfoNode.spilledMemory = self.spilledMemory()
+
+    def getBlockCosts(self):
+        """
+        get a list of (block id, time stamp, size in bytes, computation time in seconds)
+
+        This is what cost-aware eviction policies base their decisions on.
+        Size and computation time may be None if unknown; the default
+        implementation only knows the time stamps of getBlockAccessTimes().
+        """
+        return [(block_id, t, None, None) for block_id, t in self.getBlockAccessTimes()]
+
     @abstractmethod
     def freeBlock(self, block_id):
         """
@@ -226,6 +257,9 @@ class MemInfoNode(object):
     # fraction of used memory that is dirty
     fractionOfUsedMemoryDirty = None
 
+    # bytes spilled to disk (see cacheSpillStore.py)
+    spilledMemory = None
+
     # python timestamp of last access
     lastAccessTime = None
 
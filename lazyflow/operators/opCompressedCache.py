@@ -39,7 +39,8 @@ import h5py
 # Lazyflow
 from lazyflow.request import Request, RequestPool, RequestLock
 from lazyflow.graph import Operator, InputSlot, OutputSlot
-from lazyflow.roi import TinyVector, getIntersectingBlocks, getBlockBounds, roiToSlice, getIntersection
+from lazyflow.roi import Box, TinyVector, getIntersectingBlocks, getBlockBounds, roiToSlice, getIntersection
+from lazyflow.operators import cacheSpillStore, compressedBlockStore
 from lazyflow.operators.opCache import ManagedBlockedCache
 from lazyflow.utility.chunkHelpers import chooseChunkShape
 from lazyflow.utility.helpers import bigintprod
@@ -51,14 +52,18 @@ def get_storage_size(h5dataset):
     """
     get the storage size allocated for this hdf5 dataset in bytes
 
-    (shorthand for the hidden h5py functionality)
+    (shorthand for the hidden h5py functionality, also works for compressedBlockStore.BloscDataset)
     """
+    if isinstance(h5dataset, compressedBlockStore.BloscDataset):
+        return h5dataset.get_storage_size()
     return h5py.h5d.DatasetID.get_storage_size(h5dataset.id)
 
 
 class OpUnmanagedCompressedCache(Operator):
     """
     A blockwise cache that stores each block as a separate in-memory hdf5 file with a compressed dataset.
+    With the "blosc" backend (see compressedBlockStore.py), blocks are stored as
+    blosc-compressed buffers instead, which avoids the hdf5 overhead.
 
     The files for each block have an internal chunk-shape, which corresponds to
     the amount of data that has to be decompressed for a single pixel lookup.
@@ -96,22 +101,32 @@ class OpUnmanagedCompressedCache(Operator):
     def __init__(self, *args, **kwargs):
         super(OpUnmanagedCompressedCache, self).__init__(*args, **kwargs)
         self._lock = RequestLock()
+        self._spill_owner = cacheSpillStore.newOwner()
         self._init_cache(None)
         self._block_id_counter = itertools.count()  # Used to ensure unique in-memory file names
         self._ignore_ideal_blockshape = False
 
     def _init_cache(self, new_blockshape):
+        spill_store = cacheSpillStore.getSpillStore()
+        if spill_store is not None:
+            spill_store.discardOwner(self._spill_owner)
         with self._lock:
             self._blockshape = new_blockshape
+            self._backend = compressedBlockStore.getDefaultBackend()
             self._cacheFiles = {}
             self._dirtyBlocks = set()
             self._blockLocks = {}
             self._chunkshape = self._chooseChunkshape(self._blockshape)
             self._last_access_times = collections.defaultdict(float)
+            # Time it took to compute each block (used by cost-aware eviction policies)
+            self._block_compute_times = {}
 
     def cleanUp(self):
         logger.debug("Cleaning up")
         self._closeAllCacheFiles()
+        spill_store = cacheSpillStore.getSpillStore()
+        if spill_store is not None:
+            spill_store.discardOwner(self._spill_owner)
         super(OpUnmanagedCompressedCache, self).cleanUp()
 
     def setupOutputs(self):
@@ -182,33 +197,55 @@ class OpUnmanagedCompressedCache(Operator):
 
     def _copyData(self, roi, destination, block_starts):
         # Copy data from each block
-        # (Parallelism not needed here: h5py will serialize these requests anyway)
         logger.debug("Copying data from {} blocks...".format(len(block_starts)))
-        for block_start in block_starts:
-            entire_block_roi = getBlockBounds(self.Output.meta.shape, self._blockshape, block_start)
-
-            # This block's portion of the roi
-            intersecting_roi = getIntersection((roi.start, roi.stop), entire_block_roi)
-
-            # Compute slicing within destination array and slicing within this block
-            destination_relative_intersection = numpy.subtract(intersecting_roi, roi.start)
-            block_relative_intersection = numpy.subtract(intersecting_roi, block_start)
-            destination_relative_intersection_slicing = roiToSlice(*destination_relative_intersection)
-            block_relative_intersection_slicing = roiToSlice(*block_relative_intersection)
-
-            # Copy from block to destination
-            dataset = self._getBlockDataset(entire_block_roi)
-            if self.Output.meta.has_mask:
-                destination.data[destination_relative_intersection_slicing] = dataset["data"][
-                    block_relative_intersection_slicing
-                ]
-                destination.mask[destination_relative_intersection_slicing] = dataset["mask"][
-                    block_relative_intersection_slicing
-                ]
-                destination.fill_value = dataset["fill_value"][()]
-            else:
-                destination[destination_relative_intersection_slicing] = dataset[block_relative_intersection_slicing]
-            self._last_access_times[block_start] = time.time()
+        if self._backend == "blosc" and len(block_starts) > 1:
+            # Blosc releases the GIL, so decompress blocks in parallel
+            reqPool = RequestPool()
+            for block_start in block_starts:
+                reqPool.add(Request(partial(self._copyBlock, roi, destination, block_start)))
+            reqPool.wait()
+        else:
+            # (Parallelism not needed here: h5py will serialize these requests anyway)
+            for block_start in block_starts:
+                self._copyBlock(roi, destination, block_start)
+
+    def _copyBlock(self, roi, destination, block_start):
+        entire_block_roi = getBlockBounds(self.Output.meta.shape, self._blockshape, block_start)
+
+        # This block's portion of the roi
+        intersecting_roi = Box(roi.start, roi.stop).intersection(entire_block_roi)
+        assert intersecting_roi is not None, "Rois do not intersect: {} and {}".format(roi, entire_block_roi)
+
+        # Compute slicing within destination array and slicing within this block
+        destination_relative_intersection_slicing = intersecting_roi.relative_to(roi.start).slicing
+        block_relative_intersection_slicing = intersecting_roi.relative_to(block_start).slicing
+
+        # Copy from block to destination
+        dataset = self._getBlockDataset(entire_block_roi)
+        if isinstance(dataset, compressedBlockStore.BloscBlockFile):
+            dataset["data"].read_direct(
+                destination.data, block_relative_intersection_slicing, destination_relative_intersection_slicing
+            )
+            dataset["mask"].read_direct(
+                destination.mask, block_relative_intersection_slicing, destination_relative_intersection_slicing
+            )
+            destination.fill_value = dataset["fill_value"][()]
+        elif isinstance(dataset, compressedBlockStore.BloscDataset):
+            # Decompresses straight into the destination
+            dataset.read_direct(
+                destination, block_relative_intersection_slicing, destination_relative_intersection_slicing
+            )
+        elif self.Output.meta.has_mask:
+            destination.data[destination_relative_intersection_slicing] = dataset["data"][
+                block_relative_intersection_slicing
+            ]
+            destination.mask[destination_relative_intersection_slicing] = dataset["mask"][
+                block_relative_intersection_slicing
+            ]
+            destination.fill_value = dataset["fill_value"][()]
+        else:
+            destination[destination_relative_intersection_slicing] = dataset[block_relative_intersection_slicing]
+        self._last_access_times[block_start] = time.time()
 
     def _executeCleanBlocks(self, destination):
         """
@@ -242,7 +279,10 @@ class OpUnmanagedCompressedCache(Operator):
         self._ensureCached(block_roi)
         dataset = self._getBlockDataset(block_roi)
         assert str(block_roi) not in destination, "destination hdf5 group already has a dataset with this block's name"
-        destination.copy(dataset, str(block_roi))
+        if self._backend == "blosc":
+            compressedBlockStore.copyToHdf5(dataset, destination, str(block_roi))
+        else:
+            destination.copy(dataset, str(block_roi))
         return destination
 
     def propagateDirty(self, slot, subindex, roi):
@@ -255,6 +295,7 @@ class OpUnmanagedCompressedCache(Operator):
 
                     for block_start in block_starts:
                         self._dirtyBlocks.add(block_start)
+                self._discardSpilledBlocks(block_starts)
             # Forward to downstream connections
             self.Output.setDirty(roi)
         elif slot == self.BlockShape:
@@ -393,13 +434,16 @@ class OpUnmanagedCompressedCache(Operator):
             return self._cacheFiles[block_start]
         with self._lock:
             if block_start not in self._cacheFiles:
-                # Create an in-memory hdf5 file with a unique name
-                # (the counter ensures that even blocks that have been deleted previously get a unique name when they are re-created).
                 logger.debug("Creating a cache file for block: {}".format(list(block_start)))
-                filename = (
-                    str(id(self)) + str(id(self._cacheFiles)) + str(block_start) + str(next(self._block_id_counter))
-                )
-                mem_file = h5py.File(filename, driver="core", backing_store=False, mode="w")
+                if self._backend == "blosc":
+                    mem_file = compressedBlockStore.BloscBlockFile()
+                else:
+                    # Create an in-memory hdf5 file with a unique name
+                    # (the counter ensures that even blocks that have been deleted previously get a unique name when they are re-created).
+                    filename = (
+                        str(id(self)) + str(id(self._cacheFiles)) + str(block_start) + str(next(self._block_id_counter))
+                    )
+                    mem_file = h5py.File(filename, driver="core", backing_store=False, mode="w")
 
                 # h5py will crash if the chunkshape is larger than the dataset shape.
                 datashape = tuple(entire_block_roi[1] - entire_block_roi[0])
@@ -440,7 +484,14 @@ class OpUnmanagedCompressedCache(Operator):
                     # Can't write directly into the hdf5 dataset because
                     #  h5py.dataset.__getitem__ creates a copy, not a view.
                     # We must use a temporary numpy array to hold the data.
-                    data = self.Input(*entire_block_roi).wait()
+                    spill_store = cacheSpillStore.getSpillStore()
+                    spilled = spill_store.take(self._spill_owner, block_start) if spill_store is not None else None
+                    if spilled is not None:
+                        data, self._block_compute_times[block_start] = spilled
+                    else:
+                        compute_start = time.perf_counter()
+                        data = self.Input(*entire_block_roi).wait()
+                        self._block_compute_times[block_start] = time.perf_counter() - compute_start
                     block_file["data"][...] = data
                     if self.Output.meta.has_mask:
                         block_file["mask"][...] = data.mask
@@ -448,11 +499,11 @@ class OpUnmanagedCompressedCache(Operator):
 
                     if logger.isEnabledFor(logging.DEBUG):
                         uncompressed_size = bigintprod(data.shape) * self._getDtypeBytes(data.dtype)
-                        storage_size = block_file["data"].id.get_storage_size()
+                        storage_size = get_storage_size(block_file["data"])
                         if "mask" in block_file:
-                            storage_size += block_file["mask"].id.get_storage_size()
+                            storage_size += get_storage_size(block_file["mask"])
                         if "fill_value" in block_file:
-                            storage_size += block_file["fill_value"].id.get_storage_size()
+                            storage_size += get_storage_size(block_file["fill_value"])
                         logger.debug(
                             "Storage for block: {} is {}. ({}% of original)".format(
                                 block_start, storage_size, 100 * storage_size / uncompressed_size
@@ -494,6 +545,7 @@ class OpUnmanagedCompressedCache(Operator):
 
         block_starts = getIntersectingBlocks(self._blockshape, (roi.start, roi.stop))
         block_starts = list(map(tuple, block_starts))
+        self._discardSpilledBlocks(block_starts)
 
         # Copy data to each block
         logger.debug("Copying data INTO {} blocks...".format(len(block_starts)))
@@ -590,6 +642,7 @@ class OpUnmanagedCompressedCache(Operator):
                 cachefile.copy(value, "data")
 
             block_start = tuple(roi.start)
+            self._discardSpilledBlocks([block_start])
             self._dirtyBlocks.discard(block_start)
         else:
             # This hdf5 data does not correspond to exactly one block.
@@ -621,6 +674,15 @@ class OpUnmanagedCompressedCache(Operator):
         else:
             return block_file["data"]
 
+    def _discardSpilledBlocks(self, block_starts):
+        """
+        Remove outdated copies of the given blocks from the spill store (see OpCompressedCache.evictBlock()).
+        """
+        spill_store = cacheSpillStore.getSpillStore()
+        if spill_store is not None and spill_store.usedBytes(self._spill_owner) > 0:
+            block_starts = set(block_starts)
+            spill_store.discardWhere(self._spill_owner, block_starts.__contains__)
+
     def _closeAllCacheFiles(self):
         logger.debug("Closing all caches")
         cacheFiles = self._cacheFiles
@@ -693,10 +755,50 @@ class OpCompressedCache(OpUnmanagedCompressedCache, ManagedBlockedCache):
             with self._lock:
                 del self._cacheFiles[block_id]
                 del self._last_access_times[block_id]
+                self._block_compute_times.pop(block_id, None)
             return mem
 
+    def evictBlock(self, block_id):
+        spill_store = cacheSpillStore.getSpillStore()
+        if spill_store is None or self.Output.meta.has_mask or block_id not in self._blockLocks:
+            return self.freeBlock(block_id)
+
+        with self._blockLocks[block_id]:
+            try:
+                # Dirty blocks would be recomputed anyway
+                data = None if block_id in self._dirtyBlocks else self._cacheFiles[block_id]["data"][...]
+            except (KeyError, ValueError):
+                # block was freed in the meantime, or its file was closed
+                data = None
+        if data is not None and spill_store.put(
+            self._spill_owner, block_id, data, self._block_compute_times.get(block_id)
+        ):
+            with self._lock:
+                outdated = block_id in self._dirtyBlocks
+            if outdated:
+                spill_store.discard(self._spill_owner, block_id)
+        return self.freeBlock(block_id)
+
+    def spilledMemory(self):
+        spill_store = cacheSpillStore.getSpillStore()
+        return spill_store.usedBytes(self._spill_owner) if spill_store is not None else 0
+
     def getBlockAccessTimes(self):
         with self._lock:
             # needs to be locked because dicts must not change size
             # during iteration
             return [(key, self._last_access_times[key]) for key in self._last_access_times]
+
+    def getBlockCosts(self):
+        with self._lock:
+            keys_and_times = list(self._last_access_times.items())
+        costs = []
+        for key, t in keys_and_times:
+            # actual (compressed) size, as in freeBlock()
+            try:
+                nbytes = get_storage_size(self._cacheFiles[key]["data"])
+            except (KeyError, ValueError):
+                # block was freed in the meantime, or its file was closed
+                nbytes = None
+            costs.append((key, t, nbytes, self._block_compute_times.get(key)))
+        return costs
@@ -125,7 +125,12 @@ class OpConcatenateFeatureMatrices(Operator):
         #  we have to unpack them from their single-element lists.
         subresult_list = list(itertools.chain(*subresults))
 
-        total_matrix = numpy.concatenate(subresult_list, axis=0)
+        non_empty = [matrix for matrix in subresult_list if len(matrix)]
+        if len(non_empty) == 1:
+            # Typically, only one image is labeled: pass its matrix on without copying it
+            total_matrix = non_empty[0]
+        else:
+            total_matrix = numpy.concatenate(subresult_list, axis=0)
         self.progressSignal(100.0)
         result[0] = total_matrix
 
@@ -22,7 +22,9 @@
 from __future__ import division
 from builtins import map
 from functools import partial
+import itertools
 import logging
+import weakref
 
 logger = logging.getLogger(__name__)
 
@@ -32,14 +34,143 @@ from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.request import RequestLock, Request, RequestPool
 from lazyflow.utility import OrderedSignal
 from lazyflow.roi import getBlockBounds, getIntersectingBlocks, determineBlockShape
+from lazyflow.operators.opCache import ObservableCache
 
 
-class OpFeatureMatrixCache(Operator):
+class BlockwiseRowStore:
+    """
+    The rows of a 2D matrix, grouped by block: each block has a (possibly empty) set of rows.
+
+    All rows are kept in one preallocated buffer, in no particular order, so that :py:meth:`matrix`
+    can return them without concatenating anything.  Updating a block only writes its own rows
+    (plus an equal number of rows moved from the end of the buffer to fill gaps, if the block shrinks).
+    The buffer grows by doubling its capacity.
+
+    A matrix returned by :py:meth:`matrix` stays valid: if it (or a view of it) is still in use when
+    the store is modified, the store switches to a copy of the buffer first.
+
+    Not thread-safe.
+    """
+
+    def __init__(self, num_columns: int, dtype=numpy.float32, initial_capacity: int = 1024):
+        self._data = numpy.empty((initial_capacity, num_columns), dtype=dtype)
+        self._owners = numpy.empty(initial_capacity, dtype=numpy.int64)  # block key of each row
+        self._num_rows = 0
+        self._keys = {}  # block id -> block key
+        self._next_key = itertools.count()
+        self._row_counts = {}  # block key -> number of rows
+        self._exported = None  # weakref to the last matrix returned by matrix()
+
+    @property
+    def num_columns(self) -> int:
+        return self._data.shape[1]
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def num_rows(self) -> int:
+        return self._num_rows
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes + self._owners.nbytes
+
+    def block_ids(self):
+        """Ids of the blocks that have rows."""
+        return [block_id for block_id, key in self._keys.items() if self._row_counts.get(key)]
+
+    def row_count(self, block_id) -> int:
+        key = self._keys.get(block_id)
+        return self._row_counts.get(key, 0)
+
+    def update(self, block_id, rows: numpy.ndarray) -> None:
+        """
+        Replace the rows of a block.  An empty rows array removes the block.
+        """
+        assert rows.ndim == 2 and rows.shape[1] == self.num_columns, f"Wrong shape: {rows.shape}"
+        self._ensure_private()
+
+        if block_id not in self._keys:
+            self._keys[block_id] = next(self._next_key)
+        key = self._keys[block_id]
+        positions = numpy.flatnonzero(self._owners[: self._num_rows] == key)
+        num_old, num_new = len(positions), len(rows)
+
+        # Overwrite the existing rows in place, then append or remove the difference
+        num_common = min(num_old, num_new)
+        self._data[positions[:num_common]] = rows[:num_common]
+        if num_new > num_old:
+            self._append(key, rows[num_old:])
+        elif num_new < num_old:
+            self._remove(positions[num_new:])
+
+        if num_new:
+            self._row_counts[key] = num_new
+        else:
+            self._row_counts.pop(key, None)
+            del self._keys[block_id]
+
+    def remove(self, block_id) -> None:
+        if self.row_count(block_id):
+            self.update(block_id, self._data[:0])
+
+    def matrix(self) -> numpy.ndarray:
+        """
+        All rows of all blocks (a view of the buffer, not a copy).
+        """
+        # Arrays created from a memoryview are kept alive by all views that are derived from them,
+        # so the weakref tells us whether anybody still uses the matrix.
+        matrix = numpy.asarray(memoryview(self._data[: self._num_rows]))
+        self._exported = weakref.ref(matrix)
+        return matrix
+
+    def _ensure_private(self):
+        if self._exported is not None and self._exported() is not None:
+            # Copy on write
+            data = numpy.empty_like(self._data)
+            data[: self._num_rows] = self._data[: self._num_rows]
+            self._data = data
+        self._exported = None
+
+    def _append(self, key, rows):
+        start, stop = self._num_rows, self._num_rows + len(rows)
+        if stop > len(self._data):
+            capacity = max(stop, 2 * len(self._data))
+            data = numpy.empty((capacity, self.num_columns), dtype=self._data.dtype)
+            data[:start] = self._data[:start]
+            owners = numpy.empty(capacity, dtype=self._owners.dtype)
+            owners[:start] = self._owners[:start]
+            self._data, self._owners = data, owners
+        self._data[start:stop] = rows
+        self._owners[start:stop] = key
+        self._num_rows = stop
+
+    def _remove(self, positions):
+        """Remove the rows at the given (sorted) positions, filling the gaps with rows from the end."""
+        new_num_rows = self._num_rows - len(positions)
+        gaps = positions[positions < new_num_rows]
+        tail = numpy.arange(new_num_rows, self._num_rows)
+        tail = tail[~numpy.isin(tail, positions)]
+        assert len(gaps) == len(tail)
+        self._data[gaps] = self._data[tail]
+        self._owners[gaps] = self._owners[tail]
+        self._num_rows = new_num_rows
+
+
+class OpFeatureMatrixCache(Operator, ObservableCache):
     """
     - Request features and labels in blocks
     - For nonzero label pixels in each block, extract the label image
-    - Cache the feature matrix for each block separately
-    - Output the concatenation of all feature matrices
+    - Cache the feature matrix for each block separately (all in one BlockwiseRowStore)
+    - Output the matrix of all blocks (without copying it)
+
+    The output matrix must not be modified.  It stays valid after the next update.
 
     Note: This operator does not currently have "NonZeroLabelBlocks" input slot.
           Instead, it only requests labels for blocks that have been
@@ -71,18 +202,33 @@ class OpFeatureMatrixCache(Operator):
 
         self._blockshape = None
         self._dirty_blocks = set()
-        self._blockwise_feature_matrices = {}
+        self._store = None  # BlockwiseRowStore of the label and feature matrices of all blocks
         self._block_locks = {}  # One lock per stored block
 
         self._init_blocks(None, None)
 
+        # Now that we're initialized, it's safe to register with the memory manager
+        self.registerWithMemoryManager()
+
+    def usedMemory(self):
+        store = self._store
+        return 0 if store is None else store.nbytes
+
+    def fractionOfUsedMemoryDirty(self):
+        store = self._store
+        if store is None or store.capacity == 0:
+            return 0.0
+        with self._lock:
+            dirty_rows = sum(store.row_count(block_start) for block_start in self._dirty_blocks)
+        return dirty_rows / store.capacity
+
     def _init_blocks(self, input_shape, new_blockshape):
         old_blockshape = self._blockshape
         if new_blockshape == old_blockshape:
             # Nothing to do
             return
 
-        if len(self._dirty_blocks) != 0 or len(self._blockwise_feature_matrices) != 0:
+        if len(self._dirty_blocks) != 0 or (self._store is not None and self._store.num_rows != 0):
             raise RuntimeError(
                 "It's too late to change the dimensionality of your data after you've already started training.\n"
                 "Delete all your labels and try again."
@@ -117,6 +263,15 @@ class OpFeatureMatrixCache(Operator):
             self.LabelAndFeatureMatrix.meta.num_feature_channels = num_feature_channels
             self.LabelAndFeatureMatrix.setDirty()
 
+        # Labels are converted to float (see above)
+        dtype = numpy.promote_types(numpy.float32, self.FeatureImage.meta.dtype)
+        with self._lock:
+            if self._store is None or (self._store.num_columns, self._store.dtype) != (1 + num_feature_channels, dtype):
+                if self._store is not None:
+                    # All stored matrices have to be computed again
+                    self._dirty_blocks.update(self._store.block_ids())
+                self._store = BlockwiseRowStore(1 + num_feature_channels, dtype)
+
         self.ProgressSignal.meta.shape = (1,)
         self.ProgressSignal.meta.dtype = object
         self.ProgressSignal.setValue(self.progressSignal)
@@ -130,7 +285,7 @@ class OpFeatureMatrixCache(Operator):
                 # A block should never span multiple time slices.
                 # For txy volumes, that could lead to lots of extra features being computed.
                 tagged_shape["t"] = 1
-            blockshape = determineBlockShape(list(tagged_shape.values()), 40 ** 3)
+            blockshape = determineBlockShape(list(tagged_shape.values()), 40**3)
 
         # Don't span more than 256 px along any axis
         blockshape = tuple(min(x, 256) for x in blockshape)
@@ -185,29 +340,16 @@ class OpFeatureMatrixCache(Operator):
                 labels_and_features_matrix = req.result
                 self._dirty_blocks.remove(block_start)
 
-                if labels_and_features_matrix.shape[0] > 0:
-                    # Update the block entry with the new matrix.
-                    self._blockwise_feature_matrices[block_start] = labels_and_features_matrix
-                else:
-                    # All labels were removed from the block,
-                    # So the new feature matrix is empty.
-                    # Just delete its entry from our list.
-                    try:
-                        del self._blockwise_feature_matrices[block_start]
-                    except KeyError:
-                        pass
-
-        # Concatenate the all blockwise results
-        if self._blockwise_feature_matrices:
-            total_feature_matrix = numpy.concatenate(list(self._blockwise_feature_matrices.values()), axis=0)
-        else:
-            # No label points at all.
-            # Return an empty label&feature matrix (of the correct shape)
-            num_feature_channels = self.FeatureImage.meta.shape[-1]
-            total_feature_matrix = numpy.ndarray(shape=(0, 1 + num_feature_channels), dtype=numpy.float32)
+                # Replace the block's rows.
+                # (If all labels were removed from the block, the new matrix is empty, which removes the block.)
+                self._store.update(block_start, labels_and_features_matrix)
+
+            # Only the updated rows were touched, all blocks are returned without copying
+            total_feature_matrix = self._store.matrix()
+            num_blocks = len(self._store.block_ids())
 
         self.progressSignal(100.0)
-        logger.debug("After update, there are {} clean blocks".format(len(self._blockwise_feature_matrices)))
+        logger.debug("After update, there are {} clean blocks".format(num_blocks))
         result[0] = total_feature_matrix
 
     def propagateDirty(self, slot, subindex, roi):
@@ -228,7 +370,8 @@ class OpFeatureMatrixCache(Operator):
             # Technically, this would be inefficient if it's possible for the features
             # to become only partially dirty in a small ROI.
             # But currently, there is no known use-case for that.
-            block_starts = list(self._blockwise_feature_matrices.keys())
+            with self._lock:
+                block_starts = [] if self._store is None else self._store.block_ids()
         else:
             block_starts = getIntersectingBlocks(self._blockshape, (roi.start, roi.stop))
             block_starts = list(map(tuple, block_starts))
@@ -29,12 +29,15 @@ from functools import partial
 
 from lazyflow import roi
 from lazyflow.graph import Operator, InputSlot, OutputSlot
-from lazyflow.request import RequestPool
+from lazyflow.request import Request, RequestPool
 from lazyflow.roi import sliceToRoi, roiToSlice
 from lazyflow.rtype import SubRegion
 
+from . import filterBank, persistentBlockCache
 from .operators import OpArrayPiper
+from .opBlockedArrayCache import OpBlockedArrayCache
 from .filterOperators import (
+    OpBaseFilter,
     OpGaussianSmoothing,
     OpDifferenceOfGaussians,
     OpHessianOfGaussianEigenvalues,
@@ -49,6 +52,33 @@ if WITH_FAST_FILTERS:
 
 logger = logging.getLogger(__name__)
 
+#: Values of OpPixelFeaturesPresmoothed.FilterBackend:
+#: "operators" computes each feature with its own filter operator (see filterOperators.py),
+#: "fused" computes all features of a scale together, sharing Gaussian derivatives (see filterBank.py)
+FILTER_BACKENDS = ("operators", "fused")
+
+# Edge length of the tiles in which pre-smoothed images are cached, 0 disables the tile caches
+_presmoothing_tile_size = 0
+
+
+def setPresmoothingTileSize(size: int) -> None:
+    """
+    Cache the pre-smoothed image of each scale in tiles of the given edge length
+    (in all spatial dimensions), so that neighbouring feature requests reuse the
+    pre-smoothed halo instead of computing it again.  Pass 0 to pre-smooth
+    every request separately (the default).
+
+    Affects operators that are created from now on.
+    """
+    global _presmoothing_tile_size
+    if size < 0:
+        raise ValueError(f"Invalid pre-smoothing tile size {size}")
+    _presmoothing_tile_size = int(size)
+
+
+def getPresmoothingTileSize() -> int:
+    return _presmoothing_tile_size
+
 
 class OpPixelFeaturesPresmoothed(Operator):
     name = "OpPixelFeaturesPresmoothed"
@@ -71,6 +101,9 @@ class OpPixelFeaturesPresmoothed(Operator):
         ]
     )
 
+    # How to compute the features of a block, one of FILTER_BACKENDS
+    FilterBackend = InputSlot(value="operators")
+
     Output = OutputSlot()  # The entire block of features as a single image (many channels)
     Features = OutputSlot(level=1)  # Each feature image listed separately, with feature name provided in metadata
 
@@ -81,6 +114,10 @@ class OpPixelFeaturesPresmoothed(Operator):
         self.source = OpArrayPiper(parent=self)
         self.source.Input.connect(self.Input)
 
+        # One (OpPresmoothing, OpBlockedArrayCache) pair per scale if pre-smoothed tiles are cached
+        self._presmoothingTileSize = getPresmoothingTileSize()
+        self._presmoothingOps = []
+
     def getInvalidScales(self):
         """
         Check each of the scales the user selected against the shape of the input dataset (in space only).
@@ -114,6 +151,7 @@ class OpPixelFeaturesPresmoothed(Operator):
 
         assert self.Input.meta.getAxisKeys() == list("tczyx"), self.Input.meta.getAxisKeys()
         assert isinstance(self.ComputeIn2d.value, list), type(self.ComputeIn2d.value)
+        assert self.FilterBackend.value in FILTER_BACKENDS, f"Unknown filter backend {self.FilterBackend.value}"
         self.scales = self.Scales.value
         self.matrix = self.SelectionMatrix.value
 
@@ -227,6 +265,8 @@ class OpPixelFeaturesPresmoothed(Operator):
 
         self.featureOps = oparray
 
+        self._setupPresmoothingCaches()
+
         # Output meta is a modified copy of the input meta
         self.Output.meta.assignFrom(self.Input.meta)
         self.Output.meta.dtype = numpy.float32
@@ -240,6 +280,46 @@ class OpPixelFeaturesPresmoothed(Operator):
         #        but vigra functions may use internal RAM as well.
         self.Output.meta.ram_usage_per_requested_pixel = 4.0 * self.Output.meta.shape[1]
 
+    def _setupPresmoothingCaches(self):
+        for opPresmoothing, opCache in self._presmoothingOps:
+            if opPresmoothing is not None:
+                opCache.Input.disconnect()
+                opCache.cleanUp()
+                opPresmoothing.Input.disconnect()
+                opPresmoothing.cleanUp()
+        self._presmoothingOps = []
+
+        if not self._presmoothingTileSize:
+            return
+
+        tile_shape = (1, self.Input.meta.shape[1]) + tuple(
+            min(self._presmoothingTileSize, s) for s in self.Input.meta.shape[2:]
+        )
+        for j, scale in enumerate(self.scales):
+            if not self.matrix[:, j].any():
+                self._presmoothingOps.append((None, None))
+                continue
+            opPresmoothing = OpPresmoothing(
+                parent=self,
+                sigma=self._presmoothingSigma(scale),
+                in2d=self.ComputeIn2d.value[j],
+                smoothing_fn=self._computeGaussianSmoothing,
+                window_size=self.WINDOW_SIZE,
+            )
+            opPresmoothing.Input.connect(self.source.Output)
+            opCache = OpBlockedArrayCache(parent=self)
+            opCache.name = f"{self.name}.presmoothed[{scale}]"
+            opCache.BlockShape.setValue(tile_shape)
+            opCache.Input.connect(opPresmoothing.Output)
+            self._presmoothingOps.append((opPresmoothing, opCache))
+
+    @staticmethod
+    def _presmoothingSigma(scale):
+        # The features themselves smooth with sigma 1.0 (at most), so that the combination has the requested scale
+        if scale > 1.0:
+            return math.sqrt(scale**2 - 1.0)
+        return scale
+
     def _get_ideal_blockshape(self):
         assert self.Output.meta.getAxisKeys() == list("tczyx")
 
@@ -287,6 +367,7 @@ class OpPixelFeaturesPresmoothed(Operator):
             or inputSlot == self.Scales
             or inputSlot == self.FeatureIds
             or inputSlot == self.ComputeIn2d
+            or inputSlot == self.FilterBackend
         ):
             self.Output.setDirty(slice(None))
         else:
@@ -345,9 +426,14 @@ class OpPixelFeaturesPresmoothed(Operator):
             target.axistags = copy.copy(axistags)
 
             # filter roi in input frame
-            # sigma = 0.7, because the features receive a pre-smoothed array and don't need much of a neighborhood
+            if self.FilterBackend.value == "fused":
+                # the radius of the derivative kernels plus the structure tensor smoothing, see filterBank.haloSize()
+                filter_halo = (self._fusedHaloSize(), 1.0)
+            else:
+                # sigma = 0.7, because the features receive a pre-smoothed array and don't need much of a neighborhood
+                filter_halo = (0.7, self.WINDOW_SIZE)
             input_filter_start, input_filter_stop = roi.enlargeRoiForHalo(
-                output_start, output_stop, output_shape, 0.7, self.WINDOW_SIZE, enlarge_axes=axes2enlarge
+                output_start, output_stop, output_shape, *filter_halo, enlarge_axes=axes2enlarge
             )
 
             # smooth roi in input frame
@@ -371,80 +457,101 @@ class OpPixelFeaturesPresmoothed(Operator):
             filter_target_slice = roi.roiToSlice(filter_target_start, filter_target_stop)
             input_smooth_slice = roi.roiToSlice(input_smooth_start, input_smooth_stop)
 
-            # pre-smooth for all requested time slices and all channels
-            full_input_smooth_slice = (full_output_slice[0], slice(None), *input_smooth_slice)
-            req = self.Input[full_input_smooth_slice]
-            source = req.wait()
-            req.clean()
-            req.destination = None
-            if source.dtype != numpy.float32:
-                sourceF = source.astype(numpy.float32)
-                try:
-                    source.resize((1,), refcheck=False)
-                except Exception:
-                    pass
-                del source
-                source = sourceF
-
-            sourceV = source.view(vigra.VigraArray)
-            sourceV.axistags = copy.copy(self.Input.meta.axistags)
-
             dimCol = len(self.scales)
             dimRow = self.matrix.shape[0]
+            persistent_cache = persistentBlockCache.getPersistentCache()
+
+            if self._presmoothingOps:
+                # pre-smoothed tiles are cached per scale, only assemble the filter roi from them
+                full_input_filter_slice = (
+                    full_output_slice[0],
+                    slice(None),
+                    *roiToSlice(input_filter_start, input_filter_stop),
+                )
+                presmoothed_source = self._readPresmoothedTiles(full_input_filter_slice)
+                if persistent_cache is not None:
+                    persistent_key = self._persistentCacheKey(
+                        slot_roi, full_input_filter_slice, *(p for p in presmoothed_source if p is not None)
+                    )
+                    if persistent_cache.get(persistent_key, target):
+                        return
+            else:
+                # pre-smooth for all requested time slices and all channels
+                full_input_smooth_slice = (full_output_slice[0], slice(None), *input_smooth_slice)
+                req = self.Input[full_input_smooth_slice]
+                source = req.wait()
+                req.clean()
+                req.destination = None
+
+                if persistent_cache is not None:
+                    persistent_key = self._persistentCacheKey(slot_roi, full_input_smooth_slice, source)
+                    if persistent_cache.get(persistent_key, target):
+                        return
+                if source.dtype != numpy.float32:
+                    sourceF = source.astype(numpy.float32)
+                    try:
+                        source.resize((1,), refcheck=False)
+                    except Exception:
+                        pass
+                    del source
+                    source = sourceF
 
-            presmoothed_source = [None] * dimCol
-
-            source_smooth_shape = tuple(smooth_filter_stop - smooth_filter_start)
-            full_source_smooth_shape = (
-                full_output_stop[0] - full_output_start[0],
-                self.Input.meta.shape[1],
-            ) + source_smooth_shape
-            try:
-                for j in range(dimCol):
-                    for i in range(dimRow):
-                        if self.matrix[i, j]:
-                            # There is at least one filter op with this scale
-                            break
-                    else:
-                        # There is no filter op at this scale
-                        continue
-
-                    if self.scales[j] > 1.0:
-                        tempSigma = math.sqrt(self.scales[j] ** 2 - 1.0)
-                    else:
-                        tempSigma = self.scales[j]
+                sourceV = source.view(vigra.VigraArray)
+                sourceV.axistags = copy.copy(self.Input.meta.axistags)
 
-                    presmoothed_source[j] = numpy.ndarray(full_source_smooth_shape, numpy.float32)
+                presmoothed_source = [None] * dimCol
 
-                    droi = (
-                        (0, *tuple(smooth_filter_start._asint())),
-                        (sourceV.shape[1], *tuple(smooth_filter_stop._asint())),
-                    )
-                    for i, vsa in enumerate(sourceV.timeIter()):
-                        presmoothed_source[j][i, ...] = self._computeGaussianSmoothing(
-                            vsa, tempSigma, droi, in2d=self.ComputeIn2d.value[j]
+                source_smooth_shape = tuple(smooth_filter_stop - smooth_filter_start)
+                full_source_smooth_shape = (
+                    full_output_stop[0] - full_output_start[0],
+                    self.Input.meta.shape[1],
+                ) + source_smooth_shape
+                try:
+                    for j in range(dimCol):
+                        for i in range(dimRow):
+                            if self.matrix[i, j]:
+                                # There is at least one filter op with this scale
+                                break
+                        else:
+                            # There is no filter op at this scale
+                            continue
+
+                        tempSigma = self._presmoothingSigma(self.scales[j])
+
+                        presmoothed_source[j] = numpy.ndarray(full_source_smooth_shape, numpy.float32)
+
+                        droi = (
+                            (0, *tuple(smooth_filter_start._asint())),
+                            (sourceV.shape[1], *tuple(smooth_filter_stop._asint())),
                         )
+                        for i, vsa in enumerate(sourceV.timeIter()):
+                            presmoothed_source[j][i, ...] = self._computeGaussianSmoothing(
+                                vsa, tempSigma, droi, in2d=self.ComputeIn2d.value[j]
+                            )
 
-            except RuntimeError as e:
-                if "kernel longer than line" in str(e):
-                    raise RuntimeError(
-                        "Feature computation error:\nYour image is too small to apply a filter with "
-                        f"sigma={self.scales[j]:.1f}. Please select features with smaller sigmas."
-                    )
-                else:
-                    raise e
+                except RuntimeError as e:
+                    if "kernel longer than line" in str(e):
+                        raise RuntimeError(
+                            "Feature computation error:\nYour image is too small to apply a filter with "
+                            f"sigma={self.scales[j]:.1f}. Please select features with smaller sigmas."
+                        )
+                    else:
+                        raise e
 
-            del sourceV
-            try:
-                source.resize((1,), refcheck=False)
-            except ValueError:
-                # Sometimes this fails, but that's okay.
-                logger.debug("Failed to free array memory.")
-            del source
+                del sourceV
+                try:
+                    source.resize((1,), refcheck=False)
+                except ValueError:
+                    # Sometimes this fails, but that's okay.
+                    logger.debug("Failed to free array memory.")
+                del source
 
             cnt = 0
             written = 0
             closures = []
+            fused = self.FilterBackend.value == "fused"
+            # scale index -> [(feature index, first channel, stop channel, target)]
+            fused_features = {}
             # connect individual operators
             for i in range(dimRow):
                 for j in range(dimCol):
@@ -468,6 +575,12 @@ class OpPixelFeaturesPresmoothed(Operator):
                             feature_slice = (slice(None), slice(written, written + end - begin)) + (slice(None),) * 3
 
                             subtarget = target[feature_slice]
+                            if fused:
+                                fused_features.setdefault(j, []).append((i, begin, end, subtarget))
+                                written += end - begin
+                                cnt += slices
+                                continue
+
                             # readjust the roi for the new source array
                             full_filter_target_slice = [full_output_slice[0], slice(begin, end), *filter_target_slice]
                             filter_target_roi = SubRegion(oslot, pslice=full_filter_target_slice)
@@ -484,12 +597,32 @@ class OpPixelFeaturesPresmoothed(Operator):
 
                             written += end - begin
                         cnt += slices
+
+            for j, features in fused_features.items():
+                # All features of a scale are computed together, separately for each time step and channel
+                for tstep in range(presmoothed_source[j].shape[0]):
+                    for channel in range(presmoothed_source[j].shape[1]):
+                        closures.append(
+                            partial(
+                                self._computeFusedFeatures,
+                                presmoothed_source[j][tstep, channel],
+                                filter_target_slice,
+                                j,
+                                features,
+                                tstep,
+                                channel,
+                            )
+                        )
+
             pool = RequestPool()
             for c in closures:
                 pool.request(c)
             pool.wait()
             pool.clean()
 
+            if persistent_cache is not None:
+                persistent_cache.put(persistent_key, target)
+
             for i in range(len(presmoothed_source)):
                 if presmoothed_source[i] is not None:
                     try:
@@ -497,6 +630,101 @@ class OpPixelFeaturesPresmoothed(Operator):
                     except Exception:
                         presmoothed_source[i] = None
 
+    def _fusedHaloSize(self):
+        used_scales = [scale for j, scale in enumerate(self.newScales) if self.matrix[:, j].any()]
+        return max((filterBank.haloSize(scale, OpBaseFilter.window_size_feature) for scale in used_scales), default=0)
+
+    def _computeFusedFeatures(self, source, result_slicing, j, features, tstep, channel):
+        """
+        Compute the requested features of scale j for one channel of the pre-smoothed source (zyx),
+        and write them directly into their targets.
+        """
+        # Like the filter operators, only filter along axes that are not singletons.
+        # Features that are computed in 2D are computed slice by slice.
+        banks = {}  # filtered axes -> [(z index into the target, FilterBank)]
+        for i, begin, end, subtarget in features:
+            op = self.featureOps[i][j]
+            channels_per_input = op.resultingChannels()
+            # Channels of this feature that belong to the given input channel
+            first = max(begin, channel * channels_per_input)
+            stop = min(end, (channel + 1) * channels_per_input)
+            if first >= stop:
+                continue
+
+            space_axes = "yx" if op.invalid_z or op.ComputeIn2d.value else "zyx"
+            axes = tuple(key for key, size in zip("zyx", self.Input.meta.shape[2:]) if key in space_axes and size > 1)
+            if axes not in banks:
+                banks[axes] = self._fusedFilterBanks(source, result_slicing, self.newScales[j], axes)
+
+            target = subtarget[tstep, first - begin : stop - begin]
+            for z, bank in banks[axes]:
+                # drop the axes that are not filtered (singletons, or z when computing slice by slice)
+                out = target[(slice(None),) + tuple(slice(None) if key in axes else z for key in "zyx")]
+                bank.feature(self.FeatureIds.value[i], out, first_channel=first - channel * channels_per_input)
+
+    def _fusedFilterBanks(self, source, result_slicing, scale, axes):
+        """[(z index into the target, FilterBank)] that compute features over the given axes of source (zyx)"""
+        window_size = OpBaseFilter.window_size_feature
+
+        def filtered(key, z):
+            return slice(None) if key in axes else z
+
+        slicing = tuple(s for key, s in zip("zyx", result_slicing) if key in axes)
+        if "z" in axes:
+            image = source[tuple(filtered(key, 0) for key in "zyx")]
+            return [(0, filterBank.FilterBank(image, slicing, scale, window_size))]
+
+        # filter each z slice separately
+        z_start, z_stop, _ = result_slicing[0].indices(source.shape[0])
+        return [
+            (
+                target_z,
+                filterBank.FilterBank(source[tuple(filtered(key, z) for key in "zyx")], slicing, scale, window_size),
+            )
+            for target_z, z in enumerate(range(z_start, z_stop))
+        ]
+
+    def _readPresmoothedTiles(self, input_slicing):
+        """
+        Read the given region of the pre-smoothed image of each scale from the tile caches.
+        """
+        presmoothed_source = [None] * len(self.scales)
+        pool = RequestPool()
+        for j, (opPresmoothing, opCache) in enumerate(self._presmoothingOps):
+            if opCache is not None:
+
+                def read(j, req):
+                    presmoothed_source[j] = req.wait()
+
+                pool.add(Request(partial(read, j, opCache.Output[input_slicing])))
+        pool.wait()
+        pool.clean()
+        return presmoothed_source
+
+    def _persistentCacheKey(self, slot_roi, input_slicing, *sources):
+        """
+        Key of the requested output block in the persistent cache (see persistentBlockCache.py).
+
+        The input is identified by the content of the region the block is computed from
+        (the raw input, or the pre-smoothed images if these are cached in tiles),
+        so the cache stays valid across sessions, and the key changes when the data does.
+        """
+        return persistentBlockCache.blockKey(
+            self.name,
+            "fastfilters" if WITH_FAST_FILTERS else "vigra",
+            self.FilterBackend.value,
+            list(self.FeatureIds.value),
+            [float(scale) for scale in self.scales],
+            numpy.asarray(self.matrix, dtype=bool),
+            [bool(in2d) for in2d in self.ComputeIn2d.value],
+            self.WINDOW_SIZE,
+            tuple(map(int, self.Input.meta.shape)),
+            tuple(map(int, slot_roi.start)),
+            tuple(map(int, slot_roi.stop)),
+            [tuple(map(int, bound)) for bound in sliceToRoi(input_slicing, self.Input.meta.shape)],
+            *sources,
+        )
+
     def _computeGaussianSmoothing(self, vol, sigma, roi, in2d):
         if WITH_FAST_FILTERS:
             # Use fast filters (if available)
@@ -524,3 +752,61 @@ class OpPixelFeaturesPresmoothed(Operator):
             # vigra's filter functions need roi without channels axis
             vigra_roi = (roi[0][1:], roi[1][1:])
             return vigra.filters.gaussianSmoothing(vol, sigma, roi=vigra_roi, window_size=self.WINDOW_SIZE)
+
+
+class OpPresmoothing(Operator):
+    """
+    Gaussian pre-smoothing of the input for a single scale of OpPixelFeaturesPresmoothed.
+
+    Each request is computed from the requested region plus a halo of ``window_size * sigma``,
+    so the result is the same as if the whole image had been smoothed at once.
+    OpPixelFeaturesPresmoothed caches the output in tiles, see setPresmoothingTileSize().
+    """
+
+    Input = InputSlot()
+    Output = OutputSlot()
+
+    def __init__(self, *args, sigma, in2d, smoothing_fn, window_size, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sigma = sigma
+        self.in2d = in2d
+        self.smoothing_fn = smoothing_fn
+        self.window_size = window_size
+
+    def setupOutputs(self):
+        assert self.Input.meta.getAxisKeys() == list("tczyx"), self.Input.meta.getAxisKeys()
+        self.Output.meta.assignFrom(self.Input.meta)
+        self.Output.meta.dtype = numpy.float32
+
+    def _enlargeForHalo(self, start, stop):
+        """Enlarge the spatial part of a tczyx roi by the smoothing halo."""
+        enlarged_start, enlarged_stop = roi.enlargeRoiForHalo(
+            start[2:],
+            stop[2:],
+            self.Input.meta.shape[2:],
+            self.sigma,
+            self.window_size,
+            enlarge_axes=(0, 1, 1) if self.in2d else (1, 1, 1),
+        )
+        return (*start[:2], *enlarged_start), (*stop[:2], *enlarged_stop)
+
+    def execute(self, slot, subindex, slot_roi, result):
+        source_start, source_stop = self._enlargeForHalo(slot_roi.start, slot_roi.stop)
+        source = self.Input(source_start, source_stop).wait()
+        if source.dtype != numpy.float32:
+            source = source.astype(numpy.float32)
+
+        sourceV = source.view(vigra.VigraArray)
+        sourceV.axistags = copy.copy(self.Input.meta.axistags)
+
+        # result roi relative to the source, without the time axis
+        droi = (
+            (0, *(int(b - s) for b, s in zip(slot_roi.start[2:], source_start[2:]))),
+            (source.shape[1], *(int(e - s) for e, s in zip(slot_roi.stop[2:], source_start[2:]))),
+        )
+        for i, vsa in enumerate(sourceV.timeIter()):
+            result[i, ...] = self.smoothing_fn(vsa, self.sigma, droi, in2d=self.in2d)
+
+    def propagateDirty(self, slot, subindex, dirty_roi):
+        dirty_start, dirty_stop = self._enlargeForHalo(dirty_roi.start, dirty_roi.stop)
+        self.Output.setDirty(dirty_start, dirty_stop)
@@ -30,6 +30,7 @@ import numpy.typing as npt
 import vigra
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot
+from lazyflow.operators import cacheSpillStore
 from lazyflow.operators.opCache import ManagedBlockedCache
 from lazyflow.request import RequestLock
 from lazyflow.roi import getIntersection, roiFromShape, roiToSlice, containing_rois
@@ -67,6 +68,7 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
     def __init__(self, *args, **kwargs):
         super(OpUnblockedArrayCache, self).__init__(*args, **kwargs)
         self._lock = RequestLock()
+        self._spill_owner = cacheSpillStore.newOwner()
         self._resetBlocks()
 
         self.Input.notifyUnready(self._resetBlocks)
@@ -151,17 +153,28 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
                     self.Output.stype.copy_data(out, self._block_data[block_roi][:])
                     return out
 
+            spill_store = cacheSpillStore.getSpillStore()
+            spilled = spill_store.take(self._spill_owner, block_roi, out) if spill_store is not None else None
+            if spilled is not None:
+                block_data, compute_time = spilled
+                self._store_block_data(block_roi, block_data, compute_time=compute_time)
+                return block_data
+
             req = self.Input(*block_roi)
             if out is not None:
                 req.writeInto(out)
+            compute_start = time.perf_counter()
             block_data = req.wait()
-            self._store_block_data(block_roi, block_data)
+            self._store_block_data(block_roi, block_data, compute_time=time.perf_counter() - compute_start)
         return block_data
 
-    def _store_block_data(self, block_roi, block_data):
+    def _store_block_data(self, block_roi, block_data, compute_time=None):
         """
         Copy block_data and store it into the cache.
         The block_lock is not obtained here, so lock it before you call this.
+
+        compute_time is the time it took to produce block_data (None if unknown).
+        It is used by cost-aware eviction policies.
         """
         with self._lock:
             if self.CompressionEnabled.value and numpy.dtype(block_data.dtype) in [
@@ -183,6 +196,7 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             # (Could have happened via propagateDirty() or eventually the arrayCacheMemoryMgr)
             if block_roi in self._block_locks:
                 self._block_data[block_roi] = block_storage_data
+                self._block_compute_times[block_roi] = compute_time
 
         self._last_access_times[block_roi] = time.time()
 
@@ -202,6 +216,9 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             block_lock = self._block_locks[block_roi]
 
         with block_lock:
+            spill_store = cacheSpillStore.getSpillStore()
+            if spill_store is not None:
+                spill_store.discard(self._spill_owner, block_roi)
             self._store_block_data(block_roi, block_data)
 
     def propagateDirty(self, slot, subindex, roi):
@@ -223,6 +240,13 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
                 if getIntersection(block_roi, dirty_roi, assertIntersect=False):
                     self.freeBlock(block_roi)
 
+            spill_store = cacheSpillStore.getSpillStore()
+            if spill_store is not None:
+                spill_store.discardWhere(
+                    self._spill_owner,
+                    lambda block_roi: getIntersection(block_roi, dirty_roi, assertIntersect=False) is not None,
+                )
+
         self.Output.setDirty(roi.start, roi.stop)
 
     ##
@@ -258,6 +282,15 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             l = [(k, self._last_access_times[k]) for k in self._last_access_times]
         return l
 
+    def getBlockCosts(self):
+        with self._lock:
+            costs = []
+            for k, t in self._last_access_times.items():
+                block = self._block_data.get(k)
+                nbytes = block.size * numpy.dtype(block.dtype).itemsize if block is not None else None
+                costs.append((k, t, nbytes, self._block_compute_times.get(k)))
+        return costs
+
     def freeMemory(self):
         used = self.usedMemory()
         self._resetBlocks()
@@ -273,13 +306,50 @@ class OpUnblockedArrayCache(Operator, ManagedBlockedCache):
             del self._block_data[key]
             del self._block_locks[key]
             del self._last_access_times[key]
+            self._block_compute_times.pop(key, None)
             return mem
 
+    def evictBlock(self, key):
+        spill_store = cacheSpillStore.getSpillStore()
+        if spill_store is None:
+            return self.freeBlock(key)
+
+        with self._lock:
+            block = self._block_data.get(key)
+            compute_time = self._block_compute_times.get(key)
+        if block is None:
+            return 0
+
+        # Decompress chunked blocks; masked arrays are not spilled (see SpillStore.put()).
+        data = block[:] if isinstance(block, vigra.ChunkedArrayCompressed) else block
+        if spill_store.put(self._spill_owner, key, data, compute_time):
+            with self._lock:
+                still_cached = self._block_data.get(key) is block
+            if not still_cached:
+                # The block was freed (e.g. marked dirty) while we were writing it.
+                spill_store.discard(self._spill_owner, key)
+        return self.freeBlock(key)
+
+    def spilledMemory(self):
+        spill_store = cacheSpillStore.getSpillStore()
+        return spill_store.usedBytes(self._spill_owner) if spill_store is not None else 0
+
     def freeDirtyMemory(self):
         return 0.0
 
+    def cleanUp(self):
+        self._discardSpilledBlocks()
+        super(OpUnblockedArrayCache, self).cleanUp()
+
+    def _discardSpilledBlocks(self):
+        spill_store = cacheSpillStore.getSpillStore()
+        if spill_store is not None:
+            spill_store.discardOwner(self._spill_owner)
+
     def _resetBlocks(self, *_):
+        self._discardSpilledBlocks()
         with self._lock:
             self._block_data = {}
             self._block_locks = {}
+            self._block_compute_times = {}
             self._last_access_times = collections.defaultdict(float)
@@ -0,0 +1,226 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Persistent on-disk cache for computed blocks, shared across sessions and processes.
+
+Unlike the in-memory caches, entries are not invalidated by dirty notifications.
+Instead, the key of an entry must identify its content completely: operators
+build it with :func:`blockKey` from their configuration, the requested roi and
+the *content* of the input data the block was computed from.  Changed inputs
+(or settings) simply lead to new keys, and stale entries age out.
+
+Each entry is one .npy file.  Reading an entry updates its modification time, so
+when the cache grows beyond its capacity, the least recently used entries are deleted.
+
+The cache is disabled by default.  Enable it with::
+
+    from lazyflow.operators import persistentBlockCache
+    persistentBlockCache.configure("~/.cache/ilastik/blocks", capacity=20 * 1024**3)
+
+or in the ilastik config file (``[lazyflow] persistent_cache_dir`` and ``persistent_cache_mb``).
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+# Bump when the file format or the meaning of keys changes
+_LAYOUT_VERSION = "v1"
+
+# When pruning, delete entries until the cache is this full
+_PRUNE_TARGET = 0.9
+
+
+def blockKey(*parts) -> str:
+    """
+    Hash the given parts into a cache key.
+
+    Arrays are hashed by dtype, shape and content; everything else by its repr().
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, numpy.ndarray):
+            h.update(f"ndarray {part.dtype.str} {part.shape}".encode())
+            h.update(memoryview(numpy.ascontiguousarray(part)).cast("B"))
+        else:
+            h.update(repr(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class PersistentBlockCache:
+    """
+    Directory of cached blocks with a size limit.
+
+    Several processes may use the same directory: files are written atomically,
+    and every process prunes based on what is actually on disk.
+    """
+
+    def __init__(self, directory: str, capacity: int):
+        self.directory = os.path.join(os.path.expanduser(directory), _LAYOUT_VERSION)
+        self.capacity = capacity
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._used = sum(size for _, _, size in self._entries())
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, out: numpy.ndarray) -> bool:
+        """
+        Read the block into out.
+
+        :return: False if the block is not cached (or has a different shape or dtype).
+        """
+        path = self._path(key)
+        hit = False
+        try:
+            cached = numpy.load(path, mmap_mode="r", allow_pickle=False)
+            if cached.shape != out.shape or cached.dtype != out.dtype:
+                logger.warning(f"Ignoring cached block {path} of unexpected shape {cached.shape} or dtype")
+            else:
+                out[...] = cached
+                os.utime(path)
+                hit = True
+            del cached
+        except (OSError, ValueError):
+            # Not cached, deleted by another process in the meantime, or a truncated file
+            pass
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hit
+
+    def put(self, key: str, data: numpy.ndarray) -> None:
+        if data.nbytes > self.capacity:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                numpy.save(f, numpy.asarray(data), allow_pickle=False)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                # The entry may exist already (written by another thread or process)
+                replaced_size = _size(path)
+                os.replace(tmp_path, path)
+                self._used += size - replaced_size
+                need_pruning = self._used > self.capacity
+        except OSError:
+            logger.warning(f"Could not write cached block {path}", exc_info=True)
+            _remove(tmp_path)
+            return
+
+        if need_pruning:
+            self.prune()
+
+    def prune(self, target: Optional[int] = None) -> None:
+        """
+        Delete least recently used entries until at most ``target`` bytes are used
+        (default: 90% of the capacity).
+        """
+        if target is None:
+            target = int(_PRUNE_TARGET * self.capacity)
+        entries = sorted(self._entries())
+        used = sum(size for _, _, size in entries)
+        removed = 0
+        for _, path, size in entries:
+            if used <= target:
+                break
+            if _remove(path):
+                used -= size
+                removed += 1
+        with self._lock:
+            self._used = used
+        logger.debug(f"Pruned {removed} entries from {self.directory}, {used / 1024**2:.0f} MB left")
+
+    def usedBytes(self) -> int:
+        return self._used
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".npy")
+
+    def _entries(self):
+        """(last access time, path, size) of all entries on disk."""
+        for subdir in os.scandir(self.directory):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if not entry.name.endswith(".npy"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield stat.st_mtime, entry.path, stat.st_size
+
+
+def _size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _remove(path) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+_cache: Optional[PersistentBlockCache] = None
+
+
+def configure(directory: Optional[str], capacity: int) -> Optional[PersistentBlockCache]:
+    """
+    Use the given directory as persistent block cache, with a size limit of ``capacity`` bytes.
+    Pass directory=None (or capacity=0) to disable the cache.  Existing entries are kept.
+    """
+    global _cache
+    _cache = None
+    if directory and capacity > 0:
+        _cache = PersistentBlockCache(directory, capacity)
+        if _cache.usedBytes() > capacity:
+            _cache.prune()
+        logger.info(
+            f"Persistent block cache in {_cache.directory}: "
+            f"{_cache.usedBytes() / 1024**2:.0f} of {capacity / 1024**2:.0f} MB used"
+        )
+    return _cache
+
+
+def getPersistentCache() -> Optional[PersistentBlockCache]:
+    """
+    Return the active persistent cache, or None if it is disabled.
+    """
+    return _cache
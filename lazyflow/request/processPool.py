@@ -0,0 +1,288 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Process pool for computations that hold the GIL.
+
+Requests run in threads, so pure-Python code (and C extensions that don't release the GIL)
+can't use more than one core, no matter how many requests run in parallel.  Functions
+marked with :func:`kernel` run in a pool of worker processes instead, if the pool is enabled::
+
+    from lazyflow.request import processPool
+
+    @processPool.kernel(outputs=["out"])
+    def _count_labels(labels, *, out):
+        for label in labels.flat:  # slow python loop
+            out[label] += 1
+
+    class OpCountLabels(Operator):
+        def execute(self, slot, subindex, roi, result):
+            labels = self.Input(roi.start, roi.stop).wait()
+            _count_labels(labels, out=result)
+
+* Kernels must be module-level functions, so that the worker processes can import them.
+* numpy arrays among the arguments are passed through shared memory instead of being pickled.
+  Kernels receive plain numpy arrays (no vigra axistags).  All other arguments and the return
+  value are pickled, so they should be small.
+* Arrays passed as one of the ``outputs`` keyword arguments are copied back after the kernel
+  has finished.  Their content is undefined when the kernel starts.
+* The calling request is suspended (it doesn't block its worker thread) until the kernel is done.
+  If the request is cancelled meanwhile, it stops waiting immediately.  Kernels that run for a
+  long time should check :func:`isCancelled` now and then, and return early.
+
+The pool is disabled by default: kernels are simply called in the current thread.  Enable it with
+``processPool.configure(num_workers)``, or in the ilastik config file (``[lazyflow] process_workers``).
+"""
+import concurrent.futures
+import functools
+import importlib
+import logging
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+from typing import Callable, Optional, Sequence
+
+import numpy
+
+from .request import Request, RequestLock
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def configure(num_workers: int) -> None:
+    """
+    Run kernels in a pool of num_workers processes from now on.  Pass 0 to run them in the calling thread.
+    Kernels that are still running in the previous pool are finished in the background.
+    """
+    global _executor
+    executor = None
+    if num_workers > 0:
+        # Forking a process that runs many threads is not safe, so workers are always started fresh
+        executor = concurrent.futures.ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Running process pool kernels in {num_workers} worker processes")
+
+    with _executor_lock:
+        previous, _executor = _executor, executor
+    if previous is not None:
+        previous.shutdown(wait=False, cancel_futures=True)
+
+
+def numWorkers() -> int:
+    executor = _executor
+    return 0 if executor is None else executor._max_workers
+
+
+def kernel(fn: Optional[Callable] = None, *, outputs: Sequence[str] = ()):
+    """
+    Decorator for module-level functions that may run in the process pool (see module docs).
+
+    :param outputs: names of keyword arguments that take output arrays
+    """
+    if fn is None:
+        return functools.partial(kernel, outputs=outputs)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        executor = _executor
+        if executor is None:
+            return fn(*args, **kwargs)
+        return _Task(executor, wrapper, args, kwargs).run()
+
+    wrapper.outputs = tuple(outputs)
+    return wrapper
+
+
+# Cancellation flag of the kernel that runs in this worker process
+_worker_cancel_flag: Optional[numpy.ndarray] = None
+
+
+def isCancelled() -> bool:
+    """
+    Return True if the request that called the current kernel was cancelled.
+    """
+    if _worker_cancel_flag is not None:
+        return bool(_worker_cancel_flag[0])
+    return bool(Request.current_request_is_cancelled())
+
+
+class _SharedArray:
+    """Picklable reference to an array in shared memory."""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def attach(self):
+        shm = shared_memory.SharedMemory(name=self.name)
+        return shm, numpy.ndarray(self.shape, self.dtype, buffer=shm.buf)
+
+
+def _shareable(value) -> bool:
+    return isinstance(value, numpy.ndarray) and not value.dtype.hasobject
+
+
+class _Task:
+    """
+    One call of a kernel in the process pool, from the point of view of the calling request.
+    """
+
+    def __init__(self, executor, wrapper, args, kwargs):
+        self._executor = executor
+        self._wrapper = wrapper
+        self._args = args
+        self._kwargs = kwargs
+        self._future = None
+        self._shared_memory = []
+        self._outputs = []  # (array of the caller, shared copy)
+        self._cancel_flag = None
+
+        self._state_lock = threading.Lock()
+        self._woken = False
+
+    def run(self):
+        Request.raise_if_cancelled()
+        try:
+            cancel_flag, self._cancel_flag = self._share(numpy.zeros(1, dtype=numpy.uint8))
+            args = tuple(self._shareArgument(arg) for arg in self._args)
+            kwargs = {}
+            for name, value in self._kwargs.items():
+                if name in self._wrapper.outputs and _shareable(value):
+                    kwargs[name], shared = self._share(value, copy=False)
+                    self._outputs.append((value, shared))
+                else:
+                    kwargs[name] = self._shareArgument(value)
+
+            self._future = self._executor.submit(
+                _runKernel, self._wrapper.__module__, self._wrapper.__qualname__, cancel_flag, args, kwargs
+            )
+            result = self._wait()
+            for output, shared in self._outputs:
+                output[...] = shared
+            return result
+        finally:
+            if self._future is None or self._future.done():
+                self._releaseSharedMemory()
+            else:
+                # Cancelled, but the kernel is still running and may still access the shared memory
+                self._future.add_done_callback(lambda _: self._releaseSharedMemory())
+
+    def _wait(self):
+        current_request = Request._current_request()
+        if current_request is None or Request.global_thread_pool.num_workers == 0:
+            # Foreign thread (or debug mode without worker threads): just block
+            return self._future.result()
+
+        # The request waits on this lock, which is released when the kernel
+        # is done or when the request is cancelled, whichever happens first
+        waiter = RequestLock()
+        waiter.acquire()
+
+        def wake_up(*_):
+            with self._state_lock:
+                if self._woken:
+                    return
+                self._woken = True
+            waiter.release()
+
+        def cancel():
+            with self._state_lock:
+                if self._cancel_flag is not None:
+                    self._cancel_flag[0] = 1
+            self._future.cancel()
+            wake_up()
+
+        self._future.add_done_callback(wake_up)
+        current_request.add_cancel_callback(cancel)
+        try:
+            # Suspends the request until wake_up() is called, raises if the request was cancelled
+            waiter.acquire()
+            waiter.release()
+        finally:
+            # Requests may call many kernels, don't keep the callbacks (and this task) until the request is done
+            current_request.remove_cancel_callback(cancel)
+        return self._future.result()
+
+    def _share(self, array: numpy.ndarray, copy: bool = True):
+        """Copy the array to shared memory.  Return the reference for the worker, and the shared array."""
+        shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        self._shared_memory.append(shm)
+        shared = numpy.ndarray(array.shape, array.dtype, buffer=shm.buf)
+        if copy:
+            shared[...] = array
+        return _SharedArray(shm.name, array.shape, array.dtype), shared
+
+    def _shareArgument(self, value):
+        return self._share(value)[0] if _shareable(value) else value
+
+    def _releaseSharedMemory(self):
+        # Views of the shared memory must be gone before it can be closed
+        with self._state_lock:
+            self._cancel_flag = None
+        self._outputs = []
+        for shm in self._shared_memory:
+            _close(shm)
+            shm.unlink()
+        self._shared_memory = []
+
+
+def _close(shm: shared_memory.SharedMemory) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        # Some array still uses the buffer (e.g. a kernel returned one of its arguments),
+        # the mapping is released together with that array
+        pass
+
+
+def _runKernel(module_name, qualname, cancel_flag, args, kwargs):
+    """
+    Entry point in the worker process.
+    """
+    global _worker_cancel_flag
+    wrapper = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        wrapper = getattr(wrapper, name)
+    fn = wrapper.__wrapped__
+
+    attached = []
+
+    def attach(value):
+        if isinstance(value, _SharedArray):
+            shm, array = value.attach()
+            attached.append(shm)
+            return array
+        return value
+
+    try:
+        flag_shm, _worker_cancel_flag = cancel_flag.attach()
+        attached.append(flag_shm)
+        args = tuple(attach(arg) for arg in args)
+        kwargs = {name: attach(value) for name, value in kwargs.items()}
+        return fn(*args, **kwargs)
+    finally:
+        _worker_cancel_flag = None
+        args = kwargs = None
+        for shm in attached:
+            _close(shm)
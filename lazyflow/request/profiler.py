@@ -0,0 +1,313 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Request-graph profiler.
+
+Records one entry per profiled call (typically one ``Operator.execute`` call), including wall time,
+CPU time and the time spent blocked while waiting for other requests.
+The result can be exported as a Chrome trace (which can also be opened in speedscope)
+and as a flat per-operator summary.
+
+When profiling is off, the only cost on the hot paths is a check of the module-level ``active`` flag.
+
+Example::
+
+    from lazyflow.request import profiler
+
+    profiler.start()
+    op.Output[:].wait()
+    prof = profiler.stop()
+    prof.save_chrome_trace("trace.json")
+    print(prof.summary_table())
+"""
+import collections
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import greenlet
+
+logger = logging.getLogger(__name__)
+
+#: Checked by the hot paths (``Slot.RequestExecutionWrapper``, ``Request.wait``).
+#: Only modify via :func:`start` and :func:`stop`.
+active = False
+
+_profiler: Optional["RequestProfiler"] = None
+
+
+class ProfileRecord(NamedTuple):
+    name: str
+    slot: str
+    roi_shape: Tuple[int, ...]
+    nbytes: int
+    start: float  # seconds since the profiler was started
+    wall: float
+    cpu: float
+    blocked: float
+    thread: str
+    tid: int
+
+
+class OperatorSummary(NamedTuple):
+    name: str
+    calls: int
+    wall: float
+    self_wall: float
+    cpu: float
+    blocked: float
+    nbytes: int
+    voxels: int
+
+
+class _Frame:
+    __slots__ = ("name", "slot", "roi_shape", "start", "cpu_start", "blocked", "blocked_cpu", "tid")
+
+    def __init__(self, name, slot, roi_shape, tid):
+        self.name = name
+        self.slot = slot
+        self.roi_shape = roi_shape
+        self.tid = tid
+        self.blocked = 0.0
+        self.blocked_cpu = 0.0
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+
+class RequestProfiler:
+    """Collects :class:`ProfileRecord` entries.
+
+    Calls are tracked per greenlet, since several requests share one worker thread.
+    Waiting for another request, including executing it directly in the waiting greenlet,
+    is accounted as blocked time of the innermost call.
+    """
+
+    def __init__(self):
+        self.records: List[ProfileRecord] = []
+        self._stacks: Dict[greenlet.greenlet, List[_Frame]] = {}
+        # Keyed by id(), to not keep finished greenlets alive.  A reused id maps a new greenlet
+        # onto the trace lane of a dead one, which is harmless since they never overlap in time.
+        self._tids: Dict[int, int] = {}
+        self._tid_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    def _tid(self, gr) -> int:
+        tid = self._tids.get(id(gr))
+        if tid is None:
+            with self._lock:
+                tid = self._tids.setdefault(id(gr), len(self._tids) + 1)
+                self._tid_names[tid] = f"{threading.current_thread().name} / greenlet {tid}"
+        return tid
+
+    def enter(self, name: str, slot: str, roi) -> _Frame:
+        gr = greenlet.getcurrent()
+        frame = _Frame(name, slot, _roi_shape(roi), self._tid(gr))
+        self._stacks.setdefault(gr, []).append(frame)
+        return frame
+
+    def leave(self, frame: _Frame, result=None) -> None:
+        wall_stop = time.perf_counter()
+        cpu = time.thread_time() - frame.cpu_start - frame.blocked_cpu
+
+        gr = greenlet.getcurrent()
+        stack = self._stacks.get(gr)
+        if stack and stack[-1] is frame:
+            stack.pop()
+            if not stack:
+                del self._stacks[gr]
+
+        self.records.append(
+            ProfileRecord(
+                name=frame.name,
+                slot=frame.slot,
+                roi_shape=frame.roi_shape,
+                nbytes=int(getattr(result, "nbytes", 0)),
+                start=frame.start - self._t0,
+                wall=wall_stop - frame.start,
+                cpu=max(cpu, 0.0),
+                blocked=frame.blocked,
+                thread=threading.current_thread().name,
+                tid=frame.tid,
+            )
+        )
+
+    def block_begin(self):
+        """Call before the current greenlet suspends (or blocks) to wait for another request."""
+        stack = self._stacks.get(greenlet.getcurrent())
+        if not stack:
+            return None
+        return stack[-1], time.perf_counter(), time.thread_time()
+
+    def block_end(self, token) -> None:
+        """Call after the current greenlet resumed. ``token`` is the return value of :meth:`block_begin`."""
+        if token is None:
+            return
+        frame, wall_start, cpu_start = token
+        frame.blocked += time.perf_counter() - wall_start
+        # While suspended, the worker thread runs other greenlets; that cpu time is theirs.
+        frame.blocked_cpu += time.thread_time() - cpu_start
+
+    def chrome_trace(self) -> dict:
+        """Return the records in the Chrome trace event format (also readable by speedscope)."""
+        pid = os.getpid()
+        events = []
+        for tid, name in self._tid_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        for r in self.records:
+            events.append(
+                {
+                    "name": r.name,
+                    "cat": r.slot,
+                    "ph": "X",
+                    "ts": r.start * 1e6,
+                    "dur": r.wall * 1e6,
+                    "pid": pid,
+                    "tid": r.tid,
+                    "args": {
+                        "slot": r.slot,
+                        "roi_shape": list(r.roi_shape),
+                        "bytes": r.nbytes,
+                        "cpu_ms": r.cpu * 1e3,
+                        "blocked_ms": r.blocked * 1e3,
+                        "thread": r.thread,
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self) -> List[OperatorSummary]:
+        """Per-operator totals, sorted by self time (wall time not spent waiting for other requests)."""
+        totals = collections.defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0, 0, 0])
+        for r in self.records:
+            t = totals[r.name]
+            t[0] += 1
+            t[1] += r.wall
+            t[2] += r.wall - r.blocked
+            t[3] += r.cpu
+            t[4] += r.blocked
+            t[5] += r.nbytes
+            t[6] += _prod(r.roi_shape)
+        summary = [OperatorSummary(name, *values) for name, values in totals.items()]
+        return sorted(summary, key=lambda s: s.self_wall, reverse=True)
+
+    def summary_table(self) -> str:
+        header = ("operator", "calls", "wall [s]", "self [s]", "cpu [s]", "blocked [s]", "MB", "voxels")
+        rows = [
+            (
+                s.name,
+                str(s.calls),
+                f"{s.wall:.3f}",
+                f"{s.self_wall:.3f}",
+                f"{s.cpu:.3f}",
+                f"{s.blocked:.3f}",
+                f"{s.nbytes / 1024**2:.1f}",
+                str(s.voxels),
+            )
+            for s in self.summary()
+        ]
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+        lines = [
+            "  ".join(cell.ljust(w) if i == 0 else cell.rjust(w) for i, (cell, w) in enumerate(zip(row, widths)))
+            for row in [header] + rows
+        ]
+        return "\n".join(lines)
+
+    def save_summary(self, path: str) -> None:
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(OperatorSummary._fields)
+            writer.writerows(self.summary())
+
+
+def _roi_shape(roi) -> Tuple[int, ...]:
+    try:
+        return tuple(int(stop) - int(start) for start, stop in zip(roi.start, roi.stop))
+    except (AttributeError, TypeError, ValueError):
+        return ()
+
+
+def _prod(shape) -> int:
+    result = 1
+    for s in shape:
+        result *= s
+    return result if shape else 0
+
+
+def start() -> RequestProfiler:
+    """Start a new profiling session (discarding the records of the previous one)."""
+    global _profiler, active
+    _profiler = RequestProfiler()
+    active = True
+    return _profiler
+
+
+def stop() -> Optional[RequestProfiler]:
+    """Stop profiling and return the profiler holding the recorded data."""
+    global active
+    active = False
+    return _profiler
+
+
+def current() -> Optional[RequestProfiler]:
+    return _profiler
+
+
+def enter(name: str, slot: str, roi) -> Optional[_Frame]:
+    profiler = _profiler
+    return profiler.enter(name, slot, roi) if profiler is not None else None
+
+
+def leave(frame: Optional[_Frame], result=None) -> None:
+    profiler = _profiler
+    if frame is not None and profiler is not None:
+        profiler.leave(frame, result)
+
+
+def block_begin():
+    profiler = _profiler
+    return profiler.block_begin() if profiler is not None else None
+
+
+def block_end(token) -> None:
+    profiler = _profiler
+    if profiler is not None:
+        profiler.block_end(token)
+
+
+def save(path: str) -> None:
+    """Stop profiling, write the Chrome trace to ``path`` and a csv summary next to it (``<path>.summary.csv``)."""
+    profiler = stop()
+    if profiler is None:
+        return
+    profiler.save_chrome_trace(path)
+    summary_path = os.path.splitext(path)[0] + ".summary.csv"
+    profiler.save_summary(summary_path)
+    logger.info("Request profile written to %s (summary: %s)\n%s", path, summary_path, profiler.summary_table())
@@ -43,6 +43,7 @@ logger = logging.getLogger(__name__)
 import greenlet
 
 # lazyflow
+from . import profiler
 from . import threadPool
 
 # This module's code needs to be sanitized if you're not using CPython.
@@ -71,6 +72,10 @@ class SimpleSignal:
     def subscribe(self, fn: Callable):
         self.callbacks.append(fn)
 
+    def unsubscribe(self, fn: Callable):
+        # A new list, so that an emission in progress is not disturbed
+        self.callbacks = [f for f in self.callbacks if f is not fn]
+
     def __call__(self, *args, **kwargs):
         """Emit the signal."""
         assert not self._cleaned, "Can't emit a signal after it's already been cleaned!"
@@ -141,7 +146,7 @@ class Request(object):
     active_count = 0
 
     @classmethod
-    def reset_thread_pool(cls, num_workers=min(multiprocessing.cpu_count(), 8)):
+    def reset_thread_pool(cls, num_workers=min(multiprocessing.cpu_count(), 8), scheduler="shared", numa_aware=False):
         """
         Change the number of threads allocated to the request system.
 
@@ -150,6 +155,10 @@ class Request(object):
                             workers, even on machines with many CPUs.
                             For more details, see:
                             https://github.com/ilastik/ilastik/issues/1458
+        :param scheduler: How unassigned requests are distributed to the workers,
+                          one of ``threadPool.SCHEDULERS``.  The default "shared" scheduler uses one
+                          queue for all workers; "work-stealing" scales better on machines with many cores.
+        :param numa_aware: Pin groups of workers to NUMA nodes (only with the "work-stealing" scheduler).
 
         As a special case, you may set ``num_workers`` to 0.
         In that case, the normal thread pool is not used at all.
@@ -165,7 +174,7 @@ class Request(object):
 
             if cls.global_thread_pool is not None:
                 cls.global_thread_pool.stop()
-            cls.global_thread_pool = threadPool.ThreadPool(num_workers)
+            cls.global_thread_pool = threadPool.make_thread_pool(num_workers, scheduler, numa_aware)
 
     class CancellationException(Exception):
         """
@@ -229,6 +238,7 @@ class Request(object):
         self._lock = threading.Lock()  # NOT an RLock, since requests may share threads
         self._sig_failed = SimpleSignal()
         self._sig_cancelled = SimpleSignal()
+        self._sig_cancel_requested = SimpleSignal()
         self._sig_finished = SimpleSignal()
         self._sig_execution_complete = SimpleSignal()
 
@@ -323,6 +333,8 @@ class Request(object):
                            Otherwise, delete everything, including the result.
         """
         self._sig_cancelled.clean()
+        # Not clean()ed, the request may still be cancelled after it has finished
+        self._sig_cancel_requested = SimpleSignal()
         self._sig_finished.clean()
         self._sig_failed.clean()
 
@@ -539,6 +551,7 @@ class Request(object):
         """
         Suspend this request so another one can be woken up by the worker.
         """
+        block_token = profiler.block_begin() if profiler.active else None
         # Switch back to the worker that we're currently running in.
         try:
             self.greenlet.parent.switch()
@@ -549,6 +562,8 @@ class Request(object):
                 )
             )
             raise
+        if block_token is not None:
+            profiler.block_end(block_token)
 
     def wait(self, timeout=None):
         """
@@ -627,6 +642,7 @@ class Request(object):
             else:
                 raise Request.CircularWaitException()
 
+        block_token = profiler.block_begin() if profiler.active else None
         if direct_execute_needed:
             self._current_foreign_thread = threading.current_thread()
             self._execute()
@@ -635,6 +651,8 @@ class Request(object):
 
         # This is a non-worker thread, so just block the old-fashioned way
         completed = self.finished_event.wait(timeout)
+        if block_token is not None:
+            profiler.block_end(block_token)
         if not completed:
             raise Request.TimeoutException()
 
@@ -698,6 +716,7 @@ class Request(object):
         if suspend_needed:
             current_request._suspend()
         elif direct_execute_needed:
+            block_token = profiler.block_begin() if profiler.active else None
             # Optimization: Don't start a new greenlet.  Directly run this request in the current greenlet.
             self.greenlet = current_request.greenlet
             self.greenlet.owning_requests.append(self)
@@ -705,6 +724,8 @@ class Request(object):
             self._execute()
             self.greenlet = None
             current_request.blocking_requests.remove(self)
+            if block_token is not None:
+                profiler.block_end(block_token)
 
         if suspend_needed or direct_execute_needed:
             # No need to lock here because set.remove is atomic in CPython.
@@ -750,6 +771,31 @@ class Request(object):
         if complete:
             callback(self)
 
+    def add_cancel_callback(self, fn: Callable[[], None]) -> None:
+        """
+        Register a callback function to be called as soon as this request is cancelled,
+        i.e. while it may still be running.  Useful to interrupt work that happens outside
+        of the request system.  If we're already cancelled, call it now.
+
+        :param fn: The callback to call when the request is cancelled.  Signature: ``fn()``
+        """
+        assert not self._cleaned, "This request has been cleaned() already."
+        with self._lock:
+            cancelled = self.cancelled
+            if not cancelled:
+                self._sig_cancel_requested.subscribe(fn)
+
+        if cancelled:
+            fn()
+
+    def remove_cancel_callback(self, fn: Callable[[], None]) -> None:
+        """
+        Unregister a callback function that was registered with :py:meth:`add_cancel_callback`,
+        e.g. when the work it would interrupt is done.
+        """
+        with self._lock:
+            self._sig_cancel_requested.unsubscribe(fn)
+
     def notify_finished(self, fn):
         """
         Register a callback function to be called when this request is finished.
@@ -823,12 +869,16 @@ class Request(object):
             for r in self.pending_requests:
                 cancelled &= r.cancelled
 
+            newly_cancelled = cancelled and not self.cancelled
             self.cancelled = cancelled
             if cancelled:
                 # Any children added after this point will receive our same cancelled status
                 child_requests = self.child_requests
                 self.child_requests = set()
 
+        if newly_cancelled:
+            self._sig_cancel_requested()
+
         if self.cancelled:
             # Cancel all requests that were spawned from this one.
             for child in child_requests:
@@ -1058,7 +1108,10 @@ class RequestLock(object):
             self.num_waiting_threads += 1
 
         # Wait for the internal lock to become free
+        block_token = profiler.block_begin() if profiler.active else None
         self._modelLock.acquire(True)
+        if block_token is not None:
+            profiler.block_end(block_token)
 
         with self._selfProtectLock:
             self.num_waiting_threads -= 1
@@ -21,31 +21,63 @@
 ###############################################################################
 
 import atexit
+import glob
+import heapq
+import itertools
 import logging
+import os
 import queue
+import random
 import threading
-from typing import Callable, List
+from typing import Callable, Dict, List, Optional, Set
 
 logger = logging.getLogger(__name__)
 
+#: Names of the available scheduling strategies, see :func:`make_thread_pool`.
+SCHEDULERS = ("shared", "work-stealing")
+
+
+def make_thread_pool(num_workers: int, scheduler: str = "shared", numa_aware: bool = False) -> "ThreadPool":
+    """Create a thread pool that dispatches tasks with the given scheduling strategy.
+
+    Args:
+        num_workers: The number of worker threads.
+        scheduler: "shared" uses a single queue for unassigned tasks that is shared by all workers.
+            "work-stealing" keeps one queue per worker; idle workers steal from busy ones.
+        numa_aware: Only used by the "work-stealing" scheduler: pin groups of workers
+            to NUMA nodes, and prefer stealing from workers on the same node.
+    """
+    if scheduler == "shared":
+        return ThreadPool(num_workers)
+    elif scheduler == "work-stealing":
+        return WorkStealingThreadPool(num_workers, numa_aware=numa_aware)
+    raise ValueError(f"Unknown thread pool scheduler {scheduler!r}, expected one of {SCHEDULERS}")
+
 
 class ThreadPool:
     """Manages a set of worker threads and dispatches tasks to them.
 
+    Unassigned tasks are kept in one queue, shared by all workers.
+
     Attributes:
         num_workers: The number of worker threads.
     """
 
+    scheduler = "shared"
+
     def __init__(self, num_workers: int):
         """Start all workers."""
         self.unassigned_tasks = queue.PriorityQueue()
 
-        self.workers = {_Worker(self, i) for i in range(num_workers)}
+        self.workers = {self._create_worker(i) for i in range(num_workers)}
         for w in self.workers:
             w.start()
 
         atexit.register(self.stop)
 
+    def _create_worker(self, index: int) -> "_Worker":
+        return _Worker(self, index)
+
     @property
     def num_workers(self):
         return len(self.workers)
@@ -58,10 +90,7 @@ class ThreadPool:
         if hasattr(task, "assigned_worker") and task.assigned_worker is not None:
             task.assigned_worker.wake_up(task)
         else:
-            self.unassigned_tasks.put_nowait(task)
-            for worker in self.workers:
-                with worker.job_queue_condition:
-                    worker.job_queue_condition.notify()
+            self._submit_unassigned(task)
 
     def stop(self) -> None:
         """Stop all threads in the pool, and block for them to complete.
@@ -77,6 +106,223 @@ class ThreadPool:
     def get_states(self) -> List[str]:
         return [w.state for w in self.workers]
 
+    def _submit_unassigned(self, task) -> None:
+        self.unassigned_tasks.put_nowait(task)
+        for worker in self.workers:
+            with worker.job_queue_condition:
+                worker.job_queue_condition.notify()
+
+    def _pop_unassigned(self, worker: "_Worker"):
+        """Non-blocking. Return an unassigned task for the given worker, or None."""
+        try:
+            return self.unassigned_tasks.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _worker_idle(self, worker: "_Worker") -> None:
+        """Called (with the worker's job_queue_condition held) before the worker goes to sleep."""
+
+    def _worker_busy(self, worker: "_Worker") -> None:
+        """Called (without holding the worker's job_queue_condition) after an idle worker has found work again."""
+
+
+class WorkStealingThreadPool(ThreadPool):
+    """Thread pool with one queue of unassigned tasks per worker.
+
+    Tasks submitted from a worker thread go to that worker's own queue, tasks submitted
+    from any other thread are distributed round-robin.  Only a single idle worker is woken
+    up per submitted task.  A worker that runs out of work steals unassigned tasks from
+    other workers, preferring workers on its own NUMA node if ``numa_aware`` is set.
+
+    Tasks that already have an ``assigned_worker`` are never stolen.
+    """
+
+    scheduler = "work-stealing"
+
+    def __init__(self, num_workers: int, numa_aware: bool = False):
+        self._local_queues: Dict["_Worker", _LocalQueue] = {}
+        self._steal_order: Dict["_Worker", List["_Worker"]] = {}
+        self._idle_workers: Set["_Worker"] = set()
+        self._idle_lock = threading.Lock()
+        self._pending = 0
+        self._round_robin = itertools.count()
+
+        nodes = numa_nodes() if numa_aware else []
+        self._numa_nodes = nodes if len(nodes) > 1 else []
+        if numa_aware and not self._numa_nodes:
+            logger.info("NUMA-aware scheduling requested, but only one NUMA node is available.")
+
+        # ThreadPool.__init__ starts the workers, so the per-worker state has to exist first.
+        self._workers_by_index: List["_Worker"] = []
+        super().__init__(num_workers)
+
+        for worker in self._workers_by_index:
+            self._steal_order[worker] = self._compute_steal_order(worker)
+
+    def _create_worker(self, index: int) -> "_Worker":
+        cpus = self._numa_nodes[index % len(self._numa_nodes)] if self._numa_nodes else None
+        worker = _Worker(self, index, numa_node=index % len(self._numa_nodes) if cpus else None, cpus=cpus)
+        self._local_queues[worker] = _LocalQueue()
+        self._workers_by_index.append(worker)
+        return worker
+
+    def _compute_steal_order(self, worker: "_Worker") -> List["_Worker"]:
+        """Victims closest to the worker come first: same NUMA node, then all others."""
+        others = [w for w in self._workers_by_index if w is not worker]
+        same_node = [w for w in others if w.numa_node == worker.numa_node]
+        other_nodes = [w for w in others if w.numa_node != worker.numa_node]
+        return same_node + other_nodes
+
+    def _submit_unassigned(self, task) -> None:
+        if not self._workers_by_index:
+            return
+
+        current = threading.current_thread()
+        if current in self._local_queues:
+            target = current
+        else:
+            target = self._workers_by_index[next(self._round_robin) % len(self._workers_by_index)]
+
+        self._local_queues[target].push(task)
+
+        with self._idle_lock:
+            self._pending += 1
+            if target in self._idle_workers:
+                wakee = target
+            else:
+                wakee = self._pick_idle_worker(target.numa_node)
+            if wakee is not None:
+                self._idle_workers.discard(wakee)
+
+        if wakee is not None:
+            with wakee.job_queue_condition:
+                wakee.job_queue_condition.notify()
+
+    def _pick_idle_worker(self, numa_node: Optional[int]) -> Optional["_Worker"]:
+        """Must be called with self._idle_lock held."""
+        fallback = None
+        for w in self._idle_workers:
+            if w.numa_node == numa_node:
+                return w
+            fallback = w
+        return fallback
+
+    def _pop_unassigned(self, worker: "_Worker"):
+        task = self._local_queues[worker].pop()
+        if task is None:
+            victims = self._steal_order.get(worker, ())
+            if victims:
+                # Start at a random victim (within the worker's own node first) to spread contention.
+                local = [w for w in victims if w.numa_node == worker.numa_node]
+                offset = random.randrange(len(local)) if local else 0
+                for victim in itertools.chain(local[offset:], local[:offset], victims[len(local) :]):
+                    task = self._local_queues[victim].pop()
+                    if task is not None:
+                        break
+
+        if task is not None:
+            with self._idle_lock:
+                self._pending -= 1
+        return task
+
+    def _worker_idle(self, worker: "_Worker") -> None:
+        with self._idle_lock:
+            self._idle_workers.add(worker)
+
+    def _worker_busy(self, worker: "_Worker") -> None:
+        with self._idle_lock:
+            self._idle_workers.discard(worker)
+            # The worker might have been woken up for an unassigned task, but picked up a task
+            # of its own instead.  Pass the wake-up on, so that the unassigned task is not stranded.
+            wakee = self._pick_idle_worker(worker.numa_node) if self._pending > 0 else None
+            if wakee is not None:
+                self._idle_workers.discard(wakee)
+
+        if wakee is not None:
+            with wakee.job_queue_condition:
+                wakee.job_queue_condition.notify()
+
+
+class _LocalQueue:
+    """Priority queue of unassigned tasks that belongs to one worker, but may be popped by any worker."""
+
+    __slots__ = ("_heap", "_lock", "_counter")
+
+    def __init__(self):
+        self._heap = []
+        self._lock = threading.Lock()
+        # Tie-breaker, so that tasks that do not define an ordering are run first-in first-out.
+        self._counter = itertools.count()
+
+    def push(self, task) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, _QueueEntry(task, next(self._counter)))
+
+    def pop(self):
+        if not self._heap:
+            return None
+        with self._lock:
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap).task
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class _QueueEntry:
+    __slots__ = ("task", "count")
+
+    def __init__(self, task, count):
+        self.task = task
+        self.count = count
+
+    def __lt__(self, other):
+        try:
+            if self.task < other.task:
+                return True
+            if other.task < self.task:
+                return False
+        except TypeError:
+            pass
+        return self.count < other.count
+
+
+def _parse_cpulist(cpulist: str) -> Set[int]:
+    """Parse a linux cpu list, e.g. "0-3,8-11,16" into a set of cpu ids."""
+    cpus = set()
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, stop = part.split("-")
+            cpus.update(range(int(start), int(stop) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def numa_nodes() -> List[Set[int]]:
+    """Return the sets of cpus of all NUMA nodes that this process may run on.
+
+    Returns an empty list if the topology cannot be determined (i.e. on non-linux platforms).
+    """
+    try:
+        allowed = os.sched_getaffinity(0)
+    except AttributeError:
+        return []
+
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        try:
+            with open(path) as f:
+                cpus = _parse_cpulist(f.read()) & allowed
+        except (OSError, ValueError):
+            return []
+        if cpus:
+            nodes.append(cpus)
+    return nodes
+
 
 class _Worker(threading.Thread):
     """Run in a loop until stopped.
@@ -84,16 +330,25 @@ class _Worker(threading.Thread):
     The loop pops one task from the threadpool and executes it.
     """
 
-    def __init__(self, thread_pool, index):
+    def __init__(self, thread_pool, index, numa_node=None, cpus=None):
         super().__init__(name=f"Worker #{index}", daemon=True)
         self.thread_pool = thread_pool
         self.stopped = False
         self.job_queue_condition = threading.Condition()
         self.job_queue = queue.PriorityQueue()
         self.state = "initialized"
+        self.numa_node = numa_node
+        self.cpus = cpus
 
     def run(self):
         """Keep executing available tasks until we're stopped."""
+        if self.cpus:
+            try:
+                # On linux, pid 0 refers to the calling thread.
+                os.sched_setaffinity(0, self.cpus)
+            except (AttributeError, OSError):
+                logger.warning("Could not pin %s to NUMA node %s", self.name, self.numa_node)
+
         # Try to get some work.
         self.state = "waiting"
         next_task = self._get_next_job()
@@ -144,26 +399,38 @@ class _Worker(threading.Thread):
         If necessary, block until a task is available (return it) or the worker has been stopped (might return None).
         """
         # Keep trying until we get a job
+        went_idle = False
         with self.job_queue_condition:
             if self.stopped:
                 return None
             next_task = self._pop_job()
 
             while next_task is None and not self.stopped:
-                # Wait for work to become available
-                self.job_queue_condition.wait()
-                if self.stopped:
-                    return None
+                # Register as idle *before* checking the queues one last time,
+                # so that a concurrent submit either sees us idle or its task is found here.
+                self.thread_pool._worker_idle(self)
+                went_idle = True
                 next_task = self._pop_job()
+                if next_task is None:
+                    # Wait for work to become available
+                    self.job_queue_condition.wait()
+                    if not self.stopped:
+                        next_task = self._pop_job()
+
+        # Must not hold our own condition here: the pool may notify other workers.
+        if went_idle:
+            self.thread_pool._worker_busy(self)
 
-        if not self.stopped:
-            assert next_task is not None
-            assert next_task.assigned_worker is self
+        if self.stopped:
+            return None
+
+        assert next_task is not None
+        assert next_task.assigned_worker is self
 
         return next_task
 
     def _pop_job(self):
-        """If possible, get a job from our own job queue; otherwise, get one from the global job queue.
+        """If possible, get a job from our own job queue; otherwise, get an unassigned one from the thread pool.
 
         Return None if neither queue has work to do.
 
@@ -172,9 +439,8 @@ class _Worker(threading.Thread):
         try:
             return self.job_queue.get_nowait()
         except queue.Empty:
-            try:
-                task = self.thread_pool.unassigned_tasks.get_nowait()
-            except queue.Empty:
+            task = self.thread_pool._pop_unassigned(self)
+            if task is None:
                 return None
             else:
                 # If this fails, then your callable is some built-in that doesn't allow arbitrary
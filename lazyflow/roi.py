@@ -22,10 +22,9 @@
 
 from collections.abc import Iterable
 import numbers
-from functools import partial
 from itertools import combinations
 from math import ceil, floor, log10, pow
-from typing import Sequence, Tuple, Union
+from typing import Optional, Sequence, Tuple, Union
 
 import numpy
 
@@ -249,6 +248,162 @@ class TinyVector(list):
         return answer
 
 
+def _intTuple(values: Sequence[numbers.Integral]) -> Tuple[int, ...]:
+    if isinstance(values, numpy.ndarray):
+        # much faster than converting the numpy scalars one by one
+        return tuple(values.astype(numpy.int64, copy=False).tolist())
+    return tuple(map(int, values))
+
+
+def _setSlots(box, start, stop):
+    object.__setattr__(box, "start", start)
+    object.__setattr__(box, "stop", stop)
+    object.__setattr__(box, "_slicing", None)
+
+
+class Box:
+    """
+    An immutable roi: ``start`` (inclusive) and ``stop`` (exclusive) as tuples of ints.
+
+    Boxes are cheap to create, hashable and compute their slicing only once, which makes them
+    suitable for the per-block bookkeeping of caches and filters.  A box unpacks like a
+    ``(start, stop)`` pair, so it can be passed to the other functions of this module.
+
+    >>> box = Box((10, 20, 0), (30, 40, 1))
+    >>> box.shape
+    (20, 20, 1)
+    >>> box.slicing
+    (slice(10, 30, None), slice(20, 40, None), slice(0, 1, None))
+    >>> box.intersection(Box((0, 30, 0), (15, 50, 1)))
+    Box((10, 30, 0), (15, 40, 1))
+    >>> box.relative_to((10, 20, 0))
+    Box((0, 0, 0), (20, 20, 1))
+    >>> start, stop = box
+    >>> stop
+    (30, 40, 1)
+    """
+
+    __slots__ = ("start", "stop", "_slicing")
+
+    def __init__(self, start: Sequence[numbers.Integral], stop: Sequence[numbers.Integral]):
+        start = _intTuple(start)
+        stop = _intTuple(stop)
+        if len(start) != len(stop):
+            raise ValueError("ROI has different start and stop sizes")
+        _setSlots(self, start, stop)
+
+    @classmethod
+    def _fromIntTuples(cls, start: Tuple[int, ...], stop: Tuple[int, ...]) -> "Box":
+        # Skips the conversion in __init__, for results of operations on boxes
+        box = object.__new__(cls)
+        _setSlots(box, start, stop)
+        return box
+
+    @classmethod
+    def from_shape(cls, shape: Sequence[numbers.Integral]) -> "Box":
+        return cls((0,) * len(shape), shape)
+
+    @classmethod
+    def from_slicing(cls, slicing, shape: Sequence[numbers.Integral]) -> "Box":
+        """See sliceToRoi"""
+        return cls(*sliceToRoi(slicing, shape))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __iter__(self):
+        yield self.start
+        yield self.stop
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return (self.start, self.stop)[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, Box):
+            return NotImplemented
+        return self.start == other.start and self.stop == other.stop
+
+    def __hash__(self):
+        return hash((self.start, self.stop))
+
+    def __repr__(self):
+        return f"Box({self.start}, {self.stop})"
+
+    @property
+    def ndim(self) -> int:
+        return len(self.start)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(b - a for a, b in zip(self.start, self.stop))
+
+    @property
+    def slicing(self) -> Tuple[slice, ...]:
+        if self._slicing is None:
+            object.__setattr__(self, "_slicing", tuple(map(slice, self.start, self.stop)))
+        return self._slicing
+
+    def is_empty(self) -> bool:
+        return any([b <= a for a, b in zip(self.start, self.stop)])
+
+    def contains(self, other) -> bool:
+        other = other if isinstance(other, Box) else Box(*other)
+        return all([a <= b for a, b in zip(self.start, other.start)]) and all(
+            [a >= b for a, b in zip(self.stop, other.stop)]
+        )
+
+    def intersection(self, other) -> Optional["Box"]:
+        """The overlap with another roi, or None if they do not intersect."""
+        other = other if isinstance(other, Box) else Box(*other)
+        # (conditional expressions are faster than calling max and min for every axis)
+        start = tuple([a if a > b else b for a, b in zip(self.start, other.start)])
+        stop = tuple([a if a < b else b for a, b in zip(self.stop, other.stop)])
+        if any([b <= a for a, b in zip(start, stop)]):
+            return None
+        return Box._fromIntTuples(start, stop)
+
+    def translated(self, offset: Sequence[numbers.Integral]) -> "Box":
+        offset = _intTuple(offset)
+        return Box._fromIntTuples(
+            tuple([a + o for a, o in zip(self.start, offset)]), tuple([b + o for b, o in zip(self.stop, offset)])
+        )
+
+    def relative_to(self, origin: Sequence[numbers.Integral]) -> "Box":
+        """The same roi, in the coordinates of an array that starts at ``origin``."""
+        origin = _intTuple(origin)
+        return Box._fromIntTuples(
+            tuple([a - o for a, o in zip(self.start, origin)]), tuple([b - o for b, o in zip(self.stop, origin)])
+        )
+
+    def enlarged(self, halo, shape: Optional[Sequence[numbers.Integral]] = None) -> "Box":
+        """
+        Grow the roi by ``halo`` (an int, or one int per axis) on both sides,
+        without leaving an image of the given shape.
+        """
+        halo = (int(halo),) * self.ndim if isinstance(halo, numbers.Integral) else _intTuple(halo)
+        start = tuple([a - h if a > h else 0 for a, h in zip(self.start, halo)])
+        stop = tuple([b + h for b, h in zip(self.stop, halo)])
+        if shape is not None:
+            stop = tuple([b if b < s else s for b, s in zip(stop, _intTuple(shape))])
+        return Box._fromIntTuples(start, stop)
+
+    def block_starts(self, blockshape: Sequence[numbers.Integral]) -> numpy.ndarray:
+        """See getIntersectingBlocks"""
+        return getIntersectingBlocks(blockshape, self)
+
+    def blocks(
+        self, blockshape: Sequence[numbers.Integral], shape: Sequence[numbers.Integral], clip: bool = True
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """See getIntersectingBlockRois"""
+        return getIntersectingBlockRois(shape, blockshape, self, clip)
+
+
 def sliceToRoi(
     slicing: Union[numbers.Integral, slice, "ellipsis", Sequence[Union[numbers.Integral, slice, "ellipsis"]]],
     shape: Sequence[numbers.Integral],
@@ -408,9 +563,9 @@ def getIntersection(roiA, roiB, assertIntersect=True):
     start = numpy.maximum(roiA[0], roiB[0])
     stop = numpy.minimum(roiA[1], roiB[1])
 
-    if ((stop - start) <= 0).any():
+    if (stop <= start).any():
         if assertIntersect:
-            assert ((stop - start) > 0).all(), "Rois do not intersect: {} and {}".format(roiA, roiB)
+            assert False, "Rois do not intersect: {} and {}".format(roiA, roiB)
         else:
             return None
     return (start, stop)
@@ -439,7 +594,7 @@ def roiToSlice(start: Sequence[numbers.Integral], stop: Sequence[numbers.Integra
     """
     if len(start) != len(stop):
         raise ValueError("ROI has different start and stop sizes")
-    return tuple(slice(int(a), int(b)) for a, b in zip(start, stop))
+    return tuple(map(slice, map(int, start), map(int, stop)))
 
 
 def nonzero_bounding_box(data):
@@ -520,35 +675,21 @@ def enlargeRoiForHalo(start, stop, shape, sigma, window=3.5, enlarge_axes=None,
                            assert data_without_halo.shape == stop - start
     """
     assert len(start) == len(stop) == len(shape)
-    shape = TinyVector(shape)
     if enlarge_axes is None:
-        enlarge_axes = TinyVector((1,) * len(start))
+        enlarge_axes = numpy.ones(len(start), dtype=bool)
     else:
-        enlarge_axes = TinyVector(enlarge_axes) * 1
-
-    # non-enlarged axes are zero'd out while we enlarge the rest.
+        enlarge_axes = numpy.asarray(enlarge_axes, dtype=bool)
     assert len(enlarge_axes) == len(shape)
-    max_spatial_shape = enlarge_axes * shape
-    spatial_start = enlarge_axes * start
-    spatial_stop = enlarge_axes * stop
-
-    if isinstance(sigma, Iterable):
-        sigma = TinyVector(sigma)
-    if isinstance(start, Iterable):
-        ret_type = type(start[0])
-    else:
-        ret_type = type(start)
+    ret_type = type(start[0])
 
-    zeros = TinyVector(start) - start
-
-    enlarged_start = numpy.maximum(spatial_start - numpy.ceil(window * sigma), zeros).astype(ret_type)
-    enlarged_stop = numpy.minimum(spatial_stop + numpy.ceil(window * sigma), max_spatial_shape).astype(ret_type)
+    halo = numpy.ceil(window * numpy.asarray(sigma, dtype=numpy.float64))
+    enlarged_start = numpy.maximum(numpy.subtract(start, halo), 0).astype(ret_type)
+    enlarged_stop = numpy.minimum(numpy.add(stop, halo), shape).astype(ret_type)
 
     # Restore non-halo elements exactly as they were
-    enlarged_start += (enlarge_axes == 0) * start
-    enlarged_stop += (enlarge_axes == 0) * stop
-
-    enlarged_roi = numpy.array((enlarged_start, enlarged_stop))
+    enlarged_roi = numpy.array(
+        (numpy.where(enlarge_axes, enlarged_start, start), numpy.where(enlarge_axes, enlarged_stop, stop))
+    )
     if return_result_roi:
         inner_roi = numpy.asarray((start, stop))
         result_roi = inner_roi - enlarged_roi[0]
@@ -617,20 +758,15 @@ def getIntersectingBlocks(blockshape, roi, asarray=False):
     assert len(blockshape) == len(roi[0]) == len(roi[1]), "blockshape and roi are mismatched: {} vs {}".format(
         blockshape, roi
     )
-    assert not numpy.any(numpy.isclose(blockshape, 0)), f"blockshape ({blockshape}) should not contain zero elements"
-    roistart = TinyVector(roi[0])
-    roistop = TinyVector(roi[1])
-    blockshape = TinyVector(blockshape)
-
-    block_index_map_start = roistart // blockshape
-    block_index_map_stop = (
-        roistop + (blockshape - 1)
-    ) // blockshape  # Add (blockshape-1) first as a faster alternative to ceil()
-    block_index_map_shape = block_index_map_stop - block_index_map_start
-
-    num_axes = len(blockshape)
-    block_indices = numpy.indices(block_index_map_shape)
-    block_indices = numpy.rollaxis(block_indices, 0, num_axes + 1)
+    # The grid bounds are computed with python ints: for a handful of axes this is faster than numpy
+    blockshape = tuple(map(int, blockshape))
+    assert 0 not in blockshape, f"blockshape ({blockshape}) should not contain zero elements"
+    block_index_map_start = [int(a) // s for a, s in zip(roi[0], blockshape)]
+    # Add (blockshape-1) first as a faster alternative to ceil()
+    block_index_map_stop = [(int(b) + s - 1) // s for b, s in zip(roi[1], blockshape)]
+    block_index_map_shape = [max(b - a, 0) for a, b in zip(block_index_map_start, block_index_map_stop)]
+
+    block_indices = numpy.moveaxis(numpy.indices(block_index_map_shape, dtype=numpy.int64), 0, -1)
     block_indices += block_index_map_start
 
     # Multiply by blockshape to get the list of start coordinates
@@ -640,17 +776,42 @@ def getIntersectingBlocks(blockshape, roi, asarray=False):
         return block_indices
     else:
         # Reshape into N*M matrix for easy iteration
-        num_indexes = bigintprod(block_indices.shape[0:-1])
-        axiscount = block_indices.shape[-1]
-        return numpy.reshape(block_indices, (num_indexes, axiscount))
+        return numpy.reshape(block_indices, (-1, len(blockshape)))
 
 
-def getIntersectingRois(dataset_shape, blockshape, roi, clip_blocks_to_roi=True):
-    block_starts = getIntersectingBlocks(blockshape, roi)
-    block_rois = list(map(partial(getBlockBounds, dataset_shape, blockshape), block_starts))
+def getIntersectingBlockRois(dataset_shape, blockshape, roi, clip_blocks_to_roi=True):
+    """
+    The rois of all blocks that intersect the given roi, computed at once for all blocks.
+    Returns the start and stop coordinates as two arrays of shape (N, M) (N blocks with M coordinates each).
+    The blocks are clipped to the dataset shape and, if clip_blocks_to_roi is True, to the roi.
+
+    >>> starts, stops = getIntersectingBlockRois((35, 35), (10, 20), [(15, 25), (23, 35)])
+    >>> print(starts)
+    [[15 25]
+     [20 25]]
+    >>> print(stops)
+    [[20 35]
+     [23 35]]
+    >>> starts, stops = getIntersectingBlockRois((35, 35), (10, 20), [(15, 25), (23, 35)], clip_blocks_to_roi=False)
+    >>> print(starts)
+    [[10 20]
+     [20 20]]
+    >>> print(stops)
+    [[20 35]
+     [30 35]]
+    """
+    starts = getIntersectingBlocks(blockshape, roi)
+    stops = numpy.minimum(starts + numpy.asarray(blockshape, dtype=numpy.int64), dataset_shape)
+    starts = numpy.maximum(starts, 0)
     if clip_blocks_to_roi:
-        block_rois = [getIntersection(block_roi, roi) for block_roi in block_rois]
-    return block_rois
+        starts = numpy.maximum(starts, roi[0])
+        stops = numpy.minimum(stops, roi[1])
+    assert (stops > starts).all(), "Rois do not intersect: {} and {}".format(roi, roiFromShape(dataset_shape))
+    return starts, stops
+
+
+def getIntersectingRois(dataset_shape, blockshape, roi, clip_blocks_to_roi=True):
+    return list(zip(*getIntersectingBlockRois(dataset_shape, blockshape, roi, clip_blocks_to_roi)))
 
 
 def is_fully_contained(inner_roi, outer_roi):
@@ -670,12 +831,13 @@ def getBlockBounds(dataset_shape, block_shape, block_start):
         numpy.mod(block_start, block_shape) == 0
     ).all(), "Invalid block_start: {}.  Must be a multiple of the block shape: {}".format(block_start, block_shape)
 
-    entire_dataset_roi = roiFromShape(dataset_shape)
-    block_shape = TinyVector(block_shape)
-    block_bounds = (block_start, block_start + block_shape)
+    block_stop = numpy.add(block_start, block_shape)
 
     # Clip to dataset bounds
-    block_bounds = getIntersection(block_bounds, entire_dataset_roi)
+    block_bounds = (numpy.maximum(block_start, 0), numpy.minimum(block_stop, dataset_shape))
+    assert (block_bounds[1] > block_bounds[0]).all(), "Rois do not intersect: {} and {}".format(
+        (block_start, block_stop), roiFromShape(dataset_shape)
+    )
     return block_bounds
 
 
@@ -45,6 +45,7 @@ import vigra
 from lazyflow import rtype
 from lazyflow.roi import TinyVector
 from lazyflow.request import Request
+from lazyflow.request import profiler as request_profiler
 from lazyflow.stype import ArrayLike, Opaque
 from lazyflow.metaDict import MetaDict
 from lazyflow.utility import slicingtools, OrderedSignal
@@ -870,6 +871,17 @@ class Slot(object):
             self.roi = roi
 
         def __call__(self, destination=None):
+            if request_profiler.active:
+                frame = request_profiler.enter(self.operator.name, self.slot.name, self.roi)
+                result = None
+                try:
+                    result = self._execute(destination)
+                    return result
+                finally:
+                    request_profiler.leave(frame, result)
+            return self._execute(destination)
+
+        def _execute(self, destination):
             # store whether the user wants the results in a given
             # destination area
             destination_given = destination is not None
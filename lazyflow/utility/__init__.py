@@ -45,5 +45,6 @@ from .export_to_tiles import export_to_tiles
 from .blockwise_view import blockwise_view
 from .log_exception import log_exception
 from .transposed_view import TransposedView
+from .daskAdapter import slotToDaskArray
 from .reorderAxesDecorator import reorder_options, reorder
 from .pipeline import Pipeline
@@ -42,6 +42,28 @@ from .memory import Memory
 
 logger = logging.getLogger(__name__)
 
+# Prefetching is off by default; see setPrefetchEnabled()
+_prefetch_enabled = False
+
+# Results waiting to be handled may use this fraction of the available RAM...
+_PREFETCH_RAM_FRACTION = 0.25
+# ...but there is little point in computing further ahead than this many batches
+_MAX_PREFETCH_BATCHES = 2
+
+
+def setPrefetchEnabled(enabled: bool) -> None:
+    """
+    Let BigRequestStreamers compute blocks ahead of their result handler by default,
+    and handle the results in a separate writer thread (see RoiRequestBatch).
+    Only applies to streamers that don't allow parallel results.
+    """
+    global _prefetch_enabled
+    _prefetch_enabled = enabled
+
+
+def isPrefetchEnabled() -> bool:
+    return _prefetch_enabled
+
 
 class BigRequestStreamer(object):
     """
@@ -95,7 +117,15 @@ class BigRequestStreamer(object):
     """
 
     def __init__(
-        self, outputSlot, roi, blockshape=None, batchSize=None, blockAlignment="absolute", allowParallelResults=False
+        self,
+        outputSlot,
+        roi,
+        blockshape=None,
+        batchSize=None,
+        blockAlignment="absolute",
+        allowParallelResults=False,
+        prefetch=None,
+        skipRoi=None,
     ):
         """
         Constructor.
@@ -107,6 +137,14 @@ class BigRequestStreamer(object):
         :param blockAlignment: Determines how block the requests. Choices are 'absolute' or 'relative'.
         :param allowParallelResults: If False, The resultSignal will not be called in parallel.
                                      In that case, your handler function has no need for locks.
+        :param prefetch: The number of blocks that may be computed ahead of the result handler
+                         (see :py:class:`RoiRequestBatch<lazyflow.utility.roiRequestBatch.RoiRequestBatch>`).
+                         If omitted, it is chosen from the available RAM if prefetching is enabled
+                         (see :py:func:`setPrefetchEnabled`), and 0 otherwise.
+        :param skipRoi: Optional ``f(roi) -> bool``.  Blocks for which it returns True are not requested
+                        (e.g. the blocks that an interrupted export has already written, see
+                        :py:class:`ExportManifest<lazyflow.utility.exportManifest.ExportManifest>`).
+                        It is called when a block is scheduled, in the block's request.
         """
         self._outputSlot = outputSlot
         self._bigRoi = roi
@@ -119,6 +157,7 @@ class BigRequestStreamer(object):
 
         if blockshape is None:
             blockshape = self._determine_blockshape(outputSlot)
+        self.blockshape = tuple(blockshape)
 
         assert blockAlignment in ["relative", "absolute"]
         if blockAlignment == "relative":
@@ -174,7 +213,31 @@ class BigRequestStreamer(object):
                         logger.debug("Requesting Roi: {}".format(block_bounds))
                         yield block_intersecting_portion
 
-        self._requestBatch = RoiRequestBatch(self._outputSlot, roiGen(), totalVolume, batchSize, allowParallelResults)
+        if prefetch is None:
+            prefetch = 0
+            if _prefetch_enabled and not allowParallelResults:
+                prefetch = self._determine_prefetch(outputSlot, blockshape, batchSize)
+
+        self._requestBatch = RoiRequestBatch(
+            self._outputSlot,
+            roiGen(),
+            totalVolume,
+            batchSize,
+            allowParallelResults,
+            prefetch=prefetch,
+            skipRoi=skipRoi,
+        )
+
+    def _determine_prefetch(self, outputSlot, blockshape, batchSize):
+        """
+        Choose how many blocks to compute ahead of the result handler, so that the results
+        waiting to be written fit into a fraction of the RAM that is available for computation.
+        """
+        block_bytes = bigintprod(blockshape) * numpy.dtype(outputSlot.meta.dtype).itemsize
+        budget = Memory.getAvailableRamComputation() * _PREFETCH_RAM_FRACTION
+        prefetch = int(min(_MAX_PREFETCH_BATCHES * batchSize, budget // max(1, block_bytes)))
+        logger.debug(f"Prefetching up to {prefetch} blocks of {Memory.format(block_bytes)}")
+        return prefetch
 
     def _determine_blockshape(self, outputSlot):
         """
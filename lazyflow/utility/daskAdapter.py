@@ -0,0 +1,89 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Interoperability with dask (an optional dependency, only imported when these functions are used).
+
+Use :func:`slotToDaskArray` to hand the output of an operator to dask-based code, and
+:class:`lazyflow.operators.OpArrayLikeSource` to feed a dask array into a lazyflow graph.
+"""
+import uuid
+
+import numpy
+
+
+class SlotArrayView:
+    """
+    A read-only, array-like view of an output slot: indexing it with a tuple of slices requests
+    that roi from the slot and waits for the result.
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.shape = tuple(slot.meta.shape)
+        self.dtype = numpy.dtype(slot.meta.dtype)
+        self.ndim = len(self.shape)
+
+    def __getitem__(self, key):
+        return numpy.asarray(self.slot[key].wait())
+
+    def __len__(self):
+        return self.shape[0]
+
+
+def defaultChunks(slot):
+    """
+    The ideal blockshape of the slot (with unconstrained axes extended to the full shape),
+    or "auto" if the slot doesn't have one.
+    """
+    shape = slot.meta.shape
+    ideal_blockshape = slot.meta.ideal_blockshape
+    if ideal_blockshape is None or len(ideal_blockshape) != len(shape) or not any(ideal_blockshape):
+        return "auto"
+    return tuple(min(size or extent, extent) for size, extent in zip(ideal_blockshape, shape))
+
+
+def slotToDaskArray(slot, chunks=None):
+    """
+    Return a lazy dask array with the data of the given (ready) output slot.
+
+    Computing a chunk of the dask array requests the corresponding roi from the slot,
+    so the work is done by lazyflow's thread pool, whichever dask scheduler is used.
+    The array reflects the slot at compute time; create a new one after the slot's meta changes.
+
+    chunks: Any chunk specification dask accepts.  By default, the ideal blockshape of the slot.
+    """
+    import dask.array as da
+
+    if not slot.ready():
+        raise ValueError(f"Slot {slot.name} is not ready")
+    view = SlotArrayView(slot)
+    if chunks is None:
+        chunks = defaultChunks(slot)
+    return da.from_array(
+        view,
+        chunks=chunks,
+        name=f"lazyflow-{slot.name}-{uuid.uuid4().hex}",
+        lock=False,
+        asarray=True,
+        fancy=False,
+        meta=numpy.empty((0,) * view.ndim, dtype=view.dtype),
+    )
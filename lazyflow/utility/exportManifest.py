@@ -0,0 +1,177 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Manifests of the blocks that a chunked export (HDF5, N5, OME-Zarr) has written so far, so that an
+interrupted export can be resumed instead of started over.
+
+The manifest is a small json file next to the export (see :py:meth:`ExportManifest.pathFor`).
+It records the crc32 checksum of each block that has been written, for each dataset in the export.
+When the export is resumed, blocks whose data still matches the recorded checksum are skipped
+(see the ``skipRoi`` parameter of :py:class:`BigRequestStreamer<lazyflow.utility.BigRequestStreamer>`).
+Once a dataset has been exported completely, its entry is discarded, and the file is removed
+when no entries are left.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Callable, Optional
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+# Seconds between manifest updates on disk (plus one update at the end of each dataset)
+SAVE_INTERVAL = 5.0
+
+
+def blockChecksum(data) -> int:
+    return zlib.crc32(numpy.ascontiguousarray(data).view(numpy.uint8).reshape(-1))
+
+
+def _blockKey(roi) -> str:
+    start, stop = roi
+    return ",".join(map(str, map(int, start))) + ":" + ",".join(map(str, map(int, stop)))
+
+
+class ExportManifest:
+    VERSION = 1
+
+    def __init__(self, path: str, flush: Optional[Callable[[], None]] = None):
+        """
+        path: The manifest file (read if it exists)
+        flush: Called before each manifest update, to make sure that the blocks it lists are on disk
+               (e.g. ``h5py.File.flush``)
+        """
+        self.path = path
+        self._flush = flush
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+        self._datasets = {}
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self.VERSION:
+                self._datasets = manifest["datasets"]
+            else:
+                logger.warning(f"Ignoring export manifest {path} with unknown version")
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError):
+            logger.warning(f"Ignoring invalid export manifest {path}")
+
+    @staticmethod
+    def pathFor(external_path: str) -> str:
+        """The manifest file for an export to the given file (or directory, for N5 and zarr)."""
+        return external_path.rstrip("/\\") + ".manifest.json"
+
+    def dataset(self, name: str, shape, dtype, resume: bool = False) -> "ManifestDataset":
+        """
+        The manifest entry for a dataset in the export.  Unless ``resume`` is True (and the shape and dtype of the
+        dataset haven't changed), any blocks recorded for the dataset by a previous export are forgotten.
+        """
+        properties = {"shape": [int(s) for s in shape], "dtype": numpy.dtype(dtype).str}
+        with self._lock:
+            entry = self._datasets.get(name)
+            if resume and entry is not None and all(entry.get(key) == value for key, value in properties.items()):
+                logger.info(f"Resuming export of {name}: {len(entry['blocks'])} blocks were already written")
+            else:
+                entry = self._datasets[name] = {**properties, "blockshape": None, "blocks": {}}
+        return ManifestDataset(self, name, entry)
+
+    def discard(self, name: str):
+        """Forget the dataset (e.g. because its export is complete), and update the file."""
+        with self._lock:
+            self._datasets.pop(name, None)
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _saveIfDue(self):
+        with self._lock:
+            if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+                self._save()
+
+    def _save(self):
+        self._last_save = time.monotonic()
+        if not self._datasets:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+
+        if self._flush is not None:
+            self._flush()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.VERSION, "datasets": self._datasets}, f)
+        os.replace(tmp_path, self.path)
+
+
+class ManifestDataset:
+    """The blocks of one dataset in an export manifest (see ExportManifest.dataset)."""
+
+    def __init__(self, manifest: ExportManifest, name: str, entry: dict):
+        self.manifest = manifest
+        self.name = name
+        self._entry = entry
+
+    @property
+    def blockshape(self):
+        """The blockshape of the previous export (use it again, so the blocks match), or None."""
+        blockshape = self._entry["blockshape"]
+        return tuple(blockshape) if blockshape else None
+
+    @blockshape.setter
+    def blockshape(self, blockshape):
+        self._entry["blockshape"] = [int(s) for s in blockshape]
+
+    @property
+    def numCompleted(self) -> int:
+        return len(self._entry["blocks"])
+
+    def isComplete(self, roi, read: Optional[Callable] = None) -> bool:
+        """
+        Whether the block has been written.  If ``read(roi)`` is given, it must return the
+        block's data from the export, which is checked against the recorded checksum.
+        """
+        checksum = self._entry["blocks"].get(_blockKey(roi))
+        if checksum is None:
+            return False
+        if read is not None and blockChecksum(read(roi)) != checksum:
+            logger.warning(f"Block {roi} of {self.name} doesn't match its checksum in the export manifest")
+            return False
+        return True
+
+    def markComplete(self, roi, data):
+        """Record that the given data has been written to the block."""
+        checksum = blockChecksum(data)
+        with self.manifest._lock:
+            self._entry["blocks"][_blockKey(roi)] = checksum
+        self.manifest._saveIfDue()
+
+    def finish(self):
+        """The dataset has been exported completely: Remove it from the manifest."""
+        self.manifest.discard(self.name)
@@ -39,6 +39,7 @@ from lazyflow.roi import determineBlockShape, roiFromShape, roiToSlice
 from lazyflow.slot import Slot
 from lazyflow.utility import OrderedSignal, PathComponents, BigRequestStreamer
 from lazyflow.utility.data_semantics import ImageTypes
+from lazyflow.utility.exportManifest import ExportManifest, ManifestDataset
 from lazyflow.utility.io_util.OMEZarrStore import (
     OMEZarrMultiscaleMeta,
     InvalidTransformationError,
@@ -198,10 +199,66 @@ def _create_empty_zarray(
     return zarray
 
 
-def _write_block(zarray: zarr.Array, roi, data):
+def _open_or_create_zarray(
+    abs_export_path: str,
+    scale_key: str,
+    scale_shape: Shape,
+    chunk_shape: Shape,
+    export_dtype,
+    resume: bool,
+) -> Tuple[zarr.Array, bool]:
+    """
+    When resuming, open the existing array of the scale (if any).  Otherwise, create an empty one.
+    Returns the array and whether it already existed.
+    """
+    if resume:
+        store = FSStore(abs_export_path, mode="w", **OME_ZARR_V_0_4_KWARGS)
+        if zarr.storage.contains_array(store, scale_key):
+            zarray = zarr.open_array(store, mode="r+", path=scale_key)
+            if (zarray.shape, zarray.chunks, zarray.dtype) != (
+                tuple(scale_shape),
+                tuple(chunk_shape),
+                numpy.dtype(export_dtype),
+            ):
+                raise ValueError(
+                    f"Cannot resume export to {abs_export_path}: Existing scale {scale_key} "
+                    f"(shape {zarray.shape}, dtype {zarray.dtype}) doesn't match the export."
+                )
+            return zarray, True
+    return _create_empty_zarray(abs_export_path, scale_key, scale_shape, chunk_shape, export_dtype), False
+
+
+def _write_block(zarray: zarr.Array, manifest_dataset: ManifestDataset, roi, data):
     slicing = roiToSlice(*roi)
     logger.debug(f"Writing data with shape={data.shape} to {slicing=}")
     zarray[slicing] = data
+    manifest_dataset.markComplete(roi, data)
+
+
+def _read_block(zarray: zarr.Array, roi):
+    return zarray[roiToSlice(*roi)]
+
+
+def _write_scale(
+    source: Slot,
+    zarray: zarr.Array,
+    manifest_dataset: ManifestDataset,
+    progress_signal: OrderedSignal,
+    blockshape: Optional[Shape] = None,
+):
+    """Write source to zarray blockwise, skipping blocks that a previous (interrupted) export wrote already."""
+    skip_roi = None
+    if manifest_dataset.numCompleted:
+        blockshape = blockshape or manifest_dataset.blockshape
+        skip_roi = partial(manifest_dataset.isComplete, read=partial(_read_block, zarray))
+    requester = BigRequestStreamer(source, roiFromShape(source.meta.shape), blockshape=blockshape, skipRoi=skip_roi)
+    manifest_dataset.blockshape = requester.blockshape
+    requester.resultSignal.subscribe(partial(_write_block, zarray, manifest_dataset))
+    requester.progressSignal.subscribe(progress_signal)
+    try:
+        requester.execute()
+    finally:
+        manifest_dataset.manifest.save()
 
 
 def _write_to_dataset_attrs(ilastik_meta: Dict, za: zarr.Array):
@@ -436,28 +493,39 @@ def _write_ome_zarr_and_ilastik_metadata(
         _write_to_dataset_attrs(ilastik_meta, za)
 
 
-def write_ome_zarr(
-    export_path: str,
-    image_source_slot: Slot,
-    progress_signal: OrderedSignal,
-    export_offset: Union[Shape, None],
-    target_scales: Optional[Multiscales] = None,
-):
+def _get_abs_export_path(export_path: str, allow_existing: bool = False) -> str:
     pc = PathComponents(export_path)
     if pc.internalPath:
         raise ValueError(
             f'Internal paths are not supported by OME-Zarr export. Received internal path: "{pc.internalPath}"'
         )
     abs_export_path = pc.externalPath
-    if Path(abs_export_path).exists():
+    if Path(abs_export_path).exists() and not allow_existing:
         raise FileExistsError(
             "Aborting because export path already exists. Please delete it manually if you intended to overwrite it. "
             "Appending to an existing OME-Zarr store is not yet implemented."
             f"\nPath: {abs_export_path}."
         )
+    return abs_export_path
+
+
+def write_ome_zarr(
+    export_path: str,
+    image_source_slot: Slot,
+    progress_signal: OrderedSignal,
+    export_offset: Union[Shape, None],
+    target_scales: Optional[Multiscales] = None,
+    resume: bool = False,
+):
+    """
+    resume: Continue an interrupted export to the same path, skipping the blocks listed in its export manifest
+        (see ExportManifest).  Otherwise, the export path must not exist yet.
+    """
+    abs_export_path = _get_abs_export_path(export_path, allow_existing=resume)
     export_offset: TaggedShape = (
         ODict(zip(image_source_slot.meta.getAxisKeys(), export_offset)) if export_offset else None
     )
+    manifest = ExportManifest(ExportManifest.pathFor(abs_export_path))
     op_reorder = OpReorderAxes(parent=image_source_slot.operator)
     op_reorder.AxisOrder.setValue("".join(OME_ZARR_AXES))
     ops_to_clean = [op_reorder]
@@ -497,11 +565,11 @@ def write_ome_zarr(
                     TargetShape=target_shape,
                     InterpolationOrder=interpolation_order,
                 )
-                requester = BigRequestStreamer(op_scale.ResizedImage, roiFromShape(op_scale.ResizedImage.meta.shape))
-                zarray = _create_empty_zarray(abs_export_path, upscale_key, target_shape, chunk_shape, export_dtype)
-                requester.resultSignal.subscribe(partial(_write_block, zarray))
-                requester.progressSignal.subscribe(progress_signal)
-                requester.execute()
+                zarray, resumed = _open_or_create_zarray(
+                    abs_export_path, upscale_key, target_shape, chunk_shape, export_dtype, resume
+                )
+                manifest_dataset = manifest.dataset(upscale_key, target_shape, export_dtype, resume=resumed)
+                _write_scale(op_scale.ResizedImage, zarray, manifest_dataset, progress_signal)
             finally:
                 op_scale.cleanUp()
 
@@ -522,13 +590,11 @@ def write_ome_zarr(
             ops_to_clean.append(op_cache)
             op_cache.Input.connect(op_scale.ResizedImage)
             op_cache.BlockShape.setValue(chunk_shape)
-            requester = BigRequestStreamer(
-                op_cache.Output, roiFromShape(op_cache.Output.meta.shape), blockshape=chunk_shape
+            zarray, resumed = _open_or_create_zarray(
+                abs_export_path, downscale_key, target_shape, chunk_shape, export_dtype, resume
             )
-            zarray = _create_empty_zarray(abs_export_path, downscale_key, target_shape, chunk_shape, export_dtype)
-            requester.resultSignal.subscribe(partial(_write_block, zarray))
-            requester.progressSignal.subscribe(progress_signal)
-            requester.execute()
+            manifest_dataset = manifest.dataset(downscale_key, target_shape, export_dtype, resume=resumed)
+            _write_scale(op_cache.Output, zarray, manifest_dataset, progress_signal, blockshape=chunk_shape)
             prev_slot = op_cache.Output
 
         progress_signal(95)
@@ -546,7 +612,48 @@ def write_ome_zarr(
                 "drange": reordered_source.meta.get("drange"),
             },
         )
+        # The export is complete, it can't be resumed anymore
+        for scale_key in target_scales:
+            manifest.discard(scale_key)
     finally:
         for op in reversed(ops_to_clean):
             op.cleanUp()
         logger.log(USER_LOGLEVEL, "")
+
+
+def create_empty_ome_zarr(export_path: str, image_source_slot: Slot, chunk_shape: Shape) -> zarr.Array:
+    """
+    Create a single-scale OME-Zarr store with all metadata for the image of image_source_slot, but without data.
+    For exports that write the blocks separately (e.g. distributed export).
+
+    chunk_shape and the returned array are in OME-Zarr axis order (tczyx).
+    """
+    abs_export_path = _get_abs_export_path(export_path)
+    op_reorder = OpReorderAxes(parent=image_source_slot.operator)
+    try:
+        op_reorder.AxisOrder.setValue("".join(OME_ZARR_AXES))
+        op_reorder.Input.connect(image_source_slot)
+        reordered_source = op_reorder.Output
+        export_shape = reordered_source.meta.getTaggedShape()
+        input_scale_key = reordered_source.meta.get("active_scale")
+        scale_key = input_scale_key if input_scale_key else SINGE_SCALE_DEFAULT_KEY
+        zarray = _create_empty_zarray(
+            abs_export_path, scale_key, tuple(export_shape.values()), chunk_shape, reordered_source.meta.dtype
+        )
+        _write_ome_zarr_and_ilastik_metadata(
+            abs_export_path,
+            _multiscales_to_scalings(Multiscales({scale_key: export_shape}), export_shape, export_shape.keys()),
+            OpResize.semantics_to_interpolation[reordered_source.meta.get("data_semantics", ImageTypes.Intensities)],
+            None,
+            reordered_source.meta.get("scales"),
+            input_scale_key,
+            reordered_source.meta.get("ome_zarr_meta"),
+            {
+                "axistags": reordered_source.meta.axistags,
+                "display_mode": reordered_source.meta.get("display_mode"),
+                "drange": reordered_source.meta.get("drange"),
+            },
+        )
+        return zarray
+    finally:
+        op_reorder.cleanUp()
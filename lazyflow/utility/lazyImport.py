@@ -0,0 +1,68 @@
+###############################################################################
+#   lazyflow: data flow based lazy parallel computation framework
+#
+#       Copyright (C) 2011-2024, the ilastik developers
+#                                <team@ilastik.org>
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the Lesser GNU General Public License
+# as published by the Free Software Foundation; either version 2.1
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Lesser General Public License for more details.
+#
+# See the files LICENSE.lgpl2 and LICENSE.lgpl3 for full text of the
+# GNU Lesser General Public License version 2.1 and 3 respectively.
+# This information is also available on the ilastik web site at:
+# 		   http://ilastik.org/license/
+###############################################################################
+"""
+Import the submodules of a package on first use (PEP 562).
+
+Importing lazyflow used to import all operators and classifiers, and through them vigra, h5py,
+sklearn and fastfilters, which costs seconds per process even if only a few of them are needed.
+Packages that use :func:`lazy_module_attributes` import the submodule that defines a name only
+when the name is accessed::
+
+    from lazyflow.utility.lazyImport import lazy_module_attributes
+
+    __getattr__, __dir__, __all__ = lazy_module_attributes(__name__, {"OpArrayPiper": ".opArrayPiper"})
+
+``from package import OpArrayPiper`` and ``package.OpArrayPiper`` then work like before.
+"""
+import importlib
+import importlib.util
+import sys
+from typing import Callable, List, Mapping, Tuple
+
+
+def lazy_module_attributes(
+    package: str, attributes: Mapping[str, str]
+) -> Tuple[Callable[[str], object], Callable[[], List[str]], List[str]]:
+    """
+    Create the module-level ``__getattr__`` and ``__dir__`` functions and ``__all__`` for a package.
+
+    Args:
+        package: Name of the package (``__name__`` in its ``__init__.py``).
+        attributes: Public name -> module that defines it, relative to the package.
+            Submodules of the package are available as attributes as well, like after an eager import.
+    """
+
+    def __getattr__(name):
+        if name in attributes:
+            value = getattr(importlib.import_module(attributes[name], package), name)
+        elif not name.startswith("__") and importlib.util.find_spec(f"{package}.{name}") is not None:
+            value = importlib.import_module(f"{package}.{name}")
+        else:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        # Later lookups do not go through __getattr__
+        setattr(sys.modules[package], name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(attributes))
+
+    return __getattr__, __dir__, sorted(attributes)
@@ -23,6 +23,7 @@
 from __future__ import division
 from builtins import object
 
+import contextlib
 import os
 import psutil
 import platform
@@ -49,6 +50,7 @@ class Memory(object):
     _default_allowed_ram = max(_physically_available_ram - 1024.0 ** 3, 0)
     _default_cache_fraction = 0.25
     _allowed_ram = _default_allowed_ram
+    _computation_shares = 1
     _user_limits_specified = {"total": False, "caches": False}
 
     _magnitude_strings = {0: "B", 1: "KiB", 2: "MiB", 3: "GiB", 4: "TiB"}
@@ -147,15 +149,46 @@ class Memory(object):
     @classmethod
     def getAvailableRamComputation(cls):
         """
-        shortcut for available_ram - ram_for_caches
+        shortcut for (available_ram - ram_for_caches) / computation_shares
         """
         available = cls.getAvailableRam()
         caches = cls.getAvailableRamCaches()
         comp = available - caches
         if comp < 0:
             comp = 0
+        if cls._computation_shares > 1:
+            comp //= cls._computation_shares
         return comp
 
+    @classmethod
+    def getComputationShares(cls):
+        return cls._computation_shares
+
+    @classmethod
+    def setComputationShares(cls, shares):
+        """
+        set the number of independent computations (e.g. exports) that run at the same time,
+        and that share the memory available for computation equally
+        """
+        if shares < 1:
+            raise ValueError(f"Invalid number of computation shares: {shares}")
+        cls._computation_shares = int(shares)
+        logger.info("Memory for computations split between {} computations".format(cls._computation_shares))
+
+    @classmethod
+    @contextlib.contextmanager
+    def sharedComputation(cls, shares):
+        """
+        context manager that splits the memory available for computation between ``shares``
+        computations, and restores the previous setting afterwards
+        """
+        previous = cls._computation_shares
+        cls.setComputationShares(shares)
+        try:
+            yield
+        finally:
+            cls._computation_shares = previous
+
     @staticmethod
     def format(ram, trailing_digits=1):
         mant, exp = Memory.toScientific(ram)
@@ -26,10 +26,11 @@ import re
 import fnmatch
 import errno
 import pathlib
+import sys
+from operator import attrgetter
 from typing import List
 
 import h5py
-import z5py
 import numpy
 
 
@@ -354,6 +355,17 @@ def mkdir_p(path):
             raise
 
 
+def loadedZ5pyTypes(*names):
+    """
+    z5py classes (e.g. "N5File") for isinstance checks, without importing z5py:
+    if it was not imported yet, no object can be an instance of them.
+    """
+    z5py = sys.modules.get("z5py")
+    if z5py is None:
+        return ()
+    return tuple(attrgetter(name)(z5py) for name in names)
+
+
 def lsH5N5(h5N5FileObject, minShape=2, maxShape=5):
     """Generates dataset list of given h5py or z5py file object
 
@@ -367,11 +379,11 @@ def lsH5N5(h5N5FileObject, minShape=2, maxShape=5):
     listOfDatasets = []
 
     def addObjectNames(objectName, obj):
-        if not isinstance(obj, (h5py._hl.dataset.Dataset, z5py.dataset.Dataset)):
+        if not isinstance(obj, (h5py._hl.dataset.Dataset, *loadedZ5pyTypes("dataset.Dataset"))):
             return
         if len(obj.shape) not in range(minShape, maxShape + 1):
             return
-        if isinstance(h5N5FileObject, z5py.N5File):
+        if isinstance(h5N5FileObject, loadedZ5pyTypes("N5File")):
             # make sure we get a path with forward slashes on windows
             objectName = pathlib.Path(objectName).as_posix()
         listOfDatasets.append({"name": objectName, "object": obj})
@@ -401,7 +413,7 @@ def globH5N5(fileObject, globString):
           matches occurred.
         - None if fileObject is not a h5 or n5 file object
     """
-    if isinstance(fileObject, (h5py.File, z5py.N5File)):
+    if isinstance(fileObject, (h5py.File, *loadedZ5pyTypes("N5File"))):
         pathlist = [x["name"] for x in lsH5N5(fileObject)]
     else:
         return None
@@ -19,7 +19,9 @@
 # This information is also available on the ilastik web site at:
 # 		   http://ilastik.org/license/
 ###############################################################################
+import queue
 import sys
+import threading
 from functools import partial
 
 import numpy
@@ -34,6 +36,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Result of the requests for skipped rois
+_SKIPPED = object()
+
 
 class RoiRequestBatchException(Exception):
     pass
@@ -95,9 +100,22 @@ class RoiRequestBatch:
     Progress: 0 20 40 60 80 100 100
     >>> print(f"Processed {result_count[0]} result blocks with a total sum of: {result_total_sum[0]}")
     Processed 5 result blocks with a total sum of: 14500
+
+    With ``prefetch > 0``, results are handled in a separate writer thread, so that a slow result
+    handler (e.g. writing to a network filesystem) doesn't stall the computation: up to ``prefetch``
+    further results are computed ahead while the writer is busy.
     """
 
-    def __init__(self, outputSlot, roiIterator, totalVolume=None, batchSize=2, allowParallelResults=False):
+    def __init__(
+        self,
+        outputSlot,
+        roiIterator,
+        totalVolume=None,
+        batchSize=2,
+        allowParallelResults=False,
+        prefetch=0,
+        skipRoi=None,
+    ):
         """
         Constructor.
 
@@ -109,7 +127,14 @@ class RoiRequestBatch:
         :param batchSize: The maximum number of requests to launch in parallel.
         :param allowParallelResults: If False, The resultSignal will not be called in parallel.
                                      In that case, your handler function has no need for locks.
+        :param prefetch: The maximum number of finished results that may wait for the result handler.
+                         If > 0, the resultSignal is called from a separate writer thread (never in parallel),
+                         and computation continues while results are handled.
+        :param skipRoi: Optional ``f(roi) -> bool``.  Rois for which it returns True are not requested,
+                        and no result is signaled for them (they count as processed for the progress).
+                        It is called in the request of each roi, so the checks run in parallel.
         """
+        assert not (prefetch and allowParallelResults), "Prefetching requires results to be handled in order"
         self._resultSignal = OrderedSignal()
         self._progressSignal = OrderedSignal()
 
@@ -120,11 +145,18 @@ class RoiRequestBatch:
         self._roiIter = roiIterator
         self._batchSize = batchSize
         self._allowParallelResults = allowParallelResults
+        self._prefetch = prefetch
+        self._skipRoi = skipRoi
 
         self._condition = SimpleRequestCondition()
 
         self._activated_count = 0
-        self._completed_count = 0
+        self._finished_count = 0  # requests that are done computing
+        self._completed_count = 0  # results that have been handled
+
+        # Results waiting for the writer thread (only used if prefetching)
+        self._writerQueue = queue.Queue() if prefetch else None
+        self._writerThread = None
 
         self._failure_excinfo = None
 
@@ -164,6 +196,10 @@ class RoiRequestBatch:
         ## instead of forcing them to wait for the entire batch to be launched before the first
         ## finished request can be handled and discarded.
 
+        if self._writerQueue is not None:
+            self._writerThread = threading.Thread(target=self._writeResults, name="RoiRequestBatch-writer", daemon=True)
+            self._writerThread.start()
+
         try:
             # Start by activating a batch of N requests
             for _ in range(self._batchSize):
@@ -173,11 +209,9 @@ class RoiRequestBatch:
 
             # Loop until StopIteration
             while True:
-                # Wait for at least one active request to finish
+                # Wait for at least one active request to finish (or its result to be written)
                 with self._condition:
-                    while (
-                        not self._failure_excinfo and (self._activated_count - self._completed_count) == self._batchSize
-                    ):
+                    while not self._failure_excinfo and not self._canActivate():
                         self._condition.wait()
 
                 if self._failure_excinfo:
@@ -185,7 +219,7 @@ class RoiRequestBatch:
                     raise RoiRequestBatchException() from exc_value
 
                 # Launch new requests until we have the correct number of active requests
-                while not self._failure_excinfo and self._activated_count - self._completed_count < self._batchSize:
+                while not self._failure_excinfo and self._canActivate():
                     with self._condition:
                         self._activateNewRequest()  # Eventually raises StopIteration
                         self._activated_count += 1
@@ -205,8 +239,23 @@ class RoiRequestBatch:
                 exc_type, exc_value, exc_tb = self._failure_excinfo
                 raise RoiRequestBatchException() from exc_value
 
+        finally:
+            if self._writerThread is not None:
+                # Results that arrive after this point are discarded
+                self._writerQueue.put(None)
+                self._writerThread.join()
+
         self.progressSignal(100)
 
+    def _canActivate(self):
+        """
+        True if another request may be launched: at most batchSize requests compute in parallel,
+        and at most batchSize + prefetch requests are computing or waiting for their result to be handled.
+        """
+        computing = self._activated_count - self._finished_count
+        unhandled = self._activated_count - self._completed_count
+        return computing < self._batchSize and unhandled < self._batchSize + self._prefetch
+
     def _activateNewRequest(self):
         """
         Creates and activates a new request if there are more rois to process.
@@ -214,7 +263,10 @@ class RoiRequestBatch:
         """
         # This could raise StopIteration
         roi = next(self._roiIter)
-        req = self._outputSlot(roi[0], roi[1])
+        if self._skipRoi is not None:
+            req = Request(partial(self._requestUnlessSkipped, roi))
+        else:
+            req = self._outputSlot(roi[0], roi[1])
 
         # We have to make sure that we didn't get a so-called "ValueRequest"
         # because those don't work the same way.
@@ -226,7 +278,28 @@ class RoiRequestBatch:
         req.notify_cancelled(partial(self._handleCancelledRequest, roi))
         req.submit()
 
+    def _requestUnlessSkipped(self, roi):
+        if self._skipRoi(roi):
+            return _SKIPPED
+        return self._outputSlot(roi[0], roi[1]).wait()
+
     def _handleCompletedRequest(self, roi, result):
+        if result is _SKIPPED:
+            with self._condition:
+                try:
+                    self._finished_count += 1
+                    self._reportCompleted(roi)
+                finally:
+                    self._condition.notify()
+            return
+
+        if self._writerQueue is not None:
+            with self._condition:
+                self._finished_count += 1
+                self._writerQueue.put((roi, result))
+                self._condition.notify()
+            return
+
         try:
             if self._allowParallelResults:
                 # Signal the user with the result before the critical section
@@ -244,19 +317,49 @@ class RoiRequestBatch:
                     # Signal here, inside the critical section.
                     self.resultSignal(roi, result)
 
-                # Report progress (if possible)
-                if self._totalVolume is not None:
-                    self._processedVolume += bigintprod(numpy.subtract(roi[1], roi[0]))
-                    progress = 100 * self._processedVolume // self._totalVolume
-                    self.progressSignal(progress)
-
-                logger.debug("Request completed for roi: {}".format(roi))
-                self._completed_count += 1
+                self._reportCompleted(roi)
+                self._finished_count += 1
             finally:
                 # Always notify in this finally section,
                 #  even if the client result/progress handler raised.
                 self._condition.notify()
 
+    def _writeResults(self):
+        """
+        Writer thread: handle the results one by one, in the order in which they were computed.
+        The handler runs without holding the condition, so that finishing requests aren't blocked by it.
+        """
+        while True:
+            item = self._writerQueue.get()
+            if item is None:
+                return
+            roi, result = item
+            try:
+                self.resultSignal(roi, result)
+            except Exception:
+                logger.exception(f"Failed to handle the result for roi: {roi}")
+                with self._condition:
+                    self._failure_excinfo = sys.exc_info()
+                    self._condition.notify()
+                return
+            del item, result
+
+            with self._condition:
+                try:
+                    self._reportCompleted(roi)
+                finally:
+                    self._condition.notify()
+
+    def _reportCompleted(self, roi):
+        # Report progress (if possible)
+        if self._totalVolume is not None:
+            self._processedVolume += bigintprod(numpy.subtract(roi[1], roi[0]))
+            progress = 100 * self._processedVolume // self._totalVolume
+            self.progressSignal(progress)
+
+        logger.debug("Request completed for roi: {}".format(roi))
+        self._completed_count += 1
+
     def _handleFailedRequest(self, roi, exc, exc_info):
         with self._condition:
             msg = "Encountered exception while processing roi: {}".format(roi)
@@ -97,3 +97,81 @@ def test_BatchProcessingCallsPostProcessOnException(batchProcessingApplet):
     dataExportApplet.post_process_entire_export.assert_called_once()
     dataExportApplet.prepare_lane_for_export.assert_called_once()
     dataExportApplet.post_process_lane_export.assert_not_called()
+
+
+@pytest.mark.parametrize("parallel_lanes", [1, 4, 50])
+def test_BatchProcessingParallelLanes(batchProcessingApplet, dataselectionApplet, parallel_lanes):
+    """
+    Exporting several lanes at once gives the same results, in the same order, as the sequential export,
+    and removes all lanes again.
+    """
+    lanes = []
+    dataselectionApplet.pushLane.side_effect = lanes.append
+    dataselectionApplet.dropLastLane.side_effect = lanes.pop
+    type(dataselectionApplet).num_lanes = property(lambda self: len(lanes))
+
+    dataExportApplet = batchProcessingApplet.dataExportApplet
+    dataExportApplet.topLevelOperator.getLane.side_effect = lambda lane_index: Mock(lane_config=lanes[lane_index])
+
+    progress = []
+    batchProcessingApplet.progressSignal.subscribe(progress.append)
+
+    lane_configs = list(range(42))
+    results = batchProcessingApplet.run_export(
+        lane_configs=lane_configs,
+        export_function=lambda opDataExport: opDataExport.lane_config,
+        parallel_lanes=parallel_lanes,
+    )
+
+    assert results == lane_configs
+    assert lanes == []
+    assert dataExportApplet.prepare_lane_for_export.call_count == len(lane_configs)
+    assert dataExportApplet.post_process_lane_export.call_count == len(lane_configs)
+    assert progress[0] == 0
+    assert progress[-1] == 100
+
+
+def test_BatchProcessingParallelLanesDropsLanesOnException(batchProcessingApplet, dataselectionApplet):
+    lanes = []
+    dataselectionApplet.pushLane.side_effect = lanes.append
+    dataselectionApplet.dropLastLane.side_effect = lanes.pop
+    type(dataselectionApplet).num_lanes = property(lambda self: len(lanes))
+
+    def export_function(opDataExport):
+        raise Exception("Who knows")
+
+    with pytest.raises(Exception):
+        batchProcessingApplet.run_export(
+            lane_configs=list(range(10)), export_function=export_function, parallel_lanes=3
+        )
+
+    assert lanes == []
+    batchProcessingApplet.dataExportApplet.post_process_entire_export.assert_called_once()
+    batchProcessingApplet.dataExportApplet.post_process_lane_export.assert_not_called()
+
+
+@pytest.mark.parametrize("parallel_lanes", [1, 4])
+def test_BatchProcessingReusesLanes(batchProcessingApplet, dataselectionApplet, parallel_lanes):
+    lanes = []
+    dataselectionApplet.pushLane.side_effect = lanes.append
+    dataselectionApplet.dropLastLane.side_effect = lanes.pop
+    dataselectionApplet.reconfigureLane.side_effect = lanes.__setitem__
+    type(dataselectionApplet).num_lanes = property(lambda self: len(lanes))
+
+    dataExportApplet = batchProcessingApplet.dataExportApplet
+    dataExportApplet.topLevelOperator.getLane.side_effect = lambda lane_index: Mock(lane_config=lanes[lane_index])
+
+    lane_configs = list(range(42))
+    results = batchProcessingApplet.run_export(
+        lane_configs=lane_configs,
+        export_function=lambda opDataExport: opDataExport.lane_config,
+        parallel_lanes=parallel_lanes,
+        reuse_lanes=True,
+    )
+
+    assert results == lane_configs
+    assert lanes == []
+    assert dataselectionApplet.pushLane.call_count == parallel_lanes
+    assert dataselectionApplet.reconfigureLane.call_count == len(lane_configs) - parallel_lanes
+    assert dataExportApplet.prepare_lane_for_export.call_count == len(lane_configs)
+    assert dataExportApplet.post_process_lane_export.call_count == len(lane_configs)
@@ -26,6 +26,7 @@ import ilastik.ilastik_logging
 ilastik.ilastik_logging.default_config.init()
 
 import unittest
+from unittest import mock
 import numpy as np
 import vigra
 from lazyflow.graph import Graph
@@ -271,6 +272,13 @@ class TestOpObjectPredict(unittest.TestCase):
         self.assertTrue(np.all(preds[0] == np.array([0, 1, 2])))
         self.assertTrue(np.all(preds[1] == np.array([0, 1, 1, 2])))
 
+    def test_predict_in_chunks(self):
+        # one object per chunk
+        with mock.patch("ilastik.applets.objectClassification.opObjectClassification.PREDICTION_CHUNK_BYTES", 4):
+            preds = self.op.Predictions([0, 1]).wait()
+        self.assertTrue(np.all(preds[0] == np.array([0, 1, 2])))
+        self.assertTrue(np.all(preds[1] == np.array([0, 1, 1, 2])))
+
     def test_probabilities(self):
         ###
         # test whether the probability channel slots and the total probability slot return the same values
@@ -0,0 +1,66 @@
+import itertools
+
+import numpy
+import pytest
+
+from ilastik.applets.objectExtraction.blockwiseRegionFeatures import MERGEABLE_FEATURES, RegionFeatureAccumulator
+
+
+@pytest.fixture
+def volume():
+    rng = numpy.random.default_rng(0)
+    labels = rng.integers(0, 7, (30, 25, 12)).astype(numpy.uint32)
+    labels[labels == 4] = 0  # a label that does not occur
+    raw = rng.gamma(2.0, 10.0, size=labels.shape + (2,))
+    return raw, labels
+
+
+def add_blocks(accumulator, raw, labels, block_shape):
+    for start in itertools.product(*(range(0, n, b) for n, b in zip(labels.shape, block_shape))):
+        slicing = tuple(slice(s, s + b) for s, b in zip(start, block_shape))
+        accumulator.add_block(raw[slicing], labels[slicing], start)
+
+
+@pytest.mark.parametrize("block_shape", [(7, 5, 4), (1, 25, 12), (30, 25, 12)])
+def test_blocks_are_merged_exactly(volume, block_shape):
+    raw, labels = volume
+    accumulator = RegionFeatureAccumulator(num_channels=2, num_spatial_axes=3)
+    add_blocks(accumulator, raw, labels, block_shape)
+    features = accumulator.features(MERGEABLE_FEATURES)
+
+    assert accumulator.num_objects == 6
+    for label in range(1, 7):
+        row = label - 1
+        mask = labels == label
+        if label == 4:
+            assert features["Count"][row] == 0
+            continue
+
+        values = raw[mask]
+        centered = values - values.mean(axis=0)
+        variance = (centered**2).mean(axis=0)
+        coords = numpy.argwhere(mask)
+
+        numpy.testing.assert_array_equal(features["Count"][row], [mask.sum()])
+        numpy.testing.assert_allclose(features["Sum"][row], values.sum(axis=0))
+        numpy.testing.assert_allclose(features["Mean"][row], values.mean(axis=0))
+        numpy.testing.assert_allclose(features["Variance"][row], variance)
+        numpy.testing.assert_allclose(features["Skewness"][row], (centered**3).mean(axis=0) / variance**1.5)
+        numpy.testing.assert_allclose(features["Kurtosis"][row], (centered**4).mean(axis=0) / variance**2 - 3)
+        numpy.testing.assert_array_equal(features["Minimum"][row], values.min(axis=0))
+        numpy.testing.assert_array_equal(features["Maximum"][row], values.max(axis=0))
+        numpy.testing.assert_array_equal(features["Coord<Minimum>"][row], coords.min(axis=0))
+        numpy.testing.assert_array_equal(features["Coord<Maximum>"][row], coords.max(axis=0) + 1)
+        numpy.testing.assert_allclose(features["RegionCenter"][row], coords.mean(axis=0))
+
+
+def test_empty_blocks():
+    accumulator = RegionFeatureAccumulator(num_channels=1, num_spatial_axes=2)
+    accumulator.add_block(numpy.ones((4, 4, 1)), numpy.zeros((4, 4), dtype=numpy.uint32), (0, 0))
+    assert accumulator.num_objects == 0
+    assert accumulator.features(["Count", "Mean"])["Mean"].shape == (0, 1)
+
+
+def test_unsupported_features():
+    with pytest.raises(ValueError):
+        RegionFeatureAccumulator(num_channels=1, num_spatial_axes=2).features(["Count", "Histogram"])
@@ -0,0 +1,103 @@
+import numpy
+import pytest
+
+from ilastik.applets.objectExtraction.featureTable import FeatureTable
+from ilastik.applets.objectExtraction.opObjectExtraction import default_features_key
+
+NAME = "Standard Object Features"
+
+
+def frame_features(num_objects, offset=0.0):
+    values = numpy.arange(num_objects, dtype=numpy.float32) + offset
+    return {
+        NAME: {
+            "Count": values[:, None],
+            "Mean": numpy.stack([values, -values], axis=1),
+            "Variance": values[:, None] * 2,
+        },
+        default_features_key: {"Count": values[:, None].astype(numpy.float64)},
+    }
+
+
+@pytest.fixture
+def frames():
+    return {2: frame_features(5, 200), 0: frame_features(3), 1: frame_features(1, 100)}
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_append_frames(memmap, tmp_path):
+    table = FeatureTable(
+        FeatureTable.columns_for(frame_features(2), {NAME: ["Count", "Mean"]}),
+        capacity=2,
+        memmap=memmap,
+        scratch_dir=str(tmp_path),
+    )
+    assert table.memmapped == memmap
+    assert table.column_names == [(NAME, "Count"), (NAME, "Mean"), (NAME, "Mean")]
+    table.append_frame(0, frame_features(3))
+    table.append_frame(1, frame_features(4, 10))
+
+    assert table.frames == [0, 1]
+    assert table.num_rows == 7
+    assert table.rows(1) == slice(3, 7)
+    numpy.testing.assert_array_equal(table.frame(1), [[10, 10, -10], [11, 11, -11], [12, 12, -12], [13, 13, -13]])
+    numpy.testing.assert_array_equal(table.column(NAME, "Mean", 1), [0, -1, -2, -10, -11, -12, -13])
+    assert table.column(NAME, "Mean", 1).flags.c_contiguous
+    assert table.feature(NAME, "Mean").shape == (7, 2)
+    numpy.testing.assert_array_equal(table.object_rows(), [1, 2, 4, 5, 6])
+
+    with pytest.raises(ValueError):
+        table.append_frame(1, frame_features(2))
+    table.close()
+
+
+def test_from_frames(frames):
+    table = FeatureTable.from_frames(frames, {NAME: ["Variance", "Count"]})
+    assert table.frames == [0, 1, 2]
+    assert table.values().dtype == numpy.float32
+    assert table.values().shape == (9, 2)
+    numpy.testing.assert_array_equal(table.frame(2)[:, 1], numpy.arange(5) * 2 + 400)
+
+    with_defaults = FeatureTable.from_frames(frames, include_default_features=True)
+    assert (default_features_key, "Count") in with_defaults.features
+    assert with_defaults.features[(NAME, "Mean")] == 2
+
+
+def test_for_frames(frames):
+    table = FeatureTable.for_frames(frames.values(), {NAME: ["Variance", "Count"]}, max_ram=16)
+    assert table.num_rows == 0
+    assert table.memmapped
+    for t in sorted(frames):
+        table.append_frame(t, frames[t])
+    assert table.values().shape == (9, 2)
+    numpy.testing.assert_array_equal(table.frame(2)[:, 1], numpy.arange(5) * 2 + 400)
+    table.close()
+
+
+def test_append_some_objects(frames):
+    objects = {0: [2], 1: [], 2: [4, 1]}
+    table = FeatureTable.for_frames(frames.values(), {NAME: ["Variance", "Count"]}, num_rows=3)
+    assert table._data.shape[1] == 3
+    for t in sorted(frames):
+        table.append_frame(t, frames[t], objects=objects[t])
+    numpy.testing.assert_array_equal(table.values(), [[2, 4], [204, 408], [201, 402]])
+    assert table.rows(1) == slice(1, 1)
+    numpy.testing.assert_array_equal(table.frame(2)[:, 0], [204, 201])
+
+
+def test_frames_without_objects_may_lack_features(frames):
+    frames[1] = {NAME: {"Count": numpy.zeros((1, 1))}}
+    table = FeatureTable.from_frames(frames, {NAME: ["Count", "Mean"]})
+    numpy.testing.assert_array_equal(table.frame(1), [[0, 0, 0]])
+
+    frames[1] = {NAME: {"Count": numpy.zeros((2, 1))}}
+    with pytest.raises(ValueError):
+        FeatureTable.from_frames(frames, {NAME: ["Count", "Mean"]})
+
+
+def test_memmap_if_too_big(frames, tmp_path):
+    table = FeatureTable.from_frames(frames, max_ram=16, scratch_dir=str(tmp_path))
+    assert table.memmapped
+    assert not FeatureTable.from_frames(frames).memmapped
+    numpy.testing.assert_array_equal(table.frame(0), FeatureTable.from_frames(frames).frame(0))
+    table.close()
@@ -28,8 +28,14 @@ import numpy as np
 import vigra
 from lazyflow.graph import Graph
 from lazyflow.operators import OpLabelVolume
-from ilastik.applets.objectExtraction.opObjectExtraction import OpAdaptTimeListRoi, OpRegionFeatures, OpObjectExtraction
+from ilastik.applets.objectExtraction.opObjectExtraction import (
+    OpAdaptTimeListRoi,
+    OpRegionFeatures,
+    OpObjectExtraction,
+    max_margin,
+)
 from ilastik.plugins.manager import pluginManager
+from ilastik.plugins.types import ObjectFeaturesPlugin
 
 import warnings
 
@@ -211,3 +217,108 @@ class TestOpRegionFeaturesAgainstNumpy(unittest.TestCase):
                 # that means bounding box centers can differ with a maximum of 0.5
                 bbox_center = mins[iobj] + ((maxs[iobj] - mins[iobj]) / 2.0)
                 np.testing.assert_allclose(centers[iobj], bbox_center, atol=0.5)
+
+
+class TestOpRegionFeaturesBlockwise(unittest.TestCase):
+    def setUp(self):
+        g = Graph()
+        self.features = {
+            NAME: {
+                "Count": {},
+                "Sum": {},
+                "Mean": {},
+                "Variance": {},
+                "Minimum": {},
+                "Maximum": {},
+                "RegionCenter": {},
+                "Coord<Minimum>": {},
+                "Coord<Maximum>": {},
+            }
+        }
+        rawimage = rawImage()
+        rawimage[...] += np.random.default_rng(0).normal(size=rawimage.shape).astype(np.float32)
+        self.labelop = OpLabelVolume(graph=g)
+        self.labelop.Input.setValue(binaryImage())
+
+        self.op = OpRegionFeatures(graph=g)
+        self.op.LabelVolume.connect(self.labelop.Output)
+        self.op.RawVolume.setValue(rawimage)
+        self.op.Features.setValue(self.features)
+
+        self.op_blockwise = OpRegionFeatures(graph=g)
+        self.op_blockwise.LabelVolume.connect(self.labelop.Output)
+        self.op_blockwise.RawVolume.setValue(rawimage)
+        self.op_blockwise.Features.setValue(self.features)
+        # All objects but the smallest ones cross block boundaries
+        self.op_blockwise.FeatureBlockShape.setValue({"x": 16, "y": 16, "z": 8})
+
+    def test_same_as_whole_volume(self):
+        expected = self.op.Output[:].wait()
+        feats = self.op_blockwise.Output[:].wait()
+        for t in range(2):
+            for plugin_name in (NAME, "Default features"):
+                assert feats[t][plugin_name].keys() == expected[t][plugin_name].keys()
+                for key, value in expected[t][plugin_name].items():
+                    np.testing.assert_allclose(feats[t][plugin_name][key], value, rtol=1e-4, err_msg=key)
+
+    def test_unmergeable_features(self):
+        from ilastik.applets.base.applet import DatasetConstraintError
+
+        self.op_blockwise.Features.setValue({NAME: {"Mean in neighborhood": {"margin": (5, 5, 2)}}})
+        with self.assertRaises(DatasetConstraintError):
+            self.op_blockwise.Output[0:1].wait()
+
+
+class TestComputeLocalBatch(unittest.TestCase):
+    class Axes:
+        x, y, z, c = 0, 1, 2, 3
+
+    def test_same_as_per_object(self):
+        raw = rawImage()[0]
+        raw += np.random.default_rng(0).normal(size=raw.shape).astype(np.float32)
+        labels = vigra.analysis.labelVolumeWithBackground(binaryImage()[0, ..., 0].astype(np.uint32))
+        features = {
+            "Mean in neighborhood": {"margin": (5, 5, 2)},
+            "Variance in neighborhood": {"margin": (5, 5, 2)},
+            "Maximum in neighborhood": {"margin": (5, 5, 2)},
+        }
+
+        plugin = pluginManager.getPluginByName(NAME, "ObjectFeatures").plugin_object
+        bboxes = plugin.compute_global(raw, labels, {"Coord<Minimum>": {}, "Coord<Maximum>": {}}, self.Axes)
+        extents = OpRegionFeatures(graph=Graph()).compute_extents(
+            raw,
+            bboxes["Coord<Minimum>"].astype(int),
+            bboxes["Coord<Maximum>"].astype(int),
+            self.Axes,
+            max_margin({NAME: features}),
+        )
+        object_ids = np.arange(1, len(extents) + 1)
+
+        batch = plugin.compute_local_batch(raw, labels, object_ids, extents, features, self.Axes)
+        per_object = ObjectFeaturesPlugin.compute_local_batch(
+            plugin, raw, labels, object_ids, extents, features, self.Axes
+        )
+        assert len(batch) == 6
+        assert batch.keys() == per_object.keys()
+        for key, value in per_object.items():
+            assert batch[key].shape == value.shape == (3, 1)
+            np.testing.assert_allclose(batch[key], value, rtol=1e-5, err_msg=key)
+
+    def test_empty_neighborhood(self):
+        """A feature fails for an object without neighborhood voxels, and is left out like in the per-object path"""
+        raw = np.random.default_rng(0).random((10, 10, 5, 1)).astype(np.float32)
+        labels = np.zeros((10, 10, 5), dtype=np.uint32)
+        labels[0:3, 0:3, :] = 1
+        labels[6:8, 6:8, 1:3] = 2
+        # the first object fills its whole extent
+        extents = [[slice(0, 3), slice(0, 3), slice(0, 5)], [slice(4, 10), slice(4, 10), slice(0, 5)]]
+        features = {"Mean in neighborhood": {"margin": (2, 2, 2)}}
+
+        plugin = pluginManager.getPluginByName(NAME, "ObjectFeatures").plugin_object
+        plugin.compute_global(raw, labels, {"Count": {}}, self.Axes)
+        batch = plugin.compute_local_batch(raw, labels, [1, 2], extents, features, self.Axes)
+        per_object = ObjectFeaturesPlugin.compute_local_batch(plugin, raw, labels, [1, 2], extents, features, self.Axes)
+        assert "Mean in neighborhood" not in batch
+        assert batch.keys() == per_object.keys() == {"Mean in object and neighborhood"}
+        for key, value in per_object.items():
+            np.testing.assert_array_equal(batch[key], value)
@@ -1,10 +1,14 @@
+import h5py
 import imageio.v3 as iio
 import numpy as np
 import pytest
+import vigra
 import xarray
+import zarr
 from pydantic import ValidationError
 
 from ilastik.experimental.api import AutocontextPipeline, PixelClassificationPipeline, from_project_file
+from ilastik.experimental.api._streaming import open_sink
 
 from ..types import ApiTestDataLookup, Dataset, TestData, TestProjects
 
@@ -59,12 +63,13 @@ class TestIlastikApiPixelClassification:
             (TestData.DATA_1_CHANNEL_3D, TestProjects.PIXEL_CLASS_3D_2D_3D_FEATURE_MIX),
         ],
     )
-    def test_predict_pretrained(self, test_data_lookup: ApiTestDataLookup, input_, proj):
+    @pytest.mark.parametrize("flat_forest", [False, True])
+    def test_predict_pretrained(self, test_data_lookup: ApiTestDataLookup, input_, proj, flat_forest):
         project_path = test_data_lookup.find_project(proj)
         input_dataset = test_data_lookup.find_dataset(input_)
 
         expected_prediction = _load_as_xarray(test_data_lookup.find_test_result(proj, input_, "Probabilities"))
-        pipeline = PixelClassificationPipeline.from_ilp_file(project_path)
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path, flat_forest=flat_forest)
 
         prediction = pipeline.get_probabilities(_load_as_xarray(input_dataset))
         assert prediction.shape == expected_prediction.shape
@@ -96,6 +101,58 @@ class TestIlastikApiPixelClassification:
         assert prediction.shape == expected_prediction.shape
         np.testing.assert_array_almost_equal(prediction, expected_prediction, decimal=1)
 
+    @pytest.mark.parametrize(
+        "input_, proj",
+        [
+            (TestData.DATA_1_CHANNEL, TestProjects.PIXEL_CLASS_1_CHANNEL_XY),
+            (TestData.DATA_1_CHANNEL_3D, TestProjects.PIXEL_CLASS_3D),
+        ],
+    )
+    def test_write_probabilities(self, test_data_lookup: ApiTestDataLookup, input_, proj, tmp_path):
+        project_path = test_data_lookup.find_project(proj)
+        input_data = _load_as_xarray(test_data_lookup.find_dataset(input_))
+        pipeline = PixelClassificationPipeline.from_ilp_file(project_path)
+        expected_prediction = pipeline.get_probabilities(input_data)
+
+        # Lazy source, sink created by the pipeline
+        source = zarr.array(input_data.values, chunks=(32,) * input_data.ndim)
+        sink_path = tmp_path / "probabilities.zarr"
+        block_shape = {"z": 16, "y": 40, "x": 50}
+        axes = pipeline.write_probabilities(
+            source, str(sink_path), axes="".join(input_data.dims), block_shape=block_shape
+        )
+        assert axes == expected_prediction.dims
+        np.testing.assert_array_almost_equal(zarr.open(str(sink_path), mode="r")[...], expected_prediction, decimal=5)
+
+        # Source on disk, existing sink
+        source_path = tmp_path / "raw.h5"
+        with h5py.File(source_path, "w") as f:
+            f.create_dataset("raw", data=input_data.values)
+            f["raw"].attrs["axistags"] = vigra.defaultAxistags("".join(input_data.dims)).toJSON()
+        sink = zarr.zeros(expected_prediction.shape, dtype=np.float32)
+        pipeline.write_probabilities(f"{source_path}/raw", sink, num_threads=2)
+        np.testing.assert_array_almost_equal(sink[...], expected_prediction, decimal=5)
+
+        # The pipeline can still be used with in-memory data
+        np.testing.assert_array_equal(pipeline.get_probabilities(input_data), expected_prediction)
+
+    @pytest.mark.parametrize(
+        "internal_path, array_path", [("", None), ("/probabilities", "probabilities"), ("/a/b/", "a/b")]
+    )
+    def test_zarr_sink_path(self, tmp_path, internal_path, array_path):
+        store = tmp_path / "out.zarr"
+        with open_sink(f"{store}{internal_path}", (10, 20, 2), (4, 32, 2)) as out:
+            out[...] = 1
+        written = zarr.open_array(str(store), mode="r", path=array_path)
+        assert written.shape == (10, 20, 2)
+        assert written.chunks == (4, 20, 2)
+        assert (written[...] == 1).all()
+
+    def test_unsupported_sink_path(self, tmp_path):
+        with pytest.raises(ValueError):
+            with open_sink(str(tmp_path / "out.tiff"), (10, 20), None):
+                pass
+
     @pytest.mark.parametrize(
         "input_, proj",
         [
@@ -55,6 +55,7 @@ def run_headless_pixel_classification(
     testdir,
     *,
     num_distributed_workers: int = 0,
+    distributed_backend: str = "mpi",
     distributed_block_roi: Optional[Dict[str, slice]] = None,
     project: Path,
     raw_data: Union[Path, str],
@@ -92,7 +93,15 @@ def run_headless_pixel_classification(
     if export_dtype:
         subprocess_args.append(f"--export_dtype={export_dtype}")
 
-    if num_distributed_workers:
+    if num_distributed_workers and distributed_backend == "local":
+        subprocess_args += [
+            "--distributed",
+            "--distributed-backend=local",
+            f"--distributed-workers={num_distributed_workers}",
+        ]
+        if distributed_block_roi:
+            subprocess_args += ["--distributed-block-roi", str(distributed_block_roi)]
+    elif num_distributed_workers:
         os.environ["OMPI_ALLOW_RUN_AS_ROOT"] = "1"
         os.environ["OMPI_ALLOW_RUN_AS_ROOT_CONFIRM"] = "1"
         subprocess_args = ["mpiexec", "-n", str(num_distributed_workers)] + subprocess_args + ["--distributed"]
@@ -225,6 +234,55 @@ def test_distributed_results_are_identical_to_single_process_results(
     assert (single_process_out_data == distributed_50x50block_data).all()
 
 
+@pytest.mark.parametrize(
+    "output_format, extension",
+    [
+        ("hdf5", "h5"),
+        ("n5", "n5"),
+        ("single-scale OME-Zarr", "zarr"),
+    ],
+)
+def test_local_distributed_results_are_identical_to_single_process_results(
+    testdir, pixel_classification_ilp_2d3c: Path, tmp_path: Path, output_format, extension
+):
+    raw_100x100y3c: Path = create_h5(numpy.random.rand(100, 100, 3), axiskeys="yxc")
+
+    single_process_output_path = tmp_path / "single_process_out_100x100y3c.h5"
+    run_headless_pixel_classification(
+        testdir,
+        project=pixel_classification_ilp_2d3c,
+        raw_data=raw_100x100y3c,
+        output_filename_format=str(single_process_output_path),
+    )
+
+    with h5py.File(single_process_output_path, "r") as f:
+        single_process_out_data = f["exported_data"][()]
+
+    distributed_output_path = tmp_path / f"distributed_out_100x100y3c.{extension}"
+    run_headless_pixel_classification(
+        testdir,
+        num_distributed_workers=2,
+        distributed_backend="local",
+        distributed_block_roi={"x": 50, "y": 30},
+        output_format=output_format,
+        project=pixel_classification_ilp_2d3c,
+        raw_data=raw_100x100y3c,
+        output_filename_format=str(distributed_output_path),
+    )
+
+    if extension == "h5":
+        with h5py.File(distributed_output_path, "r") as f:
+            distributed_out_data = f["exported_data"][()]
+    elif extension == "n5":
+        with z5py.File(distributed_output_path, "r") as f:
+            distributed_out_data = f["exported_data"][()]
+    else:
+        # tczyx -> yxc
+        distributed_out_data = zarr.open(str(distributed_output_path))["s0"][0, :, 0].transpose(1, 2, 0)
+
+    numpy.testing.assert_array_equal(distributed_out_data, single_process_out_data)
+
+
 @pytest.fixture
 def ome_zarr_store_on_disc(tmp_path) -> str:
     """Sets up a zarr store of a random image at raw scale and a downscale.
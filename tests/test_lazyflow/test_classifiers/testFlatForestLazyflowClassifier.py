@@ -0,0 +1,77 @@
+import h5py
+import numpy
+import pytest
+import vigra
+
+from lazyflow.classifiers import (
+    FlatForest,
+    FlatForestLazyflowClassifier,
+    ParallelVigraRfLazyflowClassifierFactory,
+    VigraRfLazyflowClassifierFactory,
+    flatForestLazyflowClassifier,
+)
+
+
+@pytest.fixture
+def training_data():
+    rng = numpy.random.default_rng(0)
+    labels = rng.integers(1, 4, 2000).astype(numpy.uint32)
+    features = rng.normal(size=(len(labels), 5)).astype(numpy.float32) + labels[:, None]
+    return features, labels
+
+
+@pytest.fixture
+def test_features():
+    return numpy.random.default_rng(1).normal(2, 1.5, size=(5000, 5)).astype(numpy.float32)
+
+
+@pytest.mark.parametrize(
+    "factory", [ParallelVigraRfLazyflowClassifierFactory(20, num_forests=3), VigraRfLazyflowClassifierFactory(10)]
+)
+def test_parity_with_vigra(factory, training_data, test_features):
+    classifier = factory.create_and_train(*training_data)
+    flat_classifier = FlatForestLazyflowClassifier.from_classifier(classifier)
+    assert flat_classifier.flat_forest.num_trees == sum(forest.treeCount() for forest in classifier.forests)
+    assert list(flat_classifier.known_classes) == [1, 2, 3]
+    assert flat_classifier.feature_count == 5
+
+    expected = classifier.predict_probabilities(test_features)
+    numpy.testing.assert_allclose(flat_classifier.predict_probabilities(test_features), expected, atol=1e-5)
+
+
+def test_single_tree_parity(training_data, test_features):
+    """Every tree gives the same leaf distribution as the vigra forest with only that tree."""
+    forest = vigra.learning.RandomForest(1)
+    forest.learnRF(*training_data)
+    flat_forest = FlatForest.from_vigra([forest])
+    assert flat_forest.num_trees == 1
+    numpy.testing.assert_allclose(
+        flat_forest.predict_probabilities(test_features), forest.predictProbabilities(test_features), atol=1e-6
+    )
+
+
+def test_serialization(training_data, test_features):
+    classifier = ParallelVigraRfLazyflowClassifierFactory(10).create_and_train(
+        *training_data, ["a", "b", "c", "d", "e"]
+    )
+    flat_classifier = FlatForestLazyflowClassifier.from_classifier(classifier)
+
+    with h5py.File("classifier.h5", "w", driver="core", backing_store=False) as f:
+        flat_classifier.serialize_hdf5(f.create_group("classifier"))
+        restored = FlatForestLazyflowClassifier.deserialize_hdf5(f["classifier"])
+
+    assert restored.feature_names == ["a", "b", "c", "d", "e"]
+    assert list(restored.known_classes) == [1, 2, 3]
+    numpy.testing.assert_array_equal(
+        restored.predict_probabilities(test_features), flat_classifier.predict_probabilities(test_features)
+    )
+
+
+def test_flat_classifier_is_cached(training_data):
+    classifier = ParallelVigraRfLazyflowClassifierFactory(10).create_and_train(*training_data)
+    flat_classifier = flatForestLazyflowClassifier.flatClassifierFor(classifier)
+    assert isinstance(flat_classifier, FlatForestLazyflowClassifier)
+    assert flatForestLazyflowClassifier.flatClassifierFor(classifier) is flat_classifier
+
+    # Other classifiers are not converted
+    assert flatForestLazyflowClassifier.flatClassifierFor(flat_classifier) is flat_classifier
@@ -99,3 +99,49 @@ class TestParallelVigraRfLazyflowClassifier(object):
                 "_num_forests",
             ]
         )
+
+    def test_update_and_train(self):
+        factory = ParallelVigraRfLazyflowClassifierFactory(20, num_forests=4)
+        classifier = factory.create_and_train(self.training_feature_matrix, self.training_labels)
+        assert [forest.treeCount() for forest in classifier.forests] == [5, 5, 5, 5]
+
+        # Replace the oldest 5 trees, split among all forests
+        updated = factory.update_and_train(
+            classifier, self.training_feature_matrix, self.training_labels, retrain_fraction=0.25
+        )
+        assert updated.forests[:3] == classifier.forests[1:]
+        assert [forest.treeCount() for forest in updated.forests[3:]] == [2, 1, 1, 1]
+        assert updated.tree_count == 20
+        assert len(updated.oobs) == len(updated.forests)
+
+        probabilities = updated.predict_probabilities(self.prediction_data)
+        assert (numpy.argmax(probabilities, axis=-1) + 1 == self.expected_classes).all()
+
+    def test_update_and_train_with_new_class(self):
+        factory = ParallelVigraRfLazyflowClassifierFactory(20, num_forests=4)
+        classifier = factory.create_and_train(self.training_feature_matrix, self.training_labels)
+
+        labels = self.training_labels.copy()
+        labels[:5] = 3
+        updated = factory.update_and_train(classifier, self.training_feature_matrix, labels)
+        assert list(updated.known_classes) == [1, 2, 3]
+        assert not set(updated.forests) & set(classifier.forests)
+
+    def test_predict_batch(self):
+        factory = ParallelVigraRfLazyflowClassifierFactory(10, num_forests=3)
+        classifier = factory.create_and_train(self.training_feature_matrix, self.training_labels)
+
+        rng = numpy.random.default_rng(0)
+        matrices = [rng.uniform(-5, 5, (n, 2)).astype(numpy.float32) for n in (0, 7, 10000, 3)]
+        expected = [classifier.predict_probabilities(X) for X in matrices]
+
+        # Outputs may be views, e.g. of a bigger result array
+        result = numpy.zeros((sum(map(len, matrices)), 4), dtype=numpy.float32)
+        starts = numpy.cumsum([0] + [len(X) for X in matrices])
+        outputs = [result[start : start + len(X), 1:3] for start, X in zip(starts, matrices)]
+        predictions = classifier.predict_probabilities_batch(matrices, outputs)
+
+        for prediction, output, expected_prediction in zip(predictions, outputs, expected):
+            assert prediction is output
+            numpy.testing.assert_allclose(prediction, expected_prediction, rtol=1e-5, atol=1e-6)
+        assert not result[:, [0, 3]].any()
@@ -0,0 +1,88 @@
+import sys
+import textwrap
+
+import pytest
+
+from lazyflow.distributed.localTaskOrchestrator import LocalTaskOrchestrator
+from lazyflow.distributed.orchestratorBackend import WorkUnitFailed
+
+# The workers run this script, which goes through the same orchestrations as the test
+WORKER_SCRIPT = textwrap.dedent(
+    """
+    import os
+
+    from lazyflow.distributed.localTaskOrchestrator import LocalTaskOrchestrator
+
+    FAIL_MODE = os.environ["FAIL_MODE"]
+    MARKER = os.environ["MARKER"]
+
+
+    def square(unit, rank):
+        if unit == 3 and FAIL_MODE:
+            if FAIL_MODE == "raise_always":
+                raise ValueError("Can't square 3")
+            if not os.path.exists(MARKER):
+                open(MARKER, "w").close()
+                if FAIL_MODE == "exit_once":
+                    os._exit(1)
+                raise ValueError("Can't square 3 yet")
+        return unit * unit
+
+
+    orchestrator = LocalTaskOrchestrator()
+    assert orchestrator.rank > 0
+    for _ in range(int(os.environ["NUM_ORCHESTRATIONS"])):
+        orchestrator.start_as_worker(square)
+    orchestrator.close()
+    """
+)
+
+
+@pytest.fixture
+def make_orchestrator(tmp_path):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER_SCRIPT)
+    orchestrators = []
+
+    def make(fail_mode="", num_orchestrations=1, **kwargs):
+        env = {
+            "FAIL_MODE": fail_mode,
+            "MARKER": str(tmp_path / "marker"),
+            "NUM_ORCHESTRATIONS": str(num_orchestrations),
+        }
+        orchestrator = LocalTaskOrchestrator(2, worker_command=[sys.executable, str(script)], worker_env=env, **kwargs)
+        orchestrators.append(orchestrator)
+        return orchestrator
+
+    yield make
+    for orchestrator in orchestrators:
+        orchestrator.close(timeout=10)
+
+
+def orchestrate(orchestrator, work_units):
+    results = {}
+    progress = []
+    orchestrator.orchestrate(work_units, on_result=results.__setitem__, progress_callback=progress.append)
+    assert progress[0] == 0
+    assert progress[-1] == 100
+    return results
+
+
+def test_orchestrate(make_orchestrator):
+    orchestrator = make_orchestrator(num_orchestrations=2)
+    assert orchestrator.is_orchestrator
+    assert orchestrate(orchestrator, range(10)) == {i: i * i for i in range(10)}
+    # The same workers take part in the next orchestration
+    assert orchestrate(orchestrator, range(10, 15)) == {i: i * i for i in range(10, 15)}
+
+
+@pytest.mark.parametrize("fail_mode", ["raise_once", "exit_once"])
+def test_retry_failed_work_unit(make_orchestrator, fail_mode):
+    orchestrator = make_orchestrator(fail_mode)
+    assert orchestrate(orchestrator, range(10)) == {i: i * i for i in range(10)}
+
+
+def test_give_up_after_retries(make_orchestrator):
+    orchestrator = make_orchestrator("raise_always", max_retries=1)
+    with pytest.raises(WorkUnitFailed, match="Can't square 3"):
+        orchestrator.orchestrate(range(10))
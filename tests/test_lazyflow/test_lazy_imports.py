@@ -0,0 +1,68 @@
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+
+def run_isolated(code):
+    """Run code in a fresh interpreter, so that the modules loaded by other tests do not interfere"""
+    result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "lazyflow.classifiers.vigraRfLazyflowClassifier",
+        "lazyflow.operators.classifierOperators",
+        "lazyflow.operators.ioOperators",
+        "sklearn",
+        "z5py",
+        "libdvid",
+    ],
+)
+def test_import_lazyflow_defers(module):
+    run_isolated(
+        f"""
+        import sys
+        import lazyflow
+        import lazyflow.operators
+        import lazyflow.classifiers
+        assert {module!r} not in sys.modules
+        """
+    )
+
+
+def test_lazy_operators():
+    run_isolated(
+        """
+        import sys
+        import lazyflow.operators
+        from lazyflow.operators import OpArrayPiper, OpPixelFeaturesPresmoothed
+
+        assert OpArrayPiper is sys.modules["lazyflow.operators.generic"].OpArrayPiper
+        assert "OpArrayPiper" in dir(lazyflow.operators)
+        assert lazyflow.operators.generic is sys.modules["lazyflow.operators.generic"]
+        assert "lazyflow.operators.classifierOperators" not in sys.modules
+        """
+    )
+
+
+def test_lazy_classifiers():
+    run_isolated(
+        """
+        import lazyflow.classifiers
+        from lazyflow.classifiers import LazyflowVectorwiseClassifierFactoryABC, VigraRfLazyflowClassifierFactory
+
+        assert issubclass(VigraRfLazyflowClassifierFactory, LazyflowVectorwiseClassifierFactoryABC)
+        assert "SklearnLazyflowClassifier" in dir(lazyflow.classifiers)
+        """
+    )
+
+
+def test_unknown_attribute():
+    import lazyflow.operators
+
+    with pytest.raises(AttributeError):
+        lazyflow.operators.OpDoesNotExist
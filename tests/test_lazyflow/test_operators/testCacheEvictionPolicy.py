@@ -0,0 +1,67 @@
+import pytest
+
+from lazyflow.operators.cacheEvictionPolicy import (
+    POLICY_NAMES,
+    CacheEntry,
+    GreedyDualSizePolicy,
+    LruPolicy,
+    createEvictionPolicy,
+)
+
+
+def test_create_policy():
+    assert isinstance(createEvictionPolicy("lru"), LruPolicy)
+    assert isinstance(createEvictionPolicy("gds"), GreedyDualSizePolicy)
+    assert set(POLICY_NAMES) == {"lru", "gds"}
+    with pytest.raises(ValueError):
+        createEvictionPolicy("nonsense")
+
+
+def test_lru_evicts_oldest_first():
+    entries = [
+        CacheEntry("b", last_access=2.0, nbytes=10, cost=100.0),
+        CacheEntry("a", last_access=1.0, nbytes=10, cost=100.0),
+        CacheEntry("c", last_access=3.0, nbytes=10, cost=0.0),
+    ]
+    assert [e.key for e in LruPolicy().evictionOrder(entries)] == ["a", "b", "c"]
+
+
+def test_gds_evicts_cheap_entries_first():
+    expensive = CacheEntry("features", last_access=1.0, nbytes=1000, cost=40.0)
+    cheap = CacheEntry("raw", last_access=2.0, nbytes=1000, cost=0.1)
+    order = GreedyDualSizePolicy().evictionOrder([expensive, cheap])
+    assert [e.key for e in order] == ["raw", "features"]
+
+
+def test_gds_prefers_evicting_big_entries_of_equal_cost():
+    small = CacheEntry("small", last_access=1.0, nbytes=10, cost=1.0)
+    big = CacheEntry("big", last_access=2.0, nbytes=1000, cost=1.0)
+    order = GreedyDualSizePolicy().evictionOrder([small, big])
+    assert [e.key for e in order] == ["big", "small"]
+
+
+def test_gds_unknown_cost_uses_median():
+    policy = GreedyDualSizePolicy()
+    entries = [
+        CacheEntry("cheap", last_access=1.0, nbytes=1, cost=1.0),
+        CacheEntry("medium", last_access=1.0, nbytes=1, cost=5.0),
+        CacheEntry("expensive", last_access=1.0, nbytes=1, cost=10.0),
+        CacheEntry("unknown", last_access=0.0, nbytes=1, cost=None),
+    ]
+    order = [e.key for e in policy.evictionOrder(entries)]
+    assert order == ["cheap", "unknown", "medium", "expensive"]
+
+
+def test_gds_inflation_ages_out_stale_entries():
+    policy = GreedyDualSizePolicy()
+    stale = CacheEntry("stale", last_access=1.0, nbytes=1, cost=10.0)
+    cheap = [CacheEntry(f"cheap{i}", last_access=1.0, nbytes=1, cost=6.0) for i in range(2)]
+
+    order = policy.evictionOrder([stale] + cheap)
+    assert order[0].key == "cheap0"
+    policy.notifyEvicted(order[0])
+
+    # A recently accessed cheap entry now has priority L + 6 = 12 > 10
+    refreshed = CacheEntry("cheap1", last_access=2.0, nbytes=1, cost=6.0)
+    order = policy.evictionOrder([stale, refreshed])
+    assert [e.key for e in order] == ["stale", "cheap1"]
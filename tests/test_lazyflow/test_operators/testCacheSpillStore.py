@@ -0,0 +1,109 @@
+import numpy
+import pytest
+import vigra
+
+from lazyflow.operators import cacheSpillStore
+from lazyflow.operators.cacheSpillStore import SpillStore, newOwner
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SpillStore(str(tmp_path), capacity=10 * 1024)
+    yield store
+    store.clear()
+
+
+def test_put_take_roundtrip(store):
+    owner = newOwner()
+    data = numpy.random.random((8, 16)).astype(numpy.float32)
+    assert store.put(owner, (0, 0), data, cost=2.5)
+    assert store.usedBytes(owner) == data.nbytes
+
+    spilled, cost = store.take(owner, (0, 0))
+    numpy.testing.assert_array_equal(spilled, data)
+    assert cost == 2.5
+
+    # Blocks are removed from the store once they are taken
+    assert store.take(owner, (0, 0)) is None
+    assert store.usedBytes() == 0
+    stats = store.stats()
+    assert (stats.hits, stats.misses, stats.writes) == (1, 1, 1)
+
+
+def test_take_into_out(store):
+    owner = newOwner()
+    data = numpy.arange(100, dtype=numpy.uint8).reshape(10, 10)
+    store.put(owner, "block", data)
+
+    out = numpy.zeros_like(data)
+    spilled, cost = store.take(owner, "block", out)
+    assert spilled is out
+    assert cost is None
+    numpy.testing.assert_array_equal(out, data)
+
+
+def test_axistags_are_restored(store):
+    owner = newOwner()
+    data = vigra.taggedView(numpy.arange(100, dtype=numpy.uint8).reshape(10, 10), "yx")
+    assert store.put(owner, "block", data)
+
+    spilled, _ = store.take(owner, "block")
+    assert isinstance(spilled, vigra.VigraArray)
+    assert spilled.axistags == data.axistags
+    numpy.testing.assert_array_equal(spilled, data)
+
+
+def test_owners_are_separate(store):
+    owner_a, owner_b = newOwner(), newOwner()
+    store.put(owner_a, "block", numpy.zeros(10))
+    assert store.take(owner_b, "block") is None
+
+    store.put(owner_b, "block", numpy.ones(10))
+    store.discardOwner(owner_a)
+    assert store.take(owner_a, "block") is None
+    spilled, _ = store.take(owner_b, "block")
+    assert (spilled == 1).all()
+
+
+def test_least_recently_spilled_are_evicted(store):
+    owner = newOwner()
+    block = numpy.zeros(1024, dtype=numpy.uint32)  # 4 KiB, the store holds 2.5 blocks
+    for i in range(3):
+        assert store.put(owner, i, block)
+
+    assert store.usedBytes() == 2 * block.nbytes
+    assert store.stats().evictions == 1
+    assert store.take(owner, 0) is None
+    assert store.take(owner, 1) is not None
+    assert store.take(owner, 2) is not None
+
+
+def test_unsupported_data_is_not_stored(store):
+    owner = newOwner()
+    assert not store.put(owner, "masked", numpy.ma.masked_array(numpy.zeros(10)))
+    assert not store.put(owner, "objects", numpy.array([None, 1], dtype=object))
+    assert not store.put(owner, "too big", numpy.zeros(store.capacity + 1, dtype=numpy.uint8))
+    assert store.stats().blocks == 0
+
+
+def test_discard_where(store):
+    owner = newOwner()
+    for i in range(4):
+        store.put(owner, i, numpy.full(10, i))
+    store.discardWhere(owner, lambda key: key % 2 == 0)
+    assert store.stats().blocks == 2
+    assert store.take(owner, 0) is None
+    assert store.take(owner, 1) is not None
+
+
+def test_configure(tmp_path):
+    try:
+        store = cacheSpillStore.configure(str(tmp_path), 1024**2)
+        assert cacheSpillStore.getSpillStore() is store
+        assert store.directory.startswith(str(tmp_path))
+
+        assert cacheSpillStore.configure(None, 0) is None
+        assert cacheSpillStore.getSpillStore() is None
+        assert not (tmp_path / store.directory).exists()
+    finally:
+        cacheSpillStore.configure(None, 0)
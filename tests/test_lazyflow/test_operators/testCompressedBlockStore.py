@@ -0,0 +1,99 @@
+import threading
+
+import h5py
+import numpy
+import pytest
+
+from lazyflow.operators import compressedBlockStore
+from lazyflow.operators.compressedBlockStore import BloscBlockFile, BloscDataset, copyToHdf5
+
+
+@pytest.fixture
+def data():
+    return numpy.random.default_rng(42).integers(0, 10, size=(37, 50, 23)).astype(numpy.float32)
+
+
+def test_roundtrip(data):
+    dataset = BloscDataset(data.shape, data.dtype, chunks=(10, 16, 23))
+    dataset[...] = data
+
+    numpy.testing.assert_array_equal(dataset[...], data)
+    numpy.testing.assert_array_equal(dataset[()], data)
+    numpy.testing.assert_array_equal(dataset[:], data)
+    numpy.testing.assert_array_equal(dataset[3:20, 5:45], data[3:20, 5:45])
+    assert 0 < dataset.get_storage_size() < data.nbytes
+
+
+def test_partial_write(data):
+    dataset = BloscDataset(data.shape, data.dtype, chunks=(10, 16, 23))
+    # Unwritten chunks read as zeros
+    assert (dataset[...] == 0).all()
+
+    dataset[...] = data
+    dataset[5:7, 1:30, 2:4] = 99
+    data[5:7, 1:30, 2:4] = 99
+    numpy.testing.assert_array_equal(dataset[...], data)
+
+
+def test_read_direct(data):
+    dataset = BloscDataset(data.shape, data.dtype, chunks=(10, 50, 23))
+    dataset[...] = data
+
+    out = numpy.zeros((40,) + data.shape[1:], dtype=data.dtype)
+    dataset.read_direct(out, numpy.s_[0:37], numpy.s_[3:40])
+    numpy.testing.assert_array_equal(out[3:], data)
+    assert (out[:3] == 0).all()
+
+    # non-contiguous destination
+    out = numpy.zeros(data.shape[::-1], dtype=data.dtype).transpose()
+    dataset.read_direct(out)
+    numpy.testing.assert_array_equal(out, data)
+
+
+def test_scalar_dataset():
+    dataset = BloscDataset((), numpy.float32)
+    dataset[...] = numpy.nan
+    value = dataset[()]
+    assert isinstance(value, numpy.float32)
+    assert numpy.isnan(value)
+
+
+def test_concurrent_writes_to_one_chunk():
+    dataset = BloscDataset((100,), numpy.int64)
+
+    def write(i):
+        for k in range(10):
+            dataset[10 * i + k : 10 * i + k + 1] = i
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    numpy.testing.assert_array_equal(dataset[...], numpy.repeat(numpy.arange(10), 10))
+
+
+def test_block_file_hdf5_roundtrip():
+    mask = numpy.random.default_rng(0).random((4, 6)) > 0.5
+    block_file = BloscBlockFile()
+    block_file.create_dataset("mask", shape=mask.shape, dtype=bool, chunks=(2, 3), compression="lzf")
+    block_file.create_dataset("fill_value", shape=(), dtype=numpy.float32)
+    block_file["mask"][...] = mask
+    block_file["fill_value"][...] = 7
+    assert block_file["/"] is block_file
+    assert "mask" in block_file
+
+    with h5py.File("roundtrip.h5", "w", driver="core", backing_store=False) as f:
+        copyToHdf5(block_file["/"], f, "block")
+        assert set(f["block"]) == {"mask", "fill_value"}
+        assert f["block/fill_value"][()] == 7
+
+        copy = BloscBlockFile()
+        copy.copy(f["block/mask"], "mask")
+        numpy.testing.assert_array_equal(copy["mask"][...], mask)
+
+
+def test_default_backend():
+    assert compressedBlockStore.getDefaultBackend() == "hdf5"
+    with pytest.raises(ValueError):
+        compressedBlockStore.setDefaultBackend("nonsense")
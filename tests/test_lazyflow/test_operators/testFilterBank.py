@@ -0,0 +1,154 @@
+import numpy
+import pytest
+import vigra
+
+from lazyflow.operators.filterBank import (
+    FEATURE_IDS,
+    FilterBank,
+    _eigenvaluesDescending,
+    convolve,
+    featureChannels,
+    gaussianKernel,
+    haloSize,
+)
+
+
+@pytest.fixture
+def image():
+    return numpy.random.default_rng(0).random((12, 30, 25)).astype(numpy.float32)
+
+
+def vigra_feature(image, feature_id, scale):
+    if feature_id == "GaussianSmoothing":
+        result = vigra.filters.gaussianSmoothing(image, scale, window_size=2.0)
+    elif feature_id == "DifferenceOfGaussians":
+        result = vigra.filters.gaussianSmoothing(image, scale, window_size=2.0) - vigra.filters.gaussianSmoothing(
+            image, 0.66 * scale, window_size=2.0
+        )
+    elif feature_id == "LaplacianOfGaussian":
+        result = vigra.filters.laplacianOfGaussian(image, scale, window_size=2.0)
+    elif feature_id == "GaussianGradientMagnitude":
+        result = vigra.filters.gaussianGradientMagnitude(image, scale, window_size=2.0)
+    elif feature_id == "HessianOfGaussianEigenvalues":
+        result = vigra.filters.hessianOfGaussianEigenvalues(image, scale, window_size=2.0)
+    elif feature_id == "StructureTensorEigenvalues":
+        result = vigra.filters.structureTensorEigenvalues(image, scale, 0.5 * scale, window_size=2.0)
+    result = numpy.asarray(result)
+    # channels first, like FilterBank
+    return result[None] if result.ndim == image.ndim else numpy.moveaxis(result, -1, 0)
+
+
+def compute(image, feature_id, scale, region=None):
+    region = region or (slice(None),) * image.ndim
+    shape = tuple(len(range(*s.indices(size))) for s, size in zip(region, image.shape))
+    out = numpy.empty((featureChannels(feature_id, image.ndim),) + shape, dtype=numpy.float32)
+    FilterBank(image, region, scale).feature(feature_id, out)
+    return out
+
+
+@pytest.mark.parametrize("feature_id", FEATURE_IDS)
+@pytest.mark.parametrize("scale", [0.7, 1.0, 1.6])
+def test_features_match_vigra(image, feature_id, scale):
+    numpy.testing.assert_allclose(
+        compute(image, feature_id, scale), vigra_feature(image, feature_id, scale), rtol=1e-4, atol=1e-5
+    )
+
+
+@pytest.mark.parametrize("feature_id", FEATURE_IDS)
+def test_2d_features_match_vigra(image, feature_id):
+    for z in range(image.shape[0]):
+        numpy.testing.assert_allclose(
+            compute(image[z], feature_id, 1.0), vigra_feature(image[z], feature_id, 1.0), rtol=1e-4, atol=1e-5
+        )
+
+
+@pytest.mark.parametrize("feature_id", FEATURE_IDS)
+def test_result_region(image, feature_id):
+    """Computing a region of the image gives the same result as cropping the result for the whole image."""
+    region = numpy.s_[3:9, 0:20, 7:25]
+    expected = compute(image, feature_id, 1.0)
+    numpy.testing.assert_allclose(
+        compute(image, feature_id, 1.0, region), expected[(slice(None),) + region], rtol=1e-6, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("feature_id", FEATURE_IDS)
+@pytest.mark.parametrize("scale", [0.7, 1.0])
+def test_halo(image, feature_id, scale):
+    """A block only needs the image in the block and its halo."""
+    halo = haloSize(scale)
+    block = numpy.s_[4:8, 9:20, 6:17]
+    source = image[tuple(slice(s.start - halo, s.stop + halo) for s in block)]
+    result = compute(source, feature_id, scale, (slice(halo, -halo),) * 3)
+    numpy.testing.assert_allclose(
+        result, compute(image, feature_id, scale)[(slice(None),) + block], rtol=1e-6, atol=1e-6
+    )
+
+
+def test_channel_subset(image):
+    out = compute(image, "HessianOfGaussianEigenvalues", 1.0)
+    # writes into a (strided) view of the output
+    subset = numpy.zeros((4,) + image.shape, dtype=numpy.float32)
+    FilterBank(image, (slice(None),) * 3, 1.0).feature("HessianOfGaussianEigenvalues", subset[::2], first_channel=1)
+    numpy.testing.assert_array_equal(subset[::2], out[1:])
+    assert not subset[1::2].any()
+
+
+def test_derivatives_are_shared(image):
+    bank = FilterBank(image, (slice(None),) * 3, 1.0)
+    out = numpy.empty((3,) + image.shape, dtype=numpy.float32)
+    bank.feature("HessianOfGaussianEigenvalues", out)
+    partial_results = len(bank._partial_results)
+
+    # The Laplacian only needs second derivatives, which are known from the Hessian already
+    bank.feature("LaplacianOfGaussian", out[:1])
+    assert len(bank._partial_results) == partial_results
+
+    # The smoothed image shares the smoothing along z and y with the derivatives along x
+    bank.feature("GaussianSmoothing", out[:1])
+    assert len(bank._partial_results) == partial_results + 1
+
+
+def test_kernels():
+    x = numpy.arange(-2, 3)
+    numpy.testing.assert_allclose(gaussianKernel(1.0, 0, 2.0).sum(), 1)
+    numpy.testing.assert_allclose((gaussianKernel(1.0, 1, 2.0) * -x).sum(), 1)
+    numpy.testing.assert_allclose((gaussianKernel(1.0, 2, 2.0) * x**2).sum() / 2, 1)
+    numpy.testing.assert_allclose(gaussianKernel(1.0, 2, 2.0).sum(), 0, atol=1e-12)
+    assert len(gaussianKernel(0.7, 2, 2.0)) == 3
+    assert len(gaussianKernel(1.0)) == 7
+
+
+def test_convolve():
+    data = numpy.random.default_rng(0).random((5, 20)).astype(numpy.float32)
+    kernel = gaussianKernel(1.6, 1, 2.0)
+    radius = len(kernel) // 2
+    padded = numpy.pad(data, ((0, 0), (radius, radius)), mode="reflect")
+    expected = sum(kernel[radius + x] * padded[:, radius - x : radius - x + 20] for x in range(-radius, radius + 1))
+    numpy.testing.assert_allclose(convolve(data, kernel, axis=1), expected, rtol=1e-5, atol=1e-6)
+    numpy.testing.assert_allclose(convolve(data, kernel, axis=1, start=2, stop=17), expected[:, 2:17], rtol=1e-5)
+
+    # derivatives of polynomials
+    line = numpy.arange(20, dtype=numpy.float32)
+    numpy.testing.assert_allclose(convolve(line, kernel, axis=0, start=radius, stop=20 - radius), 1, rtol=1e-5)
+    second = convolve(line**2, gaussianKernel(1.6, 2, 2.0), axis=0, start=radius, stop=20 - radius)
+    numpy.testing.assert_allclose(second, 2, rtol=1e-4)
+
+    with pytest.raises(ValueError):
+        convolve(data[:, :3], kernel, axis=1)
+
+
+@pytest.mark.parametrize("n", [2, 3])
+def test_eigenvalues(n):
+    rng = numpy.random.default_rng(0)
+    matrices = rng.normal(size=(500, n, n)).astype(numpy.float32)
+    matrices = matrices + numpy.swapaxes(matrices, 1, 2)
+    # degenerate cases: zero, diagonal and multiples of the identity
+    matrices[:3] = 0
+    matrices[1, range(n), range(n)] = numpy.arange(n)
+    matrices[2, range(n), range(n)] = 2
+
+    out = numpy.empty((n, 500), dtype=numpy.float32)
+    _eigenvaluesDescending({(i, j): matrices[:, i, j] for i in range(n) for j in range(i, n)}, n, out)
+    expected = numpy.linalg.eigvalsh(matrices.astype(numpy.float64))[:, ::-1].T
+    numpy.testing.assert_allclose(out, expected, atol=1e-5 * numpy.abs(expected).max())
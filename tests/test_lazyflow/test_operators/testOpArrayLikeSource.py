@@ -0,0 +1,51 @@
+import numpy
+import pytest
+import zarr
+
+from lazyflow.graph import Graph
+from lazyflow.operators import OpArrayLikeSource
+
+
+@pytest.fixture
+def data():
+    return numpy.arange(20 * 30 * 4, dtype=numpy.uint16).reshape(20, 30, 4)
+
+
+def test_zarr_source(data):
+    array = zarr.zeros(data.shape, chunks=(10, 15, 4), dtype=data.dtype)
+    array[...] = data
+
+    op = OpArrayLikeSource(graph=Graph())
+    op.setArray(array, "yxc")
+    assert op.Output.meta.shape == data.shape
+    assert op.Output.meta.dtype == numpy.uint16
+    assert op.Output.meta.getAxisKeys() == ["y", "x", "c"]
+    assert op.Output.meta.ideal_blockshape == (10, 15, 4)
+    numpy.testing.assert_array_equal(op.Output[3:17, 5:25, 1:3].wait(), data[3:17, 5:25, 1:3])
+
+
+def test_replacing_array_sets_output_dirty(data):
+    op = OpArrayLikeSource(graph=Graph())
+    op.setArray(data, "yxc")
+    dirty_rois = []
+    op.Output.notifyDirty(lambda slot, roi: dirty_rois.append(roi))
+
+    op.setArray(data + 1, "yxc")
+    assert dirty_rois
+    numpy.testing.assert_array_equal(op.Output[:].wait(), data + 1)
+
+
+def test_axes_must_match(data):
+    op = OpArrayLikeSource(graph=Graph())
+    with pytest.raises(ValueError):
+        op.setArray(data, "yx")
+
+
+def test_dask_source(data):
+    da = pytest.importorskip("dask.array", reason="This test requires dask")
+    array = da.from_array(data, chunks=(10, 10, 2)) * 2
+
+    op = OpArrayLikeSource(graph=Graph())
+    op.setArray(array, "yxc")
+    assert op.Output.meta.ideal_blockshape == (10, 10, 2)
+    numpy.testing.assert_array_equal(op.Output[5:15, :, 1:2].wait(), data[5:15, :, 1:2] * 2)
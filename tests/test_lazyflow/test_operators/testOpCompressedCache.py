@@ -44,7 +44,7 @@ import vigra
 from numpy.testing import assert_array_equal
 
 from lazyflow.graph import Graph
-from lazyflow.operators import OpCompressedCache, OpArrayPiper
+from lazyflow.operators import OpCompressedCache, OpArrayPiper, compressedBlockStore
 from lazyflow.utility.slicingtools import slicing2shape
 from lazyflow.operators.opCache import MemInfoNode
 
@@ -966,3 +966,15 @@ class TestOpCompressedCache(object):
 
         assert op.Output.ready()
         assert_array_equal(op.Output.meta.ideal_blockshape, blockShape)
+
+
+class TestOpCompressedCacheBlosc(TestOpCompressedCache):
+    """
+    Same tests with the blosc block store backend.
+    """
+
+    @pytest.fixture(autouse=True)
+    def bloscBackend(self):
+        compressedBlockStore.setDefaultBackend("blosc")
+        yield
+        compressedBlockStore.setDefaultBackend("hdf5")
@@ -1,9 +1,11 @@
 from builtins import object
 import numpy
+import pytest
 import vigra
 
 from lazyflow.graph import Graph
-from lazyflow.operators.opFeatureMatrixCache import OpFeatureMatrixCache
+from lazyflow.operators import cacheMemoryManager
+from lazyflow.operators.opFeatureMatrixCache import BlockwiseRowStore, OpFeatureMatrixCache
 from lazyflow.operators.opBlockedArrayCache import OpBlockedArrayCache
 
 
@@ -51,3 +53,93 @@ class TestOpFeatureMatrixCache(object):
         # Just check that all features are present, regardless of order.
         for feature_vec in [[10.5, 10.5], [10.5, 11.5], [20.5, 20.5], [20.5, 21.5]]:
             assert feature_vec in labels_and_features[:, 1:]
+
+    def testIncrementalUpdate(self):
+        features = vigra.taggedView(numpy.random.default_rng(0).random((100, 100, 2), dtype=numpy.float32), "xyc")
+        labels = vigra.taggedView(numpy.zeros((100, 100, 1), dtype=numpy.uint8), "xyc")
+        labels[5:8, 5:8] = 1
+        labels[55:60, 55:60] = 2
+
+        graph = Graph()
+        opLabelCache = OpBlockedArrayCache(graph=graph)
+        opLabelCache.BlockShape.setValue((50, 50, 1))
+        opLabelCache.Input.setValue(labels)
+
+        opFeatureMatrixCache = OpFeatureMatrixCache(graph=graph)
+        opFeatureMatrixCache.LabelImage.connect(opLabelCache.Output)
+        opFeatureMatrixCache.FeatureImage.setValue(features)
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[0:100, 0:100])
+
+        assert opFeatureMatrixCache.LabelAndFeatureMatrix.value.shape == (9 + 25, 3)
+        assert opFeatureMatrixCache in cacheMemoryManager.getFirstClassCaches()
+        assert opFeatureMatrixCache.usedMemory() > 0
+
+        # Remove some labels in one block: only that block is updated, in place
+        store = opFeatureMatrixCache._store
+        data = store._data
+        labels[55:60, 58:60] = 0
+        opLabelCache.Input.setDirty(numpy.s_[55:60, 58:60])
+        labels_and_features = opFeatureMatrixCache.LabelAndFeatureMatrix.value
+        assert labels_and_features.shape == (9 + 15, 3)
+        assert numpy.shares_memory(labels_and_features, data)
+        assert sorted(map(tuple, labels_and_features[:, 1:])) == sorted(
+            map(tuple, numpy.concatenate([features[5:8, 5:8].reshape(-1, 2), features[55:60, 55:58].reshape(-1, 2)]))
+        )
+
+
+class TestBlockwiseRowStore:
+    def rows(self, value, n):
+        return numpy.full((n, 2), value, dtype=numpy.float32)
+
+    def contents(self, matrix):
+        return sorted(map(tuple, matrix))
+
+    def test_update(self):
+        store = BlockwiseRowStore(2, initial_capacity=4)
+        store.update("a", self.rows(1, 3))
+        store.update("b", self.rows(2, 2))
+        store.update("c", self.rows(3, 1))
+        assert self.contents(store.matrix()) == [(1, 1)] * 3 + [(2, 2)] * 2 + [(3, 3)]
+        assert store.capacity == 8
+
+        # Shrink (the gap is filled from the end), grow, and remove blocks
+        store.update("a", self.rows(4, 1))
+        assert self.contents(store.matrix()) == [(2, 2)] * 2 + [(3, 3)] + [(4, 4)]
+        store.update("b", self.rows(5, 4))
+        store.remove("c")
+        assert self.contents(store.matrix()) == [(4, 4)] + [(5, 5)] * 4
+        assert sorted(store.block_ids()) == ["a", "b"]
+        assert store.row_count("b") == 4
+
+        store.update("a", self.rows(0, 0))
+        assert store.block_ids() == ["b"]
+        assert store.num_rows == 4
+
+    def test_matrix_is_a_view(self):
+        store = BlockwiseRowStore(2)
+        store.update("a", self.rows(1, 3))
+        matrix = store.matrix()
+        assert numpy.shares_memory(matrix, store._data)
+
+    @pytest.mark.parametrize("keep", ["matrix", "view"])
+    def test_copy_on_write(self, keep):
+        """Matrices that are still in use are not modified by updates."""
+        store = BlockwiseRowStore(2)
+        store.update("a", self.rows(1, 3))
+        store.update("b", self.rows(2, 3))
+        matrix = store.matrix()
+        if keep == "view":
+            matrix = matrix[:, 1:]
+        before = matrix.copy()
+
+        store.update("a", self.rows(3, 1))
+        numpy.testing.assert_array_equal(matrix, before)
+        assert self.contents(store.matrix()) == [(2, 2)] * 3 + [(3, 3)]
+
+    def test_update_in_place_when_unused(self):
+        store = BlockwiseRowStore(2)
+        store.update("a", self.rows(1, 3))
+        data = store._data
+        store.matrix()  # result discarded right away
+        store.update("a", self.rows(2, 3))
+        assert store._data is data
@@ -1,8 +1,14 @@
 import numpy
+import pytest
 import vigra
 
 from lazyflow.graph import Graph
-from lazyflow.operators import OpPixelFeaturesPresmoothed
+from lazyflow.operators import (
+    OpPixelFeaturesPresmoothed,
+    filterOperators,
+    opPixelFeaturesPresmoothed,
+    persistentBlockCache,
+)
 
 DEBUG = False
 
@@ -10,6 +16,28 @@ if DEBUG:
     import matplotlib.pyplot as plt
 
 
+@pytest.fixture
+def vigra_filter_operators(monkeypatch):
+    """Filter operators that use vigra, also if fastfilters is installed"""
+
+    def differenceOfGaussians(image, sigma0, sigma1, window_size):
+        return vigra.filters.gaussianSmoothing(
+            image, sigma0, window_size=window_size
+        ) - vigra.filters.gaussianSmoothing(image, sigma1, window_size=window_size)
+
+    filters = {
+        filterOperators.OpGaussianSmoothing: vigra.filters.gaussianSmoothing,
+        filterOperators.OpDifferenceOfGaussians: differenceOfGaussians,
+        filterOperators.OpLaplacianOfGaussian: vigra.filters.laplacianOfGaussian,
+        filterOperators.OpGaussianGradientMagnitude: vigra.filters.gaussianGradientMagnitude,
+        filterOperators.OpHessianOfGaussianEigenvalues: vigra.filters.hessianOfGaussianEigenvalues,
+        filterOperators.OpStructureTensorEigenvalues: vigra.filters.structureTensorEigenvalues,
+    }
+    if filterOperators.WITH_FAST_FILTERS:
+        for op_class, filter_fn in filters.items():
+            monkeypatch.setattr(op_class, "filter_fn", staticmethod(filter_fn))
+
+
 class TestOpPixelFeaturesPresmoothed(object):
     @classmethod
     def setup_class(cls):
@@ -75,3 +103,85 @@ class TestOpPixelFeaturesPresmoothed(object):
 
         assert computed_whole.shape == computed_per_slice.shape
         assert numpy.allclose(computed_whole, computed_per_slice), abs(computed_whole - computed_per_slice).max()
+
+    def test_persistent_cache(self, tmp_path):
+        def make_op():
+            op = OpPixelFeaturesPresmoothed(graph=Graph())
+            op.Scales.setValue([0.7, 1.6])
+            op.FeatureIds.setValue(["GaussianSmoothing", "HessianOfGaussianEigenvalues"])
+            op.SelectionMatrix.setValue(numpy.array([[True, False], [False, True]]))
+            op.ComputeIn2d.setValue([False, False])
+            op.Input.setValue(self.data)
+            return op
+
+        expected = make_op().Output[:].wait()
+        cache = persistentBlockCache.configure(str(tmp_path), 1024**3)
+        try:
+            computed = make_op().Output[:].wait()
+            assert (cache.hits, cache.misses) == (0, 1)
+
+            # A new operator (e.g. in a new session) reuses the stored features
+            cached = make_op().Output[:].wait()
+            assert (cache.hits, cache.misses) == (1, 1)
+
+            # Different data must not hit the cache
+            op = make_op()
+            op.Input.setValue(self.data + 1)
+            op.Output[:].wait()
+            assert (cache.hits, cache.misses) == (1, 2)
+        finally:
+            persistentBlockCache.configure(None, 0)
+
+        numpy.testing.assert_array_equal(computed, expected)
+        numpy.testing.assert_array_equal(cached, expected)
+
+    def test_presmoothing_tiles(self):
+        def make_op():
+            op = OpPixelFeaturesPresmoothed(graph=Graph())
+            op.Scales.setValue([0.7, 1.0, 1.6])
+            op.FeatureIds.setValue(["GaussianSmoothing", "StructureTensorEigenvalues", "HessianOfGaussianEigenvalues"])
+            op.SelectionMatrix.setValue(numpy.array([[True, False, True], [False, True, False], [False, False, True]]))
+            op.ComputeIn2d.setValue([False, True, False])
+            op.Input.setValue(self.data)
+            return op
+
+        expected = make_op().Output[:].wait()
+        opPixelFeaturesPresmoothed.setPresmoothingTileSize(8)
+        try:
+            op = make_op()
+        finally:
+            opPixelFeaturesPresmoothed.setPresmoothingTileSize(0)
+
+        # Requests that are not aligned with the tiles
+        numpy.testing.assert_allclose(
+            op.Output[:, :, 3:7, 5:17, 2:11].wait(), expected[:, :, 3:7, 5:17, 2:11], atol=1e-5
+        )
+        numpy.testing.assert_allclose(op.Output[:].wait(), expected, atol=1e-5)
+
+        # Cached tiles are invalidated when the input changes
+        op.Input.setValue(self.data + 1)
+        expected = make_op()
+        expected.Input.setValue(self.data + 1)
+        numpy.testing.assert_allclose(op.Output[:].wait(), expected.Output[:].wait(), atol=1e-5)
+
+    def test_fused_backend(self, vigra_filter_operators):
+        def make_op(backend):
+            op = OpPixelFeaturesPresmoothed(graph=Graph())
+            op.Scales.setValue([0.7, 1.0, 1.6])
+            op.SelectionMatrix.setValue(numpy.ones((6, 3), dtype=bool))
+            op.ComputeIn2d.setValue([False, True, False])
+            op.FilterBackend.setValue(backend)
+            op.Input.setValue(self.data)
+            return op
+
+        expected = make_op("operators")
+        fused = make_op("fused")
+        assert fused.Output.meta.shape == expected.Output.meta.shape
+
+        # The fused filters use the kernels of vigra
+        result = fused.Output[:].wait()
+        numpy.testing.assert_allclose(result, expected.Output[:].wait(), rtol=1e-4, atol=1e-5)
+
+        # Blocks do not depend on their neighborhood beyond the halo
+        block = numpy.s_[1:2, 2:11, 3:7, 5:17, 2:11]
+        numpy.testing.assert_allclose(fused.Output[block].wait(), result[block], rtol=1e-5, atol=1e-5)
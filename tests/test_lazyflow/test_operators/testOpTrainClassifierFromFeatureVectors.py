@@ -43,3 +43,57 @@ class TestOpTrainClassifierFromFeatureVectors(object):
         assert isinstance(
             trained_classifier, ParallelVigraRfLazyflowClassifier
         ), "classifier is of the wrong type: {}".format(type(trained_classifier))
+
+    def testIncrementalTraining(self):
+        features = numpy.indices((100, 100)).astype(numpy.float32) + 0.5
+        features = vigra.taggedView(numpy.rollaxis(features, 0, 3), "xyc")
+        labels = vigra.taggedView(numpy.zeros((100, 100, 1), dtype=numpy.uint8), "xyc")
+        labels[10:12, 10:12] = 1
+        labels[20:22, 20:22] = 2
+
+        graph = Graph()
+        opFeatureMatrixCache = OpFeatureMatrixCache(graph=graph)
+        opFeatureMatrixCache.FeatureImage.setValue(features)
+        opFeatureMatrixCache.LabelImage.setValue(labels)
+        opFeatureMatrixCache.LabelImage.setDirty(numpy.s_[0:100, 0:100])
+
+        opTrain = OpTrainClassifierFromFeatureVectors(graph=graph)
+        opTrain.ClassifierFactory.setValue(ParallelVigraRfLazyflowClassifierFactory(40, num_forests=4))
+        opTrain.MaxLabel.setValue(2)
+        opTrain.FullRetrainInterval.setValue(3)
+        opTrain.LabelAndFeatureMatrix.connect(opFeatureMatrixCache.LabelAndFeatureMatrix)
+
+        def add_labels(label, position):
+            new_labels = labels.copy()
+            new_labels[position] = label
+            opFeatureMatrixCache.LabelImage.setValue(new_labels)
+            labels[...] = new_labels
+
+        first = opTrain.Classifier.value
+
+        # The next update replaces only the oldest quarter of the trees
+        add_labels(1, numpy.s_[30:32, 10:12])
+        second = opTrain.Classifier.value
+        assert second.tree_count == 40
+        assert second.forests[:3] == first.forests[1:]
+        assert not set(second.forests[3:]) & set(first.forests)
+
+        # Every third training is a full one
+        add_labels(2, numpy.s_[40:42, 20:22])
+        third = opTrain.Classifier.value
+        assert set(third.forests[:2]) <= set(second.forests)
+        add_labels(1, numpy.s_[50:52, 10:12])
+        fourth = opTrain.Classifier.value
+        assert not set(fourth.forests) & set(third.forests)
+
+        # A new label class needs a full training
+        add_labels(3, numpy.s_[60:62, 30:32])
+        opTrain.MaxLabel.setValue(3)
+        fifth = opTrain.Classifier.value
+        assert list(fifth.known_classes) == [1, 2, 3]
+        assert not set(fifth.forests) & set(fourth.forests)
+
+        # ...and so does a user request
+        opTrain.requestFullRetrain()
+        sixth = opTrain.Classifier.value
+        assert not set(sixth.forests) & set(fifth.forests)
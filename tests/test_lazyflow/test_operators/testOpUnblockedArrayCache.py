@@ -6,6 +6,7 @@ import vigra
 from lazyflow.request import RequestPool
 from lazyflow.graph import Graph
 from lazyflow.roi import roiToSlice
+from lazyflow.operators import cacheSpillStore
 from lazyflow.operators.opUnblockedArrayCache import OpUnblockedArrayCache
 from lazyflow.utility.testing import OpArrayPiperWithAccessCount
 
@@ -120,6 +121,55 @@ class TestOpUnblockedArrayCacheCache(object):
         for k, t in l:
             assert t > 0.0
 
+        costs = opCache.getBlockCosts()
+        assert len(costs) == 2
+        for k, t, nbytes, compute_time in costs:
+            assert t > 0.0
+            assert nbytes == np.prod(np.subtract(k[1], k[0])) * 4
+            assert compute_time >= 0.0
+
+    def testSpillToDisk(self, tmp_path):
+        graph = Graph()
+        opDataProvider = OpArrayPiperWithAccessCount(graph=graph)
+        opCache = OpUnblockedArrayCache(graph=graph)
+
+        data = np.random.random((100, 100, 100)).astype(np.float32)
+        opDataProvider.Input.setValue(vigra.taggedView(data, "zyx"))
+        opCache.Input.connect(opDataProvider.Output)
+
+        roi = ((30, 30, 30), (50, 50, 50))
+        spill_store = cacheSpillStore.configure(str(tmp_path), 1024**2)
+        try:
+            opCache.Output(*roi).wait()
+            assert opDataProvider.accessCount == 1
+
+            # Evicted blocks go to disk, and are read back instead of being recomputed
+            ((block_id, _),) = opCache.getBlockAccessTimes()
+            assert opCache.evictBlock(block_id) > 0
+            assert opCache.usedMemory() == 0
+            assert opCache.spilledMemory() == 20**3 * 4
+            cache_data = opCache.Output(*roi).wait()
+            assert (cache_data == data[roiToSlice(*roi)]).all()
+            assert opDataProvider.accessCount == 1
+            assert opCache.spilledMemory() == 0
+
+            # Spilled blocks are discarded when they become dirty
+            opCache.evictBlock(block_id)
+            opDataProvider.Input.setDirty((30, 30, 30), (31, 31, 31))
+            assert spill_store.usedBytes() == 0
+            cache_data = opCache.Output(*roi).wait()
+            assert (cache_data == data[roiToSlice(*roi)]).all()
+            assert opDataProvider.accessCount == 2
+
+            # Spilled blocks are discarded when the cache is cleaned up
+            opCache.evictBlock(block_id)
+            assert spill_store.usedBytes() > 0
+            opCache.Input.disconnect()
+            opCache.cleanUp()
+            assert spill_store.usedBytes() == 0
+        finally:
+            cacheSpillStore.configure(None, 0)
+
     def testCompressed(self):
         graph = Graph()
         opDataProvider = OpArrayPiperWithAccessCount(graph=graph)
@@ -0,0 +1,58 @@
+import numpy
+import pytest
+import vigra
+
+from lazyflow.graph import Graph
+from lazyflow.operators.classifierOperators import OpVectorwiseClassifierPredict
+from lazyflow.classifiers import ParallelVigraRfLazyflowClassifierFactory
+
+
+@pytest.fixture
+def features():
+    features = numpy.indices((60, 50)).astype(numpy.float32) + 0.5
+    return vigra.taggedView(numpy.rollaxis(features, 0, 3), "xyc")
+
+
+@pytest.fixture
+def factory():
+    return ParallelVigraRfLazyflowClassifierFactory(10)
+
+
+@pytest.fixture
+def classifier(features, factory):
+    # Class 1 in the left half, class 2 in the right half
+    X = numpy.asarray(features).reshape(-1, 2)
+    y = (X[:, 0] >= 30).astype(numpy.uint32) + 1
+    return factory.create_and_train(X, y)
+
+
+@pytest.fixture
+def op_predict(features, factory, classifier):
+    op = OpVectorwiseClassifierPredict(graph=Graph())
+    op.Image.setValue(features)
+    op.LabelsCount.setValue(2)
+    op.Classifier.setValue(classifier, extra_meta={"classifier_factory": factory})
+    return op
+
+
+def test_predict(op_predict, features, classifier):
+    predictions = op_predict.PMaps[:].wait()
+    assert predictions.shape == (60, 50, 2)
+    expected = classifier.predict_probabilities(numpy.asarray(features).reshape(-1, 2)).reshape(60, 50, 2)
+    numpy.testing.assert_allclose(predictions, expected, rtol=1e-5, atol=1e-6)
+
+    assert (predictions[:20, ..., 0] > 0.5).all()
+    assert (predictions[40:, ..., 1] > 0.5).all()
+
+
+def test_predict_with_mask(op_predict, features, classifier):
+    mask = numpy.zeros((60, 50, 1), dtype=numpy.uint8)
+    mask[10:50, 5:15] = 1
+    op_predict.PredictionMask.setValue(vigra.taggedView(mask, "xyc"))
+
+    predictions = numpy.asarray(op_predict.PMaps[:, :, 1:2].wait())
+    assert predictions.shape == (60, 50, 1)
+    assert not predictions[mask[..., 0] == 0].any()
+
+    expected = classifier.predict_probabilities(numpy.asarray(features)[10:50, 5:15].reshape(-1, 2))[:, 1]
+    numpy.testing.assert_allclose(predictions[10:50, 5:15].reshape(-1), expected, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,78 @@
+import os
+
+import numpy
+
+from lazyflow.operators import persistentBlockCache
+from lazyflow.operators.persistentBlockCache import PersistentBlockCache, blockKey
+
+
+def test_block_key():
+    data = numpy.arange(10, dtype=numpy.uint8)
+    assert blockKey("op", (0, 10), data) == blockKey("op", (0, 10), data.copy())
+    assert blockKey("op", (0, 10), data) != blockKey("op", (0, 11), data)
+    assert blockKey("op", data) != blockKey("op", data.astype(numpy.uint16))
+    changed = data.copy()
+    changed[3] = 42
+    assert blockKey("op", data) != blockKey("op", changed)
+
+
+def test_put_get(tmp_path):
+    cache = PersistentBlockCache(str(tmp_path), capacity=1024**2)
+    data = numpy.random.random((4, 5, 6)).astype(numpy.float32)
+    key = blockKey("block", data)
+
+    out = numpy.zeros_like(data)
+    assert not cache.get(key, out)
+    cache.put(key, data)
+    assert cache.get(key, out)
+    numpy.testing.assert_array_equal(out, data)
+
+    # Entries persist across instances (e.g. sessions)
+    cache = PersistentBlockCache(str(tmp_path), capacity=1024**2)
+    assert cache.usedBytes() >= data.nbytes
+    out = numpy.zeros_like(data)
+    assert cache.get(key, out)
+    numpy.testing.assert_array_equal(out, data)
+
+    # Mismatching shapes are treated as a miss
+    assert not cache.get(key, numpy.zeros((4, 5), dtype=numpy.float32))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_overwrite_does_not_count_twice(tmp_path):
+    cache = PersistentBlockCache(str(tmp_path), capacity=1024**2)
+    data = numpy.zeros(1000, dtype=numpy.uint8)
+    cache.put("key", data)
+    used = cache.usedBytes()
+    cache.put("key", data)
+    assert cache.usedBytes() == used == os.path.getsize(cache._path("key"))
+
+
+def test_lru_pruning(tmp_path):
+    block = numpy.zeros(1000, dtype=numpy.uint8)
+    cache = PersistentBlockCache(str(tmp_path), capacity=3500)
+    for i in range(3):
+        cache.put(f"key{i}", block)
+        path = cache._path(f"key{i}")
+        os.utime(path, (i, i))
+
+    # Reading an entry makes it the most recently used one
+    assert cache.get("key0", numpy.empty_like(block))
+
+    cache.put("key3", block)
+    assert cache.usedBytes() <= 0.9 * cache.capacity
+    out = numpy.empty_like(block)
+    assert not cache.get("key1", out)
+    assert not cache.get("key2", out)
+    assert cache.get("key0", out)
+    assert cache.get("key3", out)
+
+
+def test_configure(tmp_path):
+    try:
+        cache = persistentBlockCache.configure(str(tmp_path), 1024**2)
+        assert persistentBlockCache.getPersistentCache() is cache
+        assert cache.directory.startswith(str(tmp_path))
+    finally:
+        persistentBlockCache.configure(None, 0)
+    assert persistentBlockCache.getPersistentCache() is None
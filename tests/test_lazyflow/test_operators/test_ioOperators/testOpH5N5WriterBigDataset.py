@@ -19,6 +19,7 @@
 # This information is also available on the ilastik web site at:
 # 		   http://ilastik.org/license/
 ###############################################################################
+import os
 from typing import Union
 
 import h5py
@@ -30,6 +31,7 @@ import z5py
 import lazyflow.graph
 from lazyflow.operators.ioOperators import OpH5N5WriterBigDataset
 from lazyflow.operators.opArrayPiper import OpArrayPiper
+from lazyflow.utility.exportManifest import ExportManifest
 
 
 def setup_writer(
@@ -160,3 +162,90 @@ def test_write_to_group_with_extra_meta(tmp_path, graph, test_data_default_order
         numpy.testing.assert_array_equal(dataset[...], test_data_default_order.view(numpy.ndarray)[...])
     finally:
         file.close()
+
+
+@pytest.mark.parametrize("compression", [True, False])
+def test_write_to_h5_group_in_open_file(tmp_path, graph, test_data_default_order, compression):
+    """Like the project file serializers, which pass a group of the open project file"""
+    opPiper = OpArrayPiper(graph=graph)
+    opPiper.Input.setValue(test_data_default_order)
+
+    file_path = tmp_path / "test.h5"
+    with h5py.File(file_path, "w") as file:
+        g = file.create_group("Counting/volume")
+        opWriter = setup_writer(graph, g, "data", opPiper.Output)
+        opWriter.CompressionEnabled.setValue(compression)
+        assert opWriter.WriteImage.value  # Trigger write
+        opWriter.cleanUp()
+
+    with h5py.File(file_path, "r") as file:
+        dataset = file["Counting/volume/data"]
+        assert dataset.compression == ("gzip" if compression else None)
+        numpy.testing.assert_array_equal(dataset[...], test_data_default_order.view(numpy.ndarray))
+
+
+class OpInterruptingPiper(OpArrayPiper):
+    """Counts the requests, and fails the request with the given number (to simulate an interrupted export)."""
+
+    def __init__(self, fail_on_request=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_on_request = fail_on_request
+        self.request_count = 0
+
+    def execute(self, slot, subindex, roi, result):
+        self.request_count += 1
+        if self.request_count == self.fail_on_request:
+            raise RuntimeError("Export interrupted")
+        return super().execute(slot, subindex, roi, result)
+
+
+@pytest.mark.parametrize(
+    "file_ext, file_class",
+    [
+        ("h5", h5py.File),
+        ("n5", z5py.N5File),
+    ],
+)
+def test_resume_interrupted_export(tmp_path, graph, test_data_default_order, file_ext, file_class):
+    file_path = tmp_path / f"test.{file_ext}"
+    manifest_path = ExportManifest.pathFor(str(file_path))
+
+    def export(fail_on_request=None, resume=False):
+        opPiper = OpInterruptingPiper(fail_on_request, graph=graph)
+        opPiper.Input.setValue(test_data_default_order)
+        # Force many small blocks
+        opPiper.Output.meta.ideal_blockshape = (1, 1, 0, 0, 1)
+        opPiper.Output.meta.ram_usage_per_requested_pixel = 1000000.0
+
+        file = file_class(file_path, "a")
+        # Configure resuming before the writer sets up the dataset
+        opWriter = OpH5N5WriterBigDataset(graph=graph)
+        try:
+            opWriter.Manifest.setValue(ExportManifest(manifest_path, flush=getattr(file, "flush", None)))
+            opWriter.Resume.setValue(resume)
+            opWriter.BatchSize.setValue(1)
+            opWriter.h5N5File.setValue(file)
+            opWriter.h5N5Path.setValue("volume/data")
+            opWriter.Image.connect(opPiper.Output)
+            opWriter.WriteImage[:].wait()
+        finally:
+            opWriter.cleanUp()
+            file.close()
+        return opPiper.request_count
+
+    num_blocks = export()
+    assert num_blocks > 4
+    assert not os.path.exists(manifest_path), "The manifest of a complete export should be removed"
+
+    with pytest.raises(Exception):
+        export(fail_on_request=num_blocks // 2)
+    assert os.path.exists(manifest_path)
+
+    assert export(resume=True) < num_blocks
+    assert not os.path.exists(manifest_path)
+
+    file = file_class(file_path, "r")
+    try:
+        numpy.testing.assert_array_equal(file["volume/data"][...], test_data_default_order.view(numpy.ndarray))
+    finally:
+        file.close()
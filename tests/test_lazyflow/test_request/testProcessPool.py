@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+import numpy
+import pytest
+
+from lazyflow.request import Request, processPool
+
+
+@processPool.kernel
+def _pid_and_sum(data, offset=0):
+    return os.getpid(), int(data.sum()) + offset
+
+
+@processPool.kernel(outputs=["out"])
+def _square(data, *, out):
+    numpy.square(data, out=out)
+
+
+@processPool.kernel
+def _wait_for_cancellation(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if processPool.isCancelled():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def pool():
+    processPool.configure(2)
+    try:
+        yield
+    finally:
+        processPool.configure(0)
+
+
+def test_disabled_by_default():
+    assert processPool.numWorkers() == 0
+    pid, total = _pid_and_sum(numpy.arange(10), offset=1)
+    assert pid == os.getpid()
+    assert total == 46
+
+
+def test_runs_in_worker_process(pool):
+    assert processPool.numWorkers() == 2
+    pid, total = Request(lambda: _pid_and_sum(numpy.arange(10), offset=1)).wait()
+    assert pid != os.getpid()
+    assert total == 46
+
+
+def test_output_arrays(pool):
+    data = numpy.arange(24, dtype=numpy.float32).reshape(2, 3, 4)
+    out = numpy.zeros_like(data)
+    Request(lambda: _square(data, out=out)).wait()
+    numpy.testing.assert_array_equal(out, data**2)
+
+
+def test_output_views(pool):
+    """Non-contiguous outputs (e.g. a part of the result array of an operator) are written correctly."""
+    data = numpy.arange(12, dtype=numpy.uint32).reshape(3, 4)
+    out = numpy.zeros((6, 8), dtype=numpy.uint32)
+    _square(data, out=out[::2, ::2])
+    numpy.testing.assert_array_equal(out[::2, ::2], data**2)
+    assert not out[1::2].any()
+
+
+def test_cancel_callbacks_are_removed(pool):
+    """Every kernel call registers a cancel callback with the calling request, which is removed once it is done."""
+
+    def work():
+        req = Request._current_request()
+        for i in range(3):
+            _pid_and_sum(numpy.arange(10), offset=i)
+        return list(req._sig_cancel_requested.callbacks)
+
+    req = Request(work)
+    req.submit()
+    assert req.wait() == []
+
+
+def test_cancellation(pool):
+    started = threading.Event()
+    cancelled = threading.Event()
+    results = []
+
+    def work():
+        started.set()
+        results.append(_wait_for_cancellation(30))
+
+    req = Request(work)
+    req.notify_cancelled(cancelled.set)
+    req.submit()
+    started.wait()
+    time.sleep(0.5)
+    req.cancel()
+
+    # The request doesn't wait for the kernel to finish
+    assert cancelled.wait(10)
+    assert results == []
+
+
+def test_cancel_callback():
+    cancel_callbacks = []
+    started = threading.Event()
+    finish = threading.Event()
+
+    def work():
+        started.set()
+        finish.wait()
+
+    req = Request(work)
+    req.add_cancel_callback(lambda: cancel_callbacks.append("registered before"))
+    req.submit()
+    started.wait()
+    req.cancel()
+    assert cancel_callbacks == ["registered before"]
+
+    # Already cancelled: called right away
+    req.add_cancel_callback(lambda: cancel_callbacks.append("registered after"))
+    assert cancel_callbacks == ["registered before", "registered after"]
+
+    # Not called again
+    req.cancel()
+    assert len(cancel_callbacks) == 2
+    finish.set()
+
+
+def test_remove_cancel_callback():
+    cancel_callbacks = []
+    finish = threading.Event()
+
+    def callback():
+        cancel_callbacks.append("removed")
+
+    req = Request(finish.wait)
+    req.add_cancel_callback(callback)
+    req.remove_cancel_callback(callback)
+    req.submit()
+    req.cancel()
+    assert cancel_callbacks == []
+    finish.set()
@@ -0,0 +1,115 @@
+import json
+import time
+
+import numpy
+import pytest
+
+from lazyflow.request import Request, RequestPool, profiler
+
+
+@pytest.fixture
+def prof():
+    p = profiler.start()
+    yield p
+    profiler.stop()
+
+
+def test_profiler_inactive_by_default():
+    assert not profiler.active
+
+
+def test_start_stop(prof):
+    assert profiler.active
+    assert profiler.current() is prof
+    assert profiler.stop() is prof
+    assert not profiler.active
+
+
+class FakeRoi:
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+
+def _profiled(name, fn, roi=FakeRoi((0, 0), (10, 20))):
+    def wrapper():
+        frame = profiler.enter(name, "Output", roi)
+        result = None
+        try:
+            result = fn()
+            return result
+        finally:
+            profiler.leave(frame, result)
+
+    return wrapper
+
+
+def test_records_execution(prof):
+    Request(_profiled("OpA", lambda: numpy.zeros((10, 20), dtype=numpy.uint8))).wait()
+
+    assert len(prof.records) == 1
+    record = prof.records[0]
+    assert record.name == "OpA"
+    assert record.slot == "Output"
+    assert record.roi_shape == (10, 20)
+    assert record.nbytes == 200
+    assert record.wall >= 0
+
+
+def test_waiting_for_child_counts_as_blocked(prof):
+    def child():
+        time.sleep(0.1)
+        return numpy.zeros(1)
+
+    def parent():
+        pool = RequestPool()
+        for _ in range(2):
+            pool.add(Request(_profiled("OpChild", child)))
+        pool.wait()
+
+    Request(_profiled("OpParent", parent)).wait()
+
+    records = {r.name: r for r in prof.records}
+    assert records["OpParent"].blocked >= 0.1
+    assert records["OpParent"].wall - records["OpParent"].blocked < 0.1
+    assert records["OpChild"].blocked == 0
+
+
+def test_summary(prof):
+    for _ in range(3):
+        Request(_profiled("OpA", lambda: numpy.zeros(4, dtype=numpy.uint8))).wait()
+    Request(_profiled("OpB", lambda: time.sleep(0.05))).wait()
+
+    summary = {s.name: s for s in prof.summary()}
+    assert summary["OpA"].calls == 3
+    assert summary["OpA"].nbytes == 12
+    assert summary["OpA"].voxels == 600
+    assert prof.summary()[0].name == "OpB"
+    assert "OpA" in prof.summary_table()
+
+
+def test_save(prof, tmp_path):
+    Request(_profiled("OpA", lambda: None)).wait()
+
+    trace_path = tmp_path / "trace.json"
+    profiler.save(str(trace_path))
+    assert not profiler.active
+
+    trace = json.loads(trace_path.read_text())
+    events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert [e["name"] for e in events] == ["OpA"]
+    assert (tmp_path / "trace.summary.csv").read_text().startswith("name,calls")
+
+
+def test_operator_execute_is_profiled(prof, graph):
+    from lazyflow.operators import OpArrayPiper
+
+    op = OpArrayPiper(graph=graph)
+    op.Input.setValue(numpy.zeros((10, 20), dtype=numpy.float32))
+    op.Output[2:4, :].wait()
+
+    records = [r for r in prof.records if r.name == op.name]
+    assert len(records) == 1
+    assert records[0].slot == "Output"
+    assert records[0].roi_shape == (2, 20)
+    assert records[0].nbytes == 2 * 20 * 4
@@ -5,7 +5,7 @@ import itertools
 
 import pytest
 
-from lazyflow.request.threadPool import ThreadPool
+from lazyflow.request.threadPool import SCHEDULERS, ThreadPool, WorkStealingThreadPool, _parse_cpulist, make_thread_pool
 
 
 NUM_WORKERS = 4
@@ -119,3 +119,116 @@ def test_exception_in_task_logged(caplog, pool):
     record = caplog.records[0]
 
     assert issubclass(record.exc_info[0], MyExc)
+
+
+@pytest.fixture(params=SCHEDULERS)
+def any_pool(request):
+    p = make_thread_pool(NUM_WORKERS, scheduler=request.param)
+    yield p
+    p.stop()
+
+
+def test_make_thread_pool_rejects_unknown_scheduler():
+    with pytest.raises(ValueError):
+        make_thread_pool(NUM_WORKERS, scheduler="nonsense")
+
+
+def test_make_thread_pool_work_stealing():
+    pool = make_thread_pool(NUM_WORKERS, scheduler="work-stealing", numa_aware=True)
+    try:
+        assert isinstance(pool, WorkStealingThreadPool)
+        assert pool.num_workers == NUM_WORKERS
+    finally:
+        pool.stop()
+
+
+def test_many_tasks_are_all_executed(any_pool: ThreadPool):
+    num_tasks = 1000
+    done = threading.Event()
+    lock = threading.Lock()
+    executed = []
+
+    def task():
+        with lock:
+            executed.append(1)
+            if len(executed) == num_tasks:
+                done.set()
+
+    for _ in range(num_tasks):
+        any_pool.wake_up(Task(task))
+
+    assert done.wait(timeout=10)
+
+
+def test_tasks_submitted_from_workers_are_executed(any_pool: ThreadPool):
+    num_children = 100
+    done = threading.Event()
+    lock = threading.Lock()
+    executed = []
+
+    def child():
+        with lock:
+            executed.append(1)
+            if len(executed) == NUM_WORKERS * num_children:
+                done.set()
+
+    def parent():
+        for _ in range(num_children):
+            any_pool.wake_up(Task(child))
+
+    for _ in range(NUM_WORKERS):
+        any_pool.wake_up(Task(parent))
+
+    assert done.wait(timeout=10)
+
+
+def test_work_stealing_idle_workers_steal_from_busy_worker():
+    pool = WorkStealingThreadPool(NUM_WORKERS)
+    release = threading.Event()
+    lock = threading.Lock()
+    threads = set()
+
+    def blocking():
+        with lock:
+            threads.add(threading.current_thread())
+        release.wait(timeout=5)
+
+    def parent():
+        # All children land in this worker's own queue, which it can't drain while blocked
+        for _ in range(NUM_WORKERS - 1):
+            pool.wake_up(Task(blocking))
+        blocking()
+
+    try:
+        pool.wake_up(Task(parent))
+        deadline = time.time() + 5
+        while len(threads) < NUM_WORKERS and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(threads) == NUM_WORKERS
+    finally:
+        release.set()
+        pool.stop()
+
+
+def test_assigned_tasks_are_not_stolen(any_pool: ThreadPool):
+    worker = random.choice(list(any_pool.workers))
+    done = threading.Event()
+    threads = []
+
+    def task():
+        threads.append(threading.current_thread())
+        if len(threads) == 20:
+            done.set()
+
+    for _ in range(20):
+        t = Task(task)
+        t.assigned_worker = worker
+        any_pool.wake_up(t)
+
+    assert done.wait(timeout=5)
+    assert set(threads) == {worker}
+
+
+def test_parse_cpulist():
+    assert _parse_cpulist("0-3,8,10-11\n") == {0, 1, 2, 3, 8, 10, 11}
+    assert _parse_cpulist("") == set()
@@ -2,8 +2,10 @@ from builtins import object
 from unittest import TestCase
 
 import numpy
+import pytest
 
 from lazyflow.roi import (
+    Box,
     determineBlockShape,
     determine_optimal_request_blockshape,
     getIntersection,
@@ -12,6 +14,10 @@ from lazyflow.roi import (
     nonzero_bounding_box,
     containing_rois,
     getIntersectingBlocks,
+    getIntersectingBlockRois,
+    getIntersectingRois,
+    getBlockBounds,
+    roiToSlice,
 )
 
 
@@ -74,6 +80,15 @@ class Test_getIntersection(object):
 
 
 class TestEnlargeRoiForHalo(object):
+    def testResultRoi(self):
+        start = numpy.array([0, 10, 10])
+        stop = numpy.array([1, 20, 95])
+        enlarged_roi, result_roi = enlargeRoiForHalo(
+            start, stop, (1, 100, 100), (1.0, 2.0, 2.0), window=2, enlarge_axes=(0, 1, 1), return_result_roi=True
+        )
+        assert (enlarged_roi == [[0, 6, 6], [1, 24, 99]]).all()
+        assert (result_roi == [[0, 4, 4], [1, 14, 89]]).all()
+
     def testBasic(self):
         start = TinyVector([10, 100, 200, 300, 1])
         stop = TinyVector([11, 150, 300, 500, 3])
@@ -147,3 +162,115 @@ class TestGetIntersectionBlocks(TestCase):
 
         with self.assertRaises(AssertionError):
             getIntersectingBlocks(numpy.array((256, 256, 0, 2)), ([0, 0, 0, 0], [256, 256, 256, 2]))
+
+    def test_many_blocks(self):
+        blockshape = (1, 64, 64, 3)
+        roi = ([0, 0, 0, 0], [1, 1000, 1000, 3])
+        block_starts = getIntersectingBlocks(blockshape, roi)
+        assert block_starts.shape == (16 * 16, 4)
+        assert (block_starts[:2] == [[0, 0, 0, 0], [0, 0, 64, 0]]).all()
+        assert (block_starts[-1] == [0, 960, 960, 0]).all()
+
+        block_start_matrix = getIntersectingBlocks(blockshape, roi, asarray=True)
+        assert block_start_matrix.shape == (1, 16, 16, 1, 4)
+        assert (block_start_matrix.reshape(-1, 4) == block_starts).all()
+
+
+class TestGetIntersectingBlockRois(object):
+    def testSameAsBlockBounds(self):
+        dataset_shape = (35, 50, 7)
+        blockshape = (10, 20, 3)
+        roi = ([5, 12, 1], [33, 50, 6])
+
+        for clip in (True, False):
+            starts, stops = getIntersectingBlockRois(dataset_shape, blockshape, roi, clip)
+            block_starts = getIntersectingBlocks(blockshape, roi)
+            assert starts.shape == stops.shape == block_starts.shape
+
+            for block_start, start, stop in zip(block_starts, starts, stops):
+                expected = getBlockBounds(dataset_shape, blockshape, block_start)
+                if clip:
+                    expected = getIntersection(expected, roi)
+                assert (start == expected[0]).all()
+                assert (stop == expected[1]).all()
+
+            block_rois = getIntersectingRois(dataset_shape, blockshape, roi, clip)
+            assert [(tuple(a), tuple(b)) for a, b in block_rois] == list(zip(map(tuple, starts), map(tuple, stops)))
+
+    def testEmpty(self):
+        starts, stops = getIntersectingBlockRois((10, 10), (5, 5), ([5, 4], [5, 8]))
+        assert starts.shape == stops.shape == (0, 2)
+
+
+class TestBox(object):
+    def testBasic(self):
+        box = Box(numpy.array([1, 2, 3]), [4, 5, 6])
+        assert box.start == (1, 2, 3)
+        assert box.stop == (4, 5, 6)
+        assert all(type(x) is int for x in box.start)
+        assert box.shape == (3, 3, 3)
+        assert box.ndim == 3
+        assert not box.is_empty()
+        assert Box((1, 2), (1, 5)).is_empty()
+
+    def testSlicing(self):
+        box = Box([1, 2, 3], [4, 5, 6])
+        assert box.slicing == roiToSlice([1, 2, 3], [4, 5, 6])
+        assert box.slicing is box.slicing
+
+        data = numpy.arange(7 * 8 * 9).reshape(7, 8, 9)
+        assert (data[box.slicing] == data[1:4, 2:5, 3:6]).all()
+
+    def testImmutable(self):
+        box = Box([1, 2], [3, 4])
+        with pytest.raises(AttributeError):
+            box.start = (0, 0)
+        with pytest.raises(AttributeError):
+            box.foo = 1
+        assert box == Box((1, 2), (3, 4))
+        assert len({box, Box((1, 2), (3, 4))}) == 1
+
+    def testMismatchedLengths(self):
+        with pytest.raises(ValueError):
+            Box([1, 2], [3, 4, 5])
+
+    def testCompatibility(self):
+        box = Box([10, 10, 10], [20, 20, 20])
+        start, stop = box
+        assert (start, stop) == ((10, 10, 10), (20, 20, 20))
+        assert (numpy.asarray(box) == [[10, 10, 10], [20, 20, 20]]).all()
+        assert roiToSlice(*box) == box.slicing
+
+        intersection = getIntersection(box, [(15, 16, 17), (25, 25, 25)])
+        assert (numpy.array(intersection) == ([15, 16, 17], [20, 20, 20])).all()
+
+    def testIntersection(self):
+        box = Box([10, 10, 10], [20, 20, 20])
+        assert box.intersection([(15, 16, 17), (25, 25, 25)]) == Box((15, 16, 17), (20, 20, 20))
+        assert box.intersection(Box((15, 26, 27), (16, 30, 30))) is None
+        assert box.contains(Box((12, 12, 12), (20, 15, 16)))
+        assert not box.contains(Box((12, 12, 12), (21, 15, 16)))
+
+    def testRelativeTo(self):
+        box = Box([10, 10, 10], [20, 20, 20])
+        assert box.relative_to(numpy.array([5, 10, 15])) == Box((5, 0, -5), (15, 10, 5))
+        assert box.translated((1, 2, 3)) == Box((11, 12, 13), (21, 22, 23))
+
+    def testEnlarged(self):
+        box = Box([0, 10, 10, 300, 1], [1, 150, 300, 490, 2])
+        shape = (20, 152, 500, 500, 10)
+        enlarged = box.enlarged((0, 7, 7, 7, 0), shape)
+        assert enlarged == Box((0, 3, 3, 293, 1), (1, 152, 307, 497, 2))
+
+        expected = enlargeRoiForHalo(box.start, box.stop, shape, 3.1, 2, (0, 1, 1, 1, 0))
+        assert enlarged == Box(*expected)
+        assert Box.from_shape((3, 4)).enlarged(2) == Box((0, 0), (5, 6))
+
+    def testBlocks(self):
+        box = Box.from_slicing(numpy.s_[15:23, 25:], (35, 35))
+        assert box == Box((15, 25), (23, 35))
+        assert (box.block_starts((10, 20)) == getIntersectingBlocks((10, 20), box)).all()
+
+        starts, stops = box.blocks((10, 20), (35, 35))
+        assert (starts == [[15, 25], [20, 25]]).all()
+        assert (stops == [[20, 35], [23, 35]]).all()
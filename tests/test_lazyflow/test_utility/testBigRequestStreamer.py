@@ -158,3 +158,41 @@ def test_pool_results_discarded():
     # Now check that ALL results are truly lost.
     for ref in result_refs:
         assert ref() is None, "Some data was not discarded."
+
+
+def test_skip_roi():
+    op = OpArrayPiper(graph=Graph())
+    inputData = numpy.indices((100, 100)).sum(0)
+    op.Input.setValue(inputData)
+
+    def skip(roi):
+        return roi[0][0] < 50
+
+    handled_rois = []
+    progress = []
+    batch = BigRequestStreamer(op.Output, [(0, 0), (100, 100)], (10, 10), skipRoi=skip)
+    batch.resultSignal.subscribe(lambda roi, result: handled_rois.append(roi))
+    batch.progressSignal.subscribe(progress.append)
+    batch.execute()
+
+    assert batch.blockshape == (10, 10)
+    assert len(handled_rois) == 50
+    assert all(start[0] >= 50 for start, stop in handled_rois)
+    assert progress[-1] == 100
+
+
+def test_skip_roi_is_checked_in_requests():
+    op = OpArrayPiper(graph=Graph())
+    op.Input.setValue(numpy.indices((100, 100)).sum(0))
+
+    checked_rois = []
+
+    def skip(roi):
+        assert Request._current_request() is not None
+        checked_rois.append(roi)
+        return False
+
+    batch = BigRequestStreamer(op.Output, [(0, 0), (100, 100)], (10, 10), skipRoi=skip)
+    assert not checked_rois, "blocks should be checked when they are scheduled"
+    batch.execute()
+    assert len(checked_rois) == 100
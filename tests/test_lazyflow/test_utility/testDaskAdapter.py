@@ -0,0 +1,48 @@
+import numpy
+import pytest
+import vigra
+
+from lazyflow.graph import Graph
+from lazyflow.operators import OpArrayLikeSource, OpArrayPiper
+from lazyflow.utility import slotToDaskArray
+
+da = pytest.importorskip("dask.array", reason="These tests require dask")
+
+
+@pytest.fixture
+def data():
+    return vigra.taggedView(numpy.random.default_rng(0).random((40, 50, 3)).astype(numpy.float32), "yxc")
+
+
+@pytest.fixture
+def op(data):
+    op = OpArrayPiper(graph=Graph())
+    op.Input.setValue(data)
+    return op
+
+
+def test_slot_to_dask_array(op, data):
+    array = slotToDaskArray(op.Output, chunks=(16, 16, 3))
+    assert array.shape == data.shape
+    assert array.dtype == numpy.float32
+    assert array.chunks == ((16, 16, 8), (16, 16, 16, 2), (3,))
+
+    numpy.testing.assert_array_equal(array.compute(), data)
+    numpy.testing.assert_allclose(array[5:30, 7:9].sum(axis=-1).compute(), data[5:30, 7:9].sum(axis=-1), rtol=1e-6)
+
+
+def test_default_chunks_from_ideal_blockshape(op, data):
+    op.Output.meta.ideal_blockshape = (20, 0, 0)
+    assert slotToDaskArray(op.Output).chunks == ((20, 20), (50,), (3,))
+
+
+def test_slot_must_be_ready():
+    op = OpArrayPiper(graph=Graph())
+    with pytest.raises(ValueError):
+        slotToDaskArray(op.Output)
+
+
+def test_round_trip(op, data):
+    source = OpArrayLikeSource(graph=Graph())
+    source.setArray(slotToDaskArray(op.Output, chunks=(10, 25, 3)) + 1, "yxc")
+    numpy.testing.assert_allclose(source.Output[3:33, 10:20].wait(), numpy.asarray(data)[3:33, 10:20] + 1)
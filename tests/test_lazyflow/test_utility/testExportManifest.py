@@ -0,0 +1,67 @@
+import os
+
+import numpy
+import pytest
+
+from lazyflow.utility.exportManifest import ExportManifest
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return ExportManifest.pathFor(str(tmp_path / "export.zarr"))
+
+
+def test_path_for(tmp_path):
+    assert ExportManifest.pathFor("/data/export.n5/") == "/data/export.n5.manifest.json"
+
+
+def test_blocks_are_kept_for_resume(manifest_path):
+    data = numpy.arange(100, dtype=numpy.uint16).reshape(10, 10)
+    manifest = ExportManifest(manifest_path)
+    dataset = manifest.dataset("s0", data.shape, data.dtype)
+    dataset.blockshape = (5, 10)
+    dataset.markComplete(((0, 0), (5, 10)), data[:5])
+    manifest.save()
+
+    resumed = ExportManifest(manifest_path).dataset("s0", data.shape, data.dtype, resume=True)
+    assert resumed.blockshape == (5, 10)
+    assert resumed.numCompleted == 1
+    assert resumed.isComplete(((0, 0), (5, 10)))
+    assert not resumed.isComplete(((5, 0), (10, 10)))
+
+    # The data in the export is checked against the checksum
+    assert resumed.isComplete(((0, 0), (5, 10)), read=lambda roi: data[:5])
+    assert not resumed.isComplete(((0, 0), (5, 10)), read=lambda roi: numpy.zeros_like(data[:5]))
+
+
+@pytest.mark.parametrize(
+    "resume, shape, dtype", [(False, (10, 10), "uint16"), (True, (10, 11), "uint16"), (True, (10, 10), "uint8")]
+)
+def test_blocks_are_discarded(manifest_path, resume, shape, dtype):
+    data = numpy.ones((10, 10), dtype=numpy.uint16)
+    manifest = ExportManifest(manifest_path)
+    manifest.dataset("s0", data.shape, data.dtype).markComplete(((0, 0), (10, 10)), data)
+    manifest.save()
+
+    assert ExportManifest(manifest_path).dataset("s0", shape, dtype, resume=resume).numCompleted == 0
+
+
+def test_finished_datasets_are_removed(manifest_path):
+    manifest = ExportManifest(manifest_path)
+    data = numpy.ones((4,), dtype=numpy.float32)
+    for name in ("a", "b"):
+        manifest.dataset(name, data.shape, data.dtype).markComplete(((0,), (4,)), data)
+    manifest.save()
+
+    manifest.dataset("a", data.shape, data.dtype, resume=True).finish()
+    assert os.path.exists(manifest_path)
+    assert ExportManifest(manifest_path).dataset("b", data.shape, data.dtype, resume=True).numCompleted == 1
+
+    manifest.dataset("b", data.shape, data.dtype, resume=True).finish()
+    assert not os.path.exists(manifest_path)
+
+
+def test_invalid_manifest_is_ignored(manifest_path):
+    with open(manifest_path, "w") as f:
+        f.write("{not json")
+    assert ExportManifest(manifest_path).dataset("s0", (3,), "uint8", resume=True).numCompleted == 0
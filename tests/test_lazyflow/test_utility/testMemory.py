@@ -64,6 +64,17 @@ class TestMemory(unittest.TestCase):
         Memory.setAvailableRamCaches(cache_ram)
         assert Memory.getAvailableRamCaches() == cache_ram
 
+    def testSharedComputation(self):
+        Memory.setAvailableRam(4000)
+        Memory.setAvailableRamCaches(1000)
+        assert Memory.getAvailableRamComputation() == 3000
+        with Memory.sharedComputation(4):
+            assert Memory.getAvailableRamComputation() == 750
+        assert Memory.getAvailableRamComputation() == 3000
+
+        with self.assertRaises(ValueError):
+            Memory.setComputationShares(0)
+
     def testParsing(self):
         parse = Memory.parse
 
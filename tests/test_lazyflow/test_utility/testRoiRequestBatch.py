@@ -23,6 +23,7 @@ import pytest
 
 import numpy
 import threading
+import time
 from lazyflow.graph import Graph
 from lazyflow.utility import is_root_cause
 from lazyflow.roi import getIntersectingBlocks, getBlockBounds, roiToSlice
@@ -127,3 +128,69 @@ class TestRoiRequestBatch(object):
             batch.execute()
 
         assert is_root_cause(ProcessingException, exc_info.value)
+
+    def testPrefetch(self):
+        """
+        With prefetching, requests keep computing while a slow result handler is busy,
+        but no more than batchSize + prefetch results exist at any time.
+        """
+        op = OpArrayPiper(graph=Graph())
+        inputData = numpy.indices((100, 100)).sum(0)
+        op.Input.setValue(inputData)
+        roiList = [
+            getBlockBounds([100, 100], [10, 10], start)
+            for start in getIntersectingBlocks([10, 10], ([0, 0], [100, 100]))
+        ]
+
+        results = numpy.zeros((100, 100), dtype=numpy.int32)
+        handler_threads = set()
+        handled = []
+        max_ahead = [0]
+
+        batch = RoiRequestBatch(op.Output, iter(roiList), numpy.prod(inputData.shape), batchSize=2, prefetch=3)
+
+        def handleResult(roi, result):
+            handler_threads.add(threading.current_thread())
+            # Slow writer
+            time.sleep(0.01)
+            results[roiToSlice(*roi)] = result
+            handled.append(roi)
+            max_ahead[0] = max(max_ahead[0], batch._activated_count - len(handled))
+
+        progressList = []
+        batch.resultSignal.subscribe(handleResult)
+        batch.progressSignal.subscribe(progressList.append)
+        batch.execute()
+
+        assert (results == inputData).all()
+        assert len(handled) == len(roiList)
+        assert progressList[0] == 0 and progressList[-1] == 100
+
+        # All results were handled by the writer thread
+        assert len(handler_threads) == 1
+        assert handler_threads.pop() is not threading.current_thread()
+
+        assert max_ahead[0] <= 2 + 3
+
+    def testPrefetchFailedResultHandler(self):
+        op = OpArrayPiper(graph=Graph())
+        op.Input.setValue(numpy.indices((100, 100)).sum(0))
+        roiList = [
+            getBlockBounds([100, 100], [10, 10], start)
+            for start in getIntersectingBlocks([10, 10], ([0, 0], [100, 100]))
+        ]
+
+        class SpecialException(Exception):
+            pass
+
+        def handleResult(roi, result):
+            raise SpecialException("Intentional Exception: raised while handling the result")
+
+        batch = RoiRequestBatch(op.Output, iter(roiList), 100 * 100, batchSize=2, prefetch=2)
+        batch.resultSignal.subscribe(handleResult)
+
+        with pytest.raises(RoiRequestBatchException) as exc_info:
+            batch.execute()
+
+        assert is_root_cause(SpecialException, exc_info.value)
+        assert not batch._writerThread.is_alive()
@@ -1,3 +1,4 @@
+import os
 from collections import OrderedDict
 from typing import List, Union, Iterable
 from unittest import mock
@@ -9,6 +10,7 @@ import zarr
 
 from lazyflow.operators import OpArrayPiper
 from lazyflow.utility.data_semantics import ImageTypes
+from lazyflow.utility.exportManifest import ExportManifest
 from lazyflow.utility.io_util import multiscaleStore
 from lazyflow.utility.io_util.OMEZarrStore import OMEZarrMultiscaleMeta
 from lazyflow.utility.io_util.write_ome_zarr import (
@@ -135,6 +137,39 @@ def test_do_not_overwrite(tmp_path, tiny_5d_vigra_array_piper):
     numpy.testing.assert_array_equal(group["s0"], original_data_array)
 
 
+class OpFlakyPiper(OpArrayPiper):
+    """Fails the first request, to simulate an interrupted export."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failed = False
+
+    def execute(self, slot, subindex, roi, result):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("Export interrupted")
+        return super().execute(slot, subindex, roi, result)
+
+
+def test_resume_interrupted_export(tmp_path, graph, tiny_5d_vigra_array_piper):
+    original_data_array = tiny_5d_vigra_array_piper.Output.value
+    export_path = tmp_path / "test.zarr"
+    manifest_path = ExportManifest.pathFor(str(export_path))
+    source_op = OpFlakyPiper(graph=graph)
+    source_op.Input.connect(tiny_5d_vigra_array_piper.Output)
+    progress = mock.Mock()
+
+    with pytest.raises(Exception):
+        write_ome_zarr(str(export_path), source_op.Output, progress, None)
+    assert os.path.exists(manifest_path)
+
+    write_ome_zarr(str(export_path), source_op.Output, progress, None, resume=True)
+    assert not os.path.exists(manifest_path), "The manifest of a complete export should be removed"
+    group = zarr.open(str(export_path))
+    numpy.testing.assert_array_equal(group["s0"], original_data_array)
+    assert "multiscales" in group.attrs
+
+
 def test_match_input_scale_metadata_single_scale_export(tmp_path, tiny_5d_vigra_array_piper):
     """If the source slot has scale (but not OME-Zarr) metadata, single-scale export should match
     the scale name to the input. Scaling metadata should be relative to the input's raw data."""